@@ -1,89 +1,359 @@
-import google.generativeai as genai
-import os
-import logging
-from dotenv import load_dotenv
-from typing import List, Tuple
-
-load_dotenv()
-logger = logging.getLogger(__name__)
-
-
-class AIProcessor:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            default_model = "gemini-2.5-flash"
-            self.model = genai.GenerativeModel(default_model)
-            self.model_name = default_model
-        else:
-            logger.warning(
-                "GEMINI_API_KEY not found. AI summarization will be disabled."
-            )
-            self.model = None
-            self.model_name = None
-
-    def list_models(self) -> List[str]:
-        """Возвращает список доступных моделей.
-        Пытается получить список от API, если доступен ключ. Иначе — дефолтный набор.
-        """
-        default = [
-            "gemini-2.5-flash",
-            "gemini-2.5-pro",
-            "gemini-2.0-flash",
-            "gemini-2.0-pro-exp-02-05",
-            "gemini-1.5-flash",
-            "gemini-1.5-pro",
-        ]
-        models = set(default)
-        if self.api_key:
-            try:
-                for m in genai.list_models():
-                    name = getattr(m, "name", "")
-                    # API возвращает ресурсы вида models/xxx
-                    if name.startswith("models/"):
-                        name = name.split("/", 1)[1]
-                    if name:
-                        models.add(name)
-            except Exception as e:
-                logger.debug(f"list_models failed: {e}")
-        return sorted(models)
-
-    def get_model_name(self) -> str | None:
-        return self.model_name
-
-    def set_model(self, model_name: str) -> Tuple[bool, str]:
-        """Сменить текущую модель. Возвращает (ok, message)."""
-        if not self.api_key:
-            return False, "GEMINI_API_KEY не задан — работа с моделями недоступна"
-        try:
-            self.model = genai.GenerativeModel(model_name)
-            self.model_name = model_name
-            return True, f"Модель установлена: {model_name}"
-        except Exception as e:
-            logger.error(f"Не удалось установить модель '{model_name}': {e}")
-            return False, f"Ошибка при установке модели: {e}"
-
-    def summarize(self, text):
-        """Суммаризация текста с помощью Gemini"""
-        if not self.model or not text.strip():
-            return text[:500] + "..." if len(text) > 500 else text
-
-        try:
-            prompt = f"""
-            Суммаризируй следующий текст кратко и ясно на русском языке.\n
-            Выдели основные идеи и ключевые моменты.
-
-            Текст для суммаризации:
-            {text}
-            """
-
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-
-        except Exception as e:
-            logger.error(f"Gemini summarization error: {e}")
-            return text[:500] + "..." if len(text) > 500 else text
-
-
-ai_processor = AIProcessor()
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from core.cache import TTLCache
+from core.config import config
+from core.lazy import LazyObject, lazy_module
+from core.metrics import counters, metrics
+
+logger = logging.getLogger(__name__)
+
+# Клиент Gemini импортируется при первом обращении: импорт google.generativeai занимает секунды
+genai = lazy_module("google.generativeai")
+
+# Версия промптов входит в ключ кэша: после их правки старые ответы не переиспользуются
+_PROMPT_VERSION = 1
+_MAX_REDUCE_DEPTH = 3
+
+DEFAULT_MODELS = (
+    "gemini-2.5-flash",
+    "gemini-2.5-pro",
+    "gemini-2.0-flash",
+    "gemini-2.0-pro-exp-02-05",
+    "gemini-1.5-flash",
+    "gemini-1.5-pro",
+)
+_MODELS_KEY = "models"
+_MODELS_RETRY_SECONDS = 60.0
+
+_SUMMARY_PROMPT = """
+Суммаризируй следующий текст кратко и ясно на русском языке.\n
+Выдели основные идеи и ключевые моменты.
+
+Текст для суммаризации:
+{text}
+"""
+
+_CHUNK_PROMPT = """
+Это часть {i} из {n} длинного текста. Кратко изложи её на русском языке:
+основные идеи, решения, имена файлов и функций. Не пиши вступлений.
+
+Часть текста:
+{text}
+"""
+
+_REDUCE_PROMPT = """
+Ниже — краткие изложения последовательных частей одного текста.
+Сведи их в одну краткую и ясную суммаризацию на русском языке, выдели основные идеи
+и ключевые моменты, убери повторы.
+
+Изложения частей:
+{text}
+"""
+
+
+def _fallback(text: str) -> str:
+    return text[:500] + "..." if len(text) > 500 else text
+
+
+def _split_chunks(text: str, limit: int) -> List[str]:
+    """Части не длиннее limit; границы — по абзацам, затем по строкам, в крайнем случае жёстко."""
+    chunks: List[str] = []
+    rest = text
+    while len(rest) > limit:
+        cut = rest.rfind("\n\n", 0, limit)
+        if cut < limit // 2:
+            cut = rest.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        chunks.append(rest[:cut])
+        rest = rest[cut:].lstrip("\n")
+    if rest.strip():
+        chunks.append(rest)
+    return chunks
+
+
+class AIProcessor:
+    DEFAULT_MODEL = "gemini-2.5-flash"
+
+    def __init__(self, model=None):
+        """model — готовый объект с generate_content(prompt) (для проверок без сети); иначе Gemini."""
+        self.api_key = config.GEMINI_API_KEY or None
+        self._configured = False
+        self._model = model
+        self.cache = TTLCache(
+            max_entries=config.AI_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.AI_CACHE_TTL_SECONDS,
+            directory=config.AI_CACHE_DIR.strip() or None,
+        )
+        self._loops: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # Каталог моделей — отдельный кэш в подкаталоге (не вытесняется ответами суммаризации)
+        cache_dir = config.AI_CACHE_DIR.strip()
+        self.models_cache = TTLCache(
+            max_entries=4,
+            ttl_seconds=config.AI_MODELS_TTL_SECONDS,
+            directory=os.path.join(cache_dir, "models") if cache_dir else None,
+        )
+        self._models_lock = threading.Lock()
+        self._models_refreshing = False
+        self._models_failed_at = None
+        self.models_refreshes = 0
+        self.models_failures = 0
+        self.models_last_error = None
+        self.models_refresh_ms = None
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.coalesced = 0
+        if self.api_key or model is not None:
+            self.model_name = getattr(model, "model_name", None) or self.DEFAULT_MODEL
+        else:
+            logger.warning(
+                "GEMINI_API_KEY not found. AI summarization will be disabled."
+            )
+            self.model_name = None
+
+    def _client(self):
+        """Модуль genai, настроенный ключом при первом вызове."""
+        if not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        return genai
+
+    @property
+    def model(self):
+        """Модель Gemini; создаётся при первом обращении (None — без ключа или при ошибке)."""
+        if self._model is None and self.api_key and self.model_name:
+            try:
+                self._model = self._client().GenerativeModel(self.model_name)
+            except Exception as e:
+                logger.error(f"Не удалось создать модель '{self.model_name}': {e}")
+        return self._model
+
+    # === Каталог моделей ===
+
+    def refresh_models(self) -> bool:
+        """Запросить список моделей у API и сохранить в кэш (блокирующий вызов — из фонового потока)."""
+        t0 = time.perf_counter()
+        try:
+            names = set()
+            for m in self._client().list_models():
+                name = getattr(m, "name", "")
+                # API возвращает ресурсы вида models/xxx
+                if name.startswith("models/"):
+                    name = name.split("/", 1)[1]
+                if name:
+                    names.add(name)
+            if not names:
+                raise RuntimeError("API вернул пустой список")
+        except Exception as e:
+            self.models_failures += 1
+            self.models_last_error = str(e)[:200]
+            self._models_failed_at = time.monotonic()
+            counters().inc("models_refresh", result="error")
+            logger.debug(f"list_models failed: {e}")
+            return False
+        finally:
+            self.models_refresh_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+            metrics().observe("models_refresh_seconds", round(self.models_refresh_ms / 1000.0, 3))
+        self.models_cache.set(_MODELS_KEY, sorted(names))
+        self.models_refreshes += 1
+        self.models_last_error = None
+        counters().inc("models_refresh", result="ok")
+        return True
+
+    def _refresh_models_background(self) -> None:
+        """Одно фоновое обновление за раз; после ошибки — не чаще раза в _MODELS_RETRY_SECONDS."""
+        with self._models_lock:
+            if self._models_refreshing:
+                return
+            if self._models_failed_at is not None and time.monotonic() - self._models_failed_at < _MODELS_RETRY_SECONDS:
+                return
+            self._models_refreshing = True
+
+        def _run():
+            try:
+                self.refresh_models()
+            finally:
+                self._models_refreshing = False
+
+        threading.Thread(target=_run, name="models-refresh", daemon=True).start()
+
+    def list_models(self) -> List[str]:
+        """Возвращает список доступных моделей сразу, без сетевого вызова.
+
+        Дефолтный набор плюс каталог из кэша (память и диск, AI_MODELS_TTL_SECONDS). Устаревший
+        или отсутствующий каталог обновляется в фоне, а пока отдаётся прежний (stale-while-revalidate).
+        """
+        models = set(DEFAULT_MODELS)
+        if not self.api_key:
+            return sorted(models)
+        found = self.models_cache.lookup(_MODELS_KEY)
+        if found is not None:
+            models.update(found[0] or [])
+        if found is None or found[1] > self.models_cache.ttl_seconds:
+            self._refresh_models_background()
+        return sorted(models)
+
+    def models_stats(self) -> dict:
+        found = self.models_cache.lookup(_MODELS_KEY) if self.api_key else None
+        return {
+            "cached": len(found[0] or []) if found is not None else 0,
+            "age_seconds": round(found[1], 1) if found is not None else None,
+            "stale": found is None or found[1] > self.models_cache.ttl_seconds,
+            "refreshing": self._models_refreshing,
+            "refreshes": self.models_refreshes,
+            "failures": self.models_failures,
+            "last_error": self.models_last_error,
+            "last_refresh_ms": self.models_refresh_ms,
+        }
+
+    def get_model_name(self) -> str | None:
+        return self.model_name
+
+    def set_model(self, model_name: str) -> Tuple[bool, str]:
+        """Сменить текущую модель. Возвращает (ok, message)."""
+        if not self.api_key:
+            return False, "GEMINI_API_KEY не задан — работа с моделями недоступна"
+        try:
+            self._model = self._client().GenerativeModel(model_name)
+            self.model_name = model_name
+            return True, f"Модель установлена: {model_name}"
+        except Exception as e:
+            logger.error(f"Не удалось установить модель '{model_name}': {e}")
+            return False, f"Ошибка при установке модели: {e}"
+
+    # === Суммаризация ===
+
+    def _loop_state(self) -> Tuple[asyncio.Semaphore, Dict[str, "asyncio.Task"]]:
+        """Семафор и незавершённые запросы текущего event loop (у каждого loop — свои)."""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = (asyncio.Semaphore(max(1, config.AI_MAX_CONCURRENCY)), {})
+            self._loops[loop] = state
+        return state
+
+    async def _generate(self, prompt: str) -> str:
+        """Один вызов модели: не больше AI_MAX_CONCURRENCY одновременно, таймаут AI_TIMEOUT_SECONDS."""
+        model = self.model
+        if model is None:
+            raise RuntimeError("модель Gemini недоступна")
+        sem, _ = self._loop_state()
+        async with sem:
+            self.calls += 1
+            call = getattr(model, "generate_content_async", None)
+            # Синхронный клиент уходит в поток пула, чтобы не блокировать event loop
+            coro = call(prompt) if call is not None else asyncio.to_thread(model.generate_content, prompt)
+            timeout = config.AI_TIMEOUT_SECONDS
+            try:
+                response = await asyncio.wait_for(coro, timeout=timeout if timeout > 0 else None)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+        return (getattr(response, "text", "") or "").strip()
+
+    async def _summarize_text(self, text: str, depth: int = 0) -> str:
+        """Текст в пределах AI_CHUNK_CHARS — одним запросом, длиннее — map-reduce по частям."""
+        limit = max(1000, config.AI_CHUNK_CHARS)
+        if len(text) <= limit:
+            return await self._generate(_SUMMARY_PROMPT.format(text=text))
+        chunks = _split_chunks(text, limit)
+        # map: части суммаризируются параллельно (семафор ограничивает число запросов)
+        parts = await asyncio.gather(*(
+            self._generate(_CHUNK_PROMPT.format(i=i + 1, n=len(chunks), text=chunk))
+            for i, chunk in enumerate(chunks)
+        ))
+        combined = "\n\n".join(f"[{i + 1}/{len(parts)}] {p}" for i, p in enumerate(parts))
+        # reduce: изложения частей сводятся в одно; слишком длинные — ещё одним проходом
+        if len(combined) > limit and depth < _MAX_REDUCE_DEPTH:
+            return await self._summarize_text(combined, depth + 1)
+        return await self._generate(_REDUCE_PROMPT.format(text=combined[:limit]))
+
+    def _cache_key(self, text: str) -> str:
+        raw = f"{self.model_name}\n{_PROMPT_VERSION}\n{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def summarize_async(self, text: str) -> str:
+        """Суммаризация без блокировки event loop.
+
+        Результат кэшируется по хэшу (модель + текст) в памяти и на диске (AI_CACHE_*);
+        одинаковые одновременные запросы ждут один вызов. При ошибке или таймауте —
+        усечённый исходный текст (в кэш не попадает).
+        """
+        text = text or ""
+        if not self.model or not text.strip():
+            return _fallback(text)
+        key = self._cache_key(text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        _, inflight = self._loop_state()
+        task = inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._summarize_text(text))
+            inflight[key] = task
+            task.add_done_callback(lambda _t: inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общий запрос
+            summary = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini summarization timeout ({config.AI_TIMEOUT_SECONDS}s)")
+            return _fallback(text)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Gemini summarization error: {e}")
+            return _fallback(text)
+        if not summary:
+            return _fallback(text)
+        await asyncio.to_thread(self.cache.set, key, summary)
+        return summary
+
+    def summarize(self, text):
+        """Синхронная обёртка над summarize_async (для скриптов; в обработчиках — await summarize_async)."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.summarize_async(text))
+        logger.warning("summarize() вызван из event loop — используйте await summarize_async()")
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.summarize_async(text)).result()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "coalesced": self.coalesced,
+            "cache": self.cache.stats(),
+        }
+
+
+def format_models_catalog(stats: dict) -> str:
+    """Строка /status о каталоге моделей из AIProcessor.models_stats()."""
+    age = stats.get("age_seconds")
+    parts = [f"{stats.get('cached', 0)} шт."]
+    parts.append(f"возраст {int(age // 60)} мин" if age is not None else "ещё не загружен")
+    if stats.get("stale"):
+        parts.append("обновляется" if stats.get("refreshing") else "устарел")
+    parts.append(f"обновлений {stats.get('refreshes', 0)}, ошибок {stats.get('failures', 0)}")
+    if stats.get("last_refresh_ms") is not None:
+        parts.append(f"последнее {stats['last_refresh_ms']:.0f} мс")
+    if stats.get("last_error"):
+        parts.append(f"ошибка: {stats['last_error']}")
+    return "Каталог моделей: " + ", ".join(parts)
+
+
+# Ленивый синглтон: клиент и модель создаются при первом обращении
+ai_processor = LazyObject(AIProcessor)
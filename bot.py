@@ -1,4 +1,5 @@
 import asyncio
+import json
 import os
 import logging
 from datetime import datetime, timedelta
@@ -6,59 +7,40 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.filters import CommandStart, Command
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.exceptions import TelegramNetworkError
-from dotenv import load_dotenv
 from typing import Optional, List
 
 from windsurf_controller import desktop_controller
+from core.config import config
+from core.streaming import PartialMessage
+from core.metrics import counters, format_percentiles, metrics
+from core.openmetrics import start_metrics_server
+from core.tg_sender import format_sender_stats, tg_sender
+from core.tracing import format_trace, get_tracer
+from core.ui_worker import UIJobCancelled
 from mac_window_manager import MacWindowManager
-from ai_processor import ai_processor
+from ai_processor import ai_processor, format_models_catalog
 import asyncio as _asyncio
 from asyncio.subprocess import PIPE as _PIPE
 import html
 
 # Используйте для запуска в терминале taskkill /f /im python.exe; Start-Process powershell -ArgumentList "-NoExit", "-Command", "cd 'z:\Dev\vibe\vibe_coding'; python bot.py"
 
-load_dotenv()
-
 
 async def answer_chunks(message: types.Message, text: str, parse_mode: Optional[str] = None, reply_markup: Optional[ReplyKeyboardMarkup] = None):
-    """Безопасная отправка длинных сообщений (разбиение по 4096 символов).
+    """Отправка длинных сообщений через core.tg_sender: части до 4096 (UTF-16) с целыми блоками кода,
+    темп по чату, flood-wait и повторы при обрыве соединения; очень длинные ответы — файлом.
     Ставит клавиатуру только к первому сообщению, чтобы не дублировать её в чате.
     """
     if text is None:
         return
-    max_len = 4096
-    remaining = text
-    first = True
-    while remaining:
-        if len(remaining) <= max_len:
-            chunk = remaining
-            remaining = ""
-        else:
-            # стараемся резать по переводу строки
-            split_at = remaining.rfind("\n", 0, max_len)
-            if split_at == -1:
-                split_at = max_len
-            chunk = remaining[:split_at]
-            remaining = remaining[split_at:]
-        # Пару повторных попыток на случай кратковременного обрыва соединения
-        attempts = 0
-        while True:
-            try:
-                await message.answer(chunk, parse_mode=parse_mode, reply_markup=(reply_markup if first else None))
-                break
-            except TelegramNetworkError as e:
-                attempts += 1
-                if attempts <= 2:
-                    logger.warning(f"answer_chunks retry {attempts} after TelegramNetworkError: {e}")
-                    try:
-                        await asyncio.sleep(0.7)
-                    except Exception:
-                        pass
-                    continue
-                logger.warning(f"answer_chunks give up after {attempts} attempts: {e}")
-                return
-        first = False
+
+    async def _send(chunk: str, i: int):
+        await message.answer(chunk, parse_mode=parse_mode, reply_markup=(reply_markup if i == 0 else None))
+
+    async def _send_document(data: bytes, filename: str, caption: str):
+        await message.answer_document(types.BufferedInputFile(data, filename=filename), caption=caption)
+
+    await tg_sender().send_text(message.chat.id, text, _send, _send_document, retry_on=(TelegramNetworkError,))
 
 
 
@@ -142,6 +124,8 @@ async def start_command(message: types.Message):
             "/newchat — открыть новый чат (клик по 1192,51)\n"
             "/change <name> — открыть проект из ~/VovkaNowEngineer/<name> в Windsurf\n"
             "/git — управление Git (status/commit/push) — доступ ограничен по user_id\n"
+            "/cancel — отменить ваши запросы в очереди\n"
+            "/trace [N|export] — разбивка времени последних запросов по фазам\n"
             "/whoami — показать ваш Telegram user_id\n\n"
             "Просто напишите сообщение, чтобы отправить его в Windsurf!",
             reply_markup=main_keyboard,
@@ -154,10 +138,13 @@ async def start_command(message: types.Message):
 @dp.message(Command(commands=["status"]))
 async def status(message: types.Message):
     diag = desktop_controller.get_diagnostics()
+    m = diag.get('metrics') or {}
+    wcache = diag.get('window_cache') or {}
     status_lines = [
         "📊 Статус системы:",
         f"Платформа: {diag.get('platform')}",
         f"Windsurf процессов: {len(diag.get('windsurf_pids', []))} — {diag.get('windsurf_pids')}",
+        f"Сэмплер процессов: {diag.get('process_sampler')}",
         f"Windows automation: {'✅' if diag.get('windows_automation') else '❌'}",
         f"Успешных отправок: {diag.get('success_sends')}",
         f"Неуспешных отправок: {diag.get('failed_sends')}",
@@ -175,9 +162,22 @@ async def status(message: types.Message):
         f"last_visual_region: {diag.get('last_visual_region')}",
         f"last_click_xy: {diag.get('last_click_xy')}",
         f"last_ready_pixel: {diag.get('last_ready_pixel')}",
+        f"ready_probe_count: {diag.get('ready_probe_count')} (wasted: {diag.get('ready_wasted_probes')})",
         f"last_model_set: {diag.get('last_model_set')}",
         f"cpu_quiet_seconds: {diag.get('cpu_quiet_seconds')}",
         f"cpu_last_total_percent: {diag.get('cpu_last_total_percent')}",
+        f"Очередь UI: {diag.get('ui_queue')}",
+        f"Пропускная способность: {(diag.get('ui_queue') or {}).get('requests_per_hour')} запросов/час",
+        f"Кэш окон (hit/miss): {wcache.get('hits')} / {wcache.get('misses')}",
+        f"AppleScript-воркер: {diag.get('script_worker')}",
+        f"Извлечение ответа: {diag.get('extraction')}",
+        f"Буфер обмена (мс по операциям): {diag.get('clipboard')}",
+        f"Паузы запроса: {diag.get('last_sleep')}",
+        f"p50/p95/p99 за ≈1ч: {format_percentiles(m.get('last_hour'))}",
+        f"p50/p95/p99 за {(m.get('store') or {}).get('retention_hours')}ч: {format_percentiles(m.get('window'))}",
+        f"Готовность по окнам, с: {format_percentiles(m.get('ready_by_window'))}",
+        f"Готовность по моделям, с: {format_percentiles(m.get('ready_by_model'))}",
+        format_sender_stats(tg_sender().stats(), metrics().percentiles("tg_delivery_seconds", window_seconds=3600)),
         "",
         "Параметры:",
         f"RESPONSE_WAIT_SECONDS={diag.get('RESPONSE_WAIT_SECONDS')}",
@@ -211,10 +211,42 @@ async def status(message: types.Message):
         "",
         "AI:",
         f"Gemini модель: {ai_processor.get_model_name() or '—'}",
+        format_models_catalog(ai_processor.models_stats()),
     ]
     await answer_chunks(message, "\n".join(status_lines), reply_markup=main_keyboard)
 
 
+@dp.message(Command(commands=["trace"]))
+async def cmd_trace(message: types.Message):
+    """/trace [N] — дерево фаз последних N запросов; /trace export — буфер трасс файлом JSON lines."""
+    parts = (message.text or "").split()
+    arg = parts[1].strip().lower() if len(parts) > 1 else ""
+    tracer = get_tracer()
+    try:
+        if arg == "export":
+            items = tracer.recent(tracer.capacity)
+            if not items:
+                await message.answer("Трасс пока нет", reply_markup=main_keyboard)
+                return
+            data = "".join(json.dumps(d, ensure_ascii=False, default=str) + "\n" for d in items).encode("utf-8")
+            await message.answer_document(
+                types.BufferedInputFile(data, filename=f"traces_{datetime.now():%Y%m%d_%H%M%S}.jsonl"),
+                caption=f"Трасс: {len(items)}",
+            )
+            return
+        try:
+            n = max(1, min(20, int(arg))) if arg else 3
+        except ValueError:
+            n = 3
+        items = tracer.recent(n)
+        if not items:
+            await message.answer("Трасс пока нет — отправьте запрос в Windsurf", reply_markup=main_keyboard)
+            return
+        await answer_chunks(message, "\n\n".join(format_trace(d) for d in items), reply_markup=main_keyboard)
+    except TelegramNetworkError as e:
+        logger.warning(f"/trace send failed: {e}")
+
+
 @dp.message(Command(commands=["windows"]))
 async def windows(message: types.Message):
     try:
@@ -405,11 +437,26 @@ async def cmd_wsmodel(message: types.Message):
     if not name:
         await message.answer("Пустое имя модели", reply_markup=main_keyboard)
         return
-    ok, msg = desktop_controller.set_model_ui(name, target or "active")
+    ok, msg = await desktop_controller.ui.run(
+        desktop_controller.set_model_ui, name, target or "active", label="wsmodel", owner=message.chat.id,
+    )
     prefix = "✅" if ok else "❌"
     await message.answer(f"{prefix} {msg}", reply_markup=main_keyboard)
 
 
+@dp.message(Command(commands=["cancel"]))
+async def cmd_cancel(message: types.Message):
+    """Отменить запросы этого чата в очереди UI (выполняющийся — кооперативно, на ближайшей пробе)."""
+    n = desktop_controller.ui.cancel_owner(message.chat.id)
+    try:
+        await message.answer(
+            f"🛑 Отменено запросов: {n}" if n else "Нет запросов в очереди для этого чата",
+            reply_markup=main_keyboard,
+        )
+    except TelegramNetworkError as e:
+        logger.warning(f"/cancel send failed: {e}")
+
+
 @dp.message(Command(commands=["whoami"]))
 async def cmd_whoami(message: types.Message):
     uid = message.from_user.id if message.from_user else None
@@ -424,7 +471,9 @@ async def cmd_whoami(message: types.Message):
 async def cmd_newchat(message: types.Message):
     """Открыть новый чат кликом по координатам (1192,51)."""
     try:
-        ok, msg = desktop_controller.newchat_click()
+        ok, msg = await desktop_controller.ui.run(
+            desktop_controller.newchat_click, label="newchat", owner=message.chat.id,
+        )
         prefix = "✅" if ok else "❌"
         await message.answer(f"{prefix} {msg}", reply_markup=main_keyboard)
     except TelegramNetworkError as e:
@@ -482,7 +531,9 @@ async def cmd_change(message: types.Message):
                     arr = []
             if 1 <= idx <= len(arr):
                 target = arr[idx - 1]
-    ok, msg = desktop_controller.change_project(folder, target or "active")
+    ok, msg = await desktop_controller.ui.run(
+        desktop_controller.change_project, folder, target or "active", label="change", owner=message.chat.id,
+    )
     prefix = "✅" if ok else "❌"
     try:
         await message.answer(f"{prefix} {msg}", reply_markup=main_keyboard)
@@ -516,6 +567,7 @@ async def _get_git_root_for(chat_id: int | None, user_id: int | None) -> str:
         return GIT_WORKDIR
     # 4. Попытка из текущей рабочей директории
     try:
+        counters().inc("subprocess_spawns", cmd="git")
         proc = await _asyncio.create_subprocess_exec(
             "git", "rev-parse", "--show-toplevel",
             cwd=_os.getcwd(), stdout=_PIPE, stderr=_PIPE,
@@ -529,6 +581,7 @@ async def _get_git_root_for(chat_id: int | None, user_id: int | None) -> str:
         pass
     # 5. Попытка из директории файла бота
     try:
+        counters().inc("subprocess_spawns", cmd="git")
         proc = await _asyncio.create_subprocess_exec(
             "git", "rev-parse", "--show-toplevel",
             cwd=REPO_ROOT, stdout=_PIPE, stderr=_PIPE,
@@ -547,6 +600,7 @@ async def _get_git_root_for(chat_id: int | None, user_id: int | None) -> str:
 async def _git_run(args: list[str], cwd: str) -> tuple[int, str, str]:
     """Выполнить git-команду и вернуть (code, stdout, stderr)."""
     try:
+        counters().inc("subprocess_spawns", cmd="git")
         proc = await _asyncio.create_subprocess_exec(
             *args,
             cwd=cwd,
@@ -585,6 +639,16 @@ async def handle_message(message: types.Message):
     #     )
     #     return
 
+    # Потоковое превью (STREAM_PARTIAL) удаляется на любом выходе: ответ, отмена, ошибка, пустой ответ
+    preview_msg = None
+
+    async def _drop_preview():
+        if preview_msg is not None:
+            try:
+                await preview_msg.delete()
+            except Exception as e:
+                logger.debug(f"preview delete failed: {e}")
+
     try:
         # Единый парсер префикса [#N]/[@sub]
         target, text = _parse_target_prefix(user_input)
@@ -617,15 +681,51 @@ async def handle_message(message: types.Message):
             logger.warning(f"pre-send notice failed: {e}")
         copied_response = None
         diag = None
-        if target:
-            success = await desktop_controller.send_message_to(target, text)
-        else:
-            success = await desktop_controller.send_message(text)
-        # Получим локальную телеметрию
-        diag = desktop_controller.get_diagnostics()
+        # Потоковая выдача: одно сообщение-превью, редактируемое по мере генерации
+        partial = None
+        if config.STREAM_PARTIAL:
+            async def _send_preview(t: str):
+                return await message.answer(t)
+
+            async def _edit_preview(msg, t: str):
+                await msg.edit_text(t)
+
+            partial = PartialMessage(
+                _send_preview, _edit_preview,
+                min_interval=config.STREAM_EDIT_MIN_INTERVAL_SECONDS,
+                max_chars=config.STREAM_PREVIEW_MAX_CHARS,
+                header="⏳ Windsurf ещё отвечает…\n\n",
+            )
+        job = await desktop_controller.enqueue_send(
+            text, target, owner=message.chat.id, on_partial=partial.update if partial else None,
+        )
+        pos = desktop_controller.ui.position(job)
+        if pos > 0:
+            try:
+                await message.answer(
+                    f"🕒 В очереди: позиция {pos}, ожидание ~{int(desktop_controller.ui.eta(job))}s (/cancel — отменить)"
+                )
+            except TelegramNetworkError as e:
+                logger.warning(f"queue notice failed: {e}")
+        try:
+            success = await desktop_controller.ui.wait(job)
+        except UIJobCancelled:
+            success = None
+        finally:
+            if partial is not None:
+                preview_msg = await partial.close()
+        if success is None or job.cancelled:
+            try:
+                await message.answer("🛑 Запрос отменён.", reply_markup=main_keyboard)
+            except TelegramNetworkError as e:
+                logger.warning(f"cancel notice failed: {e}")
+            return
+        # Получим телеметрию и ответ именно этой задачи (при параллельных окнах буфер мог смениться)
+        diag = {**desktop_controller.get_diagnostics(), **(job.meta.get('diag') or {})}
+        if 'response' in job.meta:
+            copied_response = job.meta['response']
         # 1) Если отправка неуспешна — сразу сообщаем об ошибке и выходим
         if not success:
-            diag = desktop_controller.get_diagnostics()
             reason = diag.get("last_error") or "Неизвестно"
             try:
                 await message.answer(
@@ -740,6 +840,8 @@ async def handle_message(message: types.Message):
             await message.answer("❌ Произошла ошибка при обработке запроса")
         except TelegramNetworkError:
             pass
+    finally:
+        await _drop_preview()
 
 
 async def main():
@@ -749,6 +851,8 @@ async def main():
         logger.error("TELEGRAM_BOT_TOKEN не задан. Создайте .env и укажите токен.")
         return
     bot = Bot(token=token)
+    # Опциональный /metrics для Prometheus (METRICS_HTTP_PORT) в этом же event loop
+    metrics_server = await start_metrics_server(lambda: desktop_controller.export_openmetrics())
     try:
         try:
             me = await bot.get_me()
@@ -758,6 +862,9 @@ async def main():
         await dp.start_polling(bot)
     except (KeyboardInterrupt, TelegramNetworkError) as e:
         logger.warning(f"Bot stopped: {e}")
+    finally:
+        if metrics_server is not None:
+            await metrics_server.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,10 +1,12 @@
 import platform
-import subprocess
 import time
 import logging
 from typing import Optional
 
-import pyperclip
+from core import timing
+from core.clipboard import ClipboardSession
+from core.paste_verify import PasteVerifierChain, create_paste_verifiers
+from core.tracing import record_span
 
 try:
     if platform.system() == "Windows":
@@ -29,28 +31,23 @@ def copy_to_clipboard(text: str) -> bool:
             logger.info("Текст скопирован через win32clipboard")
             return True
         else:
-            try:
-                pyperclip.copy(str(text))
-                logger.info("Текст скопирован через pyperclip")
+            # Запись с подтверждением по счётчику изменений буфера (pbcopy — запасной путь внутри)
+            if ClipboardSession(restore=False).copy(str(text)):
+                logger.info("Текст скопирован в буфер")
                 return True
-            except Exception as e:
-                if platform.system() == "Darwin":
-                    try:
-                        p = subprocess.Popen(["/usr/bin/pbcopy"], stdin=subprocess.PIPE)
-                        p.communicate(input=str(text).encode("utf-8"))
-                        logger.info("Текст скопирован через pbcopy")
-                        return True
-                    except Exception as e2:
-                        logger.error(f"pbcopy failed: {e2}")
-                raise e
+            raise RuntimeError("буфер не подтвердил запись")
     except Exception as e:
         logger.error(f"Ошибка при копировании в буфер: {e}")
         return False
 
 
-def paste_from_clipboard_mac(expected_text: str, paste_retry_count: int = 2) -> bool:
+def paste_from_clipboard_mac(expected_text: str, paste_retry_count: int = 2, telemetry=None,
+                             verifiers: Optional[PasteVerifierChain] = None) -> bool:
     """Вставка и верификация на macOS с ретраями.
-    На повторных попытках: выделяем всё и удаляем, затем вставляем заново.
+    Проверка — цепочка core.paste_verify (AXValue, длина, пиксели поля, в крайнем случае Cmd+A/Cmd+C);
+    сработавшая стратегия пишется в telemetry.last_paste_strategy.
+    На повторных попытках: выделяем всё и удаляем, заново кладём expected_text в буфер
+    (проверка select_all могла его перезаписать) и вставляем снова.
     Предполагается, что клавиатурные действия выполняются снаружи.
     """
     import pyautogui
@@ -64,6 +61,8 @@ def paste_from_clipboard_mac(expected_text: str, paste_retry_count: int = 2) ->
 
     pasted_ok = False
     expected = str(expected_text).strip()
+    cb = ClipboardSession(restore=False)
+    chain = verifiers or create_paste_verifiers()
     for attempt in range(paste_retry_count + 1):
         try:
             # Optional re-focus before each attempt to ensure input field is active
@@ -95,7 +94,7 @@ def paste_from_clipboard_mac(expected_text: str, paste_retry_count: int = 2) ->
                         if detailed_log:
                             logger.info(f"[Paste] attempt {attempt}: refocus click at ({cx},{cy})")
                         pyautogui.click(cx, cy)
-                        time.sleep(0.2)
+                        timing.delay("refocus_settle")
                 except Exception as _e:
                     if detailed_log:
                         logger.info(f"[Paste] attempt {attempt}: refocus skipped due to error: {_e}")
@@ -103,35 +102,30 @@ def paste_from_clipboard_mac(expected_text: str, paste_retry_count: int = 2) ->
             if attempt > 0:
                 logger.warning("Повтор вставки: очищаю поле (Cmd+A, Backspace) и пробую снова")
                 pyautogui.hotkey('command', 'a')
-                time.sleep(0.1)
+                timing.delay("key_step")
                 pyautogui.press('backspace')
-                time.sleep(0.15)
+                timing.delay("clear_settle")
+                cb.copy(str(expected_text))
 
+            attempt_t0 = time.monotonic()
+            chain.before_paste(expected)
             pyautogui.hotkey('command', 'v')
-            time.sleep(0.5)
-            # Проверяем вставку (Cmd+A, Cmd+C)
-            if detailed_log:
-                logger.info(f"[Paste] attempt {attempt}: select-all and copy to verify")
-            pyautogui.hotkey('command', 'a')
-            time.sleep(0.1)
-            pyautogui.hotkey('command', 'c')
-            time.sleep(0.2)
-            try:
-                pasted_text = pyperclip.paste()
-            except Exception:
-                if platform.system() == "Darwin":
-                    pasted_text = subprocess.check_output(["/usr/bin/pbpaste"]).decode("utf-8", "ignore")
-                else:
-                    pasted_text = ""
-            got = (pasted_text or "").strip()
+            # Проверяем вставку: первая применимая стратегия (ожидание с дедлайном вместо паузы)
+            t0 = time.monotonic()
+            ok, strategy = chain.verify(expected)
+            if telemetry is not None:
+                telemetry.last_paste_strategy = strategy
+                telemetry.last_paste_attempts = attempt + 1
+            record_span("paste_attempt", time.monotonic() - attempt_t0, attempt=attempt, strategy=strategy, ok=ok)
             if detailed_log:
-                logger.info(f"[Paste] attempt {attempt}: got_len={len(got)} expected_len={len(expected)} eq={got==expected}")
-                if len(got) > 3 * max(1, len(expected)) and not (got == expected):
-                    logger.info("[Paste] hint: получен очень длинный текст — вероятно, фокус не в поле ввода (выделилась панель ответа)")
-            if got == expected:
+                logger.info(
+                    f"[Paste] attempt {attempt}: verified by {strategy or '—'} ok={ok} "
+                    f"in {(time.monotonic() - t0) * 1000:.0f} ms"
+                )
+            if ok:
                 pasted_ok = True
                 break
         except Exception as e:
             logger.debug(f"mac paste attempt {attempt} failed: {e}")
-            time.sleep(0.3)
+            timing.delay("retry_backoff")
     return pasted_ok
@@ -16,6 +16,12 @@ try:
 except Exception:
     MacWindowManager = None  # type: ignore
 
+# Optional: export of multi-point readiness signatures (core/signature.py)
+try:
+    from core.signature import ProbePoint, ReadySignature, capture_template, default_signature_path  # type: ignore
+except Exception:
+    ReadySignature = None  # type: ignore
+
 
 def rgb_at(x: int, y_top: int):
     """Robust RGB sampling at top-origin coordinates using pyautogui.
@@ -43,7 +49,7 @@ def hex_of(rgb):
 class PipetteApp:
     def __init__(self, rate_hz: float = 30.0, save_dir: str = "debug", follow: bool = False, avg_k: int = 3,
                  info_backend: str = "capture", info_hz: float = 10.0, save_backend: str = "status",
-                 auto_quit_seconds: float = 0.0):
+                 auto_quit_seconds: float = 0.0, signature_out: str = "", template_size: int = 24):
         self.rate_hz = max(1.0, float(rate_hz))
         self.period_ms = int(1000.0 / self.rate_hz)
         self.save_dir = save_dir
@@ -65,6 +71,11 @@ class PipetteApp:
         self._info_last_t = 0.0
         self._info_last_rgb = (0, 0, 0)
         self.auto_quit_seconds = float(auto_quit_seconds or 0.0)
+        # Signature being assembled: G adds a point, P grabs a template patch, X exports JSON
+        self.signature_out = signature_out or (default_signature_path() if ReadySignature is not None else "")
+        self.template_size = max(4, int(template_size or 24))
+        self.sig_points = []
+        self.sig_template = None
         # averaging kernel size (odd), clamp to 1..9
         try:
             avg_k = int(avg_k)
@@ -96,7 +107,9 @@ class PipetteApp:
 
         # Help
         help_text = (
-            "Space: pause/resume  |  Alt/Option: hold to freeze  |  F: follow on/off  |  B: info backend  |  T: save backend  |  S: save  |  C: copy .env  |  E: echo .env  |  V: verify  |  Q: quit"
+            "Space: pause/resume  |  Alt/Option: hold to freeze  |  F: follow on/off  |  B: info backend  |  "
+            "T: save backend  |  S: save  |  C: copy .env  |  E: echo .env  |  V: verify  |  "
+            "G: add sig point  |  P: sig patch  |  X: export sig  |  Q: quit"
         )
         self.help_label = ttk.Label(self.root, text=help_text, foreground="#666")
         self.help_label.grid(row=2, column=0, columnspan=2, sticky="w", padx=8, pady=(0, 8))
@@ -133,6 +146,13 @@ class PipetteApp:
         self.root.bind("V", self.on_verify)
         self.root.bind("b", self.on_toggle_backend)
         self.root.bind("B", self.on_toggle_backend)
+        # Readiness signature export
+        self.root.bind("g", self.on_sig_add_point)
+        self.root.bind("G", self.on_sig_add_point)
+        self.root.bind("p", self.on_sig_template)
+        self.root.bind("P", self.on_sig_template)
+        self.root.bind("x", self.on_sig_export)
+        self.root.bind("X", self.on_sig_export)
         # Toggle save backend
         self.root.bind("t", self.on_toggle_save_backend)
         self.root.bind("T", self.on_toggle_save_backend)
@@ -664,6 +684,66 @@ class PipetteApp:
         print(lines)
         sys.stdout.flush()
 
+    def _sample_for_save(self, x: int, y: int):
+        """RGB for export, chosen by save_backend (same policy as on_copy_env)."""
+        if self.save_backend in ("status", "capture"):
+            return self.sample_rgb_consistent(x, y)
+        if self.save_backend == "direct":
+            return self.avg_rgb(x, y)
+        crop, rx, ry, px, py = self._capture_crop(x, y, 180, 140)
+        return self._rgb_from_image(crop, px, py, self.avg_k)
+
+    def on_sig_add_point(self, event=None):
+        """Add the point under the cross to the signature being assembled."""
+        if ReadySignature is None:
+            print("Signature export unavailable (core.signature import failed)")
+            return
+        x, y = self.last_pos
+        rgb = self._sample_for_save(x, y) or (0, 0, 0)
+        tol = int(os.getenv("READY_PIXEL_TOL", "4"))
+        name = f"p{len(self.sig_points) + 1}"
+        self.sig_points.append(ProbePoint(name, x, y, rgb, tol=tol, k=self.avg_k))
+        print(f"Signature point {name}: XY=({x},{y}) RGB={rgb} tol={tol} k={self.avg_k} (total {len(self.sig_points)})")
+        sys.stdout.flush()
+
+    def on_sig_template(self, event=None):
+        """Grab a template patch centred on the cross (hidden overlay)."""
+        if ReadySignature is None:
+            print("Signature export unavailable (core.signature import failed)")
+            return
+        x, y = self.last_pos
+        n = self.template_size
+        try:
+            self.root.withdraw()
+            time.sleep(0.05)
+            self.sig_template = capture_template(x - n // 2, y - n // 2, n, n)
+        finally:
+            try:
+                self.root.deiconify()
+            except Exception:
+                pass
+        if self.sig_template is None:
+            print("Signature template: capture failed")
+        else:
+            print(f"Signature template: {n}x{n} at ({x - n // 2},{y - n // 2})")
+        sys.stdout.flush()
+
+    def on_sig_export(self, event=None):
+        """Write the assembled signature as JSON (+ PPM patch) for READY_SIGNATURE_FILE."""
+        if ReadySignature is None or not (self.sig_points or self.sig_template is not None):
+            print("Signature export: nothing to export (use G to add points, P for a patch)")
+            return
+        sig = ReadySignature(self.sig_points, self.sig_template, name="pipette")
+        try:
+            sig.save(self.signature_out)
+        except Exception as e:
+            print(f"Signature export failed: {e}")
+            return
+        print(f"Signature exported: {self.signature_out} points={len(self.sig_points)} "
+              f"template={'yes' if self.sig_template is not None else 'no'} region={sig.bounding_region()}\n"
+              f"READY_SIGNATURE_FILE={self.signature_out}")
+        sys.stdout.flush()
+
     def on_verify(self, event=None):
         """Сверка измерений: сравнивает три способа в одной точке X,Y из last_pos.
         1) pyautogui.pixel(x,y) — прямое чтение
@@ -738,7 +818,8 @@ class PipetteApp:
         self.frozen_alt = False
 
     def run(self):
-        print("Color Pipette running. Move the mouse. Hotkeys: Space pause/resume, S save, C copy .env, E echo .env, Q quit.")
+        print("Color Pipette running. Move the mouse. Hotkeys: Space pause/resume, S save, C copy .env, "
+              "E echo .env, G/P/X signature, Q quit.")
         try:
             self.root.mainloop()
         except KeyboardInterrupt:
@@ -755,11 +836,15 @@ def main():
     ap.add_argument("--save-backend", type=str, choices=["crop", "capture", "direct", "status"], default="status", help="Saved RGB source")
     ap.add_argument("--info-hz", type=float, default=10.0, help="Status sampling frequency in Hz")
     ap.add_argument("--auto-quit", type=float, default=0.0, help="Auto-quit after N seconds (0=disabled)")
+    ap.add_argument("--signature-out", type=str, default="",
+                    help="Signature JSON path (default core/ready_signature.json)")
+    ap.add_argument("--template-size", type=int, default=24, help="Signature template patch size in pixels")
     args = ap.parse_args()
 
     app = PipetteApp(rate_hz=args.rate, save_dir=args.save_dir, follow=args.follow, avg_k=args.avg,
                      info_backend=args.info_backend, info_hz=args.info_hz, save_backend=args.save_backend,
-                     auto_quit_seconds=args.auto_quit)
+                     auto_quit_seconds=args.auto_quit, signature_out=args.signature_out,
+                     template_size=args.template_size)
     return app.run()
 
 
@@ -0,0 +1,166 @@
+"""Кэш LRU со сроком жизни записей и необязательной копией на диске.
+
+    cache = TTLCache(max_entries=256, ttl_seconds=3600, directory=".ai_cache")
+    cache.set(key, value)          # value — JSON-совместимое значение
+    cache.get(key)                 # None, если нет или запись старше ttl_seconds
+    cache.lookup(key)              # (value, возраст, сек) без проверки срока — для stale-while-revalidate
+
+В памяти — ``OrderedDict`` с вытеснением самых давно использованных записей сверх ``max_entries``.
+С ``directory`` каждая запись дублируется в ``<directory>/<sha256(key)>.json`` (атомарная запись
+через временный файл); промах в памяти читает диск, так что кэш переживает перезапуск бота.
+Просроченные и лишние (по mtime) файлы удаляются при записи раз в ``max_entries // 4`` вставок.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """LRU в памяти + файлы на диске; потокобезопасен."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0, directory: Optional[str] = None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.directory = directory or None
+        self._items: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # === Диск ===
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[Any, float]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                rec = json.load(f)
+            if rec.get("k") != key:
+                return None
+            return rec.get("v"), float(rec.get("t", 0.0))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"cache: чтение {key[:16]}… не удалось: {e}")
+            return None
+
+    def _write_disk(self, key: str, value: Any, stored_at: float) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"k": key, "t": stored_at, "v": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.debug(f"cache: запись {key[:16]}… не удалась: {e}")
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            return
+        self._writes += 1
+        if self._writes % max(1, self.max_entries // 4) == 0:
+            self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """Удалить просроченные файлы и самые старые сверх max_entries; возвращает число удалённых."""
+        if not self.directory:
+            return 0
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except Exception:
+            return 0
+        now = time.time()
+        files = []
+        for n in names:
+            p = os.path.join(self.directory, n)
+            try:
+                files.append((os.path.getmtime(p), p))
+            except Exception:
+                continue
+        files.sort(reverse=True)
+        removed = 0
+        for i, (mtime, p) in enumerate(files):
+            if i >= self.max_entries or (self.ttl_seconds > 0 and now - mtime > self.ttl_seconds):
+                try:
+                    os.remove(p)
+                    removed += 1
+                except Exception:
+                    pass
+        return removed
+
+    # === Доступ ===
+
+    def lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(значение, возраст в секундах) без проверки срока жизни; None — записи нет."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        if item is None:
+            item = self._read_disk(key)
+            if item is None:
+                return None
+            with self._lock:
+                self._items[key] = item
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+            self.disk_hits += 1
+        value, stored_at = item
+        return value, max(0.0, time.time() - stored_at)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        found = self.lookup(key)
+        if found is None or (self.ttl_seconds > 0 and found[1] > self.ttl_seconds):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return found[0]
+
+    def set(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._items[key] = (value, stored_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        self._write_disk(key, value, stored_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except Exception:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "directory": self.directory,
+        }
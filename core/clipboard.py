@@ -0,0 +1,242 @@
+"""Работа с системным буфером обмена без фиксированных пауз.
+
+Раньше после ``Cmd+C``/``pyperclip.copy`` ждали ``time.sleep(0.2–0.5)`` и читали буфер «наугад».
+``ClipboardSession`` вместо этого ждёт смены счётчика изменений буфера
+(``NSPasteboard.changeCount`` на macOS; где AppKit недоступен — хэш содержимого) с дедлайном,
+а на выходе из ``with`` восстанавливает содержимое, которое было до операции.
+
+Латентность каждой операции (copy/hotkey_copy/restore) копится в ``clipboard_stats()`` и
+показывается в ``/status``.
+
+Модуль читает параметры из os.getenv (его импортируют clipboard_utils и selection — без циклов через config).
+"""
+
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import pyperclip
+
+from core.metrics import counters
+from core.sleep_utils import wait_until
+
+# PyObjC (macOS): счётчик изменений буфера без чтения содержимого. На других платформах — None.
+try:
+    from AppKit import NSPasteboard  # type: ignore
+except Exception:
+    NSPasteboard = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+
+class ClipboardStats:
+    """Счётчики и латентность по видам операций: count, timeouts, avg_ms, max_ms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, float]] = {}
+
+    def record(self, op: str, seconds: float, ok: bool = True) -> None:
+        ms = seconds * 1000.0
+        with self._lock:
+            s = self._ops.setdefault(op, {"count": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["count"] += 1
+            if not ok:
+                s["timeouts"] += 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                op: {
+                    "count": int(s["count"]),
+                    "timeouts": int(s["timeouts"]),
+                    "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else None,
+                    "max_ms": round(s["max_ms"], 1),
+                }
+                for op, s in self._ops.items()
+            }
+
+
+_stats = ClipboardStats()
+
+
+def clipboard_stats() -> ClipboardStats:
+    """Общая статистика операций с буфером (для диагностики)."""
+    return _stats
+
+
+def read_clipboard() -> str:
+    """Текст буфера; при сбое pyperclip на macOS — через pbpaste."""
+    try:
+        return pyperclip.paste() or ""
+    except Exception:
+        if sys.platform == "darwin":
+            try:
+                counters().inc("subprocess_spawns", cmd="pbpaste")
+                return subprocess.check_output(["/usr/bin/pbpaste"]).decode("utf-8", "ignore")
+            except Exception:
+                pass
+        return ""
+
+
+def write_clipboard(text: str) -> bool:
+    """Записать текст в буфер; при сбое pyperclip на macOS — через pbcopy."""
+    try:
+        pyperclip.copy(str(text))
+        return True
+    except Exception as e:
+        if sys.platform == "darwin":
+            try:
+                counters().inc("subprocess_spawns", cmd="pbcopy")
+                p = subprocess.Popen(["/usr/bin/pbcopy"], stdin=subprocess.PIPE)
+                p.communicate(input=str(text).encode("utf-8"))
+                return True
+            except Exception as e2:
+                logger.debug(f"pbcopy failed: {e2}")
+        logger.debug(f"clipboard write failed: {e}")
+        return False
+
+
+def change_token(reader: Optional[Callable[[], str]] = None):
+    """Метка состояния буфера: changeCount NSPasteboard, иначе — хэш содержимого.
+
+    Сравнивать метки можно только на равенство. reader — подмена чтения (отладка без AppKit).
+    """
+    if reader is None and NSPasteboard is not None:
+        try:
+            return ("cc", int(NSPasteboard.generalPasteboard().changeCount()))
+        except Exception:
+            pass
+    return _content_token((reader or read_clipboard)())
+
+
+def _content_token(text: str):
+    return ("h", hashlib.blake2b(text.encode("utf-8", "ignore"), digest_size=16).digest())
+
+
+class ClipboardSession:
+    """Сеанс операций с буфером: снимок на входе, ожидание изменений по счётчику, восстановление на выходе.
+
+        with ClipboardSession() as cb:
+            cb.copy(prompt)                       # запись с подтверждением
+            text = cb.copy_hotkey()               # Cmd+C и чтение, как только буфер сменился
+
+    restore=None — по CLIPBOARD_RESTORE; timeout — дедлайн ожидания (CLIPBOARD_WAIT_TIMEOUT_SECONDS).
+    hotkey/reader/writer подменяются для проверки без GUI.
+    """
+
+    def __init__(self, restore: Optional[bool] = None, timeout: Optional[float] = None,
+                 poll: Optional[float] = None,
+                 hotkey: Optional[Callable[..., None]] = None,
+                 reader: Optional[Callable[[], str]] = None,
+                 writer: Optional[Callable[[str], bool]] = None,
+                 stats: Optional[ClipboardStats] = None):
+        self.restore = _env_bool("CLIPBOARD_RESTORE", "1") if restore is None else bool(restore)
+        self.timeout = _env_float("CLIPBOARD_WAIT_TIMEOUT_SECONDS", 1.0) if timeout is None else float(timeout)
+        self.poll = max(0.005, _env_float("CLIPBOARD_POLL_INTERVAL_SECONDS", 0.02) if poll is None else float(poll))
+        self._hotkey = hotkey
+        self._reader = reader
+        self._writer = writer
+        self.stats = stats or _stats
+        self._snapshot: Optional[str] = None
+        self._dirty = False
+
+    # === Примитивы ===
+
+    def read(self) -> str:
+        return (self._reader or read_clipboard)()
+
+    def _write(self, text: str) -> bool:
+        return (self._writer or write_clipboard)(text)
+
+    def token(self):
+        return change_token(self._reader)
+
+    def wait_for_change(self, before, timeout: Optional[float] = None) -> bool:
+        """Ждать, пока метка буфера отличается от before; False — дедлайн истёк."""
+        return wait_until(lambda: self.token() != before,
+                          self.timeout if timeout is None else float(timeout), poll=self.poll)
+
+    # === Операции ===
+
+    def copy(self, text: str, timeout: Optional[float] = None) -> bool:
+        """Записать text в буфер и дождаться, что запись видна (а не просто «отправлена»)."""
+        t0 = time.monotonic()
+        text = str(text)
+        self._dirty = True
+        before = self.token()
+        if not self._write(text):
+            self.stats.record("copy", time.monotonic() - t0, ok=False)
+            return False
+        if before == _content_token(text):
+            # Без changeCount запись того же текста не видна как изменение — ждать нечего
+            ok = True
+        else:
+            ok = self.wait_for_change(before, timeout) or self.read() == text
+        self.stats.record("copy", time.monotonic() - t0, ok=ok)
+        return ok
+
+    def copy_hotkey(self, keys: Sequence[str] = ("command", "c"), timeout: Optional[float] = None) -> str:
+        """Нажать сочетание копирования и вернуть текст буфера, как только он сменился.
+
+        По истечении дедлайна возвращается текущее содержимое (скопированный текст мог совпасть
+        с прежним, а без changeCount такое изменение не видно).
+        """
+        t0 = time.monotonic()
+        self._dirty = True
+        before = self.token()
+        if self._hotkey is not None:
+            self._hotkey(*keys)
+        else:
+            import pyautogui
+            pyautogui.hotkey(*keys)
+        ok = self.wait_for_change(before, timeout)
+        text = self.read()
+        self.stats.record("hotkey_copy", time.monotonic() - t0, ok=ok)
+        return text
+
+    # === Снимок и восстановление ===
+
+    def begin(self) -> "ClipboardSession":
+        """Запомнить текущее содержимое (если restore); то же, что вход в with."""
+        if self.restore:
+            t0 = time.monotonic()
+            self._snapshot = self.read()
+            self.stats.record("snapshot", time.monotonic() - t0)
+        return self
+
+    def end(self) -> None:
+        """Вернуть запомненное содержимое, если буфер трогали; то же, что выход из with."""
+        if self.restore and self._dirty and self._snapshot is not None:
+            t0 = time.monotonic()
+            ok = self._write(self._snapshot)
+            self.stats.record("restore", time.monotonic() - t0, ok=ok)
+        self._dirty = False
+
+    def __enter__(self) -> "ClipboardSession":
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            self.end()
+        except Exception as e:
+            logger.debug(f"clipboard restore failed: {e}")
+        return False
@@ -1,55 +1,118 @@
-"""Централизованная конфигурация проекта из .env файла."""
+"""Централизованная конфигурация проекта из .env файла.
 
+``Config`` объявляет поля: тип — аннотация, имя переменной и значение по умолчанию — вызов
+``_env_*`` (он же регистрирует поле). Рабочие значения живут в неизменяемом снимке
+``ConfigSnapshot``; ``config`` — прокси к текущему снимку, так что ``config.X`` всегда видит
+последнюю версию.
+
+Наблюдатель ``.env`` (опрос mtime раз в ``CONFIG_WATCH_INTERVAL_SECONDS``) перечитывает файл,
+атомарно подменяет снимок и вызывает подписчиков ``subscribe(fn)`` с изменившимися полями.
+Переменные, заданные в окружении процесса до запуска, приоритетнее файла (как ``load_dotenv``).
+Горячие циклы берут ``snapshot()`` один раз и читают поля без разбора строк.
+"""
+
+import logging
 import os
-from typing import Optional
-from dotenv import load_dotenv
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from dotenv import dotenv_values, find_dotenv, load_dotenv
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
+# Окружение процесса до загрузки .env: эти переменные файл не переопределяет
+_PROCESS_ENV_KEYS = frozenset(os.environ)
+ENV_FILE = find_dotenv() or os.path.join(os.getcwd(), ".env")
+load_dotenv(ENV_FILE)
 
-def _env_int(name: str, default: int) -> int:
-    """Безопасно читает int из ENV с fallback на default."""
+# Поля снимка: имя переменной → (разбор, значение по умолчанию); заполняется вызовами _env_* в Config
+_FIELDS: Dict[str, Tuple[Callable[[Optional[str], Any], Any], Any]] = {}
+
+
+def _parse_int(raw: Optional[str], default: int) -> int:
     try:
-        return int(os.getenv(name, default))
+        return int(default if raw is None else raw)
     except Exception:
         return default
 
 
-def _env_float(name: str, default: float) -> float:
-    """Безопасно читает float из ENV с fallback на default."""
+def _parse_float(raw: Optional[str], default: float) -> float:
     try:
-        return float(os.getenv(name, default))
+        return float(default if raw is None else raw)
     except Exception:
         return default
 
 
+def _parse_bool(raw: Optional[str], default: str) -> bool:
+    return (default if raw is None else raw) not in ("0", "false", "False")
+
+
+def _parse_str(raw: Optional[str], default: str) -> str:
+    return default if raw is None else raw
+
+
+def _env_int(name: str, default: int) -> int:
+    """Безопасно читает int из ENV с fallback на default."""
+    _FIELDS[name] = (_parse_int, default)
+    return _parse_int(os.getenv(name), default)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Безопасно читает float из ENV с fallback на default."""
+    _FIELDS[name] = (_parse_float, default)
+    return _parse_float(os.getenv(name), default)
+
+
 def _env_bool(name: str, default: str = "0") -> bool:
     """Безопасно читает bool из ENV (0/false/False считается False)."""
-    return os.getenv(name, default) not in ("0", "false", "False")
+    _FIELDS[name] = (_parse_bool, default)
+    return _parse_bool(os.getenv(name), default)
+
+
+def _env_str(name: str, default: str = "") -> str:
+    """Строка из ENV с fallback на default."""
+    _FIELDS[name] = (_parse_str, default)
+    return _parse_str(os.getenv(name), default)
 
 
 class Config:
     """Централизованный конфигурационный класс для всех параметров проекта."""
     
     # === Telegram ===
-    TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    TELEGRAM_BOT_TOKEN: str = _env_str("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_API_ID: int = _env_int("TELEGRAM_API_ID", 0)
-    TELEGRAM_API_HASH: str = os.getenv("TELEGRAM_API_HASH", "")
+    TELEGRAM_API_HASH: str = _env_str("TELEGRAM_API_HASH", "")
+    # Исходящие сообщения (core/tg_sender.py): размер части (UTF-16), темп, повторы, отправка файлом
+    TG_MESSAGE_LIMIT: int = _env_int("TG_MESSAGE_LIMIT", 4096)
+    TG_CHAT_RATE_PER_SECOND: float = _env_float("TG_CHAT_RATE_PER_SECOND", 1.0)
+    TG_CHAT_BURST: int = _env_int("TG_CHAT_BURST", 3)
+    TG_GLOBAL_RATE_PER_SECOND: float = _env_float("TG_GLOBAL_RATE_PER_SECOND", 25.0)
+    TG_SEND_RETRIES: int = _env_int("TG_SEND_RETRIES", 2)
+    TG_MAX_FLOOD_WAIT_SECONDS: float = _env_float("TG_MAX_FLOOD_WAIT_SECONDS", 120.0)
+    TG_DOCUMENT_THRESHOLD_CHUNKS: int = _env_int("TG_DOCUMENT_THRESHOLD_CHUNKS", 8)
     
     # === Windsurf Window ===
-    WINDSURF_WINDOW_TITLE: str = os.getenv("WINDSURF_WINDOW_TITLE", "Windsurf")
-    WINDSURF_PROCESS_MATCH: str = os.getenv("WINDSURF_PROCESS_MATCH", "Windsurf")
-    WINDSURF_ALT_PROCESS_NAMES: str = os.getenv(
+    WINDSURF_WINDOW_TITLE: str = _env_str("WINDSURF_WINDOW_TITLE", "Windsurf")
+    WINDSURF_PROCESS_MATCH: str = _env_str("WINDSURF_PROCESS_MATCH", "Windsurf")
+    WINDSURF_ALT_PROCESS_NAMES: str = _env_str(
         "WINDSURF_ALT_PROCESS_NAMES", 
         "Electron,Windsurf Helper,Windsurf Helper (Renderer)"
     )
-    WINDSURF_APP_NAME: str = os.getenv("WINDSURF_APP_NAME", "Windsurf")
+    WINDSURF_APP_NAME: str = _env_str("WINDSURF_APP_NAME", "Windsurf")
     
     # === Gemini API ===
-    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
-    
+    GEMINI_API_KEY: str = _env_str("GEMINI_API_KEY", "")
+    # Суммаризация (ai_processor.summarize_async): параллельные запросы, таймаут, кэш, разбиение
+    AI_MAX_CONCURRENCY: int = _env_int("AI_MAX_CONCURRENCY", 2)
+    AI_TIMEOUT_SECONDS: float = _env_float("AI_TIMEOUT_SECONDS", 60.0)
+    AI_CACHE_DIR: str = _env_str("AI_CACHE_DIR", ".ai_cache")
+    AI_CACHE_TTL_SECONDS: float = _env_float("AI_CACHE_TTL_SECONDS", 604800.0)
+    AI_CACHE_MAX_ENTRIES: int = _env_int("AI_CACHE_MAX_ENTRIES", 256)
+    AI_CHUNK_CHARS: int = _env_int("AI_CHUNK_CHARS", 120000)
+    # Каталог моделей (/model list): срок свежести, после него — фоновое обновление
+    AI_MODELS_TTL_SECONDS: float = _env_float("AI_MODELS_TTL_SECONDS", 21600.0)
+
     # === Remote Controller ===
-    REMOTE_CONTROLLER_URL: str = os.getenv("REMOTE_CONTROLLER_URL", "")
+    REMOTE_CONTROLLER_URL: str = _env_str("REMOTE_CONTROLLER_URL", "")
     
     # === Core Automation ===
     RESPONSE_WAIT_SECONDS: float = _env_float("RESPONSE_WAIT_SECONDS", 15.0)
@@ -57,6 +120,8 @@ class Config:
     RESPONSE_POLL_INTERVAL_SECONDS: float = _env_float("RESPONSE_POLL_INTERVAL_SECONDS", 0.5)
     RESPONSE_STABLE_MIN_SECONDS: float = _env_float("RESPONSE_STABLE_MIN_SECONDS", 5.0)
     PASTE_RETRY_COUNT: int = _env_int("PASTE_RETRY_COUNT", 2)
+    PASTE_VERIFIERS: str = _env_str("PASTE_VERIFIERS", "ax,length,pixel,select_all")
+    PASTE_VERIFY_TIMEOUT_SECONDS: float = _env_float("PASTE_VERIFY_TIMEOUT_SECONDS", 0.8)
     COPY_RETRY_COUNT: int = _env_int("COPY_RETRY_COUNT", 2)
     KEY_DELAY_SECONDS: float = _env_float("KEY_DELAY_SECONDS", 0.2)
     USE_APPLESCRIPT_ON_MAC: bool = _env_bool("USE_APPLESCRIPT_ON_MAC", "1")
@@ -88,7 +153,7 @@ class Config:
     READY_PIXEL_TOL: int = _env_int("READY_PIXEL_TOL", 4)
     READY_PIXEL_TOL_PCT: float = _env_float("READY_PIXEL_TOL_PCT", -1.0)
     READY_PIXEL_REQUIRED: bool = _env_bool("READY_PIXEL_REQUIRED", "1")
-    READY_PIXEL_COORD_MODE: str = os.getenv("READY_PIXEL_COORD_MODE", "top")
+    READY_PIXEL_COORD_MODE: str = _env_str("READY_PIXEL_COORD_MODE", "top")
     READY_PIXEL_DX: int = _env_int("READY_PIXEL_DX", 0)
     READY_PIXEL_DY: int = _env_int("READY_PIXEL_DY", 0)
     READY_PIXEL_PROBE_INTERVAL_SECONDS: float = _env_float("READY_PIXEL_PROBE_INTERVAL_SECONDS", 0.5)
@@ -96,7 +161,41 @@ class Config:
     READY_PIXEL_REQUIRE_TRANSITION: bool = _env_bool("READY_PIXEL_REQUIRE_TRANSITION", "1")
     READY_PIXEL_STABLE_SECONDS: float = _env_float("READY_PIXEL_STABLE_SECONDS", 0.8)
     READY_PIXEL_TRANSITION_TIMEOUT_SECONDS: float = _env_float("READY_PIXEL_TRANSITION_TIMEOUT_SECONDS", 0)
-    READY_PIXEL_SRC: str = os.getenv("READY_PIXEL_SRC", "cap")
+    READY_PIXEL_SRC: str = _env_str("READY_PIXEL_SRC", "cap")
+    # Адаптивный интервал проб: backoff пока точка стабильно «занята», быстрые пробы после первого совпадения
+    READY_PIXEL_ADAPTIVE: bool = _env_bool("READY_PIXEL_ADAPTIVE", "1")
+    READY_PIXEL_MAX_PROBE_INTERVAL_SECONDS: float = _env_float("READY_PIXEL_MAX_PROBE_INTERVAL_SECONDS", 3.0)
+    READY_PIXEL_BACKOFF: float = _env_float("READY_PIXEL_BACKOFF", 1.5)
+    READY_PIXEL_FAST_INTERVAL_SECONDS: float = _env_float("READY_PIXEL_FAST_INTERVAL_SECONDS", 0.15)
+    # Сколько подряд совпавших быстрых проб подтверждают готовность раньше READY_PIXEL_STABLE_SECONDS (0 — выкл.)
+    READY_PIXEL_CONFIRM_SAMPLES: int = _env_int("READY_PIXEL_CONFIRM_SAMPLES", 3)
+    # Статистика по окну READY_PIXEL_AVG_K: mean|median|trimmed (median/trimmed устойчивее к курсору и антиалиасингу)
+    READY_PIXEL_STAT: str = _env_str("READY_PIXEL_STAT", "mean")
+    # Многоточечная сигнатура готовности (core/signature.py): JSON-файл (по умолчанию core/ready_signature.json)
+    # или JSON строкой; если задана — заменяет одиночную точку READY_PIXEL_X/Y
+    READY_SIGNATURE_FILE: str = _env_str("READY_SIGNATURE_FILE", "")
+    READY_SIGNATURE_JSON: str = _env_str("READY_SIGNATURE_JSON", "")
+    # Параллельные окна: пока одно окно генерирует, рабочий стол отдаётся запросам в другие окна.
+    # Требует сигнатур по окнам (секция "windows" в READY_SIGNATURE_FILE) и неперекрывающихся окон.
+    PARALLEL_WINDOWS: bool = _env_bool("PARALLEL_WINDOWS", "0")
+    # Потоковая выдача: пока окно генерирует, панель ответа периодически копируется, а прирост
+    # показывается в одном редактируемом сообщении Telegram (копирование протяжкой трогает UI — по умолчанию выкл.)
+    STREAM_PARTIAL: bool = _env_bool("STREAM_PARTIAL", "0")
+    STREAM_PARTIAL_INTERVAL_SECONDS: float = _env_float("STREAM_PARTIAL_INTERVAL_SECONDS", 8.0)
+    STREAM_EDIT_MIN_INTERVAL_SECONDS: float = _env_float("STREAM_EDIT_MIN_INTERVAL_SECONDS", 3.0)
+    STREAM_PREVIEW_MAX_CHARS: int = _env_int("STREAM_PREVIEW_MAX_CHARS", 3500)
+    # Дополнительные детекторы готовности через запятую: visual,cpu,clipboard
+    READY_EXTRA_DETECTORS: str = _env_str("READY_EXTRA_DETECTORS", "")
+
+    # Извлечение текста ответа (core/extraction.py): порядок бэкендов ax|drag|fake; выбор по успешности.
+    # ax — дерево Accessibility (без мыши и буфера обмена), drag — протяжка с автоскроллом и Cmd+C
+    EXTRACTION_BACKENDS: str = _env_str("EXTRACTION_BACKENDS", "ax,drag")
+    EXTRACTION_AX_TIMEOUT_SECONDS: float = _env_float("EXTRACTION_AX_TIMEOUT_SECONDS", 2.0)
+    EXTRACTION_FAKE_FILE: str = _env_str("EXTRACTION_FAKE_FILE", "")
+
+    # Захват экрана: auto|quartz|pyautogui|screencapture|fake (fake читает кадры из SCREEN_GRAB_FAKE_DIR)
+    SCREEN_GRAB_BACKEND: str = _env_str("SCREEN_GRAB_BACKEND", "auto")
+    SCREEN_GRAB_FAKE_DIR: str = _env_str("SCREEN_GRAB_FAKE_DIR", "debug/frames")
     
     # === Answer/Input focus points ===
     INPUT_ABS_X: int = _env_int("INPUT_ABS_X", 1050)
@@ -116,7 +215,7 @@ class Config:
     # === Click coordinates ===
     CLICK_ABS_X: int = _env_int("CLICK_ABS_X", 0)
     CLICK_ABS_Y: int = _env_int("CLICK_ABS_Y", 0)
-    CLICK_WINPCT: str = os.getenv("CLICK_WINPCT", "")
+    CLICK_WINPCT: str = _env_str("CLICK_WINPCT", "")
     RIGHT_CLICK_X_FRACTION: float = _env_float("RIGHT_CLICK_X_FRACTION", 0.5)
     RIGHT_CLICK_Y_OFFSET: int = _env_int("RIGHT_CLICK_Y_OFFSET", 80)
     CLICK_BEFORE_PASTE: bool = _env_bool("CLICK_BEFORE_PASTE", "1")
@@ -126,8 +225,8 @@ class Config:
     SAVE_VISUAL_SAMPLES: bool = _env_bool("SAVE_VISUAL_SAMPLES", "1")
     SAVE_READY_ONLY_ON_MATCH: bool = _env_bool("SAVE_READY_ONLY_ON_MATCH", "0")
     SAVE_READY_HYPOTHESES: bool = _env_bool("SAVE_READY_HYPOTHESES", "1")
-    SAVE_VISUAL_DIR: str = os.getenv("SAVE_VISUAL_DIR", "debug")
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "DEBUG")
+    SAVE_VISUAL_DIR: str = _env_str("SAVE_VISUAL_DIR", "debug")
+    LOG_LEVEL: str = _env_str("LOG_LEVEL", "DEBUG")
     DETAILED_AUTOMATION_LOG: bool = _env_bool("DETAILED_AUTOMATION_LOG", "1")
     TRIM_AFTER_PROMPT: bool = _env_bool("TRIM_AFTER_PROMPT", "1")
     
@@ -145,6 +244,9 @@ class Config:
     CPU_READY_THRESHOLD: float = _env_float("CPU_READY_THRESHOLD", 6.0)
     CPU_READY_STABLE_SECONDS: float = _env_float("CPU_READY_STABLE_SECONDS", 20.0)
     CPU_SAMPLE_INTERVAL_SECONDS: float = _env_float("CPU_SAMPLE_INTERVAL_SECONDS", 1.0)
+    # Фоновый сэмплер процессов Windsurf (core/proc_sampler.py)
+    PROCESS_SAMPLE_INTERVAL_SECONDS: float = _env_float("PROCESS_SAMPLE_INTERVAL_SECONDS", 1.0)
+    PROCESS_RESCAN_SECONDS: float = _env_float("PROCESS_RESCAN_SECONDS", 60.0)
     
     # === Fulltext Stabilization ===
     USE_FULLTEXT_STABILIZATION: bool = _env_bool("USE_FULLTEXT_STABILIZATION", "0")
@@ -161,15 +263,210 @@ class Config:
     CHANGE_FINAL_PROBE_Y: int = _env_int("CHANGE_FINAL_PROBE_Y", 15)
     
     # === Git ===
-    GIT_ALLOWED_USER_IDS: str = os.getenv("GIT_ALLOWED_USER_IDS", "")
-    GIT_WORKDIR: str = os.getenv("GIT_WORKDIR", "")
+    GIT_ALLOWED_USER_IDS: str = _env_str("GIT_ALLOWED_USER_IDS", "")
+    GIT_WORKDIR: str = _env_str("GIT_WORKDIR", "")
+    
+    # === Тайминги UI-автоматизации (core/timing.py) ===
+    TIMING_PROFILE: str = _env_str("TIMING_PROFILE", "default")
+    TIMING_OVERRIDES: str = _env_str("TIMING_OVERRIDES", "")
+    
+    # === Трассировка запросов (core/tracing.py, /trace) ===
+    TRACE_BUFFER_SIZE: int = _env_int("TRACE_BUFFER_SIZE", 50)
+    TRACE_EXPORT_FILE: str = _env_str("TRACE_EXPORT_FILE", "")
+    
+    # === Метрики с перцентилями (core/metrics.py, /status) ===
+    METRICS_FILE: str = _env_str("METRICS_FILE", "metrics.jsonl")
+    METRICS_RETENTION_HOURS: float = _env_float("METRICS_RETENTION_HOURS", 168.0)
+    METRICS_SLOT_SECONDS: float = _env_float("METRICS_SLOT_SECONDS", 3600.0)
+    METRICS_MAX_SERIES: int = _env_int("METRICS_MAX_SERIES", 32)
+    METRICS_FILE_MAX_BYTES: int = _env_int("METRICS_FILE_MAX_BYTES", 5000000)
+    # Экспорт OpenMetrics (core/openmetrics.py): 0 — выключен
+    METRICS_HTTP_PORT: int = _env_int("METRICS_HTTP_PORT", 0)
+    METRICS_HTTP_HOST: str = _env_str("METRICS_HTTP_HOST", "127.0.0.1")
+    
+    # === Буфер обмена ===
+    CLIPBOARD_RESTORE: bool = _env_bool("CLIPBOARD_RESTORE", "1")
+    CLIPBOARD_WAIT_TIMEOUT_SECONDS: float = _env_float("CLIPBOARD_WAIT_TIMEOUT_SECONDS", 1.0)
+    CLIPBOARD_POLL_INTERVAL_SECONDS: float = _env_float("CLIPBOARD_POLL_INTERVAL_SECONDS", 0.02)
     
     # === AppleScript ===
     OSASCRIPT_TIMEOUT_SECONDS: float = _env_float("OSASCRIPT_TIMEOUT_SECONDS", 2.0)
     
     # === ENV Reload ===
     ENV_RELOAD_INTERVAL_SECONDS: float = _env_float("ENV_RELOAD_INTERVAL_SECONDS", 99999.0)
+    # Наблюдатель .env: период проверки mtime, сек (0 — выключен)
+    CONFIG_WATCH_INTERVAL_SECONDS: float = _env_float("CONFIG_WATCH_INTERVAL_SECONDS", 2.0)
+
+
+class ConfigSnapshot:
+    """Неизменяемый снимок конфигурации: поля Config с разобранными значениями и номер версии."""
+
+    def __init__(self, values: Mapping[str, Any], version: int = 1):
+        object.__setattr__(self, "_values", dict(values))
+        object.__setattr__(self, "version", int(version))
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str], version: int = 1) -> "ConfigSnapshot":
+        return cls({name: parse(env.get(name), default) for name, (parse, default) in _FIELDS.items()}, version)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ConfigSnapshot неизменяем; изменения — через .env и reload()")
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self._values.get(name, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._values)
+
+    def diff(self, other: "ConfigSnapshot") -> Dict[str, Tuple[Any, Any]]:
+        """Поля, которые отличаются в other: имя → (старое, новое)."""
+        keys = set(self._values) | set(other._values)
+        return {k: (self._values.get(k), other._values.get(k)) for k in sorted(keys)
+                if self._values.get(k) != other._values.get(k)}
+
+
+Subscriber = Callable[[ConfigSnapshot, ConfigSnapshot, Dict[str, Tuple[Any, Any]]], None]
+
+
+class ConfigStore:
+    """Текущий снимок, перечитывание .env, подписчики и фоновый наблюдатель за mtime файла."""
+
+    def __init__(self, env_file: str = ENV_FILE):
+        self.env_file = env_file
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscriber] = []
+        self._file_keys = set(self._read_file()) - _PROCESS_ENV_KEYS
+        self._stamp = self._file_stamp()
+        self._current = ConfigSnapshot.from_env(os.environ)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloads = 0
+
+    def current(self) -> ConfigSnapshot:
+        return self._current
+
+    def subscribe(self, fn: Subscriber) -> Callable[[], None]:
+        """Подписаться на смену снимка: fn(old, new, changed). Возвращает функцию отписки."""
+        with self._lock:
+            self._subscribers.append(fn)
+
+        def _unsubscribe() -> None:
+            with self._lock:
+                if fn in self._subscribers:
+                    self._subscribers.remove(fn)
+        return _unsubscribe
+
+    def _read_file(self) -> Dict[str, str]:
+        try:
+            return {k: v for k, v in dotenv_values(self.env_file).items() if v is not None}
+        except Exception:
+            return {}
+
+    def _file_stamp(self) -> Optional[Tuple[float, int]]:
+        try:
+            st = os.stat(self.env_file)
+            return st.st_mtime, st.st_size
+        except OSError:
+            return None
+
+    def reload(self) -> Dict[str, Tuple[Any, Any]]:
+        """Перечитать .env, обновить os.environ (кроме переменных процесса) и подменить снимок.
+
+        Возвращает изменившиеся поля; подписчики вызываются только при изменениях.
+        """
+        with self._lock:
+            values = self._read_file()
+            keys = set(values) - _PROCESS_ENV_KEYS
+            # Модули, читающие os.getenv напрямую (без циклов через config), тоже видят новые значения
+            for k in keys:
+                os.environ[k] = values[k]
+            for k in self._file_keys - keys:
+                os.environ.pop(k, None)
+            self._file_keys = keys
+            self._stamp = self._file_stamp()
+            old = self._current
+            new = ConfigSnapshot.from_env(os.environ, version=old.version + 1)
+            changed = old.diff(new)
+            if not changed:
+                return {}
+            self._current = new
+            self.reloads += 1
+            subscribers = list(self._subscribers)
+        logger.info(f"config: .env перечитан, изменены: {', '.join(changed)}")
+        for fn in subscribers:
+            try:
+                fn(old, new, changed)
+            except Exception as e:
+                logger.warning(f"config subscriber failed: {e}")
+        return changed
+
+    def check(self) -> Dict[str, Tuple[Any, Any]]:
+        """Перечитать, если mtime/размер .env изменились."""
+        if self._file_stamp() == self._stamp:
+            return {}
+        return self.reload()
+
+    def start_watcher(self, interval: Optional[float] = None) -> bool:
+        """Фоновый опрос mtime .env; interval <= 0 — не запускать. Повторный вызов ничего не делает."""
+        interval = self._current.CONFIG_WATCH_INTERVAL_SECONDS if interval is None else float(interval)
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return False
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.debug(f"config watcher failed: {e}")
+
+        self._thread = threading.Thread(target=_loop, name="config-watcher", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+
+class _ConfigProxy:
+    """``config.X`` — поле текущего снимка (после перечитывания .env видно новое значение)."""
+
+    __slots__ = ("_store",)
+
+    def __init__(self, store: ConfigStore):
+        object.__setattr__(self, "_store", store)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._store.current(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("config только для чтения; изменения — через .env")
+
+    def __repr__(self) -> str:
+        return f"<config v{self._store.current().version}>"
+
+
+_store = ConfigStore()
+
+
+def config_store() -> ConfigStore:
+    return _store
+
+
+def snapshot() -> ConfigSnapshot:
+    """Текущий снимок целиком (для горячих циклов: один раз на ожидание)."""
+    return _store.current()
+
+
+def subscribe(fn: Subscriber) -> Callable[[], None]:
+    return _store.subscribe(fn)
+
+
+def reload() -> Dict[str, Tuple[Any, Any]]:
+    return _store.reload()
 
 
-# Singleton instance
-config = Config()
+# Singleton: прокси к текущему снимку
+config = _ConfigProxy(_store)
@@ -0,0 +1,291 @@
+"""Бэкенды извлечения текста ответа из правой панели Windsurf.
+
+``TextExtractor.extract(bounds) -> (text, region)`` — тот же контракт, что у
+``selection.copy_from_right_panel``. Реализации:
+
+- ``AXTreeExtractor`` — читает текст панели из дерева Accessibility (AXStaticText/AXTextArea
+  внутри региона панели): без мыши, без автоскролла и без буфера обмена;
+- ``DragCopyExtractor`` — прежняя протяжка с автоскроллом и Cmd+C (fallback);
+- ``FakeExtractor`` — заранее заданные тексты (проверка без macOS).
+
+``ExtractorChain`` на каждый запрос выбирает порядок бэкендов по скользящей доле успехов
+(неуспешные уходят в конец, периодически перепроверяются) и берёт первый непустой принятый результат.
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.config import config
+
+# PyObjC (macOS): Accessibility API и список запущенных приложений. На других платформах — None.
+try:
+    from ApplicationServices import (  # type: ignore
+        AXUIElementCopyAttributeValue,
+        AXUIElementCreateApplication,
+        AXUIElementSetAttributeValue,
+        AXValueGetValue,
+        kAXValueCGPointType,
+    )
+except Exception:
+    AXUIElementCreateApplication = None  # type: ignore
+try:
+    from AppKit import NSWorkspace  # type: ignore
+except Exception:
+    NSWorkspace = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+Bounds = Tuple[int, int, int, int]
+
+
+class TextExtractor:
+    """Базовый бэкенд: extract(bounds) -> (text, region). Пустой текст — неудача."""
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def extract(self, bounds: Bounds) -> Tuple[str, Bounds]:
+        raise NotImplementedError
+
+
+class DragCopyExtractor(TextExtractor):
+    """Протяжка с автоскроллом и Cmd+C (selection.copy_from_right_panel).
+
+    prepare(bounds) — подготовка перед протяжкой (клик в панель, прокрутка вниз), задаётся контроллером.
+    """
+
+    name = "drag"
+
+    def __init__(self, prepare: Optional[Callable[[Bounds], None]] = None):
+        self.prepare = prepare
+
+    def extract(self, bounds: Bounds) -> Tuple[str, Bounds]:
+        from selection import copy_from_right_panel
+        if self.prepare is not None:
+            self.prepare(bounds)
+        return copy_from_right_panel(bounds)
+
+
+class AXTreeExtractor(TextExtractor):
+    """Текст панели ответа из дерева Accessibility процесса Windsurf.
+
+    Electron отдаёт веб-содержимое в AX только после AXManualAccessibility=true на элементе
+    приложения. Обходим дерево в порядке чтения, берём текстовые элементы, левый край которых
+    попадает в колонку панели (по вертикали не ограничиваем — прокрученный вверх текст тоже в дереве).
+    """
+
+    name = "ax"
+    TEXT_ROLES = ("AXStaticText", "AXTextArea", "AXTextField")
+
+    def __init__(self, app_name: Optional[str] = None, max_nodes: int = 20000, timeout: float = 2.0):
+        self.app_name = app_name or os.getenv("WINDSURF_APP_NAME", "Windsurf").strip() or "Windsurf"
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self._enabled_pids: set = set()
+
+    def available(self) -> bool:
+        return AXUIElementCreateApplication is not None and NSWorkspace is not None
+
+    def _pid(self) -> Optional[int]:
+        try:
+            for app in NSWorkspace.sharedWorkspace().runningApplications():
+                if str(app.localizedName() or "") == self.app_name:
+                    return int(app.processIdentifier())
+        except Exception as e:
+            logger.debug(f"ax: pid lookup failed: {e}")
+        return None
+
+    @staticmethod
+    def _attr(elem, name: str):
+        try:
+            err, value = AXUIElementCopyAttributeValue(elem, name, None)
+            return value if err == 0 else None
+        except Exception:
+            return None
+
+    def _point(self, elem, name: str, kind) -> Optional[Tuple[float, float]]:
+        """AXPosition (CGPoint) элемента."""
+        v = self._attr(elem, name)
+        if v is None:
+            return None
+        try:
+            ok, pt = AXValueGetValue(v, kind, None)
+            if not ok:
+                return None
+            return pt.x, pt.y
+        except Exception:
+            return None
+
+    def _window(self, app, bounds: Bounds):
+        """Окно приложения с совпадающими границами (иначе — фокусное)."""
+        wins = self._attr(app, "AXWindows") or []
+        for w in wins:
+            pos = self._point(w, "AXPosition", kAXValueCGPointType)
+            if pos is not None and abs(pos[0] - bounds[0]) <= 4 and abs(pos[1] - bounds[1]) <= 4:
+                return w
+        return self._attr(app, "AXFocusedWindow") or (wins[0] if wins else None)
+
+    def extract(self, bounds: Bounds) -> Tuple[str, Bounds]:
+        from selection import answer_panel_region
+        region = answer_panel_region(bounds)
+        if not self.available():
+            return "", region
+        pid = self._pid()
+        if pid is None:
+            return "", region
+        app = AXUIElementCreateApplication(pid)
+        if pid not in self._enabled_pids:
+            try:
+                AXUIElementSetAttributeValue(app, "AXManualAccessibility", True)
+            except Exception:
+                pass
+            self._enabled_pids.add(pid)
+        win = self._window(app, bounds)
+        if win is None:
+            return "", region
+        rx, _ry, rw, _rh = region
+        deadline = time.time() + self.timeout
+        lines: List[str] = []
+        last_y: Optional[float] = None
+        visited = 0
+        stack = [win]
+        while stack and visited < self.max_nodes and time.time() < deadline:
+            elem = stack.pop()
+            visited += 1
+            role = str(self._attr(elem, "AXRole") or "")
+            if role in self.TEXT_ROLES:
+                value = self._attr(elem, "AXValue")
+                if value:
+                    pos = self._point(elem, "AXPosition", kAXValueCGPointType)
+                    if pos is not None and rx - 4 <= pos[0] <= rx + rw:
+                        text = str(value)
+                        # Соседние куски одной строки (ссылки, inline-код) склеиваем, новая строка — по сдвигу Y
+                        if lines and last_y is not None and abs(pos[1] - last_y) < 4:
+                            lines[-1] += text
+                        else:
+                            lines.append(text)
+                        last_y = pos[1]
+                    continue
+            children = self._attr(elem, "AXChildren") or []
+            stack.extend(reversed(list(children)))
+        if stack:
+            # Неполный обход — неполный ответ: считаем неудачей, цепочка перейдёт к протяжке
+            logger.info(f"ax: обход прерван на {visited} узлах (лимит/таймаут), результат отброшен")
+            return "", region
+        return "\n".join(lines).strip(), region
+
+
+class FakeExtractor(TextExtractor):
+    """Тексты по очереди из списка (последний повторяется); None в списке — неудача бэкенда."""
+
+    name = "fake"
+
+    def __init__(self, texts: Sequence[Optional[str]], name: str = "fake"):
+        self.texts = list(texts) or [None]
+        self.name = name
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "FakeExtractor":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([f.read()])
+
+    def extract(self, bounds: Bounds) -> Tuple[str, Bounds]:
+        text = self.texts[min(self.calls, len(self.texts) - 1)]
+        self.calls += 1
+        if text is None:
+            return "", tuple(bounds)
+        return text, tuple(bounds)
+
+
+class ExtractorChain(TextExtractor):
+    """Выбор бэкенда по успешности на каждый запрос.
+
+    Бэкенды идут в заданном порядке; те, чья EWMA доля успехов упала ниже demote_below, уходят
+    в конец. Каждый reprobe_every-й запрос пониженные пробуются первыми, чтобы восстановиться,
+    когда причина (например, AX-дерево ещё не построено) ушла.
+
+    accept(text) -> bool — дополнительная проверка результата (например, «не эхо»); отклонённый
+    результат считается неудачей бэкенда, и пробуется следующий.
+    """
+
+    name = "chain"
+
+    def __init__(self, extractors: Iterable[TextExtractor], alpha: float = 0.3,
+                 demote_below: float = 0.5, reprobe_every: int = 10):
+        self.extractors = [e for e in extractors if e.available()]
+        self.alpha = alpha
+        self.demote_below = demote_below
+        self.reprobe_every = max(1, int(reprobe_every))
+        self.requests = 0
+        self.success: Dict[str, float] = {e.name: 1.0 for e in self.extractors}
+        self.counts: Dict[str, Dict[str, int]] = {e.name: {"ok": 0, "fail": 0} for e in self.extractors}
+        self.latency: Dict[str, float] = {}
+        self.last_backend: Optional[str] = None
+
+    def ordered(self) -> List[TextExtractor]:
+        good = [e for e in self.extractors if self.success[e.name] >= self.demote_below]
+        bad = [e for e in self.extractors if self.success[e.name] < self.demote_below]
+        if bad and self.requests % self.reprobe_every == 0:
+            return bad + good
+        return good + bad
+
+    def _record(self, name: str, ok: bool, dt: float) -> None:
+        self.success[name] = (1 - self.alpha) * self.success[name] + self.alpha * (1.0 if ok else 0.0)
+        self.counts[name]["ok" if ok else "fail"] += 1
+        prev = self.latency.get(name)
+        self.latency[name] = dt if prev is None else (1 - self.alpha) * prev + self.alpha * dt
+
+    def extract(self, bounds: Bounds, accept: Optional[Callable[[str], bool]] = None) -> Tuple[str, Bounds]:
+        region: Bounds = tuple(bounds)
+        self.last_backend = None
+        self.requests += 1
+        for ex in self.ordered():
+            t0 = time.time()
+            try:
+                text, region = ex.extract(bounds)
+            except Exception as e:
+                logger.debug(f"extractor {ex.name} failed: {e}")
+                text = ""
+            text = (text or "").strip()
+            ok = bool(text) and (accept is None or accept(text))
+            self._record(ex.name, ok, time.time() - t0)
+            if ok:
+                self.last_backend = ex.name
+                return text, region
+            logger.info(f"Извлечение: бэкенд {ex.name} не дал результата, пробую следующий")
+        return "", region
+
+    def stats(self) -> dict:
+        return {
+            e.name: {
+                "success_rate": round(self.success[e.name], 3),
+                **self.counts[e.name],
+                "avg_ms": round(self.latency[e.name] * 1000.0, 1) if e.name in self.latency else None,
+            }
+            for e in self.extractors
+        }
+
+
+def create_extractor(spec: Optional[str] = None,
+                     prepare_drag: Optional[Callable[[Bounds], None]] = None) -> ExtractorChain:
+    """Цепочка по EXTRACTION_BACKENDS (например "ax,drag"); fake читает EXTRACTION_FAKE_FILE."""
+    spec = spec if spec is not None else config.EXTRACTION_BACKENDS
+    chain: List[TextExtractor] = []
+    for name in [s.strip().lower() for s in (spec or "").split(",") if s.strip()]:
+        if name == "ax":
+            chain.append(AXTreeExtractor(timeout=config.EXTRACTION_AX_TIMEOUT_SECONDS))
+        elif name == "drag":
+            chain.append(DragCopyExtractor(prepare=prepare_drag))
+        elif name == "fake":
+            path = config.EXTRACTION_FAKE_FILE
+            chain.append(FakeExtractor.from_file(path) if path and os.path.exists(path) else FakeExtractor([None]))
+        else:
+            logger.warning(f"Неизвестный бэкенд извлечения: {name}")
+    if not chain:
+        chain.append(DragCopyExtractor(prepare=prepare_drag))
+    return ExtractorChain(chain)
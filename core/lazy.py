@@ -0,0 +1,105 @@
+"""Отложенные импорты и ленивые синглтоны для быстрого старта.
+
+Импорт ``bot.py`` раньше тянул pyautogui, PIL, psutil, google.generativeai и строил
+``desktop_controller``/``ai_processor`` сразу — перезапуск супервизором и ``healthcheck.py``
+ждали секунды. Здесь:
+
+    pyautogui = lazy_module("pyautogui")           # импорт — при первом обращении к атрибуту
+    desktop_controller = LazyObject(DesktopController)   # конструктор — при первом обращении
+
+Прокси прозрачны для обычного использования (атрибуты, вызовы методов, присваивание атрибутов
+модуля вроде ``pyautogui.FAILSAFE``). ``module_available(name)`` проверяет наличие пакета
+без его импорта.
+"""
+
+import importlib
+import importlib.util
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def module_available(name: str) -> bool:
+    """Пакет установлен (find_spec, без выполнения кода модуля)."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except Exception:
+        return False
+
+
+class LazyModule:
+    """Модуль, импортируемый при первом обращении к атрибуту; ошибка импорта — в момент обращения."""
+
+    __slots__ = ("_name", "_module", "_lock")
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self._module is not None else ''}>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+class LazyObject(Generic[T]):
+    """Синглтон, создаваемый factory() при первом обращении к атрибуту (потокобезопасно)."""
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], T]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def get(self) -> T:
+        inst = self._instance
+        if inst is None:
+            with self._lock:
+                inst = self._instance
+                if inst is None:
+                    inst = self._factory()
+                    object.__setattr__(self, "_instance", inst)
+        return inst
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    def peek(self) -> Optional[T]:
+        """Экземпляр, если уже создан (без создания)."""
+        return self._instance
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.get(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self.get(), attr, value)
+
+    def __repr__(self) -> str:
+        state = " (created)" if self._instance is not None else ""
+        return f"<lazy {getattr(self._factory, '__name__', 'object')}{state}>"
@@ -0,0 +1,453 @@
+"""Скользящие метрики запросов: гистограммы с перцентилями, метки окна и модели, журнал на диске.
+
+``Telemetry`` хранит только последние значения — по ним не видно, что готовность ответа
+стала медленнее. Здесь каждое наблюдение (время готовности, попытки вставки, число проб,
+длина извлечённого ответа) попадает в гистограмму своей серии ``(метрика, метки)``:
+
+    metrics().observe("ready_seconds", 12.4, window="proj-a", model="gpt-5")
+    metrics().percentiles("ready_seconds", window_seconds=3600)   # {"n", "p50", "p95", "p99"}
+
+Гистограмма — HDR-подобная: логарифмические корзины с 32 делениями на октаву (относительная
+ошибка квантиля ~1.5%), хранятся только непустые корзины. Время делится на слоты
+(``METRICS_SLOT_SECONDS``), хранятся слоты за ``METRICS_RETENTION_HOURS``; число серий на метрику
+ограничено ``METRICS_MAX_SERIES`` (лишние метки сворачиваются в "other") — память ограничена
+независимо от времени работы.
+
+Наблюдения дописываются в ``METRICS_FILE`` (JSON lines) и проигрываются при старте; когда файл
+перерастает ``METRICS_FILE_MAX_BYTES``, он переписывается только с записями в пределах хранения.
+
+Модуль читает параметры из os.getenv (без зависимостей от config).
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+OTHER = "other"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+class Histogram:
+    """Логарифмическая гистограмма: корзина = (октава, деление), хранятся только непустые.
+
+    Значения <= 0 идут в отдельный счётчик нулей; октавы ограничены [MIN_EXP, MAX_EXP],
+    так что число корзин не превышает (MAX_EXP - MIN_EXP) * SUB_BUCKETS.
+    """
+
+    SUB_BUCKETS = 32
+    MIN_EXP = -16    # ~1.5e-5
+    MAX_EXP = 40     # ~1e12
+
+    __slots__ = ("buckets", "zeros", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    @classmethod
+    def _index(cls, value: float) -> int:
+        m, e = math.frexp(value)                     # value = m * 2**e, m в [0.5, 1)
+        e = max(cls.MIN_EXP, min(cls.MAX_EXP, e))
+        sub = min(cls.SUB_BUCKETS - 1, int((m - 0.5) * 2 * cls.SUB_BUCKETS))
+        return e * cls.SUB_BUCKETS + sub
+
+    @classmethod
+    def _value(cls, index: int) -> float:
+        """Середина корзины."""
+        e, sub = divmod(index, cls.SUB_BUCKETS)
+        return (0.5 + (sub + 0.5) / (2 * cls.SUB_BUCKETS)) * (2.0 ** e)
+
+    def record(self, value: float, count: int = 1) -> None:
+        value = float(value)
+        if value <= 0 or math.isnan(value):
+            self.zeros += count
+            value = 0.0
+        else:
+            idx = self._index(value)
+            self.buckets[idx] = self.buckets.get(idx, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        for idx, c in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Квантиль q (0–100); точные min/max на краях."""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 100:
+            return self.max
+        rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+        seen = self.zeros
+        if seen >= rank:
+            return 0.0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                # Корзина шире точных границ: не выходим за наблюдавшиеся min/max
+                return min(self.max, max(self.min, self._value(idx)))
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return (self.total / self.count) if self.count else None
+
+    def count_le(self, bound: float) -> int:
+        """Число наблюдений не больше bound (по серединам корзин) — для кумулятивных корзин экспорта."""
+        n = self.zeros if bound >= 0 else 0
+        for idx, c in self.buckets.items():
+            if self._value(idx) <= bound:
+                n += c
+        return n
+
+    def copy(self) -> "Histogram":
+        return Histogram().merge(self)
+
+
+class RollingHistogram:
+    """Гистограммы по временным слотам: старые слоты выбрасываются по мере прихода новых."""
+
+    __slots__ = ("slot_seconds", "slots")
+
+    def __init__(self, slot_seconds: float, max_slots: int):
+        self.slot_seconds = max(1.0, float(slot_seconds))
+        self.slots: "deque[Tuple[int, Histogram]]" = deque(maxlen=max(1, int(max_slots)))
+
+    def _slot_id(self, ts: float) -> int:
+        return int(ts // self.slot_seconds)
+
+    def record(self, value: float, ts: float) -> None:
+        sid = self._slot_id(ts)
+        if self.slots and self.slots[-1][0] == sid:
+            self.slots[-1][1].record(value)
+            return
+        if self.slots and sid < self.slots[-1][0]:
+            # Запоздавшее наблюдение (гонка потоков на границе слота) — в свой слот по порядку
+            pos = 0
+            for i, (slot_id, h) in enumerate(self.slots):
+                if slot_id == sid:
+                    h.record(value)
+                    return
+                if slot_id < sid:
+                    pos = i + 1
+            if pos == 0 and len(self.slots) == self.slots.maxlen:
+                return   # старше всех хранимых слотов
+            if len(self.slots) == self.slots.maxlen:
+                self.slots.popleft()
+                pos -= 1
+            h = Histogram()
+            h.record(value)
+            self.slots.insert(pos, (sid, h))
+            return
+        h = Histogram()
+        h.record(value)
+        self.slots.append((sid, h))
+
+    def window(self, seconds: Optional[float], now: float) -> Histogram:
+        """Сумма слотов, попадающих в последние seconds (None — все хранимые)."""
+        out = Histogram()
+        lo = self._slot_id(now - seconds) if seconds is not None else None
+        for sid, h in self.slots:
+            if lo is None or sid >= lo:
+                out.merge(h)
+        return out
+
+    def prune(self, oldest_ts: float) -> None:
+        lo = self._slot_id(oldest_ts)
+        while self.slots and self.slots[0][0] < lo:
+            self.slots.popleft()
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((str(k), str(v if v not in (None, "") else "—")[:64]) for k, v in labels.items()))
+
+
+class MetricsStore:
+    """Серии гистограмм по (метрика, метки) с журналом наблюдений на диске.
+
+    path — журнал JSON lines ("" — только память); retention_hours — горизонт хранения;
+    slot_seconds — шаг скользящего окна; max_series — предел серий на метрику.
+    """
+
+    def __init__(self, path: str = "", retention_hours: float = 168.0, slot_seconds: float = 3600.0,
+                 max_series: int = 32, max_file_bytes: int = 5_000_000):
+        self.path = path or ""
+        self.retention_seconds = max(60.0, float(retention_hours) * 3600.0)
+        self.slot_seconds = max(1.0, float(slot_seconds))
+        self.max_slots = int(math.ceil(self.retention_seconds / self.slot_seconds)) + 1
+        self.max_series = max(1, int(max_series))
+        self.max_file_bytes = max(10_000, int(max_file_bytes))
+        self._series: Dict[str, Dict[LabelKey, RollingHistogram]] = {}
+        # Накопленные с запуска гистограммы серий (монотонные — для экспорта OpenMetrics)
+        self._lifetime: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file_bytes = 0
+        self.dropped_labels = 0
+
+    # === Запись ===
+
+    def observe(self, name: str, value: float, ts: Optional[float] = None, **labels) -> None:
+        """Добавить наблюдение; при заданном path — дописать в журнал."""
+        if value is None:
+            return
+        ts = time.time() if ts is None else float(ts)
+        key = self._record(name, float(value), ts, _label_key(labels))
+        if self.path:
+            self._append({"t": round(ts, 3), "m": name, "v": value, "l": dict(key)})
+
+    def _record(self, name: str, value: float, ts: float, key: LabelKey) -> LabelKey:
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            if key not in series and len(series) >= self.max_series:
+                # Предел кардинальности: новые сочетания меток — в общую серию "other"
+                key = tuple((k, OTHER) for k, _ in key)
+                self.dropped_labels += 1
+            rh = series.get(key)
+            if rh is None:
+                rh = series[key] = RollingHistogram(self.slot_seconds, self.max_slots)
+            rh.record(value, ts)
+            lt = self._lifetime.setdefault(name, {})
+            if key not in lt:
+                lt[key] = Histogram()
+            lt[key].record(value)
+        return key
+
+    # === Журнал ===
+
+    def _append(self, rec: dict) -> None:
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        with self._file_lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self._file_bytes += len(line.encode("utf-8"))
+            except Exception as e:
+                logger.debug(f"metrics append failed: {e}")
+                return
+            if self._file_bytes > self.max_file_bytes:
+                self._compact_locked()
+
+    def _read_journal(self) -> List[dict]:
+        out: List[dict] = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        if isinstance(rec, dict) and "m" in rec and "v" in rec and "t" in rec:
+                            out.append(rec)
+                    except Exception:
+                        continue   # обрезанная последняя строка после аварийной остановки
+        except FileNotFoundError:
+            pass
+        return out
+
+    def _compact_locked(self) -> None:
+        """Переписать журнал: только записи в горизонте хранения; если и их больше предела — свежая половина."""
+        cutoff = time.time() - self.retention_seconds
+        recs = [r for r in self._read_journal() if float(r.get("t") or 0) >= cutoff]
+        lines = [json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in recs]
+        size = sum(len(s.encode("utf-8")) for s in lines)
+        while lines and size > self.max_file_bytes // 2:
+            size -= len(lines[0].encode("utf-8"))
+            lines.pop(0)
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp, self.path)
+            self._file_bytes = size
+            logger.info(f"metrics: журнал сжат до {len(lines)} записей ({size} байт)")
+        except Exception as e:
+            logger.warning(f"metrics compaction failed: {e}")
+
+    def load(self) -> int:
+        """Проиграть журнал (только записи в горизонте хранения); возвращает число записей."""
+        if not self.path:
+            return 0
+        with self._file_lock:
+            recs = self._read_journal()
+            try:
+                self._file_bytes = os.path.getsize(self.path)
+            except Exception:
+                self._file_bytes = 0
+        cutoff = time.time() - self.retention_seconds
+        n = 0
+        for r in sorted(recs, key=lambda r: float(r.get("t") or 0)):
+            try:
+                ts = float(r["t"])
+                if ts < cutoff:
+                    continue
+                self._record(str(r["m"]), float(r["v"]), ts, _label_key(r.get("l") or {}))
+                n += 1
+            except Exception:
+                continue
+        if self._file_bytes > self.max_file_bytes:
+            with self._file_lock:
+                self._compact_locked()
+        return n
+
+    # === Чтение ===
+
+    def _merged(self, name: str, window_seconds: Optional[float], match: Dict[str, str]) -> Histogram:
+        now = time.time()
+        out = Histogram()
+        with self._lock:
+            for key, rh in (self._series.get(name) or {}).items():
+                rh.prune(now - self.retention_seconds)
+                labels = dict(key)
+                if all(labels.get(k) == v for k, v in match.items()):
+                    out.merge(rh.window(window_seconds, now))
+        return out
+
+    def percentiles(self, name: str, window_seconds: Optional[float] = None,
+                    qs: Sequence[float] = (50, 95, 99), **match) -> dict:
+        """Перцентили метрики за окно (все метки или совпадающие с match): n, p50, p95, p99."""
+        h = self._merged(name, window_seconds, {k: str(v) for k, v in match.items()})
+        d = {"n": h.count}
+        for q in qs:
+            v = h.percentile(q)
+            d[f"p{int(q)}"] = round(v, 3) if v is not None else None
+        return d
+
+    def lifetime(self, name: str) -> Dict[LabelKey, Histogram]:
+        """Копии накопленных гистограмм метрики по сериям (с запуска, включая проигранный журнал)."""
+        with self._lock:
+            return {k: h.copy() for k, h in (self._lifetime.get(name) or {}).items()}
+
+    def label_values(self, name: str, label: str) -> List[str]:
+        with self._lock:
+            return sorted({dict(k).get(label) for k in (self._series.get(name) or {}) if dict(k).get(label)})
+
+    def breakdown(self, name: str, label: str, window_seconds: Optional[float] = None) -> Dict[str, dict]:
+        """Перцентили метрики по значениям одной метки (например, по окнам)."""
+        return {v: self.percentiles(name, window_seconds, **{label: v}) for v in self.label_values(name, label)}
+
+    def summary(self, window_seconds: Optional[float] = None) -> Dict[str, dict]:
+        with self._lock:
+            names = sorted(self._series)
+        return {n: self.percentiles(n, window_seconds) for n in names}
+
+    def stats(self) -> dict:
+        with self._lock:
+            series = sum(len(s) for s in self._series.values())
+            buckets = sum(len(h.buckets) for s in self._series.values() for rh in s.values() for _, h in rh.slots)
+        return {
+            "series": series,
+            "buckets": buckets,
+            "dropped_labels": self.dropped_labels,
+            "file": self.path or None,
+            "file_bytes": self._file_bytes,
+            "retention_hours": round(self.retention_seconds / 3600.0, 1),
+        }
+
+
+class Counters:
+    """Монотонные счётчики с метками (пробы готовности, запуски подпроцессов и т.п.).
+
+    Число сочетаний меток на счётчик ограничено max_series, лишние — в "other".
+    """
+
+    def __init__(self, max_series: int = 64):
+        self.max_series = max(1, int(max_series))
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            if key not in series and len(series) >= self.max_series:
+                key = tuple((k, OTHER) for k, _ in key)
+            series[key] = series.get(key, 0.0) + value
+
+    def snapshot(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            return {n: dict(s) for n, s in self._values.items()}
+
+
+_counters = Counters()
+
+
+def counters() -> Counters:
+    """Общие счётчики процесса."""
+    return _counters
+
+
+def format_percentiles(summary: Optional[Dict[str, dict]], names: Optional[Iterable[str]] = None) -> str:
+    """Компактная строка для /status: "ready_seconds 12.1/30.5/41.0 (n=57); ..."."""
+    if not summary:
+        return "—"
+    parts = []
+    for name in (names or summary.keys()):
+        d = summary.get(name)
+        if not d or not d.get("n"):
+            continue
+        parts.append(f"{name} {d.get('p50')}/{d.get('p95')}/{d.get('p99')} (n={d.get('n')})")
+    return "; ".join(parts) or "—"
+
+
+_store: Optional[MetricsStore] = None
+_store_lock = threading.Lock()
+
+
+def metrics() -> MetricsStore:
+    """Общее хранилище (METRICS_FILE, METRICS_RETENTION_HOURS, …); журнал проигрывается при первом обращении."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = MetricsStore(
+                    path=os.getenv("METRICS_FILE", "metrics.jsonl").strip(),
+                    retention_hours=_env_float("METRICS_RETENTION_HOURS", 168.0),
+                    slot_seconds=_env_float("METRICS_SLOT_SECONDS", 3600.0),
+                    max_series=_env_int("METRICS_MAX_SERIES", 32),
+                    max_file_bytes=_env_int("METRICS_FILE_MAX_BYTES", 5_000_000),
+                )
+                try:
+                    n = store.load()
+                    if n:
+                        logger.info(f"metrics: восстановлено {n} наблюдений из {store.path}")
+                except Exception as e:
+                    logger.warning(f"metrics load failed: {e}")
+                _store = store
+    return _store
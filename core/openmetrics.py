@@ -0,0 +1,171 @@
+"""Экспорт метрик бота в текстовом формате OpenMetrics (Prometheus) по локальному HTTP.
+
+Сервер поднимается в том же event loop, что и бот (``bot.py``/``telethon_bot.py``), только при
+``METRICS_HTTP_PORT`` > 0; слушает ``METRICS_HTTP_HOST`` (по умолчанию 127.0.0.1):
+
+    GET /metrics  →  application/openmetrics-text; version=1.0.0
+
+Сбор — функция ``collect() -> str`` (у контроллера — ``export_openmetrics``); она выполняется
+в потоке пула (``asyncio.to_thread``), поэтому event loop не ждёт блокировок и отрисовки.
+HTTP-разбор минимальный: Prometheus шлёт один GET на соединение.
+
+Модуль читает параметры из os.getenv (без зависимостей от config).
+"""
+
+import asyncio
+import logging
+import math
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Labels = Iterable[Tuple[str, str]]
+
+# Границы корзин экспортируемых гистограмм по умолчанию (секунды)
+SECONDS_BUCKETS: Tuple[float, ...] = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _num(v: float) -> str:
+    if v is None:
+        return "NaN"
+    if isinstance(v, float):
+        if math.isinf(v):
+            return "+Inf" if v > 0 else "-Inf"
+        if v.is_integer():
+            return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+class Family:
+    """Семейство метрик: # TYPE/# HELP и строки сэмплов."""
+
+    def __init__(self, name: str, kind: str, help_text: str = ""):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.samples: List[str] = []
+
+    def render(self) -> str:
+        head = [f"# TYPE {self.name} {self.kind}"]
+        if self.help:
+            head.append(f"# HELP {self.name} {_escape(self.help)}")
+        return "\n".join(head + self.samples)
+
+
+def counter(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> Family:
+    """Счётчик: имя семейства без суффикса, сэмплы — ``<name>_total``."""
+    f = Family(name, "counter", help_text)
+    for labels, v in sorted(values.items()):
+        f.samples.append(f"{name}_total{_labels(labels)} {_num(float(v))}")
+    return f
+
+
+def gauge(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> Family:
+    f = Family(name, "gauge", help_text)
+    for labels, v in sorted(values.items()):
+        f.samples.append(f"{name}{_labels(labels)} {_num(float(v))}")
+    return f
+
+
+def histogram(name: str, help_text: str, series: Dict[Tuple[Tuple[str, str], ...], object],
+              bounds: Sequence[float] = SECONDS_BUCKETS) -> Family:
+    """Гистограмма из core.metrics.Histogram по сериям: кумулятивные корзины le, _count, _sum."""
+    f = Family(name, "histogram", help_text)
+    for labels, h in sorted(series.items()):
+        for b in bounds:
+            f.samples.append(f"{name}_bucket{_labels(labels, ('le', _num(float(b))))} {h.count_le(b)}")
+        f.samples.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {h.count}")
+        f.samples.append(f"{name}_count{_labels(labels)} {h.count}")
+        f.samples.append(f"{name}_sum{_labels(labels)} {_num(float(h.total))}")
+    return f
+
+
+def render(families: Iterable[Family]) -> str:
+    return "\n".join(f.render() for f in families) + "\n# EOF\n"
+
+
+class MetricsServer:
+    """Минимальный HTTP-сервер на asyncio: GET /metrics → collect() в потоке пула."""
+
+    def __init__(self, collect: Callable[[], str], host: str = "127.0.0.1", port: int = 9464,
+                 read_timeout: float = 5.0):
+        self.collect = collect
+        self.host = host
+        self.port = int(port)
+        self.read_timeout = read_timeout
+        self.scrapes = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "MetricsServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"OpenMetrics: http://{self.host}:{self.port}/metrics")
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: str, body: str, ctype: str) -> None:
+        data = body.encode("utf-8")
+        head = (f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n").encode("ascii")
+        writer.write(head + data)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=self.read_timeout)
+            line = request.split(b"\r\n", 1)[0].decode("latin-1")
+            parts = line.split()
+            method, path = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+            if method != "GET" or path.split("?", 1)[0] not in ("/metrics", "/"):
+                await self._respond(writer, "404 Not Found", "not found\n", "text/plain; charset=utf-8")
+                return
+            body = await asyncio.to_thread(self.collect)
+            self.scrapes += 1
+            await self._respond(writer, "200 OK", body, CONTENT_TYPE)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.warning(f"OpenMetrics: сбор не удался: {e}")
+            try:
+                await self._respond(writer, "500 Internal Server Error", f"{e}\n", "text/plain; charset=utf-8")
+            except Exception:
+                pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+
+async def start_metrics_server(collect: Callable[[], str]) -> Optional[MetricsServer]:
+    """Поднять сервер, если METRICS_HTTP_PORT > 0; иначе (или при ошибке привязки) — None."""
+    try:
+        port = int(os.getenv("METRICS_HTTP_PORT", "0"))
+    except Exception:
+        port = 0
+    if port <= 0:
+        return None
+    host = os.getenv("METRICS_HTTP_HOST", "127.0.0.1").strip() or "127.0.0.1"
+    try:
+        return await MetricsServer(collect, host, port).start()
+    except Exception as e:
+        logger.warning(f"OpenMetrics: не удалось слушать {host}:{port}: {e}")
+        return None
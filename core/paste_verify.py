@@ -0,0 +1,304 @@
+"""Проверка вставки запроса в поле ввода без обязательного Cmd+A/Cmd+C.
+
+Прежняя проверка выделяла всё поле, копировала его и сравнивала строки: это перезаписывает
+буфер и стоит ≥0.8 с на попытку. Здесь проверки — подключаемые ``PasteVerifier`` от дешёвых
+к дорогим:
+
+- ``ax`` — AXValue сфокусированного элемента (Accessibility): точное сравнение текста;
+- ``length`` — AXNumberOfCharacters: длина без передачи текста (дёшево для длинных запросов);
+- ``pixel`` — изменение пикселей вокруг поля ввода относительно кадра до вставки;
+- ``select_all`` — прежний Cmd+A, Cmd+C и сравнение (крайний случай).
+
+Дешёвые проверки только подтверждают вставку: True или None («не могу определить» — пробуется
+следующая). Несовпадение у них тоже None — AXValue Electron может не содержать текст, а короткий
+запрос почти не меняет пиксели; отрицательный ответ даёт только ``select_all``.
+Порядок — ``PASTE_VERIFIERS``; сработавшая стратегия пишется в ``Telemetry.last_paste_strategy``.
+
+Модуль читает параметры из os.getenv (импортируется из clipboard_utils).
+"""
+
+import logging
+import os
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from core import timing
+from core.text_utils import utf16_len
+
+# PyObjC (macOS): фокусный элемент системы. На других платформах — None.
+try:
+    from ApplicationServices import (  # type: ignore
+        AXUIElementCopyAttributeValue,
+        AXUIElementCreateSystemWide,
+    )
+except Exception:
+    AXUIElementCreateSystemWide = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _norm(text: str) -> str:
+    """Сравнение без учёта краевых пробелов и вида переводов строк (поле может заменить \\r\\n)."""
+    return (text or "").replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+class PasteVerifier:
+    """Базовая проверка: before_paste() — снять исходное состояние, verify() — True/False/None.
+
+    False означает «вставка точно не удалась» и останавливает цепочку — его возвращает только
+    select_all; остальные при несовпадении отвечают None.
+    """
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def before_paste(self, expected: str) -> None:
+        pass
+
+    def verify(self, expected: str, timeout: float) -> Optional[bool]:
+        raise NotImplementedError
+
+
+class _FocusedAX(PasteVerifier):
+    """Общая часть AX-проверок: атрибут фокусного элемента с ожиданием до дедлайна."""
+
+    poll = 0.03
+
+    def __init__(self, read_attr: Optional[Callable[[str], object]] = None):
+        self._read_attr = read_attr
+
+    def available(self) -> bool:
+        return self._read_attr is not None or AXUIElementCreateSystemWide is not None
+
+    def _focused_attr(self, attr: str):
+        if self._read_attr is not None:
+            return self._read_attr(attr)
+        try:
+            err, focused = AXUIElementCopyAttributeValue(AXUIElementCreateSystemWide(), "AXFocusedUIElement", None)
+            if err != 0 or focused is None:
+                return None
+            err, value = AXUIElementCopyAttributeValue(focused, attr, None)
+            return value if err == 0 else None
+        except Exception:
+            return None
+
+    def _match(self, value, expected: str) -> bool:
+        raise NotImplementedError
+
+    def verify(self, expected: str, timeout: float) -> Optional[bool]:
+        deadline = time.monotonic() + max(0.0, timeout)
+        value = self._focused_attr(self.attr)
+        if value is None:
+            # Атрибут не читается (например, Electron без AX) — проверка неприменима, ждать нечего
+            return None
+        while not self._match(value, expected):
+            if time.monotonic() >= deadline:
+                # Несовпадение не доказывает провал вставки — решит select_all
+                logger.debug(f"paste verifier {self.name}: no match, inconclusive")
+                return None
+            time.sleep(self.poll)
+            value = self._focused_attr(self.attr)
+            if value is None:
+                return None
+        return True
+
+
+class AXValueVerifier(_FocusedAX):
+    """Текст сфокусированного поля (AXValue) совпадает с запросом."""
+
+    name = "ax"
+    attr = "AXValue"
+
+    def _match(self, value, expected: str) -> bool:
+        return _norm(str(value)) == _norm(expected)
+
+
+class LengthProbeVerifier(_FocusedAX):
+    """Длина текста в поле (AXNumberOfCharacters) совпадает с длиной запроса (с допуском на переводы строк)."""
+
+    name = "length"
+    attr = "AXNumberOfCharacters"
+
+    def _match(self, value, expected: str) -> bool:
+        try:
+            n = int(value)
+        except Exception:
+            return False
+        # AXNumberOfCharacters — длина NSString, т.е. единицы UTF-16 (эмодзи — две)
+        want = utf16_len(_norm(expected))
+        slack = max(2, expected.count("\n") + 2)
+        return abs(n - want) <= slack
+
+
+class PixelChangeVerifier(PasteVerifier):
+    """Пиксели вокруг поля ввода заметно изменились после вставки.
+
+    Подтверждает, что вставка попала в поле (а не ушла в другой элемент), но не сверяет текст.
+    Мигающий курсор меняет доли процента пикселей — порог min_changed_ratio выше этого.
+    """
+
+    name = "pixel"
+    poll = 0.05
+
+    def __init__(self, region: Optional[Region] = None, grab: Optional[Callable[[Region], object]] = None,
+                 min_changed_ratio: float = 0.01, channel_delta: int = 24):
+        self.region = region
+        self._grab = grab
+        self.min_changed_ratio = min_changed_ratio
+        self.channel_delta = channel_delta
+        self._before = None
+
+    @classmethod
+    def from_env(cls) -> "PixelChangeVerifier":
+        x = _env_int("INPUT_ABS_X", -1)
+        y = _env_int("INPUT_ABS_Y", -1)
+        if x < 0 or y < 0:
+            return cls(None)
+        w = _env_int("PASTE_VERIFY_PIXEL_W", 320)
+        h = _env_int("PASTE_VERIFY_PIXEL_H", 48)
+        return cls((max(0, x - w // 2), max(0, y - h // 2), w, h))
+
+    def available(self) -> bool:
+        return self.region is not None
+
+    def _grab_frame(self):
+        try:
+            if self._grab is not None:
+                return self._grab(self.region)
+            from core.screen_grabber import get_grabber
+            return get_grabber().grab(self.region)
+        except Exception as e:
+            logger.debug(f"paste pixel grab failed: {e}")
+            return None
+
+    def changed_ratio(self, a, b) -> Optional[float]:
+        """Доля пикселей, у которых хотя бы один канал отличается больше channel_delta."""
+        if a is None or b is None or len(a.data) != len(b.data) or not a.data:
+            return None
+        da, db, t = a.data, b.data, self.channel_delta
+        changed = 0
+        for i in range(0, len(da), 3):
+            if (abs(da[i] - db[i]) > t or abs(da[i + 1] - db[i + 1]) > t or abs(da[i + 2] - db[i + 2]) > t):
+                changed += 1
+        return changed / (len(da) // 3)
+
+    def before_paste(self, expected: str) -> None:
+        self._before = self._grab_frame()
+
+    def verify(self, expected: str, timeout: float) -> Optional[bool]:
+        if self._before is None:
+            return None
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            ratio = self.changed_ratio(self._before, self._grab_frame())
+            if ratio is None:
+                return None
+            if ratio >= self.min_changed_ratio:
+                return True
+            if time.monotonic() >= deadline:
+                # Короткий запрос меняет меньше порога — не повод считать вставку неудачной
+                return None
+            time.sleep(self.poll)
+
+
+class SelectAllVerifier(PasteVerifier):
+    """Прежняя проверка: Cmd+A, Cmd+C и сравнение (перезаписывает буфер; внешний сеанс его вернёт)."""
+
+    name = "select_all"
+
+    def __init__(self, settle: Optional[float] = None, hotkey: Optional[Callable[..., None]] = None, session=None):
+        self.settle = settle
+        self._hotkey = hotkey
+        self._session = session
+
+    def verify(self, expected: str, timeout: float) -> Optional[bool]:
+        from core.clipboard import ClipboardSession
+        if self._hotkey is not None:
+            hotkey = self._hotkey
+        else:
+            import pyautogui
+            hotkey = pyautogui.hotkey
+        timing.delay("paste_settle", self.settle)
+        hotkey('command', 'a')
+        timing.delay("key_step")
+        cb = self._session or ClipboardSession(restore=False, hotkey=hotkey)
+        got = cb.copy_hotkey(('command', 'c'))
+        ok = _norm(got) == _norm(expected)
+        if not ok and len(_norm(got)) > 3 * max(1, len(_norm(expected))):
+            logger.info("[Paste] hint: получен очень длинный текст — вероятно, фокус не в поле ввода "
+                        "(выделилась панель ответа)")
+        return ok
+
+
+class PasteVerifierChain:
+    """Первая проверка с ответом решает; None от проверки — переход к следующей.
+
+    Дешёвые проверки отвечают только True/None, поэтому провал фиксирует select_all в конце цепочки.
+    Если ни одна не дала ответа, вставка считается непроверенной (False).
+    """
+
+    def __init__(self, verifiers: Sequence[PasteVerifier], timeout: float = 0.8):
+        self.verifiers: List[PasteVerifier] = [v for v in verifiers if v.available()]
+        self.timeout = timeout
+        self.last_strategy: Optional[str] = None
+
+    def before_paste(self, expected: str) -> None:
+        for v in self.verifiers:
+            try:
+                v.before_paste(expected)
+            except Exception as e:
+                logger.debug(f"paste verifier {v.name} before_paste failed: {e}")
+
+    def verify(self, expected: str) -> Tuple[bool, Optional[str]]:
+        self.last_strategy = None
+        for v in self.verifiers:
+            t0 = time.monotonic()
+            try:
+                res = v.verify(expected, self.timeout)
+            except Exception as e:
+                logger.debug(f"paste verifier {v.name} failed: {e}")
+                res = None
+            logger.debug(f"paste verifier {v.name}: {res} in {(time.monotonic() - t0) * 1000:.0f} ms")
+            if res is not None:
+                self.last_strategy = v.name
+                return bool(res), v.name
+        return False, None
+
+
+def create_paste_verifiers(spec: Optional[str] = None) -> PasteVerifierChain:
+    """Цепочка по PASTE_VERIFIERS (например "ax,length,pixel,select_all")."""
+    spec = spec if spec is not None else os.getenv("PASTE_VERIFIERS", "ax,length,pixel,select_all")
+    chain: List[PasteVerifier] = []
+    for name in [s.strip().lower() for s in (spec or "").split(",") if s.strip()]:
+        if name == "ax":
+            chain.append(AXValueVerifier())
+        elif name == "length":
+            chain.append(LengthProbeVerifier())
+        elif name == "pixel":
+            chain.append(PixelChangeVerifier.from_env())
+        elif name in ("select_all", "selectall"):
+            chain.append(SelectAllVerifier())
+        else:
+            logger.warning(f"Неизвестная проверка вставки: {name}")
+    if not any(isinstance(v, SelectAllVerifier) for v in chain):
+        # Крайний случай всегда в конце: без него непроверяемая вставка считалась бы провалом
+        chain.append(SelectAllVerifier())
+    return PasteVerifierChain(chain, timeout=_env_float("PASTE_VERIFY_TIMEOUT_SECONDS", 0.8))
@@ -1,11 +1,23 @@
 """Утилиты для работы с пикселями и цветами на экране."""
 
-import subprocess
-import tempfile
-import os
-from typing import Tuple
-import pyautogui
-from PIL import Image
+from typing import List, Optional, Sequence, Tuple
+
+from core.lazy import lazy_module, module_available
+from core.screen_grabber import Frame, get_grabber
+
+# pyautogui импортируется при первом обращении; без него (Linux/CI) работают только бэкенды ScreenGrabber
+pyautogui = lazy_module("pyautogui") if module_available("pyautogui") else None
+
+try:
+    import numpy as np  # векторная статистика по региону
+except Exception:
+    np = None
+
+# Фоллбэк для mean/median без NumPy (импорт PIL — при первом обращении)
+ImageStat = lazy_module("PIL.ImageStat") if module_available("PIL") else None
+
+# Поддерживаемые статистики усреднения области
+STATS = ('mean', 'median', 'trimmed')
 
 
 def _sanitize_k(k: int) -> int:
@@ -36,12 +48,62 @@ def rgb_at(x: int, y: int) -> Tuple[int, int, int]:
             return 0, 0, 0
 
 
-def avg_rgb(x: int, y: int, k: int) -> Tuple[int, int, int]:
-    """Усреднение цвета по kxk пикселей вокруг (x,y) через прямые вызовы pixel()."""
+def _trim_count(n: int, trim: float) -> int:
+    """Сколько значений отбросить с каждого края для усечённого среднего."""
+    try:
+        trim = float(trim)
+    except Exception:
+        trim = 0.0
+    trim = max(0.0, min(0.49, trim))
+    return int(n * trim)
+
+
+def frame_stat(frame: Frame, stat: str = 'mean', trim: float = 0.2) -> Optional[Tuple[int, int, int]]:
+    """
+    Статистика цвета по всему кадру одним проходом по буферу.
+
+    stat: 'mean' (целочисленное среднее, как прежде), 'median' или 'trimmed'
+    (среднее после отбрасывания доли trim крайних значений в каждом канале).
+    """
+    n = frame.width * frame.height
+    if n <= 0:
+        return None
+    stat = (stat or 'mean').strip().lower()
+    if stat == 'mean':
+        return frame.mean_rgb()
+    if np is not None:
+        arr = np.frombuffer(frame.data, dtype=np.uint8).reshape(n, 3)
+        if stat == 'median':
+            med = np.median(arr, axis=0)
+            return int(med[0]), int(med[1]), int(med[2])
+        cut = _trim_count(n, trim)
+        srt = np.sort(arr, axis=0)[cut:n - cut].astype(np.int64)
+        m = srt.sum(axis=0) // len(srt)
+        return int(m[0]), int(m[1]), int(m[2])
+    if stat == 'median' and ImageStat is not None:
+        try:
+            med = ImageStat.Stat(frame.to_image()).median
+            return int(med[0]), int(med[1]), int(med[2])
+        except Exception:
+            pass
+    out = []
+    cut = _trim_count(n, trim) if stat != 'median' else 0
+    for ch in range(3):
+        vals = sorted(frame.data[ch::3])
+        if stat == 'median':
+            out.append(int(vals[(n - 1) // 2] + vals[n // 2]) // 2)
+        else:
+            vals = vals[cut:n - cut]
+            out.append(sum(vals) // len(vals))
+    return out[0], out[1], out[2]
+
+
+def _avg_rgb_per_pixel(x: int, y: int, k: int) -> Tuple[int, int, int]:
+    """Прежний путь: k*k вызовов pixel() (оставлен как фоллбэк и для бенчмарка)."""
     k = _sanitize_k(k)
     if k == 1:
         return rgb_at(x, y)
-    
+
     r = k // 2
     acc = [0, 0, 0]
     cnt = 0
@@ -55,63 +117,87 @@ def avg_rgb(x: int, y: int, k: int) -> Tuple[int, int, int]:
                 cnt += 1
             except Exception:
                 pass
-    
+
     if cnt == 0:
         return rgb_at(x, y)
     return acc[0] // cnt, acc[1] // cnt, acc[2] // cnt
 
 
-def avg_rgb_via_screencapture(x: int, y: int, k: int) -> Tuple[int, int, int]:
-    """Усреднение по kxk с использованием 'screencapture -R' (устойчиво на retina)."""
+def avg_rgb(x: int, y: int, k: int, stat: str = 'mean') -> Tuple[int, int, int]:
+    """Усреднение цвета по kxk вокруг (x,y) одним скриншотом pyautogui (источник 'dir')."""
     k = _sanitize_k(k)
+    if k == 1 and stat == 'mean':
+        return rgb_at(x, y)
     r = k // 2
-    rx, ry, rw, rh = x - r, y - r, k, k
-    
     try:
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tf:
-            tmp_path = tf.name
-        
-        subprocess.run(
-            ["screencapture", "-R", f"{rx},{ry},{rw},{rh}", tmp_path],
-            check=False,
-            timeout=1.0,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        
-        if not os.path.exists(tmp_path):
-            return rgb_at(x, y)
-        
-        img = Image.open(tmp_path)
-        os.remove(tmp_path)
-        
+        img = pyautogui.screenshot(region=(int(x) - r, int(y) - r, k, k)).convert('RGB')
         w, h = img.size
-        if w == 0 or h == 0:
-            return rgb_at(x, y)
-        
-        pixels = list(img.getdata())
-        acc_r = acc_g = acc_b = cnt = 0
-        for pix in pixels:
-            if len(pix) >= 3:
-                acc_r += pix[0]
-                acc_g += pix[1]
-                acc_b += pix[2]
-                cnt += 1
-        
-        if cnt == 0:
+        rgb = frame_stat(Frame(w, h, img.tobytes()), stat)
+        if rgb is not None:
+            return rgb
+    except Exception:
+        pass
+    return _avg_rgb_per_pixel(x, y, k)
+
+
+def avg_rgb_via_screencapture(x: int, y: int, k: int, stat: str = 'mean') -> Tuple[int, int, int]:
+    """Усреднение по kxk через ScreenGrabber (in-process буфер, без временных PNG).
+
+    Имя сохранено для совместимости; бэкенд выбирается SCREEN_GRAB_BACKEND,
+    прежний путь 'screencapture -R' остаётся крайним фоллбэком внутри grabber'а.
+    """
+    k = _sanitize_k(k)
+    r = k // 2
+    try:
+        frame = get_grabber().grab((x - r, y - r, k, k))
+        rgb = frame_stat(frame, stat) if frame is not None else None
+        if rgb is None:
             return rgb_at(x, y)
-        return acc_r // cnt, acc_g // cnt, acc_b // cnt
+        return rgb
     except Exception:
-        try:
-            if 'tmp_path' in locals() and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
         return rgb_at(x, y)
 
 
+def sample_points(
+    points: Sequence[Tuple[int, int]],
+    k: int = 1,
+    stat: str = 'mean',
+    max_area: int = 250000,
+) -> List[Tuple[int, int, int]]:
+    """
+    Статистика kxk для нескольких точек по одному захвату их общей рамки.
+
+    Если рамка больше max_area логических пикселей, точки захватываются по отдельности.
+    """
+    pts = [(int(px), int(py)) for px, py in points]
+    if not pts:
+        return []
+    k = _sanitize_k(k)
+    r = k // 2
+    x0 = min(p[0] for p in pts) - r
+    y0 = min(p[1] for p in pts) - r
+    x1 = max(p[0] for p in pts) + r + 1
+    y1 = max(p[1] for p in pts) + r + 1
+    if (x1 - x0) * (y1 - y0) > max_area:
+        return [avg_rgb_via_screencapture(px, py, k, stat) for px, py in pts]
+    try:
+        frame = get_grabber().grab((x0, y0, x1 - x0, y1 - y0))
+    except Exception:
+        frame = None
+    if frame is None:
+        return [avg_rgb_via_screencapture(px, py, k, stat) for px, py in pts]
+    sc = frame.scale
+    side = max(1, int(round(k * sc)))
+    out: List[Tuple[int, int, int]] = []
+    for px, py in pts:
+        sub = frame.crop(int((px - r - x0) * sc), int((py - r - y0) * sc), side, side)
+        rgb = frame_stat(sub, stat)
+        out.append(rgb if rgb is not None else rgb_at(px, py))
+    return out
+
+
 def sample_rgb_consistent(x: int, y: int, avg_k: int) -> Tuple[int, int, int]:
-    """Сэмплирование цвета согласованно с color_pipette: через screencapture с усреднением."""
+    """Сэмплирование цвета согласованно с color_pipette: захват области с усреднением."""
     try:
         return avg_rgb_via_screencapture(x, y, avg_k)
     except Exception:
@@ -165,19 +251,26 @@ def measure_ready_pixel_rgb(
     x: int, 
     y: int, 
     avg_k: int, 
-    target: Tuple[int, int, int] | None = None
+    target: Tuple[int, int, int] | None = None,
+    stat: str | None = None,
 ) -> Tuple[Tuple[int, int, int], str]:
     """
     Измерить RGB в точке (x,y) для READY_PIXEL в соответствии с READY_PIXEL_SRC.
     
+    stat — статистика по окну kxk (mean|median|trimmed), по умолчанию READY_PIXEL_STAT.
     Возвращает ((r,g,b), used_src).
     При 'auto' выбирается источник с меньшей дельтой до target.
     """
     src = pick_ready_src('cap')
+    if stat is None:
+        from core.config import config
+        stat = (config.READY_PIXEL_STAT or 'mean').strip().lower()
+    if stat not in STATS:
+        stat = 'mean'
     
     if src == 'auto' and target:
-        rgb_cap = avg_rgb_via_screencapture(x, y, avg_k)
-        rgb_dir = avg_rgb(x, y, avg_k)
+        rgb_cap = avg_rgb_via_screencapture(x, y, avg_k, stat)
+        rgb_dir = avg_rgb(x, y, avg_k, stat)
         
         def delta(a: Tuple[int, int, int], b: Tuple[int, int, int]) -> int:
             return abs(a[0] - b[0]) + abs(a[1] - b[1]) + abs(a[2] - b[2])
@@ -190,6 +283,6 @@ def measure_ready_pixel_rgb(
         else:
             return rgb_dir, 'dir'
     elif src == 'dir':
-        return avg_rgb(x, y, avg_k), 'dir'
+        return avg_rgb(x, y, avg_k, stat), 'dir'
     else:  # 'cap'
-        return avg_rgb_via_screencapture(x, y, avg_k), 'cap'
+        return avg_rgb_via_screencapture(x, y, avg_k, stat), 'cap'
@@ -0,0 +1,186 @@
+"""Фоновый сэмплер процессов Windsurf и их загрузки CPU.
+
+Раньше ``/status`` и детектор CPU-тиши вызывали полный ``psutil.process_iter`` с ``cmdline`` и
+``cpu_percent`` — прямо в event loop бота. Здесь отдельный поток раз в
+``PROCESS_SAMPLE_INTERVAL_SECONDS``:
+
+- берёт список PID (``psutil.pids()`` — дёшево) и классифицирует только новые PID
+  (имя/командная строка); не-Windsurf PID запоминаются и больше не проверяются;
+- у отслеживаемых процессов снимает ``cpu_percent`` (неблокирующий, с прошлого замера);
+  завершившиеся — убирает;
+- раз в ``PROCESS_RESCAN_SECONDS`` забывает классификацию (на случай переиспользования PID).
+
+Чтение — ``snapshot()``/``cpu_total()`` — отдаёт готовый неизменяемый снимок за O(1).
+Без psutil сэмплер недоступен и отдаёт пустой снимок (как прежний скан).
+
+Модуль читает параметры из os.getenv (без зависимостей от config).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import psutil  # для диагностики процессов Windsurf
+except Exception:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+class ProcessSampler:
+    """Набор процессов, в имени или командной строке которых есть одна из подстрок match."""
+
+    def __init__(self, match: Iterable[str] = ("windsurf",), interval: float = 1.0, rescan_seconds: float = 60.0):
+        self.match = tuple(m.lower() for m in match)
+        self.interval = max(0.2, float(interval))
+        self.rescan_seconds = max(self.interval, float(rescan_seconds))
+        self._tracked: Dict[int, "psutil.Process"] = {}
+        self._names: Dict[int, str] = {}
+        self._ignored: Set[int] = set()
+        self._last_rescan = 0.0
+        # Снимок заменяется целиком одной операцией присваивания — читатели не берут блокировок
+        self._snapshot: Tuple[Tuple[dict, ...], float, Optional[float]] = ((), 0.0, None)
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.classified = 0
+        self.last_refresh_ms: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return psutil is not None
+
+    # === Обновление (фоновый поток) ===
+
+    def _matches(self, proc) -> Tuple[bool, str]:
+        try:
+            name = proc.name() or ""
+        except Exception:
+            return False, ""
+        if any(m in name.lower() for m in self.match):
+            return True, name
+        try:
+            cmd = " ".join(proc.cmdline() or []).lower()
+        except Exception:
+            cmd = ""      # чужие процессы: AccessDenied — судим по имени
+        return any(m in cmd for m in self.match), name
+
+    def refresh(self) -> None:
+        """Один шаг: классификация новых PID, CPU отслеживаемых, новый снимок."""
+        if psutil is None:
+            return
+        with self._refresh_lock:
+            t0 = time.perf_counter()
+            now = time.monotonic()
+            if now - self._last_rescan >= self.rescan_seconds:
+                self._ignored.clear()
+                self._last_rescan = now
+            try:
+                pids = set(psutil.pids())
+            except Exception as e:
+                logger.debug(f"process sampler: pids failed: {e}")
+                return
+            # Исчезнувшие PID больше не нужны ни в одном из наборов
+            for pid in [p for p in self._tracked if p not in pids]:
+                self._tracked.pop(pid, None)
+                self._names.pop(pid, None)
+            self._ignored &= pids
+            for pid in pids - self._ignored - self._tracked.keys():
+                self.classified += 1
+                try:
+                    proc = psutil.Process(pid)
+                except Exception:
+                    continue
+                ok, name = self._matches(proc)
+                if not ok:
+                    self._ignored.add(pid)
+                    continue
+                try:
+                    proc.cpu_percent(None)    # первый замер — база для следующего
+                except Exception:
+                    continue
+                self._tracked[pid] = proc
+                self._names[pid] = name
+            procs: List[dict] = []
+            total = 0.0
+            for pid, proc in list(self._tracked.items()):
+                try:
+                    cpu = float(proc.cpu_percent(None) or 0.0)
+                except Exception:
+                    self._tracked.pop(pid, None)
+                    self._names.pop(pid, None)
+                    continue
+                total += cpu
+                procs.append({"pid": pid, "name": self._names.get(pid, ""), "cpu_percent": round(cpu, 2)})
+            procs.sort(key=lambda d: d["pid"])
+            self._snapshot = (tuple(procs), total, time.time())
+            self.refreshes += 1
+            self.last_refresh_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.debug(f"process sampler refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "ProcessSampler":
+        if psutil is None or (self._thread is not None and self._thread.is_alive()):
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="proc-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # === Чтение (O(1), без блокировок) ===
+
+    def snapshot(self) -> List[dict]:
+        """Процессы Windsurf: pid, name, cpu_percent (копии словарей снимка)."""
+        return [dict(p) for p in self._snapshot[0]]
+
+    def cpu_total(self) -> float:
+        return self._snapshot[1]
+
+    def stats(self) -> dict:
+        procs, total, ts = self._snapshot
+        return {
+            "available": self.available,
+            "tracked": len(procs),
+            "cpu_total_percent": round(total, 2),
+            "age_seconds": round(time.time() - ts, 2) if ts is not None else None,
+            "refreshes": self.refreshes,
+            "classified": self.classified,
+            "last_refresh_ms": self.last_refresh_ms,
+        }
+
+
+_sampler: Optional[ProcessSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def process_sampler() -> ProcessSampler:
+    """Общий сэмплер процессов Windsurf (запускается при первом обращении)."""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = ProcessSampler(
+                    interval=_env_float("PROCESS_SAMPLE_INTERVAL_SECONDS", 1.0),
+                    rescan_seconds=_env_float("PROCESS_RESCAN_SECONDS", 60.0),
+                ).start()
+    return _sampler
@@ -0,0 +1,490 @@
+"""Движок готовности ответа: детекторы и единый планировщик проб.
+
+Каждый детектор реализует интерфейс ``ReadinessDetector`` и получает источник данных
+(сэмплер пикселя, кадры, CPU, буфер обмена) снаружи — поэтому его можно прогнать
+на записанном или синтетическом потоке кадров без доступа к экрану.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from core.metrics import counters
+from core.sleep_utils import sleep_interruptible
+
+logger = logging.getLogger(__name__)
+
+RGB = Tuple[int, int, int]
+
+
+def rgb_match(rgb: RGB, target: RGB, tol: int, tol_pct: Optional[float] = None) -> Tuple[bool, RGB]:
+    """Сравнить цвет с целевым. Возвращает (match, delta).
+
+    Если задан tol_pct >= 0 — сравнивается средняя относительная ошибка по каналам (в % от 255),
+    иначе — покомпонентный допуск tol.
+    """
+    dr = abs(int(rgb[0]) - int(target[0]))
+    dg = abs(int(rgb[1]) - int(target[1]))
+    db = abs(int(rgb[2]) - int(target[2]))
+    if tol_pct is not None and tol_pct >= 0:
+        rel = (dr + dg + db) / (3.0 * 255.0) * 100.0
+        return rel <= tol_pct, (dr, dg, db)
+    return (dr <= tol and dg <= tol and db <= tol), (dr, dg, db)
+
+
+class ReadinessDetector:
+    """Базовый интерфейс детектора готовности.
+
+    Планировщик вызывает ``probe(now)`` не чаще, чем раз в ``next_interval()`` секунд.
+    ``probe`` возвращает True, когда детектор считает ответ готовым.
+    """
+
+    name = "base"
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = max(0.01, float(interval))
+        self.probes: int = 0
+        self.last: Optional[dict] = None
+
+    def reset(self, now: float) -> None:
+        """Сбросить состояние перед новым ожиданием."""
+        self.probes = 0
+        self.last = None
+
+    def next_interval(self) -> float:
+        """Через сколько секунд детектор хочет следующую пробу."""
+        return self.interval
+
+    def probe(self, now: float) -> bool:
+        raise NotImplementedError
+
+
+class PixelDetector(ReadinessDetector):
+    """READY_PIXEL: опорная точка совпала по цвету и держится stable_seconds.
+
+    sampler() -> ((r, g, b), src). Логика перехода non-match -> match повторяет прежний цикл:
+    при require_transition совпадение без предшествующего non-match игнорируется
+    только после истечения transition_timeout (если он задан).
+
+    adaptive=True: пока точка стабильно «занята» (тот же цвет non-match), интервал растёт
+    в backoff раз до max_interval; после первого совпадения пробы идут каждые fast_interval,
+    а готовность подтверждается confirm_samples подряд совпавшими пробами (или stable_seconds,
+    что наступит раньше). Пробы, не давшие новой информации (повтор того же non-match),
+    считаются в wasted.
+    """
+
+    name = "ready_pixel"
+
+    def __init__(
+        self,
+        sampler: Callable[[], Tuple[RGB, str]],
+        target: RGB,
+        tol: int = 4,
+        tol_pct: Optional[float] = None,
+        require_transition: bool = True,
+        transition_timeout: float = 0.0,
+        stable_seconds: float = 0.8,
+        interval: float = 0.5,
+        meta: Optional[dict] = None,
+        adaptive: bool = False,
+        max_interval: Optional[float] = None,
+        backoff: float = 1.5,
+        fast_interval: Optional[float] = None,
+        confirm_samples: int = 0,
+    ):
+        super().__init__(interval)
+        self.sampler = sampler
+        self.target = tuple(int(c) for c in target)
+        self.tol = int(tol)
+        self.tol_pct = tol_pct if (tol_pct is not None and tol_pct >= 0) else None
+        self.require_transition = bool(require_transition)
+        self.transition_timeout = float(transition_timeout or 0.0)
+        self.stable_seconds = max(0.0, float(stable_seconds))
+        self.meta = dict(meta or {})
+        self.seen_nonmatch = False
+        self.match_started_at: Optional[float] = None
+        self.transition_deadline: Optional[float] = None
+        self.adaptive = bool(adaptive)
+        self.max_interval = max(self.interval, float(max_interval or self.interval))
+        self.backoff = max(1.0, float(backoff))
+        self.fast_interval = max(0.01, min(self.interval, float(fast_interval or self.interval)))
+        self.confirm_samples = max(0, int(confirm_samples or 0))
+        self.current_interval = self.interval
+        self.match_streak = 0
+        self.wasted = 0
+        self._prev_state = None
+
+    def reset(self, now: float) -> None:
+        super().reset(now)
+        self.seen_nonmatch = False
+        self.match_started_at = None
+        self.transition_deadline = None
+        if self.require_transition and self.transition_timeout > 0:
+            self.transition_deadline = now + self.transition_timeout
+        self.current_interval = self.interval
+        self.match_streak = 0
+        self.wasted = 0
+        self._prev_state = None
+
+    def next_interval(self) -> float:
+        if not self.adaptive:
+            return self.interval
+        if self.match_started_at is not None:
+            return self.fast_interval
+        return self.current_interval
+
+    def _state(self):
+        """Ключ наблюдаемого состояния для сравнения соседних проб."""
+        return (self.last or {}).get('rgb')
+
+    def _same_state(self, a, b) -> bool:
+        if a is None or b is None:
+            return False
+        tol = max(2, self.tol)
+        return all(abs(int(p) - int(q)) <= tol for p, q in zip(a, b))
+
+    def _on_nonmatch(self) -> None:
+        """Учёт non-match: backoff при неизменном «busy», сброс интервала при изменении."""
+        state = self._state()
+        if self._same_state(state, self._prev_state):
+            self.wasted += 1
+            if self.adaptive:
+                self.current_interval = min(self.max_interval, self.current_interval * self.backoff)
+        else:
+            self.current_interval = self.interval
+        self._prev_state = state
+
+    def _sample_match(self) -> bool:
+        """Одна проба: заполнить self.last и вернуть совпадение цвета."""
+        rgb, src = self.sampler()
+        rgb = (int(rgb[0]), int(rgb[1]), int(rgb[2]))
+        match, delta = rgb_match(rgb, self.target, self.tol, self.tol_pct)
+        self.last = dict(self.meta)
+        self.last.update({
+            'rgb': rgb, 'src': src, 'target': self.target,
+            'tol': self.tol, 'tol_pct': self.tol_pct,
+            'delta': delta, 'match': match,
+        })
+        logger.debug(
+            "READY_PIXEL probe: rgb=%s target=%s delta=%s tol=%s tol_pct=%s -> match=%s",
+            rgb, self.target, delta, self.tol, self.tol_pct, match,
+        )
+        return match
+
+    def _log_nonmatch(self) -> None:
+        logger.info(
+            "READY_PIXEL проверка: used_xy=%s цвет=%s не подходит; жду %.1fs",
+            self.meta.get('used_xy'), (self.last or {}).get('rgb'), self.next_interval(),
+        )
+
+    def probe(self, now: float) -> bool:
+        self.probes += 1
+        if not self._sample_match():
+            self.seen_nonmatch = True
+            self.match_started_at = None
+            self.match_streak = 0
+            self._on_nonmatch()
+            self._log_nonmatch()
+            return False
+        self._prev_state = None
+        if self.require_transition and not self.seen_nonmatch:
+            if self.transition_deadline is not None and now >= self.transition_deadline:
+                logger.info(
+                    "READY_PIXEL: переход non-match->match не зафиксирован до таймаута, продолжаю ожидать совпадение..."
+                )
+                return False
+        if self.match_started_at is None:
+            self.match_started_at = now
+        self.match_streak += 1
+        stable_for = now - self.match_started_at
+        if self.confirm_samples and self.match_streak >= self.confirm_samples:
+            return True
+        if stable_for < self.stable_seconds:
+            logger.info(
+                "READY_PIXEL: совпадение, но ждём стабильность %.1fs (уже %.2fs)", self.stable_seconds, stable_for
+            )
+            return False
+        return True
+
+
+class SignatureDetector(PixelDetector):
+    """Многоточечная сигнатура (core.signature) по одному захвату рамки.
+
+    evaluator() -> (match, details). Логика перехода и стабильности — как у PixelDetector;
+    имя то же ('ready_pixel'), т.к. сигнатура заменяет одиночную опорную точку.
+    """
+
+    def __init__(
+        self,
+        evaluator: Callable[[], Tuple[bool, dict]],
+        require_transition: bool = True,
+        transition_timeout: float = 0.0,
+        stable_seconds: float = 0.8,
+        interval: float = 0.5,
+        meta: Optional[dict] = None,
+        **adaptive,
+    ):
+        super().__init__(
+            lambda: ((0, 0, 0), 'signature'), (0, 0, 0),
+            require_transition=require_transition, transition_timeout=transition_timeout,
+            stable_seconds=stable_seconds, interval=interval, meta=meta, **adaptive,
+        )
+        self.evaluator = evaluator
+
+    def _sample_match(self) -> bool:
+        match, details = self.evaluator()
+        self.last = dict(self.meta)
+        self.last.update({'match': bool(match), 'src': 'signature', 'points': details})
+        # Поля первой точки — для совместимости с телеметрией/отладкой одиночного READY_PIXEL
+        first = next((d for d in details.values() if 'rgb' in d), None)
+        if first is not None:
+            self.last.update({'rgb': first['rgb'], 'target': first['target'], 'delta': first['delta']})
+            self.last.setdefault('used_xy', first['xy'])
+        return bool(match)
+
+    def _state(self):
+        flat = []
+        for d in ((self.last or {}).get('points') or {}).values():
+            if 'rgb' in d:
+                flat.extend(d['rgb'])
+            elif 'delta' in d:
+                flat.append(int(d['delta']))
+        return tuple(flat) or None
+
+    def _log_nonmatch(self) -> None:
+        failed = [name for name, d in ((self.last or {}).get('points') or {}).items() if not d.get('match')]
+        logger.info("READY signature: не совпали %s; жду %.1fs", failed, self.next_interval())
+
+
+class VisualDiffDetector(ReadinessDetector):
+    """Визуальная стабилизация: кадры области ответа перестали меняться.
+
+    frame_source() -> bytes (например, уменьшенный grayscale-кадр) или None.
+    Кадры сравниваются средней абсолютной разницей байтов.
+    """
+
+    name = "visual"
+
+    def __init__(
+        self,
+        frame_source: Callable[[], Optional[bytes]],
+        diff_threshold: float = 5.0,
+        stable_seconds: float = 2.0,
+        interval: float = 0.5,
+    ):
+        super().__init__(interval)
+        self.frame_source = frame_source
+        self.diff_threshold = float(diff_threshold)
+        self.stable_seconds = max(0.0, float(stable_seconds))
+        self._prev: Optional[bytes] = None
+        self._last_change: float = 0.0
+
+    def reset(self, now: float) -> None:
+        super().reset(now)
+        self._prev = None
+        self._last_change = now
+
+    @staticmethod
+    def mean_diff(a: bytes, b: bytes) -> float:
+        """Средняя абсолютная разница двух кадров одинакового размера (иначе 255)."""
+        if len(a) != len(b) or not a:
+            return 255.0
+        return sum(abs(x - y) for x, y in zip(a, b)) / float(len(a))
+
+    def probe(self, now: float) -> bool:
+        self.probes += 1
+        frame = self.frame_source()
+        if frame is None:
+            return False
+        frame = bytes(frame)
+        diff = 0.0
+        if self._prev is not None:
+            diff = self.mean_diff(frame, self._prev)
+            if diff > self.diff_threshold:
+                self._last_change = now
+        self._prev = frame
+        stable_for = now - self._last_change
+        self.last = {'diff': round(diff, 2), 'stable_for': round(stable_for, 2)}
+        return stable_for >= self.stable_seconds
+
+
+class CpuQuietDetector(ReadinessDetector):
+    """CPU-тишь: суммарная загрузка процессов Windsurf ниже порога stable_seconds подряд."""
+
+    name = "cpu"
+
+    def __init__(
+        self,
+        cpu_sampler: Callable[[], float],
+        threshold: float = 6.0,
+        stable_seconds: float = 20.0,
+        interval: float = 1.0,
+    ):
+        super().__init__(interval)
+        self.cpu_sampler = cpu_sampler
+        self.threshold = float(threshold)
+        self.stable_seconds = max(0.0, float(stable_seconds))
+        self._quiet_since: Optional[float] = None
+
+    def reset(self, now: float) -> None:
+        super().reset(now)
+        self._quiet_since = None
+
+    def probe(self, now: float) -> bool:
+        self.probes += 1
+        total = float(self.cpu_sampler())
+        if total <= self.threshold:
+            if self._quiet_since is None:
+                self._quiet_since = now
+        else:
+            self._quiet_since = None
+        quiet_for = (now - self._quiet_since) if self._quiet_since is not None else 0.0
+        self.last = {'cpu_total_percent': round(total, 2), 'quiet_seconds': round(quiet_for, 2)}
+        return self._quiet_since is not None and quiet_for >= self.stable_seconds
+
+
+class ClipboardStableDetector(ReadinessDetector):
+    """Стабильность буфера обмена: текст непустой, отличается от baseline и не меняется stable_seconds."""
+
+    name = "clipboard"
+
+    def __init__(
+        self,
+        reader: Callable[[], str],
+        stable_seconds: float = 5.0,
+        interval: float = 1.0,
+        baseline: Optional[str] = None,
+    ):
+        super().__init__(interval)
+        self.reader = reader
+        self.stable_seconds = max(0.0, float(stable_seconds))
+        self.baseline = baseline
+        self._prev: Optional[str] = None
+        self._since: float = 0.0
+
+    def reset(self, now: float) -> None:
+        super().reset(now)
+        self._prev = None
+        self._since = now
+
+    def probe(self, now: float) -> bool:
+        self.probes += 1
+        text = self.reader() or ""
+        if text != self._prev:
+            self._prev = text
+            self._since = now
+        stable_for = now - self._since
+        self.last = {'length': len(text), 'stable_for': round(stable_for, 2)}
+        if not text.strip() or (self.baseline is not None and text == self.baseline):
+            return False
+        return stable_for >= self.stable_seconds
+
+
+class ReadinessScheduler:
+    """Единый планировщик проб для набора детекторов.
+
+    decisive — имена детекторов, чьё срабатывание завершает ожидание (None — любой).
+    max_wait <= 0 — ждать бесконечно. Источник времени подменяется через clock для тестов.
+    """
+
+    def __init__(
+        self,
+        detectors: Sequence[ReadinessDetector],
+        decisive: Optional[Iterable[str]] = None,
+        max_wait: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.detectors = list(detectors)
+        self.decisive = set(decisive) if decisive is not None else None
+        self.max_wait = float(max_wait or 0.0)
+        self.clock = clock
+        self.started_at: float = 0.0
+        self.ticks: int = 0
+        self.ready_by: Optional[str] = None
+        self._due: Dict[int, float] = {}
+
+    def get(self, name: str) -> Optional[ReadinessDetector]:
+        for det in self.detectors:
+            if det.name == name:
+                return det
+        return None
+
+    def start(self, now: Optional[float] = None) -> None:
+        now = self.clock() if now is None else now
+        self.started_at = now
+        self.ticks = 0
+        self.ready_by = None
+        self._due = {}
+        for i, det in enumerate(self.detectors):
+            det.reset(now)
+            self._due[i] = now
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        if self.max_wait <= 0:
+            return False
+        now = self.clock() if now is None else now
+        return (now - self.started_at) >= self.max_wait
+
+    def tick(self, now: Optional[float] = None) -> Optional[str]:
+        """Опросить детекторы, чей срок подошёл. Возвращает имя сработавшего решающего детектора."""
+        now = self.clock() if now is None else now
+        self.ticks += 1
+        for i, det in enumerate(self.detectors):
+            if now < self._due.get(i, now):
+                continue
+            counters().inc("ready_probes", detector=det.name)
+            try:
+                ok = bool(det.probe(now))
+            except Exception as e:
+                det.last = {'error': str(e)}
+                logger.debug(f"readiness detector {det.name} failed: {e}")
+                ok = False
+            self._due[i] = now + det.next_interval()
+            if ok and (self.decisive is None or det.name in self.decisive):
+                self.ready_by = det.name
+                return det.name
+        return None
+
+    def next_delay(self, now: Optional[float] = None) -> float:
+        """Сколько секунд до ближайшей запланированной пробы."""
+        now = self.clock() if now is None else now
+        if not self._due:
+            return 0.5
+        return max(0.0, min(self._due.values()) - now)
+
+    def run(
+        self,
+        cancel: Optional[threading.Event] = None,
+        sleep: Callable[[float], None] = sleep_interruptible,
+    ) -> Optional[str]:
+        """Блокирующее ожидание. Возвращает ready_by или None (таймаут/отмена)."""
+        self.start()
+        while True:
+            if self.expired() or (cancel is not None and cancel.is_set()):
+                return None
+            ready = self.tick()
+            if ready:
+                return ready
+            sleep(max(0.01, self.next_delay()))
+
+    async def wait(
+        self,
+        cancel: Optional[threading.Event] = None,
+        runner: Optional[Callable[..., Awaitable]] = None,
+    ) -> Optional[str]:
+        """Асинхронное ожидание: между пробами поток не занят, сами пробы — в runner (по умолчанию to_thread)."""
+        runner = runner or asyncio.to_thread
+        self.start()
+        while True:
+            if self.expired() or (cancel is not None and cancel.is_set()):
+                return None
+            ready = await runner(self.tick)
+            if ready:
+                return ready
+            await asyncio.sleep(max(0.01, self.next_delay()))
+
+    def ready_future(self, cancel: Optional[threading.Event] = None) -> "asyncio.Future[Optional[str]]":
+        """Запустить ожидание в текущем event loop и вернуть future с ready_by."""
+        return asyncio.ensure_future(self.wait(cancel))
@@ -0,0 +1,342 @@
+"""Захват областей экрана в raw RGB без файлового ввода-вывода.
+
+Бэкенды:
+- ``QuartzGrabber`` — нативный буфер CoreGraphics внутри процесса (macOS, pyobjc), без fork/exec и PNG;
+- ``ScreencaptureCliGrabber`` — прежний путь ``screencapture -R`` во временный PNG (дорого, но верно на Retina);
+- ``PyAutoGuiGrabber`` — фоллбэк через ``pyautogui.screenshot``; на macOS — последний: без pyobjc pyscreeze
+  снимает экран в физических пикселях и режет по логическим координатам (не та область на Retina);
+- ``FakeGrabber`` — кадры из каталога (PPM/PNG), чтобы проверять логику на Linux без экрана.
+
+Выбор бэкенда: ``SCREEN_GRAB_BACKEND`` = auto|quartz|pyautogui|screencapture|fake.
+"""
+
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from core.metrics import counters
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]
+RGB = Tuple[int, int, int]
+
+
+class Frame:
+    """Кадр: raw RGB (3 байта на пиксель, построчно) и исходный регион экрана.
+
+    scale — отношение физических пикселей к логическим (2.0 на Retina).
+    """
+
+    __slots__ = ("width", "height", "data", "origin", "scale")
+
+    def __init__(self, width: int, height: int, data: bytes, origin: Tuple[int, int] = (0, 0), scale: float = 1.0):
+        if len(data) != width * height * 3:
+            raise ValueError(f"frame data size {len(data)} != {width}x{height}x3")
+        self.width = int(width)
+        self.height = int(height)
+        self.data = bytes(data)
+        self.origin = (int(origin[0]), int(origin[1]))
+        self.scale = float(scale) if scale else 1.0
+
+    def pixel(self, x: int, y: int) -> RGB:
+        """Цвет пикселя в координатах кадра (физических)."""
+        x = max(0, min(self.width - 1, int(x)))
+        y = max(0, min(self.height - 1, int(y)))
+        i = (y * self.width + x) * 3
+        d = self.data
+        return d[i], d[i + 1], d[i + 2]
+
+    def pixel_at(self, sx: int, sy: int) -> RGB:
+        """Цвет пикселя по логическим координатам экрана."""
+        return self.pixel(int((sx - self.origin[0]) * self.scale), int((sy - self.origin[1]) * self.scale))
+
+    def crop(self, x: int, y: int, w: int, h: int) -> "Frame":
+        """Вырезать прямоугольник в координатах кадра (с обрезкой по границам)."""
+        x0 = max(0, min(self.width, int(x)))
+        y0 = max(0, min(self.height, int(y)))
+        x1 = max(x0, min(self.width, int(x) + int(w)))
+        y1 = max(y0, min(self.height, int(y) + int(h)))
+        cw, ch = x1 - x0, y1 - y0
+        row = self.width * 3
+        out = bytearray(cw * ch * 3)
+        for r in range(ch):
+            src = (y0 + r) * row + x0 * 3
+            out[r * cw * 3:(r + 1) * cw * 3] = self.data[src:src + cw * 3]
+        origin = (self.origin[0] + int(x0 / self.scale), self.origin[1] + int(y0 / self.scale))
+        return Frame(cw, ch, bytes(out), origin, self.scale)
+
+    def mean_rgb(self) -> Optional[RGB]:
+        """Средний цвет кадра (целочисленный, как в прежнем усреднении)."""
+        n = self.width * self.height
+        if n <= 0:
+            return None
+        d = self.data
+        return sum(d[0::3]) // n, sum(d[1::3]) // n, sum(d[2::3]) // n
+
+    def to_image(self):
+        """PIL.Image из кадра (PIL импортируется лениво)."""
+        from PIL import Image
+        return Image.frombytes("RGB", (self.width, self.height), self.data)
+
+
+def _rgb_from_image(img, region: Region, scale: float = 1.0) -> Frame:
+    img = img.convert("RGB")
+    w, h = img.size
+    return Frame(w, h, img.tobytes(), (region[0], region[1]), scale)
+
+
+class ScreenGrabber:
+    """Базовый интерфейс захвата. grab(region) -> Frame или None при ошибке."""
+
+    name = "base"
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class QuartzGrabber(ScreenGrabber):
+    """In-process захват через CoreGraphics: CGWindowListCreateImage -> CGDataProvider -> bytes.
+
+    Модули Quartz загружаются один раз при создании (долгоживущая сессия захвата).
+    """
+
+    name = "quartz"
+
+    def __init__(self):
+        import Quartz  # type: ignore
+        self._q = Quartz
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        q = self._q
+        x, y, w, h = (int(v) for v in region)
+        if w <= 0 or h <= 0:
+            return None
+        rect = q.CGRectMake(x, y, w, h)
+        img = q.CGWindowListCreateImage(
+            rect, q.kCGWindowListOptionOnScreenOnly, q.kCGNullWindowID, q.kCGWindowImageDefault
+        )
+        if img is None:
+            return None
+        pw = int(q.CGImageGetWidth(img))
+        ph = int(q.CGImageGetHeight(img))
+        bpr = int(q.CGImageGetBytesPerRow(img))
+        raw = bytes(q.CGDataProviderCopyData(q.CGImageGetDataProvider(img)))
+        if pw <= 0 or ph <= 0:
+            return None
+        # CoreGraphics отдаёт BGRA (little-endian premultiplied first); переупаковываем в RGB срезами
+        out = bytearray(pw * ph * 3)
+        for r in range(ph):
+            row = raw[r * bpr:r * bpr + pw * 4]
+            base = r * pw * 3
+            seg = out[base:base + pw * 3]
+            seg[0::3] = row[2::4]
+            seg[1::3] = row[1::4]
+            seg[2::3] = row[0::4]
+            out[base:base + pw * 3] = seg
+        return Frame(pw, ph, bytes(out), (x, y), pw / float(w))
+
+
+class PyAutoGuiGrabber(ScreenGrabber):
+    """Фоллбэк: pyautogui.screenshot(region=...)."""
+
+    name = "pyautogui"
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        import pyautogui
+        x, y, w, h = (int(v) for v in region)
+        if w <= 0 or h <= 0:
+            return None
+        img = pyautogui.screenshot(region=(x, y, w, h))
+        return _rgb_from_image(img, region, img.size[0] / float(w))
+
+
+class ScreencaptureCliGrabber(ScreenGrabber):
+    """Прежний путь: 'screencapture -R' во временный PNG (устойчиво на retina, но дорого)."""
+
+    name = "screencapture"
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        from PIL import Image
+        x, y, w, h = (int(v) for v in region)
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tf:
+            tmp_path = tf.name
+        try:
+            counters().inc("subprocess_spawns", cmd="screencapture")
+            subprocess.run(
+                ["screencapture", "-R", f"{x},{y},{w},{h}", tmp_path],
+                check=False, timeout=1.0, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                return None
+            with Image.open(tmp_path) as img:
+                return _rgb_from_image(img, region, img.size[0] / float(max(1, w)))
+        finally:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+
+
+def _read_ppm(path: str) -> Frame:
+    """Минимальный парсер бинарного PPM (P6, maxval 255) — без PIL."""
+    with open(path, "rb") as f:
+        blob = f.read()
+    tokens: List[bytes] = []
+    pos = 0
+    while len(tokens) < 4:
+        while blob[pos:pos + 1].isspace():
+            pos += 1
+        if blob[pos:pos + 1] == b"#":
+            pos = blob.index(b"\n", pos) + 1
+            continue
+        start = pos
+        while not blob[pos:pos + 1].isspace():
+            pos += 1
+        tokens.append(blob[start:pos])
+    if tokens[0] != b"P6" or int(tokens[3]) != 255:
+        raise ValueError(f"unsupported PPM: {path}")
+    w, h = int(tokens[1]), int(tokens[2])
+    data = blob[pos + 1:pos + 1 + w * h * 3]
+    return Frame(w, h, data)
+
+
+def write_ppm(path: str, frame: Frame) -> None:
+    """Сохранить кадр в бинарный PPM (для записи потоков кадров и фикстур)."""
+    with open(path, "wb") as f:
+        f.write(f"P6\n{frame.width} {frame.height}\n255\n".encode("ascii"))
+        f.write(frame.data)
+
+
+def load_frame(path: str) -> Frame:
+    """Загрузить кадр из файла: .ppm без зависимостей, остальные форматы через PIL."""
+    if path.lower().endswith(".ppm"):
+        return _read_ppm(path)
+    from PIL import Image
+    with Image.open(path) as img:
+        return _rgb_from_image(img, (0, 0, img.size[0], img.size[1]))
+
+
+class FakeGrabber(ScreenGrabber):
+    """Подаёт заранее записанные полноэкранные кадры по очереди; регион вырезается из текущего кадра.
+
+    После последнего кадра продолжает отдавать последний (или идёт по кругу при loop=True).
+    """
+
+    name = "fake"
+
+    def __init__(self, frames: Sequence[Frame], loop: bool = False):
+        if not frames:
+            raise ValueError("FakeGrabber requires at least one frame")
+        self.frames = list(frames)
+        self.loop = bool(loop)
+        self.index = 0
+        self.grabs = 0
+
+    @classmethod
+    def from_directory(cls, directory: str, loop: bool = False) -> "FakeGrabber":
+        exts = (".ppm", ".png", ".bmp", ".jpg", ".jpeg")
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith(exts))
+        return cls([load_frame(os.path.join(directory, n)) for n in names], loop=loop)
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        frame = self.frames[self.index]
+        self.grabs += 1
+        if self.index + 1 < len(self.frames):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        x, y, w, h = (int(v) for v in region)
+        return frame.crop(x - frame.origin[0], y - frame.origin[1], w, h)
+
+
+class ChainGrabber(ScreenGrabber):
+    """Пробует бэкенды по очереди; первый удачный становится предпочтительным."""
+
+    name = "chain"
+
+    def __init__(self, grabbers: Sequence[ScreenGrabber]):
+        self.grabbers = list(grabbers)
+
+    def grab(self, region: Region) -> Optional[Frame]:
+        for i, g in enumerate(self.grabbers):
+            try:
+                frame = g.grab(region)
+            except Exception as e:
+                logger.debug(f"screen grab via {g.name} failed: {e}")
+                frame = None
+            if frame is not None:
+                if i > 0:
+                    self.grabbers.insert(0, self.grabbers.pop(i))
+                return frame
+        return None
+
+    def close(self) -> None:
+        for g in self.grabbers:
+            g.close()
+
+
+_grabber: Optional[ScreenGrabber] = None
+_grabber_lock = threading.Lock()
+
+
+def _darwin_fallbacks() -> List[ScreenGrabber]:
+    """Фоллбэки после Quartz: на macOS screencapture -R (Retina-safe) раньше pyautogui."""
+    if platform.system() == "Darwin":
+        return [ScreencaptureCliGrabber(), PyAutoGuiGrabber()]
+    return [PyAutoGuiGrabber()]
+
+
+def create_grabber(backend: str = "auto", fake_dir: str = "") -> ScreenGrabber:
+    """Создать бэкенд захвата по имени (auto|quartz|pyautogui|screencapture|fake)."""
+    backend = (backend or "auto").strip().lower()
+    if backend == "fake":
+        return FakeGrabber.from_directory(fake_dir or "debug/frames", loop=True)
+    if backend == "quartz":
+        return ChainGrabber([QuartzGrabber()] + _darwin_fallbacks())
+    if backend == "pyautogui":
+        return PyAutoGuiGrabber()
+    if backend == "screencapture":
+        return ScreencaptureCliGrabber()
+    # auto
+    chain: List[ScreenGrabber] = []
+    if platform.system() == "Darwin":
+        try:
+            chain.append(QuartzGrabber())
+        except Exception as e:
+            logger.debug(f"QuartzGrabber unavailable: {e}")
+        chain.extend(_darwin_fallbacks())
+    else:
+        chain.append(PyAutoGuiGrabber())
+    return ChainGrabber(chain)
+
+
+def get_grabber() -> ScreenGrabber:
+    """Общий (ленивый) экземпляр захвата согласно SCREEN_GRAB_BACKEND."""
+    global _grabber
+    if _grabber is None:
+        with _grabber_lock:
+            if _grabber is None:
+                from core.config import config
+                _grabber = create_grabber(config.SCREEN_GRAB_BACKEND, config.SCREEN_GRAB_FAKE_DIR)
+                logger.info(f"screen grabber: {getattr(_grabber, 'name', '?')}")
+    return _grabber
+
+
+def set_grabber(grabber: Optional[ScreenGrabber]) -> None:
+    """Подменить общий экземпляр (тесты, FakeGrabber). None — пересоздать по конфигу при следующем вызове."""
+    global _grabber
+    with _grabber_lock:
+        if _grabber is not None and _grabber is not grabber:
+            try:
+                _grabber.close()
+            except Exception:
+                pass
+        _grabber = grabber
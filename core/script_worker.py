@@ -0,0 +1,342 @@
+"""Долгоживущий процесс для AppleScript вместо запуска ``osascript`` на каждый вызов.
+
+Каждый ``osascript -e ...`` — это fork/exec интерпретатора и компиляция скрипта заново
+(~100–300 мс). Здесь один процесс ``osascript -l JavaScript`` (JXA) читает запросы
+построчно из stdin, компилирует AppleScript через ``NSAppleScript`` один раз (кэш по тексту
+скрипта) и отвечает JSON-строкой в stdout.
+
+Протокол (JSON lines, запросы — только ASCII благодаря ``ensure_ascii``):
+  запрос:  {"id": 1, "script": "tell application ... end tell"}
+  ответ:   {"id": 1, "ok": true, "stdout": "...", "error": "", "ms": 3.2}
+
+Таймаут задаётся на каждый вызов; при зависании процесс убивается и перезапускается
+на следующем вызове. Если воркер недоступен (не macOS, не удалось запустить),
+``run_osascript`` прозрачно откатывается на прежний ``subprocess.run(["osascript", ...])``.
+
+Для проверки транспорта без macOS есть заменитель: ``python core/script_worker.py --stand-in``
+(``ScriptWorker.stand_in()``) с тем же протоколом и командами ``echo:``, ``sleep:``, ``fail:``.
+"""
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# JXA-воркер: читает JSON lines из stdin, кэширует скомпилированные NSAppleScript.
+_JXA_SOURCE = r"""
+ObjC.import('Foundation');
+var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+var stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+var cache = {};
+var cacheSize = 0;
+var MAX_CACHE = 256;
+
+function send(obj) {
+  var s = JSON.stringify(obj) + '\n';
+  stdout.writeData($(s).dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function errText(dict) {
+  try {
+    var m = dict.objectForKey('NSAppleScriptErrorMessage');
+    if (m && !m.isNil()) return ObjC.unwrap(m);
+  } catch (e) {}
+  return 'error';
+}
+
+function toText(desc) {
+  if (!desc || desc.isNil()) return '';
+  if (desc.descriptorType === 0x6C697374) {
+    var parts = [];
+    for (var i = 1; i <= desc.numberOfItems; i++) parts.push(toText(desc.descriptorAtIndex(i)));
+    return parts.join(', ');
+  }
+  var s = desc.stringValue;
+  return (s && !s.isNil()) ? ObjC.unwrap(s) : '';
+}
+
+function handle(req) {
+  var t0 = Date.now();
+  var scr = cache[req.script];
+  if (!scr) {
+    scr = $.NSAppleScript.alloc.initWithSource($(req.script));
+    var cerr = Ref();
+    if (!scr.compileAndReturnError(cerr)) {
+      send({id: req.id, ok: false, stdout: '', error: errText(cerr[0]), ms: Date.now() - t0});
+      return;
+    }
+    if (cacheSize >= MAX_CACHE) { cache = {}; cacheSize = 0; }
+    cache[req.script] = scr;
+    cacheSize++;
+  }
+  var err = Ref();
+  var desc = scr.executeAndReturnError(err);
+  if (!desc || desc.isNil()) {
+    send({id: req.id, ok: false, stdout: '', error: errText(err[0]), ms: Date.now() - t0});
+    return;
+  }
+  send({id: req.id, ok: true, stdout: toText(desc), error: '', ms: Date.now() - t0});
+}
+
+var buf = '';
+while (true) {
+  var data = stdin.availableData;
+  if (data.length === 0) break;
+  buf += ObjC.unwrap($.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding));
+  var nl;
+  while ((nl = buf.indexOf('\n')) >= 0) {
+    var line = buf.slice(0, nl);
+    buf = buf.slice(nl + 1);
+    if (!line) continue;
+    var req;
+    try { req = JSON.parse(line); }
+    catch (e) { send({id: null, ok: false, stdout: '', error: 'bad request', ms: 0}); continue; }
+    try { handle(req); } catch (e) { send({id: req.id, ok: false, stdout: '', error: String(e), ms: 0}); }
+  }
+}
+"""
+
+
+class ScriptWorkerError(Exception):
+    """Воркер недоступен или нарушен протокол (вызов стоит повторить через osascript)."""
+
+
+class ScriptWorker:
+    """Клиент долгоживущего воркера. Вызовы сериализуются (AppleScript однопоточен)."""
+
+    def __init__(self, argv: Optional[List[str]] = None, timeout: float = 2.0,
+                 max_start_failures: int = 3):
+        self.argv = list(argv) if argv else ["osascript", "-l", "JavaScript", "-e", _JXA_SOURCE]
+        self.timeout = timeout
+        self.max_start_failures = max_start_failures
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._start_failures = 0
+        self._starts = 0
+        self.disabled = False
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.total_ms = 0.0
+
+    @classmethod
+    def stand_in(cls, **kw) -> "ScriptWorker":
+        """Воркер-заменитель на Python с тем же протоколом (для проверки на Linux)."""
+        return cls(argv=[sys.executable, os.path.abspath(__file__), "--stand-in"], **kw)
+
+    # === Процесс ===
+
+    def _start(self) -> None:
+        # Импорт здесь: заменитель (--stand-in) запускается как отдельный файл, без пакета core
+        from core.metrics import counters
+        counters().inc("subprocess_spawns", cmd="osascript_worker")
+        try:
+            proc = subprocess.Popen(
+                self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding="utf-8", bufsize=1,
+            )
+        except Exception as e:
+            self._start_failures += 1
+            if self._start_failures >= self.max_start_failures:
+                self.disabled = True
+                logger.warning(f"script worker disabled after {self._start_failures} start failures: {e}")
+            raise ScriptWorkerError(f"start failed: {e}")
+        lines: "queue.Queue[Optional[str]]" = queue.Queue()
+
+        def _reader():
+            try:
+                for line in proc.stdout:
+                    lines.put(line)
+            except Exception:
+                pass
+            lines.put(None)
+
+        threading.Thread(target=_reader, name="script-worker-reader", daemon=True).start()
+        self._starts += 1
+        if self._starts > 1:
+            self.restarts += 1
+        self._proc = proc
+        self._lines = lines
+
+    def _kill(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.kill()
+            proc.wait(timeout=1.0)
+        except Exception:
+            pass
+
+    def _alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    # === Вызовы ===
+
+    def run(self, script: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """Выполнить скрипт; контракт как у ``subprocess.run(["osascript", "-e", script])``:
+        returncode 0/1, при таймауте — 124 и stderr='timeout'. ScriptWorkerError — если воркер недоступен.
+        """
+        if self.disabled:
+            raise ScriptWorkerError("disabled")
+        t = max(0.2, float(self.timeout if timeout is None else timeout))
+        args = ["osascript", "-e", script]
+        with self._lock:
+            if not self._alive():
+                self._kill()
+                self._start()
+            self._next_id += 1
+            rid = self._next_id
+            t0 = time.perf_counter()
+            try:
+                self._proc.stdin.write(json.dumps({"id": rid, "script": script}, ensure_ascii=True) + "\n")
+                self._proc.stdin.flush()
+            except Exception as e:
+                self._kill()
+                raise ScriptWorkerError(f"write failed: {e}")
+            deadline = t0 + t
+            while True:
+                left = deadline - time.perf_counter()
+                try:
+                    line = self._lines.get(timeout=max(0.0, left))
+                except queue.Empty:
+                    # Завис (например, ждёт диалог доступа) — убиваем, перезапуск на следующем вызове
+                    self.timeouts += 1
+                    self._kill()
+                    logger.debug(f"script worker timeout after {t:.2f}s, killed")
+                    return subprocess.CompletedProcess(args=args, returncode=124, stdout="", stderr="timeout")
+                if line is None:
+                    self._kill()
+                    self._start_failures += 1
+                    if self._start_failures >= self.max_start_failures:
+                        self.disabled = True
+                        logger.warning("script worker keeps exiting, disabled; using plain osascript")
+                    raise ScriptWorkerError("worker exited")
+                try:
+                    resp = json.loads(line)
+                except Exception:
+                    continue
+                if resp.get("id") != rid:
+                    continue
+                break
+            self.calls += 1
+            self.total_ms += (time.perf_counter() - t0) * 1000.0
+        if resp.get("ok"):
+            return subprocess.CompletedProcess(args=args, returncode=0,
+                                               stdout=str(resp.get("stdout") or "") + "\n", stderr="")
+        self.errors += 1
+        return subprocess.CompletedProcess(args=args, returncode=1, stdout="", stderr=str(resp.get("error") or "error"))
+
+    def stats(self) -> dict:
+        return {
+            "alive": self._alive(),
+            "disabled": self.disabled,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc is not None:
+                try:
+                    self._proc.stdin.close()
+                except Exception:
+                    pass
+            self._kill()
+
+
+_worker: Optional[ScriptWorker] = None
+_worker_lock = threading.Lock()
+
+
+def _env_timeout() -> float:
+    try:
+        return float(os.getenv("OSASCRIPT_TIMEOUT_SECONDS", "2.0"))
+    except Exception:
+        return 2.0
+
+
+def worker_enabled() -> bool:
+    return sys.platform == "darwin" and os.getenv("OSASCRIPT_WORKER", "1").lower() not in ("0", "false", "no")
+
+
+def get_script_worker() -> Optional[ScriptWorker]:
+    """Общий воркер процесса (None, если выключен OSASCRIPT_WORKER=0 или не macOS)."""
+    global _worker
+    if not worker_enabled():
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = ScriptWorker(timeout=_env_timeout())
+        return _worker
+
+
+def set_script_worker(worker: Optional[ScriptWorker]) -> None:
+    """Подменить общий воркер (например, на ScriptWorker.stand_in() в отладке)."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker is not worker:
+            _worker.close()
+        _worker = worker
+
+
+def run_osascript(script: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    """AppleScript через воркер, при его недоступности — через отдельный ``osascript``."""
+    t = max(0.2, _env_timeout() if timeout is None else float(timeout))
+    w = _worker if _worker is not None else get_script_worker()
+    if w is not None and not w.disabled:
+        try:
+            return w.run(script, timeout=t)
+        except ScriptWorkerError as e:
+            logger.debug(f"script worker unavailable ({e}), falling back to osascript")
+    from core.metrics import counters
+    counters().inc("subprocess_spawns", cmd="osascript")
+    try:
+        return subprocess.run(["osascript", "-e", script], capture_output=True, text=True, check=False, timeout=t)
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(args=["osascript", "-e", script], returncode=124,
+                                           stdout="", stderr="timeout")
+
+
+def _stand_in_main() -> None:
+    """Заменитель воркера: тот же протокол, «скрипты» — команды echo:/sleep:/fail:."""
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        t0 = time.perf_counter()
+        try:
+            req = json.loads(line)
+        except Exception:
+            resp = {"id": None, "ok": False, "stdout": "", "error": "bad request", "ms": 0}
+        else:
+            script = str(req.get("script") or "")
+            resp = {"id": req.get("id"), "ok": True, "stdout": script, "error": ""}
+            if script.startswith("echo:"):
+                resp["stdout"] = script[5:]
+            elif script.startswith("sleep:"):
+                time.sleep(float(script[6:] or 0))
+                resp["stdout"] = "slept"
+            elif script.startswith("fail:"):
+                resp.update(ok=False, stdout="", error=script[5:])
+            resp["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        sys.stdout.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    if "--stand-in" in sys.argv[1:]:
+        _stand_in_main()
@@ -0,0 +1,293 @@
+"""Сигнатура готовности: несколько именованных точек и/или шаблонный патч.
+
+Все точки и патч проверяются по одному захвату их общей рамки (``bounding_region``),
+поэтому N точек стоят один вызов ScreenGrabber, а не N.
+
+Формат JSON (``READY_SIGNATURE_FILE``, по умолчанию ``core/ready_signature.json``,
+либо строкой в ``READY_SIGNATURE_JSON``)::
+
+    {
+      "name": "windsurf-idle",
+      "quorum": 0,
+      "points": [
+        {"name": "send", "x": 1200, "y": 780, "rgb": [40, 40, 40], "tol": 4, "k": 3}
+      ],
+      "template": {"x": 1190, "y": 770, "w": 24, "h": 24, "file": "ready_signature.ppm", "max_delta": 12}
+    }
+
+quorum=0 — должны совпасть все точки; N>0 — достаточно N точек (патч обязателен всегда).
+
+Для параллельной работы с несколькими окнами (PARALLEL_WINDOWS) сигнатуры задаются по окнам::
+
+    {"windows": {"vibe_coding": {"relative": true, "points": [...]}, "#2": {...}}}
+
+Ключ — подстрока заголовка окна или "#N"; "relative": true — координаты от левого верхнего угла окна.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from core.pixel_utils import frame_stat, np
+from core.readiness import rgb_match
+from core.screen_grabber import Frame, ScreenGrabber, get_grabber, load_frame, write_ppm
+
+logger = logging.getLogger(__name__)
+
+RGB = Tuple[int, int, int]
+Region = Tuple[int, int, int, int]
+
+
+def logical_pixels(frame: Frame, x: int, y: int, w: int, h: int) -> bytes:
+    """RGB-байты w*h логических пикселей начиная с логической точки (x,y) экрана.
+
+    На Retina (scale>1) берётся ближайший физический пиксель, чтобы шаблон не зависел от DPI.
+    """
+    sc = frame.scale
+    ox, oy = frame.origin
+    if sc == 1.0:
+        return frame.crop(x - ox, y - oy, w, h).data
+    out = bytearray(w * h * 3)
+    i = 0
+    for j in range(h):
+        for k in range(w):
+            r, g, b = frame.pixel(int((x - ox + k) * sc), int((y - oy + j) * sc))
+            out[i] = r
+            out[i + 1] = g
+            out[i + 2] = b
+            i += 3
+    return bytes(out)
+
+
+def mean_abs_delta(a: bytes, b: bytes) -> float:
+    """Средняя абсолютная разница двух RGB-буферов одинаковой длины (0..255)."""
+    n = min(len(a), len(b))
+    if n <= 0:
+        return 255.0
+    if np is not None:
+        va = np.frombuffer(a[:n], dtype=np.uint8).astype(np.int16)
+        vb = np.frombuffer(b[:n], dtype=np.uint8).astype(np.int16)
+        return float(np.abs(va - vb).mean())
+    return sum(abs(p - q) for p, q in zip(a[:n], b[:n])) / float(n)
+
+
+class ProbePoint:
+    """Именованная точка сигнатуры: экранные координаты (top-origin), цвет и допуск."""
+
+    def __init__(self, name: str, x: int, y: int, rgb: RGB, tol: int = 4,
+                 tol_pct: Optional[float] = None, k: int = 1):
+        self.name = str(name)
+        self.x = int(x)
+        self.y = int(y)
+        self.rgb = (int(rgb[0]), int(rgb[1]), int(rgb[2]))
+        self.tol = int(tol)
+        self.tol_pct = tol_pct if (tol_pct is not None and tol_pct >= 0) else None
+        k = max(1, int(k))
+        self.k = k if k % 2 else k + 1
+
+    def region(self) -> Region:
+        r = self.k // 2
+        return self.x - r, self.y - r, self.k, self.k
+
+    def to_dict(self) -> dict:
+        d = {"name": self.name, "x": self.x, "y": self.y, "rgb": list(self.rgb), "tol": self.tol, "k": self.k}
+        if self.tol_pct is not None:
+            d["tol_pct"] = self.tol_pct
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict, default_tol: int = 4, default_k: int = 1) -> "ProbePoint":
+        return cls(
+            d.get("name") or f"p{d.get('x')}x{d.get('y')}",
+            d["x"], d["y"], d["rgb"],
+            tol=d.get("tol", default_tol), tol_pct=d.get("tol_pct"), k=d.get("k", default_k),
+        )
+
+
+class TemplatePatch:
+    """Небольшой эталонный патч экрана (логические пиксели) с допуском по средней разнице."""
+
+    def __init__(self, x: int, y: int, w: int, h: int, data: bytes, max_delta: float = 12.0, file: str = ""):
+        if len(data) != w * h * 3:
+            raise ValueError(f"template size {len(data)} != {w}x{h}x3")
+        self.x = int(x)
+        self.y = int(y)
+        self.w = int(w)
+        self.h = int(h)
+        self.data = bytes(data)
+        self.max_delta = float(max_delta)
+        self.file = file
+
+    def region(self) -> Region:
+        return self.x, self.y, self.w, self.h
+
+    def to_dict(self) -> dict:
+        return {"x": self.x, "y": self.y, "w": self.w, "h": self.h, "file": self.file, "max_delta": self.max_delta}
+
+
+class ReadySignature:
+    """Набор точек и/или патч, проверяемых по одному кадру."""
+
+    def __init__(self, points: List[ProbePoint], template: Optional[TemplatePatch] = None,
+                 quorum: int = 0, name: str = "signature", stat: str = "mean"):
+        if not points and template is None:
+            raise ValueError("signature needs at least one point or a template")
+        self.points = list(points)
+        self.template = template
+        self.quorum = max(0, int(quorum or 0))
+        self.name = name
+        self.stat = stat
+
+    def bounding_region(self) -> Region:
+        """Общая рамка всех точек (с окнами kxk) и патча в логических координатах."""
+        rects = [p.region() for p in self.points]
+        if self.template is not None:
+            rects.append(self.template.region())
+        x0 = min(r[0] for r in rects)
+        y0 = min(r[1] for r in rects)
+        x1 = max(r[0] + r[2] for r in rects)
+        y1 = max(r[1] + r[3] for r in rects)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def evaluate(self, frame: Frame) -> Tuple[bool, Dict[str, dict]]:
+        """Проверить сигнатуру на кадре, покрывающем bounding_region. -> (match, детали по точкам)."""
+        details: Dict[str, dict] = {}
+        sc = frame.scale
+        ox, oy = frame.origin
+        hits = 0
+        for p in self.points:
+            rx, ry, rw, rh = p.region()
+            side = max(1, int(round(rw * sc)))
+            sub = frame.crop(int((rx - ox) * sc), int((ry - oy) * sc), side, side)
+            rgb = frame_stat(sub, self.stat) or (0, 0, 0)
+            ok, delta = rgb_match(rgb, p.rgb, p.tol, p.tol_pct)
+            hits += 1 if ok else 0
+            details[p.name] = {"xy": (p.x, p.y), "rgb": rgb, "target": p.rgb, "delta": delta, "match": ok}
+        need = len(self.points) if self.quorum <= 0 else min(self.quorum, len(self.points))
+        match = hits >= need
+        if self.template is not None:
+            t = self.template
+            d = mean_abs_delta(logical_pixels(frame, t.x, t.y, t.w, t.h), t.data)
+            t_ok = d <= t.max_delta
+            details["template"] = {"xy": (t.x, t.y), "delta": round(d, 2), "max_delta": t.max_delta, "match": t_ok}
+            match = match and t_ok
+        return match, details
+
+    def measure(self, grabber: Optional[ScreenGrabber] = None) -> Tuple[bool, Dict[str, dict]]:
+        """Один захват рамки и проверка. При ошибке захвата — (False, {'error': ...})."""
+        frame = (grabber or get_grabber()).grab(self.bounding_region())
+        if frame is None:
+            return False, {"error": {"match": False, "reason": "grab failed"}}
+        return self.evaluate(frame)
+
+    def shifted(self, dx: int, dy: int) -> "ReadySignature":
+        """Копия сигнатуры, сдвинутая на (dx, dy) — для координат относительно окна."""
+        points = [ProbePoint(p.name, p.x + dx, p.y + dy, p.rgb, p.tol, p.tol_pct, p.k) for p in self.points]
+        template = None
+        if self.template is not None:
+            t = self.template
+            template = TemplatePatch(t.x + dx, t.y + dy, t.w, t.h, t.data, t.max_delta, t.file)
+        return ReadySignature(points, template, self.quorum, self.name, self.stat)
+
+    def to_dict(self) -> dict:
+        d = {"name": self.name, "quorum": self.quorum, "points": [p.to_dict() for p in self.points]}
+        if self.template is not None:
+            d["template"] = self.template.to_dict()
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict, base_dir: str = ".", default_tol: int = 4,
+                  default_k: int = 1, stat: str = "mean") -> "ReadySignature":
+        points = [ProbePoint.from_dict(p, default_tol, default_k) for p in (d.get("points") or [])]
+        template = None
+        t = d.get("template")
+        if t:
+            path = t.get("file") or ""
+            if path and not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            fr = load_frame(path)
+            w, h = int(t.get("w") or fr.width), int(t.get("h") or fr.height)
+            template = TemplatePatch(t["x"], t["y"], w, h, fr.crop(0, 0, w, h).data,
+                                     t.get("max_delta", 12.0), t.get("file") or "")
+        return cls(points, template, d.get("quorum", 0), d.get("name") or "signature", stat)
+
+    def save(self, path: str) -> None:
+        """Сохранить JSON (и патч в PPM рядом с ним)."""
+        base_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(base_dir, exist_ok=True)
+        if self.template is not None:
+            t = self.template
+            if not t.file:
+                t.file = os.path.splitext(os.path.basename(path))[0] + ".ppm"
+            write_ppm(os.path.join(base_dir, t.file), Frame(t.w, t.h, t.data))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def capture_template(x: int, y: int, w: int, h: int, max_delta: float = 12.0,
+                     grabber: Optional[ScreenGrabber] = None) -> Optional[TemplatePatch]:
+    """Снять патч экрана в логических пикселях (для экспорта из пипетки)."""
+    frame = (grabber or get_grabber()).grab((x, y, w, h))
+    if frame is None:
+        return None
+    return TemplatePatch(x, y, w, h, logical_pixels(frame, x, y, w, h), max_delta)
+
+
+def default_signature_path() -> str:
+    """Путь JSON-файла сигнатуры по умолчанию (рядом с core/config.py)."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "ready_signature.json")
+
+
+def _pick_window_entry(data: dict, window: Optional[str]) -> Optional[dict]:
+    """Выбрать запись из секции "windows" по подстроке заголовка (или "#N" для index:N)."""
+    windows = data.get("windows") or {}
+    if not window or not windows:
+        return None
+    w = str(window).strip().lower()
+    if w.startswith("index:"):
+        w = "#" + w.split(":", 1)[1]
+    for key, entry in windows.items():
+        k = str(key).strip().lower()
+        if k and (k == w or k in w):
+            return entry
+    return None
+
+
+def load_signature(window: Optional[str] = None, bounds: Optional[Region] = None,
+                   window_only: bool = False) -> Optional[ReadySignature]:
+    """Загрузить сигнатуру из READY_SIGNATURE_JSON или READY_SIGNATURE_FILE; None — не настроена.
+
+    window — заголовок/таргет окна: если в JSON есть секция "windows", берётся запись окна.
+    Записи с "relative": true задаются относительно левого верхнего угла окна и сдвигаются на bounds.
+    window_only=True — без записи для окна вернуть None (нужно для параллельных окон).
+    """
+    from core.config import config
+    stat = (config.READY_PIXEL_STAT or "mean").strip().lower()
+    tol = int(config.READY_PIXEL_TOL)
+    k = max(1, int(config.READY_PIXEL_AVG_K))
+    inline = (config.READY_SIGNATURE_JSON or "").strip()
+    try:
+        if inline:
+            data, base_dir = json.loads(inline), os.getcwd()
+        else:
+            path = (config.READY_SIGNATURE_FILE or default_signature_path()).strip()
+            if not os.path.exists(path):
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            base_dir = os.path.dirname(os.path.abspath(path))
+        entry = _pick_window_entry(data, window)
+        if entry is None:
+            if window_only or not (data.get("points") or data.get("template")):
+                return None
+            entry = data
+        sig = ReadySignature.from_dict(entry, base_dir, tol, k, stat)
+        if entry.get("relative"):
+            if not bounds:
+                return None
+            sig = sig.shifted(int(bounds[0]), int(bounds[1]))
+        return sig
+    except Exception as e:
+        logger.warning(f"READY signature не загружена: {e}")
+        return None
@@ -1,6 +1,7 @@
 """Утилиты для управления задержками и ожиданиями."""
 
 import time
+from typing import Callable
 
 
 def sleep_interruptible(total_seconds: float, step_seconds: float = 0.05) -> None:
@@ -30,3 +31,35 @@ def sleep_interruptible(total_seconds: float, step_seconds: float = 0.05) -> Non
         if remaining <= 0:
             break
         time.sleep(min(step, remaining))
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float, poll: float = 0.05,
+               sleep: Callable[[float], None] = time.sleep) -> bool:
+    """
+    Ждать, пока predicate() не станет истинным, но не дольше timeout.
+
+    Условие проверяется сразу (без начальной паузы), затем раз в poll секунд;
+    исключение в predicate считается «ещё нет».
+
+    Returns:
+        True — условие выполнилось, False — истёк дедлайн.
+    """
+    try:
+        total = max(0.0, float(timeout))
+    except Exception:
+        total = 0.0
+    try:
+        step = max(0.005, float(poll))
+    except Exception:
+        step = 0.05
+    deadline = time.monotonic() + total
+    while True:
+        try:
+            if predicate():
+                return True
+        except Exception:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        sleep(min(step, remaining))
@@ -0,0 +1,100 @@
+"""Потоковая выдача частичного ответа: одно сообщение Telegram, редактируемое по мере генерации.
+
+Контроллер периодически снимает текст панели ответа и передаёт его в ``on_partial(text, delta)``;
+``PartialMessage`` склеивает частые обновления и редактирует одно сообщение не чаще
+``min_interval`` (лимиты Telegram на редактирование), не отправляя одинаковый текст повторно.
+Отправка/редактирование — внешние корутины, модуль не зависит от aiogram/Telethon.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def preview_text(text: str, max_chars: int, header: str = "") -> str:
+    """Текст для сообщения-превью: хвост ответа, если он не помещается в max_chars."""
+    body = text or ""
+    room = max(16, max_chars - len(header))
+    if len(body) > room:
+        body = "…" + body[-(room - 1):]
+    return header + body
+
+
+class PartialMessage:
+    """Одно «живое» сообщение с частичным ответом.
+
+    send(text) -> отправленное сообщение (объект, передаваемый в edit), edit(msg, text) -> None.
+    update() только запоминает последний текст и, если интервал ещё не прошёл, планирует
+    отложенное редактирование; промежуточные версии схлопываются.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[Any]], edit: Callable[[Any, str], Awaitable[Any]],
+                 min_interval: float = 3.0, max_chars: int = 3500, header: str = ""):
+        self._send = send
+        self._edit = edit
+        self.min_interval = max(0.0, float(min_interval))
+        self.max_chars = max(64, int(max_chars))
+        self.header = header
+        self.msg: Any = None
+        self._latest = ""
+        self._shown = ""
+        self._last_push = 0.0
+        self._pending: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self.edits = 0
+        self.skipped = 0
+
+    async def update(self, text: str, delta: str = "") -> None:
+        """Новый снимок частичного ответа (delta — прирост относительно прошлого снимка, для логов)."""
+        if self._closed or not (text or "").strip():
+            return
+        self._latest = text
+        wait = self._last_push + self.min_interval - time.monotonic()
+        if wait <= 0 and (self._pending is None or self._pending.done()):
+            await self._push()
+            return
+        self.skipped += 1
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.ensure_future(self._push_later(max(0.0, wait)))
+
+    async def _push_later(self, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            await self._push()
+        except asyncio.CancelledError:
+            pass
+
+    async def _push(self) -> None:
+        async with self._lock:
+            if self._closed:
+                return
+            text = preview_text(self._latest, self.max_chars, self.header)
+            if text == self._shown:
+                return
+            try:
+                if self.msg is None:
+                    self.msg = await self._send(text)
+                else:
+                    await self._edit(self.msg, text)
+                self._shown = text
+                self.edits += 1
+            except Exception as e:
+                # FloodWait/RetryAfter: сдвигаем следующее редактирование на указанное время
+                retry = getattr(e, "retry_after", None) or getattr(e, "seconds", None)
+                if isinstance(retry, (int, float)) and retry > 0:
+                    self._last_push = time.monotonic() + float(retry)
+                    logger.debug(f"partial edit flood wait {retry}s")
+                    return
+                logger.debug(f"partial edit failed: {e}")
+            self._last_push = time.monotonic()
+
+    async def close(self) -> Any:
+        """Остановить обновления (отложенное редактирование отменяется). Возвращает сообщение-превью."""
+        self._closed = True
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+        return self.msg
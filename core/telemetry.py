@@ -15,6 +15,7 @@ class Telemetry:
         
         # Детали последней операции вставки
         self.last_paste_strategy: Optional[str] = None
+        self.last_paste_attempts: int = 0
         
         # Детали последнего копирования
         self.last_copy_method: Optional[str] = None
@@ -39,6 +40,15 @@ class Telemetry:
         
         # READY_PIXEL
         self.last_ready_pixel: Optional[dict] = None
+        self.ready_probe_count: int = 0
+        self.ready_wasted_probes: int = 0
+
+        # Паузы и ожидания последнего запроса (core/timing): sleep_seconds, sleep_share, top
+        self.last_sleep: Optional[dict] = None
+
+        # Потоковая выдача частичного ответа
+        self.stream_partials: int = 0
+        self.first_partial_seconds: Optional[float] = None
         
         # Последняя установка модели
         self.last_model_set: Optional[str] = None
@@ -64,6 +74,7 @@ class Telemetry:
             'failed_sends': self.failed_sends,
             'last_error': self.last_error,
             'last_paste_strategy': self.last_paste_strategy,
+            'last_paste_attempts': self.last_paste_attempts,
             'last_copy_method': self.last_copy_method,
             'last_copy_length': self.last_copy_length,
             'last_copy_is_echo': self.last_copy_is_echo,
@@ -76,6 +87,11 @@ class Telemetry:
             'last_visual_region': self.last_visual_region,
             'last_click_xy': self.last_click_xy,
             'last_ready_pixel': self.last_ready_pixel,
+            'ready_probe_count': self.ready_probe_count,
+            'ready_wasted_probes': self.ready_wasted_probes,
+            'last_sleep': self.last_sleep,
+            'stream_partials': self.stream_partials,
+            'first_partial_seconds': self.first_partial_seconds,
             'last_model_set': self.last_model_set,
             'cpu_quiet_seconds': round(self.cpu_quiet_seconds, 2),
             'cpu_last_total_percent': round(self.cpu_last_total_percent, 2),
@@ -0,0 +1,9 @@
+"""Утилиты для длины текста в единицах, которыми считают внешние API."""
+
+
+def utf16_len(text: str) -> int:
+    """Длина в единицах UTF-16: символ вне BMP (эмодзи) — две единицы.
+
+    Так считают Telegram (лимит 4096) и NSString.length / AXNumberOfCharacters на macOS.
+    """
+    return len(text) + sum(1 for ch in text if ord(ch) > 0xFFFF)
@@ -0,0 +1,282 @@
+"""Исходящие сообщения в Telegram: разбиение, очередь по чатам, лимиты и flood-wait.
+
+Общий компонент для ``bot.py`` (aiogram) и ``telethon_bot.py``; от библиотеки зависят только
+переданные функции отправки:
+
+    await tg_sender().send_text(
+        chat_id, text,
+        send=lambda chunk, i: message.answer(chunk, reply_markup=kb if i == 0 else None),
+        send_document=lambda data, name, caption: message.answer_document(...),
+        retry_on=(TelegramNetworkError,),
+    )
+
+- ``split_message``: части не длиннее ``TG_MESSAGE_LIMIT`` в единицах UTF-16 (так считает
+  Telegram: эмодзи — две единицы), по границам строк; блок кода ```…```, разрезанный между
+  частями, закрывается в одной и открывается тем же заголовком в следующей.
+- Части одного ответа уходят по порядку под замком чата: ответы в один чат не перемешиваются,
+  разные чаты отправляются независимо. Первая часть уходит сразу после нарезки.
+- Темп: token bucket на чат (``TG_CHAT_RATE_PER_SECOND``/``TG_CHAT_BURST``) и общий
+  (``TG_GLOBAL_RATE_PER_SECOND``). Подсказка flood-wait (aiogram ``TelegramRetryAfter.retry_after``,
+  Telethon ``FloodWaitError.seconds``) блокирует чат на указанное время, затем часть повторяется.
+- Ошибки из ``retry_on`` повторяются до ``TG_SEND_RETRIES`` раз с экспоненциальной задержкой
+  и джиттером; остальные пробрасываются вызывающему.
+- Ответ длиннее ``TG_DOCUMENT_THRESHOLD_CHUNKS`` частей (при наличии ``send_document``) уходит
+  первой частью сообщением и целиком — файлом.
+
+Задержка доставки (до первой и до последней части) пишется в core.metrics:
+``tg_first_chunk_seconds``, ``tg_delivery_seconds``; счётчики — ``tg_messages``, ``tg_flood_waits``.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from core.config import config
+from core.metrics import counters, metrics
+from core.text_utils import utf16_len
+
+logger = logging.getLogger(__name__)
+
+FENCE = "```"
+
+SendChunk = Callable[[str, int], Awaitable[object]]
+SendDocument = Callable[[bytes, str, str], Awaitable[object]]
+
+
+def _hard_split(line: str, limit: int) -> Iterator[str]:
+    """Строка длиннее limit — по limit единиц UTF-16, не разрывая суррогатные пары."""
+    start, units = 0, 0
+    for i, ch in enumerate(line):
+        w = 2 if ord(ch) > 0xFFFF else 1
+        if units + w > limit:
+            yield line[start:i]
+            start, units = i, 0
+        units += w
+    if start < len(line):
+        yield line[start:]
+
+
+def iter_chunks(text: str, limit: int = 4096) -> Iterator[str]:
+    """Части текста не длиннее limit (UTF-16) с целыми блоками кода на каждой стороне разреза.
+
+    Разрез по границе строки убирает её перевод строки; строка длиннее части режется без
+    вставленных символов — склейка частей через "\n" или "" возвращает исходный текст
+    (без добавленных закрывающих ``` и повторённых заголовков блоков).
+    """
+    limit = max(64, int(limit))
+    reserve = utf16_len(FENCE) + 1        # запас под закрывающий ``` если часть оборвётся внутри блока
+    buf: Optional[str] = None
+    size = 0
+    fence_open: Optional[str] = None      # заголовок незакрытого блока кода («```python»)
+
+    for line in (text or "").split("\n"):
+        stripped = line.strip()
+        # Слишком длинная строка с ``` — обычный текст: её нельзя повторить заголовком следующей части
+        is_fence = stripped.startswith(FENCE) and utf16_len(stripped) <= limit // 4
+        after = (None if fence_open is not None else stripped) if is_fence else fence_open
+        head = utf16_len(fence_open) + 1 if fence_open is not None else 0
+        budget = limit - reserve - head
+        pieces = [line] if utf16_len(line) <= budget else list(_hard_split(line, budget))
+        for n, piece in enumerate(pieces):
+            # Блок, открытый после этого куска: для строки-заголовка — уже с ним
+            state = after if n == len(pieces) - 1 else fence_open
+            sep = 1 if buf is not None and n == 0 else 0
+            if buf is not None and size + sep + utf16_len(piece) + (reserve if state is not None else 0) > limit:
+                yield buf + ("\n" + FENCE if fence_open is not None else "")
+                buf, size, sep = None, 0, 0
+                if fence_open is not None:
+                    buf, size, sep = fence_open, utf16_len(fence_open), 1
+            buf = piece if buf is None else buf + ("\n" if sep else "") + piece
+            size += sep + utf16_len(piece)
+        fence_open = after
+    if buf is not None and buf.strip():
+        yield buf
+
+
+def split_message(text: str, limit: Optional[int] = None) -> List[str]:
+    return list(iter_chunks(text, config.TG_MESSAGE_LIMIT if limit is None else limit))
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """Пауза flood-wait из исключения aiogram/Telethon; None — это не flood-wait."""
+    name = type(exc).__name__
+    if "RetryAfter" in name or "FloodWait" in name or "SlowModeWait" in name:
+        for attr in ("retry_after", "seconds"):
+            v = getattr(exc, attr, None)
+            if isinstance(v, (int, float)):
+                return max(0.0, float(v))
+        return 1.0
+    return None
+
+
+class _Bucket:
+    """Token bucket с резервированием: reserve() возвращает, сколько ждать до своей очереди."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(0.01, float(rate))
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._t = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+        self._t = now
+        self._tokens -= 1.0
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class _ChatState:
+    def __init__(self, rate: float, burst: float):
+        self.lock = asyncio.Lock()
+        self.bucket = _Bucket(rate, burst)
+        self.blocked_until = 0.0
+        self.last_used = time.monotonic()
+
+
+class TelegramSender:
+    """Отправка длинных ответов с очередью по чатам, лимитами темпа и повторами."""
+
+    def __init__(self):
+        self._chats: Dict[object, _ChatState] = {}
+        self._global = _Bucket(config.TG_GLOBAL_RATE_PER_SECOND, config.TG_GLOBAL_RATE_PER_SECOND)
+        self.messages = 0
+        self.chunks = 0
+        self.documents = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.failures = 0
+        self.last_flood_wait: Optional[float] = None
+
+    def _chat(self, chat_id) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            if len(self._chats) > 1000:
+                # Давно молчащие чаты без очереди не нужны
+                cutoff = time.monotonic() - 3600.0
+                for k in [k for k, s in self._chats.items() if s.last_used < cutoff and not s.lock.locked()]:
+                    self._chats.pop(k, None)
+            state = _ChatState(config.TG_CHAT_RATE_PER_SECOND, config.TG_CHAT_BURST)
+            self._chats[chat_id] = state
+        state.last_used = time.monotonic()
+        return state
+
+    async def _pace(self, state: _ChatState) -> None:
+        wait = max(state.bucket.reserve(), self._global.reserve(), state.blocked_until - time.monotonic())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _deliver(self, state: _ChatState, call: Callable[[], Awaitable[object]],
+                       retry_on: Tuple[Type[BaseException], ...]) -> bool:
+        """Один вызов отправки с темпом, flood-wait и повторами. False — сдались после повторов."""
+        attempt = 0
+        floods = 0
+        while True:
+            await self._pace(state)
+            try:
+                await call()
+                return True
+            except Exception as e:
+                wait = retry_after_of(e)
+                if wait is not None and wait <= config.TG_MAX_FLOOD_WAIT_SECONDS and floods < 5:
+                    floods += 1
+                    self.flood_waits += 1
+                    self.last_flood_wait = wait
+                    counters().inc("tg_flood_waits")
+                    state.blocked_until = max(state.blocked_until, time.monotonic() + wait + 0.1)
+                    logger.warning(f"tg_sender: flood-wait {wait:.0f}s")
+                    continue
+                if retry_on and isinstance(e, retry_on) and attempt < max(0, config.TG_SEND_RETRIES):
+                    attempt += 1
+                    self.retries += 1
+                    delay = min(10.0, 0.7 * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+                    logger.warning(f"tg_sender: retry {attempt} in {delay:.1f}s after {type(e).__name__}: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                if retry_on and isinstance(e, retry_on):
+                    logger.warning(f"tg_sender: give up after {attempt + 1} attempts: {e}")
+                    return False
+                raise
+
+    async def send_text(self, chat_id, text: str, send: SendChunk,
+                        send_document: Optional[SendDocument] = None,
+                        retry_on: Tuple[Type[BaseException], ...] = (),
+                        filename: Optional[str] = None) -> bool:
+        """Отправить text частями (или файлом, если он слишком длинный). True — доставлено целиком."""
+        if not text:
+            return True
+        t0 = time.monotonic()
+        state = self._chat(chat_id)
+        limit = config.TG_MESSAGE_LIMIT
+        threshold = config.TG_DOCUMENT_THRESHOLD_CHUNKS
+        as_document = (send_document is not None and threshold > 0
+                       and utf16_len(text) > limit * threshold)
+        ok = True
+        sent = 0
+        try:
+            async with state.lock:
+                for i, chunk in enumerate(iter_chunks(text, limit)):
+                    if not await self._deliver(state, lambda c=chunk, n=i: send(c, n), retry_on):
+                        ok = False
+                        break
+                    sent += 1
+                    if i == 0:
+                        metrics().observe("tg_first_chunk_seconds", round(time.monotonic() - t0, 3))
+                    if as_document:
+                        break       # первая часть — превью, остальное файлом
+                if ok and as_document:
+                    name = filename or f"answer_{datetime.now():%Y%m%d_%H%M%S}.txt"
+                    caption = f"📎 Полный текст: {len(text)} символов"
+                    data = text.encode("utf-8")
+                    ok = await self._deliver(state, lambda: send_document(data, name, caption), retry_on)
+                    if ok:
+                        self.documents += 1
+        except Exception:
+            self.failures += 1
+            counters().inc("tg_messages", result="error")
+            raise
+        finally:
+            self.chunks += sent
+        self.messages += 1
+        if ok:
+            metrics().observe("tg_delivery_seconds", round(time.monotonic() - t0, 3))
+        else:
+            self.failures += 1
+        counters().inc("tg_messages", result=("document" if as_document else "ok") if ok else "failed")
+        return ok
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "chunks": self.chunks,
+            "documents": self.documents,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+            "failures": self.failures,
+            "last_flood_wait": self.last_flood_wait,
+            "chats": len(self._chats),
+        }
+
+
+def format_sender_stats(stats: dict, delivery: Optional[dict] = None) -> str:
+    """Строка /status: счётчики отправителя и перцентили доставки (core.metrics.percentiles)."""
+    line = (f"Отправка в Telegram: сообщений {stats.get('messages', 0)}, частей {stats.get('chunks', 0)}, "
+            f"файлом {stats.get('documents', 0)}, повторов {stats.get('retries', 0)}, "
+            f"flood-wait {stats.get('flood_waits', 0)}, ошибок {stats.get('failures', 0)}")
+    if delivery and delivery.get("n"):
+        line += f"; доставка p50/p95 {delivery.get('p50', 0):.2f}/{delivery.get('p95', 0):.2f}s"
+    return line
+
+
+_sender: Optional[TelegramSender] = None
+
+
+def tg_sender() -> TelegramSender:
+    """Общий отправитель процесса (бот работает в одном event loop)."""
+    global _sender
+    if _sender is None:
+        _sender = TelegramSender()
+    return _sender
@@ -0,0 +1,204 @@
+"""Именованные задержки UI-автоматизации, профили таймингов и учёт времени в ожиданиях.
+
+Вместо ``time.sleep(0.2)`` в коде — ``delay("nav_settle")``: длительность берётся из таблицы
+``DEFAULT_DELAYS`` (значения прежних литералов), умножается на коэффициент профиля
+``TIMING_PROFILE`` (fast/default/safe) и может быть переопределена точечно
+``TIMING_OVERRIDES="submit_settle=0.3,fullscreen_settle=2"``. Там, где есть наблюдаемое условие,
+вместо паузы используется ``wait(name, predicate)``: тот же бюджет служит дедлайном,
+а выход — как только условие выполнено.
+
+Каждая пауза и ожидание учитываются в ``ledger()``: ``begin()`` в начале запроса,
+``summary()`` в конце показывает, сколько времени запроса ушло на сон и где.
+
+Модуль читает параметры из os.getenv (его импортируют clipboard_utils и selection — без циклов через config).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from core.sleep_utils import wait_until
+
+logger = logging.getLogger(__name__)
+
+# Базовые длительности (профиль default) — прежние литеральные паузы, сек
+DEFAULT_DELAYS: Dict[str, float] = {
+    # Клики и фокус
+    "click_settle": 0.15,          # после фокус-клика по полю/панели
+    "refocus_settle": 0.2,         # после повторного фокус-клика перед вставкой
+    "activate_settle": 0.3,        # после `activate` приложения
+    "frontmost_poll": 0.1,         # опрос «Windsurf на переднем плане»
+    # Клавиатура
+    "key_tap": 0.05,               # между быстрыми нажатиями
+    "key_step": 0.1,               # между шагами навигации (Esc, Shift+Tab, Cmd+A)
+    "nav_settle": 0.2,             # после навигации к последнему ответу
+    "open_settle": 0.3,            # после Enter на ответе перед Cmd+C
+    "clear_settle": 0.15,          # после Backspace при очистке поля
+    "select_all_settle": 0.2,      # после Cmd+A перед копированием всего окна
+    "submit_settle": 0.5,          # после Enter с запросом
+    "paste_settle": 0.5,           # после Cmd+V перед проверкой select_all
+    "retry_backoff": 0.3,          # пауза после сбоя попытки
+    # Прокрутка и протяжка (selection)
+    "scroll_step": 0.04,
+    "copy_click_settle": 0.3,      # после вспомогательного клика перед копированием
+    "drag_press": 0.05,            # после mouseDown
+    "drag_release": 0.2,           # после протяжки
+    "drag_settle": 0.1,            # после mouseUp при автоскролле
+    "drag_hold": 5.0,              # удержание при явной протяжке (задаётся COPY_DRAG_HOLD_SECONDS)
+    # Палитра команд / смена модели и проекта
+    "palette_settle": 0.2,
+    "palette_open": 0.25,
+    "palette_paste": 0.2,
+    "probe_hover": 1.5,            # курсор над точкой проверки (видно, где меряем)
+    "dialog_open": 0.35,
+    "dialog_step": 0.25,
+    "dialog_paste": 0.12,
+    "project_reload": 0.8,         # окно перегружает проект
+    "fullscreen_settle": 3.0,      # дедлайн ожидания полноэкранного режима
+    "response_wait": 0.0,          # пауза перед ожиданием ответа (задаётся RESPONSE_WAIT_SECONDS)
+    # Windows
+    "win_window_settle": 0.8,
+    "win_focus_settle": 0.3,
+    "win_copy_settle": 0.2,
+    "win_paste_settle": 0.5,
+}
+
+PROFILES: Dict[str, float] = {"fast": 0.6, "default": 1.0, "safe": 1.6}
+
+
+def _parse_overrides(spec: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip()] = max(0.0, float(v))
+        except Exception:
+            logger.warning(f"TIMING_OVERRIDES: не число для {k.strip()}: {v!r}")
+    return out
+
+
+class TimingProfile:
+    """Длительности по именам: DEFAULT_DELAYS × коэффициент профиля, затем точечные переопределения."""
+
+    def __init__(self, name: str = "default", overrides: Optional[Dict[str, float]] = None):
+        name = (name or "default").strip().lower()
+        if name not in PROFILES:
+            logger.warning(f"Неизвестный TIMING_PROFILE={name}, использую default")
+            name = "default"
+        self.name = name
+        self.scale = PROFILES[name]
+        self.overrides = dict(overrides or {})
+
+    @classmethod
+    def from_env(cls) -> "TimingProfile":
+        return cls(os.getenv("TIMING_PROFILE", "default"), _parse_overrides(os.getenv("TIMING_OVERRIDES", "")))
+
+    def seconds(self, name: str) -> float:
+        if name in self.overrides:
+            return self.overrides[name]
+        base = DEFAULT_DELAYS.get(name)
+        if base is None:
+            logger.debug(f"timing: неизвестная задержка {name}, 0.1s")
+            base = 0.1
+        return base * self.scale
+
+
+class SleepLedger:
+    """Время, проведённое в паузах и ожиданиях: по именам за всё время и за текущий запрос.
+
+    Счётчики запроса общие на процесс: при параллельных окнах (PARALLEL_WINDOWS) паузы соседних
+    запросов попадают в одну сводку.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, Dict[str, float]] = {}
+        self.request: Dict[str, float] = {}
+        self.request_started: Optional[float] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            t = self.totals.setdefault(name, {"count": 0, "seconds": 0.0})
+            t["count"] += 1
+            t["seconds"] += seconds
+            self.request[name] = self.request.get(name, 0.0) + seconds
+
+    def begin(self) -> None:
+        """Начало запроса: обнулить счётчики запроса."""
+        with self._lock:
+            self.request = {}
+            self.request_started = time.monotonic()
+
+    def summary(self, top: int = 5) -> dict:
+        """Сон за текущий запрос: всего, доля от длительности запроса и самые затратные имена."""
+        with self._lock:
+            slept = sum(self.request.values())
+            wall = (time.monotonic() - self.request_started) if self.request_started is not None else None
+            items = sorted(self.request.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return {
+            "sleep_seconds": round(slept, 3),
+            "wall_seconds": round(wall, 3) if wall is not None else None,
+            "sleep_share": round(slept / wall, 3) if wall else None,
+            "top": {k: round(v, 3) for k, v in items},
+        }
+
+
+_profile: Optional[TimingProfile] = None
+_ledger = SleepLedger()
+
+
+def profile() -> TimingProfile:
+    """Текущий профиль (из окружения при первом обращении; reload() — перечитать)."""
+    global _profile
+    if _profile is None:
+        _profile = TimingProfile.from_env()
+    return _profile
+
+
+def reload() -> TimingProfile:
+    global _profile
+    _profile = TimingProfile.from_env()
+    return _profile
+
+
+def ledger() -> SleepLedger:
+    return _ledger
+
+
+def seconds(name: str) -> float:
+    return profile().seconds(name)
+
+
+def delay(name: str, seconds_override: Optional[float] = None) -> None:
+    """Именованная пауза (учитывается в ledger). seconds_override — явная длительность (например, из конфига)."""
+    d = seconds(name) if seconds_override is None else max(0.0, float(seconds_override))
+    if d <= 0:
+        return
+    t0 = time.monotonic()
+    time.sleep(d)
+    _ledger.record(name, time.monotonic() - t0)
+
+
+def wait(name: str, predicate: Callable[[], bool], timeout: Optional[float] = None,
+         poll: Optional[float] = None) -> bool:
+    """Ожидание условия с дедлайном seconds(name) (или timeout); время учитывается как wait:<name>."""
+    t = seconds(name) if timeout is None else float(timeout)
+    t0 = time.monotonic()
+    ok = wait_until(predicate, t, poll=0.05 if poll is None else poll)
+    _ledger.record(f"wait:{name}", time.monotonic() - t0)
+    return ok
+
+
+async def adelay(name: str, seconds_override: Optional[float] = None) -> None:
+    """Асинхронный вариант delay() для ожиданий в event loop."""
+    d = seconds(name) if seconds_override is None else max(0.0, float(seconds_override))
+    if d <= 0:
+        return
+    t0 = time.monotonic()
+    await asyncio.sleep(d)
+    _ledger.record(name, time.monotonic() - t0)
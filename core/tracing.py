@@ -0,0 +1,201 @@
+"""Лёгкая трассировка запроса: дерево вложенных интервалов (span) по фазам отправки.
+
+    with tracer.trace("send", target=...):          # корень — один запрос
+        with span("focus"): ...
+        with span("paste", chars=...) as s:
+            s.set(strategy="ax")
+
+Текущий span хранится в ContextVar: вложенность работает и в корутинах, и в UI-потоке
+(``UIWorker.call`` переносит контекст в исполнитель), а параллельные запросы разных окон
+не смешиваются. Вне ``trace()`` ``span()`` ничего не делает (почти бесплатен).
+
+Завершённые запросы лежат в кольцевом буфере (``TRACE_BUFFER_SIZE``) для ``/trace`` и
+при заданном ``TRACE_EXPORT_FILE`` дописываются в JSON lines для офлайн-анализа.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """Интервал: имя, атрибуты, дочерние интервалы. Время — monotonic, в выгрузке — мс от начала запроса."""
+
+    __slots__ = ("name", "attrs", "start", "end", "children", "_lock")
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None, start: Optional[float] = None):
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs or {})
+        self.start = time.monotonic() if start is None else start
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, child: "Span") -> None:
+        with self._lock:
+            self.children.append(child)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end if self.end is not None else time.monotonic()) - self.start)
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        with self._lock:
+            children = list(self.children)
+        d = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000.0, 1),
+            "ms": round(self.duration * 1000.0, 1),
+        }
+        if self.attrs:
+            d["attrs"] = self.attrs
+        if children:
+            d["children"] = [c.to_dict(origin) for c in children]
+        return d
+
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("trace_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Вложенный интервал текущего запроса; без активного trace() — no-op (отдаёт None)."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    s = Span(name, attrs)
+    parent.add(s)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        s.end = time.monotonic()
+        _current.reset(token)
+
+
+def record_span(name: str, seconds: float, **attrs) -> None:
+    """Добавить уже измеренный интервал (закончился сейчас) к текущему span."""
+    parent = _current.get()
+    if parent is None:
+        return
+    now = time.monotonic()
+    s = Span(name, attrs, start=now - max(0.0, seconds))
+    s.end = now
+    parent.add(s)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class Tracer:
+    """Кольцевой буфер завершённых запросов и экспорт в JSON lines."""
+
+    def __init__(self, capacity: int = 50, export_path: str = ""):
+        self.capacity = max(1, int(capacity))
+        self._ring: "deque[dict]" = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self.export_path = export_path or ""
+        self._seq = 0
+
+    @contextmanager
+    def trace(self, name: str, **attrs) -> Iterator[Span]:
+        """Корневой интервал запроса. Вложенный trace() внутри активного превращается в обычный span."""
+        if _current.get() is not None:
+            with span(name, **attrs) as s:
+                yield s
+            return
+        root = Span(name, attrs)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            root.end = time.monotonic()
+            _current.reset(token)
+            self._finish(root)
+
+    def _finish(self, root: Span) -> None:
+        d = root.to_dict()
+        with self._lock:
+            self._seq += 1
+            d["id"] = self._seq
+        d["ts"] = round(time.time() - root.duration, 3)
+        with self._lock:
+            self._ring.append(d)
+        if self.export_path:
+            try:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(d, ensure_ascii=False, default=str) + "\n")
+            except Exception as e:
+                logger.debug(f"trace export failed: {e}")
+
+    def recent(self, n: int = 5) -> List[dict]:
+        """Последние n запросов (старые первыми)."""
+        with self._lock:
+            items = list(self._ring)
+        return items[-max(1, int(n)):]
+
+    def dump_jsonl(self, path: str) -> int:
+        """Выгрузить весь буфер в JSON lines; возвращает число записей."""
+        items = self.recent(self.capacity)
+        with open(path, "w", encoding="utf-8") as f:
+            for d in items:
+                f.write(json.dumps(d, ensure_ascii=False, default=str) + "\n")
+        return len(items)
+
+
+def format_trace(d: dict, min_ms: float = 0.0) -> str:
+    """Текстовое дерево одного запроса для Telegram: отступ — вложенность, справа — мс и атрибуты."""
+    lines: List[str] = []
+
+    def _walk(node: dict, depth: int) -> None:
+        if depth > 0 and node.get("ms", 0.0) < min_ms and not node.get("children"):
+            return
+        attrs = node.get("attrs") or {}
+        extra = " ".join(f"{k}={v}" for k, v in attrs.items())
+        pad = "  " * depth
+        lines.append(f"{pad}{node.get('name')}: {node.get('ms')} ms" + (f"  [{extra}]" if extra else ""))
+        for c in node.get("children") or []:
+            _walk(c, depth + 1)
+
+    _walk(d, 0)
+    head = f"#{d.get('id')} {time.strftime('%H:%M:%S', time.localtime(d.get('ts') or 0))}"
+    return head + "\n" + "\n".join(lines)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Общий трассировщик (TRACE_BUFFER_SIZE, TRACE_EXPORT_FILE)."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                try:
+                    cap = int(os.getenv("TRACE_BUFFER_SIZE", "50"))
+                except Exception:
+                    cap = 50
+                _tracer = Tracer(cap, os.getenv("TRACE_EXPORT_FILE", "").strip())
+    return _tracer
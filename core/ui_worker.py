@@ -0,0 +1,330 @@
+"""Единственный владелец рабочего стола: очередь UI-задач и выделенный поток.
+
+Все действия с pyautogui, буфером обмена и фокусом окон выполняются в одном потоке
+``ui-worker`` (``UIWorker.call``), а задачи (запросы пользователей) выполняются по одной
+из asyncio PriorityQueue. Для каждой задачи известны позиция в очереди и ETA
+(по скользящему среднему длительностей задач того же типа), задачу можно отменить.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+_current_job: "contextvars.ContextVar[Optional[UIJob]]" = contextvars.ContextVar("ui_current_job", default=None)
+
+
+class UIJobCancelled(Exception):
+    """Задача отменена (cancel/cancel_owner) до получения результата."""
+
+
+class UIJob:
+    """Задача очереди UI. future — результат (asyncio.Future), cancel_event — кооперативная отмена."""
+
+    def __init__(self, job_id: int, fn: Callable, args: tuple, kwargs: dict,
+                 priority: int, label: str, owner: Any, future: "asyncio.Future"):
+        self.id = job_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = int(priority)
+        self.label = label or getattr(fn, "__name__", "job")
+        self.owner = owner
+        self.future = future
+        self.cancel_event = threading.Event()
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.owned_until: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.released: Optional[asyncio.Event] = None
+        # Результаты, которые задача хочет передать вызывающему помимо return (ответ, телеметрия)
+        self.meta: Dict[str, Any] = {}
+
+    @property
+    def key(self) -> tuple:
+        return self.priority, self.id
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def __lt__(self, other: "UIJob") -> bool:
+        return self.key < other.key
+
+
+class UIWorker:
+    """Очередь задач с одним исполнителем и выделенным UI-потоком.
+
+    fn задачи может быть обычной функцией (выполняется в UI-потоке) или корутинной функцией
+    (выполняется в event loop; блокирующие UI-вызовы внутри неё — через ``call``).
+    Корутинная задача может вызвать ``release()``, чтобы отдать рабочий стол следующей задаче
+    и продолжить работу в фоне (параллельные окна).
+    with_cancel=True передаёт в fn аргумент ``cancel=job.cancel_event``.
+    """
+
+    def __init__(self, name: str = "ui-worker", default_duration: float = 60.0,
+                 ewma_alpha: float = 0.3, window_seconds: float = 3600.0,
+                 request_labels: tuple = ("send",)):
+        self.name = name
+        # Какие задачи считаются запросами пользователей для requests_per_hour (пробы/сбор — нет)
+        self.request_labels = set(request_labels)
+        self.default_duration = float(default_duration)
+        self.ewma_alpha = float(ewma_alpha)
+        self.window_seconds = float(window_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._ui_thread_id: Optional[int] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._seq = itertools.count(1)
+        self._pending: Dict[int, UIJob] = {}
+        self._detached: Dict[int, UIJob] = {}
+        self.current: Optional[UIJob] = None
+        self._ewma: Dict[str, float] = {}
+        self._done_times: Deque[float] = deque()
+        self.started_at = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    # --- UI-поток ---
+
+    def _mark_thread(self) -> None:
+        self._ui_thread_id = threading.get_ident()
+
+    def in_ui_thread(self) -> bool:
+        return threading.get_ident() == self._ui_thread_id
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Выполнить блокирующую функцию в UI-потоке (аналог asyncio.to_thread, контекст переносится)."""
+        if self.in_ui_thread():
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+
+        def _run():
+            self._mark_thread()
+            return ctx.run(fn, *args, **kwargs)
+
+        return await loop.run_in_executor(self._executor, _run)
+
+    # --- очередь ---
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._queue = asyncio.PriorityQueue()
+            for job in self._pending.values():
+                self._queue.put_nowait(job)
+            self._dispatcher = loop.create_task(self._dispatch(), name=f"{self.name}-dispatcher")
+
+    async def submit(self, fn: Callable, *args, priority: int = PRIORITY_NORMAL, label: str = "",
+                     owner: Any = None, with_cancel: bool = False, **kwargs) -> UIJob:
+        """Поставить задачу в очередь и вернуть UIJob (результат — await job.future)."""
+        self._ensure_started()
+        job = UIJob(next(self._seq), fn, args, kwargs, priority, label, owner, self._loop.create_future())
+        if with_cancel:
+            job.kwargs["cancel"] = job.cancel_event
+        self._pending[job.id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"UI queue: job #{job.id} '{job.label}' position={self.position(job)} eta={self.eta(job):.0f}s")
+        return job
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """submit + ожидание результата; отмена ожидающей корутины отменяет задачу.
+
+        Если вызывающий сам держит рабочий стол (текущая задача без release()), fn выполняется сразу.
+        """
+        holder = _current_job.get()
+        if holder is not None and holder is self.current:
+            for k in ("priority", "label", "owner", "with_cancel"):
+                kwargs.pop(k, None)
+            if inspect.iscoroutinefunction(fn):
+                return await fn(*args, **kwargs)
+            return await self.call(fn, *args, **kwargs)
+        job = await self.submit(fn, *args, **kwargs)
+        return await self.wait(job)
+
+    async def wait(self, job: UIJob) -> Any:
+        """Дождаться результата задачи.
+
+        Отменённая задача -> UIJobCancelled; при отмене вызывающего (CancelledError) задача тоже отменяется.
+        """
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            if job.future.cancelled():
+                raise UIJobCancelled(f"job #{job.id} '{job.label}' cancelled") from None
+            self.cancel(job)
+            raise
+
+    def cancel(self, job: UIJob) -> bool:
+        """Отменить задачу: ожидающая снимается с очереди, выполняющаяся получает cancel_event."""
+        if job.finished_at is not None or job.future.done():
+            return False
+        job.cancel_event.set()
+        if job.started_at is None:
+            self._pending.pop(job.id, None)
+            if not job.future.done():
+                job.future.cancel()
+            self.cancelled += 1
+            logger.info(f"UI queue: job #{job.id} '{job.label}' cancelled before start")
+        else:
+            logger.info(f"UI queue: job #{job.id} '{job.label}' cancel requested while running")
+        return True
+
+    def cancel_owner(self, owner: Any) -> int:
+        """Отменить все задачи владельца (например, чата). Возвращает число затронутых задач."""
+        jobs = [j for j in list(self._pending.values()) + list(self._detached.values()) if j.owner == owner]
+        if self.current is not None and self.current.owner == owner:
+            jobs.append(self.current)
+        return sum(1 for j in jobs if self.cancel(j))
+
+    def current_job(self) -> Optional[UIJob]:
+        """Задача, из корутины которой идёт вызов (None вне задач очереди)."""
+        return _current_job.get()
+
+    def release(self) -> None:
+        """Освободить рабочий стол из текущей корутинной задачи.
+
+        Очередь переходит к следующей задаче, а корутина продолжает работу сама (например,
+        ждёт генерацию в своём окне); последующие UI-действия она ставит в очередь через run().
+        """
+        job = _current_job.get()
+        if job is not None and job.released is not None and not job.released.is_set():
+            job.released.set()
+            logger.info(f"UI queue: job #{job.id} '{job.label}' released the desktop")
+
+    async def _dispatch(self) -> None:
+        while True:
+            job: UIJob = await self._queue.get()
+            if job.cancelled or job.id not in self._pending:
+                continue
+            self._pending.pop(job.id, None)
+            self.current = job
+            job.started_at = time.time()
+            job.released = asyncio.Event()
+            token = _current_job.set(job)
+            try:
+                if inspect.iscoroutinefunction(job.fn):
+                    task = self._loop.create_task(job.fn(*job.args, **job.kwargs))
+                else:
+                    task = self._loop.create_task(self.call(functools.partial(job.fn, *job.args, **job.kwargs)))
+            finally:
+                _current_job.reset(token)
+            released = self._loop.create_task(job.released.wait())
+            try:
+                await asyncio.wait({task, released}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                task.cancel()
+                released.cancel()
+                raise
+            finally:
+                released.cancel()
+                job.owned_until = time.time()
+                self.current = None
+                self._record_duration(job)
+            if task.done():
+                self._settle(job, task)
+            else:
+                self._detached[job.id] = job
+                task.add_done_callback(functools.partial(self._settle, job))
+
+    def _settle(self, job: UIJob, task: "asyncio.Task") -> None:
+        """Перенести исход задачи в job.future и счётчики."""
+        self._detached.pop(job.id, None)
+        job.finished_at = time.time()
+        if task.cancelled():
+            if not job.future.done():
+                job.future.cancel()
+            self.cancelled += 1
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error(f"UI queue: job #{job.id} '{job.label}' failed: {exc}")
+            if not job.future.done():
+                job.future.set_exception(exc)
+            self.failed += 1
+            return
+        if not job.future.done():
+            job.future.set_result(task.result())
+        self.completed += 1
+        if job.label in self.request_labels:
+            self._done_times.append(job.finished_at)
+
+    # --- позиция, ETA, статистика ---
+
+    def _record_duration(self, job: UIJob) -> None:
+        """EWMA времени владения рабочим столом (до завершения или release())."""
+        if job.started_at is None or job.owned_until is None:
+            return
+        dur = job.owned_until - job.started_at
+        prev = self._ewma.get(job.label)
+        self._ewma[job.label] = dur if prev is None else prev + self.ewma_alpha * (dur - prev)
+
+    def expected_duration(self, label: str) -> float:
+        """Ожидаемая длительность задачи (EWMA по label; иначе — по всем; иначе default_duration)."""
+        if label in self._ewma:
+            return self._ewma[label]
+        if self._ewma:
+            return sum(self._ewma.values()) / len(self._ewma)
+        return self.default_duration
+
+    def position(self, job: UIJob) -> int:
+        """0 — выполняется сейчас; N — сколько задач впереди (включая выполняющуюся)."""
+        if job is self.current:
+            return 0
+        ahead = sum(1 for j in self._pending.values() if j.key < job.key)
+        return ahead + (1 if self.current is not None else 0)
+
+    def eta(self, job: UIJob) -> float:
+        """Оценка секунд до старта задачи."""
+        if job is self.current:
+            return 0.0
+        total = 0.0
+        cur = self.current
+        if cur is not None and cur.started_at is not None:
+            total += max(0.0, self.expected_duration(cur.label) - (time.time() - cur.started_at))
+        for j in self._pending.values():
+            if j.key < job.key:
+                total += self.expected_duration(j.label)
+        return total
+
+    def requests_per_hour(self, now: Optional[float] = None) -> float:
+        """Пропускная способность: завершённые запросы (request_labels) за последнее окно, в пересчёте на час."""
+        now = time.time() if now is None else now
+        while self._done_times and now - self._done_times[0] > self.window_seconds:
+            self._done_times.popleft()
+        span = min(self.window_seconds, max(1.0, now - self.started_at))
+        return len(self._done_times) * 3600.0 / span
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "running": self.current.label if self.current is not None else None,
+            "in_flight": len(self._detached),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "requests_per_hour": round(self.requests_per_hour(), 1),
+            "avg_seconds": {k: round(v, 1) for k, v in self._ewma.items()},
+        }
+
+    def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микро-бенчмарк усреднения цвета kxk: прежний поточечный путь против одного захвата региона.
+
+Запуск:
+  python debug/bench_pixel_avg.py            # реальный экран (бэкенд по SCREEN_GRAB_BACKEND)
+  python debug/bench_pixel_avg.py --fake     # синтетический кадр, работает без GUI (Linux)
+
+Переменные окружения:
+  BENCH_X, BENCH_Y — точка замера (по умолчанию 200,200)
+  BENCH_ROUNDS     — число повторов на каждое k (по умолчанию 50)
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import pixel_utils  # noqa: E402
+from core.screen_grabber import Frame, FakeGrabber, get_grabber, set_grabber  # noqa: E402
+
+X = int(os.getenv("BENCH_X", "200"))
+Y = int(os.getenv("BENCH_Y", "200"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "50"))
+
+
+def _noise_frame(w: int = 640, h: int = 480) -> Frame:
+    rnd = random.Random(42)
+    return Frame(w, h, bytes(rnd.randrange(256) for _ in range(w * h * 3)))
+
+
+def _per_pixel_fake(x: int, y: int, k: int):
+    """Поточечный путь на FakeGrabber: один захват 1x1 на каждый пиксель, как pyautogui.pixel()."""
+    g = get_grabber()
+    r = k // 2
+    acc = [0, 0, 0]
+    for dy in range(-r, r + 1):
+        for dx in range(-r, r + 1):
+            px = g.grab((x + dx, y + dy, 1, 1)).pixel(0, 0)
+            acc[0] += px[0]
+            acc[1] += px[1]
+            acc[2] += px[2]
+    n = k * k
+    return acc[0] // n, acc[1] // n, acc[2] // n
+
+
+def _timeit(fn, *args) -> float:
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(*args)
+    return (time.perf_counter() - t0) / ROUNDS * 1000.0
+
+
+def main() -> int:
+    fake = "--fake" in sys.argv[1:]
+    if fake:
+        set_grabber(FakeGrabber([_noise_frame()], loop=True))
+        per_pixel = _per_pixel_fake
+    else:
+        per_pixel = pixel_utils._avg_rgb_per_pixel
+    print(f"backend={get_grabber().name} numpy={'yes' if pixel_utils.np is not None else 'no'} rounds={ROUNDS}")
+    print(f"{'k':>2} {'per-pixel ms':>13} {'mean ms':>9} {'median ms':>10} {'trimmed ms':>11} {'speedup':>8}  same")
+    for k in range(1, 10, 2):
+        t_old = _timeit(per_pixel, X, Y, k)
+        t_mean = _timeit(pixel_utils.avg_rgb_via_screencapture, X, Y, k, 'mean')
+        t_med = _timeit(pixel_utils.avg_rgb_via_screencapture, X, Y, k, 'median')
+        t_trim = _timeit(pixel_utils.avg_rgb_via_screencapture, X, Y, k, 'trimmed')
+        same = per_pixel(X, Y, k) == pixel_utils.avg_rgb_via_screencapture(X, Y, k, 'mean')
+        speedup = t_old / max(t_mean, 1e-9)
+        print(f"{k:>2} {t_old:>13.3f} {t_mean:>9.3f} {t_med:>10.3f} {t_trim:>11.3f} {speedup:>7.1f}x  {same}")
+    pts = [(X + 40 * i, Y + 25 * i) for i in range(5)]
+    t_multi = _timeit(pixel_utils.sample_points, pts, 3)
+    t_single = _timeit(lambda: [pixel_utils.avg_rgb_via_screencapture(px, py, 3) for px, py in pts])
+    print(f"5 points k=3: one grab {t_multi:.3f} ms vs separate grabs {t_single:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
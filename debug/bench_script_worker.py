@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: отдельный процесс на каждый AppleScript против постоянного воркера (core/script_worker.py).
+
+Запуск:
+  python debug/bench_script_worker.py          # заменитель на Python, работает на Linux
+  python debug/bench_script_worker.py --real   # macOS: osascript -e против JXA-воркера
+
+Переменные окружения:
+  BENCH_ROUNDS — число вызовов в каждом режиме (по умолчанию 30)
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.script_worker import ScriptWorker  # noqa: E402
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "30"))
+REAL_SCRIPT = 'tell application "System Events" to get name of first process whose frontmost is true'
+
+
+def _spawn_per_call(real: bool) -> float:
+    t0 = time.perf_counter()
+    for i in range(ROUNDS):
+        if real:
+            subprocess.run(["osascript", "-e", REAL_SCRIPT], capture_output=True, text=True, check=False)
+        else:
+            # Новый процесс на вызов: запуск заменителя + один запрос, как osascript -e
+            w = ScriptWorker.stand_in(timeout=5.0)
+            r = w.run(f"echo:{i}")
+            w.close()
+            assert r.returncode == 0
+    return (time.perf_counter() - t0) / ROUNDS
+
+
+def _persistent(real: bool) -> float:
+    w = ScriptWorker(timeout=5.0) if real else ScriptWorker.stand_in(timeout=5.0)
+    w.run(REAL_SCRIPT if real else "echo:warmup")
+    t0 = time.perf_counter()
+    for i in range(ROUNDS):
+        r = w.run(REAL_SCRIPT if real else f"echo:{i}")
+        assert r.returncode == 0, r.stderr
+    dt = (time.perf_counter() - t0) / ROUNDS
+    print(f"worker stats: {w.stats()}")
+    w.close()
+    return dt
+
+
+def main():
+    real = "--real" in sys.argv[1:]
+    a = _spawn_per_call(real)
+    b = _persistent(real)
+    print(f"{'osascript -e' if real else 'spawn stand-in'} per call: {a * 1000:8.2f} ms")
+    print(f"persistent worker per call: {b * 1000:8.2f} ms  speedup={a / b:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
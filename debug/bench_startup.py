@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк холодного старта: ``python -X importtime -c "import <модуль>"`` в отдельном процессе.
+
+Разбирает строки ``import time: self [us] | cumulative | name`` из stderr, печатает суммарное время
+импорта и самые дорогие модули. Код возврата 1, если:
+  - время импорта (минимум из нескольких прогонов) превысило бюджет;
+  - код проекта при импорте загрузил модуль, который должен импортироваться лениво (pyautogui, PIL,
+    google.generativeai, pywinauto — см. core/lazy.py). Импортёр берётся из вложенности строк
+    importtime; если модуль подтянула сторонняя библиотека (например, telethon), это только
+    печатается, но не считается ошибкой.
+
+Запуск:
+  python debug/bench_startup.py                  # import bot
+  python debug/bench_startup.py telethon_bot --budget-ms 800 --top 15
+
+Переменные окружения:
+  STARTUP_BUDGET_MS — бюджет импорта в мс (по умолчанию 1500)
+  BENCH_RUNS        — число прогонов (по умолчанию 3; берётся минимум)
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Модули, которые не должны загружаться при старте бота
+DEFERRED = ("pyautogui", "PIL", "google.generativeai", "pywinauto")
+
+
+def _arg(flag: str, default: str) -> str:
+    argv = sys.argv[1:]
+    if flag in argv:
+        i = argv.index(flag)
+        if i + 1 < len(argv):
+            return argv[i + 1]
+    return default
+
+
+def _positional() -> List[str]:
+    out, skip = [], False
+    for a in sys.argv[1:]:
+        if skip:
+            skip = False
+            continue
+        if a.startswith("--"):
+            skip = True
+            continue
+        out.append(a)
+    return out
+
+
+def _project_modules() -> Set[str]:
+    """Верхнеуровневые имена модулей и пакетов проекта (файлы *.py и каталоги в корне)."""
+    names = set()
+    for entry in os.listdir(ROOT):
+        if entry.startswith((".", "__")):
+            continue
+        if entry.endswith(".py"):
+            names.add(entry[:-3])
+        elif os.path.isdir(os.path.join(ROOT, entry)):
+            names.add(entry)
+    return names
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(имя, self мкс, cumulative мкс, глубина вложенности) для каждой строки ``import time:``.
+
+    importtime печатает модуль после всех, кого он импортировал, с отступом на два пробела
+    меньше — так восстанавливается, кто кого загрузил (см. importer_of).
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cum_us = int(parts[0].strip()), int(parts[1].strip())
+        except ValueError:
+            continue           # заголовок «self [us] | cumulative | imported package»
+        raw = parts[2].rstrip()
+        name = raw.lstrip()
+        rows.append((name, self_us, cum_us, (len(raw) - len(name) - 1) // 2))
+    return rows
+
+
+def importer_of(rows: List[Tuple[str, int, int, int]], index: int) -> Optional[str]:
+    """Модуль, при импорте которого загрузилась строка index: ближайшая следующая с меньшей глубиной."""
+    depth = rows[index][3]
+    for name, _self_us, _cum_us, d in rows[index + 1:]:
+        if d < depth:
+            return name
+    return None
+
+
+def run_once(module: str) -> List[Tuple[str, int, int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(ln for ln in proc.stderr.splitlines() if not ln.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"import {module} завершился с кодом {proc.returncode}:\n{tail}")
+    return parse_importtime(proc.stderr)
+
+
+def main() -> int:
+    modules = _positional() or ["bot"]
+    budget_ms = float(_arg("--budget-ms", os.getenv("STARTUP_BUDGET_MS", "1500")))
+    top = int(_arg("--top", "10"))
+    runs = max(1, int(os.getenv("BENCH_RUNS", "3")))
+    failed = False
+    project = _project_modules()
+    for module in modules:
+        best: List[Tuple[str, int, int, int]] = []
+        best_total = None
+        for _ in range(runs):
+            try:
+                rows = run_once(module)
+            except Exception as e:
+                print(f"{module}: {e}")
+                return 1
+            total = sum(r[1] for r in rows)
+            if best_total is None or total < best_total:
+                best, best_total = rows, total
+        total_ms = (best_total or 0) / 1000.0
+        print(f"import {module}: {total_ms:.1f} ms (min из {runs}), модулей {len(best)}, бюджет {budget_ms:.0f} ms")
+        print(f"  {'cumulative ms':>13} {'self ms':>8}  module")
+        for name, self_us, cum_us, _depth in sorted(best, key=lambda r: r[2], reverse=True)[:top]:
+            print(f"  {cum_us / 1000.0:>13.1f} {self_us / 1000.0:>8.1f}  {name}")
+        loaded: Dict[str, Tuple[int, Optional[str]]] = {}
+        for i, (name, _self_us, cum_us, _depth) in enumerate(best):
+            if name in DEFERRED:
+                loaded[name] = (cum_us, importer_of(best, i))
+        for name, (cum_us, importer) in loaded.items():
+            by = importer or module
+            if by.split(".")[0] in project:
+                print(f"  ✗ {name} импортируется при старте из {by} ({cum_us / 1000.0:.1f} ms) — должен быть ленивым")
+                failed = True
+            else:
+                print(f"  · {name} загружен сторонним {by} ({cum_us / 1000.0:.1f} ms) — не из кода проекта")
+        if total_ms > budget_ms:
+            print(f"  ✗ превышен бюджет: {total_ms:.1f} > {budget_ms:.0f} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
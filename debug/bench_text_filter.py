@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк text_filter.clean_copied_text: прежняя реализация (копия ниже) против предкомпилированной.
+
+Генерирует синтетические расшифровки панели 1 КБ – 5 МБ (код, текст, UI‑шум, даты, эхо запроса,
+фразы‑отказы, кириллица), проверяет побайтовое совпадение результатов и печатает время.
+
+Запуск:
+  python debug/bench_text_filter.py
+  BENCH_SIZES=1k,64k,1m python debug/bench_text_filter.py
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import text_filter  # noqa: E402
+from text_filter import extract_answer_by_prompt  # noqa: E402
+
+SIZES = os.getenv("BENCH_SIZES", "1k,16k,256k,1m,5m")
+PROMPT = "Почему падает сборка? Проверь функцию parse_config в core/config.py и предложи исправление"
+
+
+def legacy_clean_copied_text(prompt: str, text: str, echo_prefix_len: int = 24) -> str:
+    """Реализация clean_copied_text до оптимизации (эталон для сравнения)."""
+    try:
+        s = extract_answer_by_prompt(prompt, text or "", echo_prefix_len)
+
+        def _norm(s_: str) -> str:
+            s_ = (s_ or "").lower()
+            s_ = re.sub(r"[\s\t\n]+", " ", s_)
+            s_ = re.sub(r"['`“”«»()\[\]{}:;,.!?~|\/+\-]", " ", s_)
+            s_ = re.sub(r"\s+", " ", s_).strip()
+            return s_
+
+        def _tokens(s_: str) -> list[str]:
+            s_ = _norm(s_)
+            toks = re.split(r"[^a-zа-я0-9]+", s_)
+            return [t for t in toks if len(t) > 2]
+
+        prompt_norm = _norm(prompt or "")
+        prompt_tokens = set(_tokens(prompt or ""))
+
+        lines = (s or "").splitlines()
+        month_re = re.compile(
+            r"^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{1,2}:\d{2}\s+(AM|PM)$"
+        )
+        noise_substrings = [
+            "feedback submitted", "feedback", "submitted",
+            "a fews ago", "a few sec ago", "a few mins ago", " ago",
+            "edited", "copied",
+            "сохраненные кар", "сохраненные изоб", "сохранённые кар", "сохранённые изоб",
+        ]
+        refusal_phrases = [
+            "выходит за рамки моей компетенции",
+            "я здесь, чтобы помочь с кодом",
+            "this is outside the scope",
+            "i'm here to help with code",
+        ]
+        cleaned: list[str] = []
+        for ln in lines:
+            raw_ln = ln
+            low = raw_ln.strip().lower()
+            if not low:
+                cleaned.append("")
+                continue
+            if any(ns in low for ns in noise_substrings):
+                continue
+            if month_re.match(raw_ln.strip()):
+                continue
+            if low.startswith("feedback") or low.startswith("submitted"):
+                continue
+            ln_norm = _norm(raw_ln)
+            if prompt_tokens:
+                ln_tokens = set(_tokens(raw_ln))
+                if ln_tokens:
+                    inter = len(ln_tokens & prompt_tokens)
+                    union = len(ln_tokens | prompt_tokens)
+                    jacc = (inter / union) if union else 0.0
+                    if jacc >= 0.6 and (len(ln_norm) >= 20 or inter >= 4):
+                        continue
+            if len(ln_norm) >= 20 and (ln_norm in prompt_norm or prompt_norm in ln_norm):
+                continue
+            if any(p in low for p in refusal_phrases):
+                continue
+            cleaned.append(raw_ln)
+        out_lines: list[str] = []
+        prev_empty = True
+        for ln in cleaned:
+            is_empty = (ln.strip() == "")
+            if is_empty and prev_empty:
+                continue
+            out_lines.append(ln)
+            prev_empty = is_empty
+        return "\n".join(out_lines).strip()
+    except Exception:
+        return (text or "").strip()
+
+
+_LINES = [
+    "def parse_config(path: str) -> dict:",
+    "    with open(path, 'r', encoding='utf-8') as f:",
+    "        return json.load(f)  # TODO: validate [schema] {keys}",
+    "Сборка падает, потому что parse_config читает файл до load_dotenv().",
+    "The build fails because the config is read before the environment is loaded.",
+    "Проверь функцию parse_config в core/config.py",
+    "Feedback submitted",
+    "a few sec ago",
+    "Edited core/config.py",
+    "Copied!",
+    "Oct 12, 9:41 PM",
+    "This is outside the scope of what I can help with.",
+    "Сохранённые картинки",
+    "  - step 1: move load_dotenv() above parse_config()  ",
+    "«Цитата» — “quoted” text; with punctuation!? ~ | / + -",
+    "\tindented\twith\ttabs",
+    "",
+    "",
+    "ё и Ё не входят в диапазон а-я: ёлка, ЁЖ",
+]
+
+
+def make_transcript(size: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    parts = ["header noise", PROMPT]
+    n = 0
+    while n < size:
+        ln = rnd.choice(_LINES)
+        if rnd.random() < 0.2:
+            ln = ln + " " + str(rnd.randrange(10 ** 6))
+        parts.append(ln)
+        n += len(ln) + 1
+    return "\n".join(parts)
+
+
+def _parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1024, "m": 1024 * 1024}.get(s[-1:], 1)
+    return int(float(s.rstrip("km")) * mult)
+
+
+def _time(fn, *args, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(*args)
+    return (time.perf_counter() - t0) / rounds
+
+
+def main():
+    for raw in SIZES.split(","):
+        size = _parse_size(raw)
+        text = make_transcript(size)
+        new = text_filter.clean_copied_text(PROMPT, text)
+        old = legacy_clean_copied_text(PROMPT, text)
+        assert new == old, f"output mismatch at size={raw}"
+        rounds = max(1, min(50, (256 * 1024) // max(1, size)))
+        t_old = _time(legacy_clean_copied_text, PROMPT, text, rounds=rounds)
+        t_new = _time(text_filter.clean_copied_text, PROMPT, text, rounds=rounds)
+        print(f"{raw:>5s} ({len(text):>8d} chars): legacy {t_old * 1000:9.2f} ms  compiled {t_new * 1000:9.2f} ms"
+              f"  speedup={t_old / t_new:5.2f}x  identical=yes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк кэша окон MacWindowManager на заглушке _osascript (работает без macOS).
+
+Сценарий одного запроса: фокус окна по подстроке заголовка, затем несколько чтений
+get_front_window_bounds()/get_front_window_title(), как при отправке и копировании ответа.
+Сравниваются три режима:
+  legacy   — два вызова osascript на границы (position + size), без кэша;
+  combined — один совмещённый запрос на все окна, без кэша (TTL=0);
+  cached   — совмещённый запрос + TTL-кэш.
+
+Переменные окружения:
+  BENCH_OSASCRIPT_MS — имитируемая задержка одного osascript (по умолчанию 80 мс)
+  BENCH_ROUNDS       — число запросов (по умолчанию 20)
+  BENCH_BOUNDS_READS — чтений границ на запрос (по умолчанию 5)
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import mac_window_manager  # noqa: E402
+from mac_window_manager import MacWindowManager  # noqa: E402
+
+LATENCY = float(os.getenv("BENCH_OSASCRIPT_MS", "80")) / 1000.0
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+READS = int(os.getenv("BENCH_BOUNDS_READS", "5"))
+
+WINDOWS = [("api — main.py", 0, 25, 1440, 875), ("web — App.tsx", 1440, 25, 1440, 875)]
+
+
+class StubManager(MacWindowManager):
+    """Заглушка: отвечает на скрипты фиксированными данными и считает вызовы."""
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.calls = 0
+        self.order = list(WINDOWS)
+
+    def _osascript(self, script: str):
+        self.calls += 1
+        time.sleep(LATENCY)
+        out = ""
+        if "repeat with w in windows" in script and "position of w" in script:
+            out = "".join(f"{t}\t{x}\t{y}\t{w}\t{h}\n" for t, x, y, w, h in self.order)
+        elif "AXRaise" in script:
+            idx = int(script.rsplit(" ", 1)[-1]) - 1
+            self.order.insert(0, self.order.pop(idx))
+        elif "position of window 1" in script:
+            out = "%d, %d" % self.order[0][1:3]
+        elif "size of window 1" in script:
+            out = "%d, %d" % self.order[0][3:5]
+        elif "name of every window" in script or "name of windows" in script:
+            out = "{" + ", ".join(f'"{t}"' for t, *_ in self.order) + "}"
+        return subprocess.CompletedProcess(["osascript"], 0, out, "")
+
+
+def _legacy_bounds(mm: StubManager):
+    """Прежний путь: отдельные osascript на position и size."""
+    p = mm._osascript('tell application "System Events" to tell process "Windsurf" to get position of window 1')
+    s = mm._osascript('tell application "System Events" to tell process "Windsurf" to get size of window 1')
+    x, y = (int(v) for v in p.stdout.split(","))
+    w, h = (int(v) for v in s.stdout.split(","))
+    return x, y, w, h
+
+
+def run(mode: str):
+    ttl = 0.0 if mode != "cached" else 60.0
+    mm = StubManager(cache_ttl=ttl, titles_ttl=ttl)
+    t0 = time.perf_counter()
+    for i in range(ROUNDS):
+        target = WINDOWS[i % len(WINDOWS)][0].split(" ")[0]
+        mm.focus_by_title_substring(target)
+        for _ in range(READS):
+            b = _legacy_bounds(mm) if mode == "legacy" else mm.get_front_window_bounds()
+            assert b is not None and b[0] == dict((t.split(" ")[0], x) for t, x, *_ in WINDOWS)[target], (mode, b)
+        mm.get_front_window_title()
+    dt = time.perf_counter() - t0
+    return dt, mm.calls, mm.cache_info()
+
+
+def main():
+    mac_window_manager._HAVE_QUARTZ = False
+    print(f"osascript latency={LATENCY * 1000:.0f}ms rounds={ROUNDS} bounds_reads={READS}")
+    base = None
+    for mode in ("legacy", "combined", "cached"):
+        dt, calls, info = run(mode)
+        base = base or dt
+        print(f"{mode:9s} {dt * 1000 / ROUNDS:8.1f} ms/request  osascript={calls / ROUNDS:5.1f}/request"
+              f"  speedup={base / dt:5.1f}x  hits={info['hits']} misses={info['misses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка цепочки core.paste_verify на подменных AX/пикселях/буфере (без GUI и macOS).
+
+Проверяется, что select_all остаётся крайним случаем:
+  - дешёвая проверка подтвердила вставку — select_all не вызывается;
+  - AXValue не совпал (Electron отдаёт другой текст) — решает select_all;
+  - длина считается в UTF-16 (эмодзи — две единицы), несовпадение — решает select_all;
+  - короткий запрос почти не изменил пиксели поля — решает select_all;
+  - провал вставки (False) фиксирует только select_all.
+
+Запуск:
+  python debug/check_paste_verify.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.paste_verify import (  # noqa: E402
+    AXValueVerifier,
+    LengthProbeVerifier,
+    PasteVerifierChain,
+    PixelChangeVerifier,
+    SelectAllVerifier,
+)
+
+TIMEOUT = 0.05
+
+
+class _Frame:
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class _Session:
+    """Подмена ClipboardSession: copy_hotkey возвращает заданный «скопированный» текст."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    def copy_hotkey(self, keys=("command", "c"), timeout=None) -> str:
+        self.calls += 1
+        return self.text
+
+
+def _select_all(field_text: str):
+    session = _Session(field_text)
+    return SelectAllVerifier(settle=0.0, hotkey=lambda *keys: None, session=session), session
+
+
+def _pixel_verifier(changed_pixels: int) -> PixelChangeVerifier:
+    w, h = 320, 48
+    before = _Frame(bytes(3 * w * h))
+    after = _Frame(bytes([255] * 3 * changed_pixels) + bytes(3 * (w * h - changed_pixels)))
+    state = {"n": 0}
+
+    def _grab(region):
+        state["n"] += 1
+        return before if state["n"] == 1 else after
+
+    return PixelChangeVerifier((0, 0, w, h), grab=_grab)
+
+
+def _run(name: str, verifiers, expected: str, want, want_select_all_calls: int, session: _Session) -> bool:
+    chain = PasteVerifierChain(verifiers, timeout=TIMEOUT)
+    chain.before_paste(expected)
+    got = chain.verify(expected)
+    ok = got == want and session.calls == want_select_all_calls
+    print(f"{'OK ' if ok else 'FAIL'} {name} — {got}, select_all вызовов {session.calls}")
+    return ok
+
+
+def main() -> int:
+    ok = True
+
+    sa, session = _select_all("привет")
+    ok &= _run("AXValue совпал — select_all не нужен",
+               [AXValueVerifier(read_attr=lambda attr: "привет"), sa], "привет", (True, "ax"), 0, session)
+
+    sa, session = _select_all("привет")
+    ok &= _run("AXValue Electron без текста — решает select_all",
+               [AXValueVerifier(read_attr=lambda attr: "\u200b"), sa], "привет", (True, "select_all"), 1, session)
+
+    prompt = "смотри 😀😀😀😀 сюда"
+    sa, session = _select_all(prompt)
+    utf16 = len(prompt) + 4
+    ok &= _run("длина в UTF-16 с эмодзи совпала",
+               [LengthProbeVerifier(read_attr=lambda attr: utf16), sa], prompt, (True, "length"), 0, session)
+
+    sa, session = _select_all("ok")
+    ok &= _run("длина не совпала — решает select_all",
+               [LengthProbeVerifier(read_attr=lambda attr: 40), sa], "ok", (True, "select_all"), 1, session)
+
+    sa, session = _select_all("да")
+    ok &= _run("короткий запрос почти не меняет пиксели — решает select_all",
+               [_pixel_verifier(changed_pixels=20), sa], "да", (True, "select_all"), 1, session)
+
+    sa, session = _select_all("длинный запрос")
+    ok &= _run("пиксели поля изменились — select_all не нужен",
+               [_pixel_verifier(changed_pixels=2000), sa], "длинный запрос", (True, "pixel"), 0, session)
+
+    sa, session = _select_all("")
+    ok &= _run("вставка не удалась — False только от select_all",
+               [AXValueVerifier(read_attr=lambda attr: ""), LengthProbeVerifier(read_attr=lambda attr: 0),
+                _pixel_verifier(changed_pixels=0), sa], "запрос", (False, "select_all"), 1, session)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
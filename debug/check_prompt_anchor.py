@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Регрессия и бенчмарк якоря по эху промпта (text_filter.extract_answer_by_prompt).
+
+Корпус — debug/panels/*.json: {"prompt", "panel", "expect_start", "note"}; ответ, извлечённый
+из panel, должен начинаться с expect_start. Для сравнения печатается результат прежнего алгоритма
+(rfind полного промпта, затем префикса ECHO_PREFIX_LEN).
+
+Бенчмарк: панели 1 КБ – 5 МБ с переносами в эхе ближе к концу и без эха вовсе
+(худший случай — нормализованный и нечёткий поиск проходят весь текст).
+
+Запуск:
+  python debug/check_prompt_anchor.py           # регрессия + бенчмарк
+  python debug/check_prompt_anchor.py --no-bench
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from text_filter import ECHO_PREFIX_LEN_DEFAULT, extract_answer_by_prompt  # noqa: E402
+
+PANELS_DIR = os.path.join(os.path.dirname(__file__), "panels")
+SIZES = os.getenv("BENCH_SIZES", "1k,64k,1m,5m")
+
+
+def legacy_extract(prompt: str, text: str, echo_prefix_len: int = ECHO_PREFIX_LEN_DEFAULT) -> str:
+    """Прежний алгоритм: точный rfind промпта, затем rfind префикса."""
+    t = text or ""
+    p = (prompt or "").strip()
+    if p:
+        idx = t.rfind(p)
+        if idx >= 0:
+            return t[idx + len(p):].lstrip()
+        prefix = p[: min(echo_prefix_len, len(p))]
+        i2 = t.rfind(prefix)
+        if i2 >= 0:
+            return t[i2 + len(prefix):].lstrip()
+    return t
+
+
+def regression() -> bool:
+    ok_all = True
+    for path in sorted(glob.glob(os.path.join(PANELS_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            case = json.load(f)
+        got = extract_answer_by_prompt(case["prompt"], case["panel"])
+        old = legacy_extract(case["prompt"], case["panel"])
+        ok = got.startswith(case["expect_start"])
+        old_ok = old.startswith(case["expect_start"])
+        ok_all &= ok
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"{'OK  ' if ok else 'FAIL'} {name:32s} legacy={'ok' if old_ok else 'wrong'}  -> {got[:48]!r}")
+    return ok_all
+
+
+def _parse_size(s: str) -> int:
+    s = s.strip().lower()
+    return int(float(s.rstrip("km")) * {"k": 1024, "m": 1024 * 1024}.get(s[-1:], 1))
+
+
+def bench() -> None:
+    prompt = "Почему падает сборка? Проверь функцию parse_config в core/config.py и предложи исправление"
+    echo = "Почему падает\nсборка? Проверь функцию parse_config в core/config.py и\nпредложи исправление"
+    rnd = random.Random(3)
+    words = "def return self config load_dotenv сборка файл ответ модуль import print value".split()
+    for raw in SIZES.split(","):
+        size = _parse_size(raw)
+        body = " ".join(rnd.choice(words) for _ in range(size // 6))
+        panel = body[:size] + "\n" + echo + "\n\nОтвет."
+        rounds = max(1, min(20, (256 * 1024) // max(1, size)))
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            got = extract_answer_by_prompt(prompt, panel)
+        dt = (time.perf_counter() - t0) / rounds
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            legacy_extract(prompt, panel)
+        dt_old = (time.perf_counter() - t0) / rounds
+        assert got == "Ответ.", got[:80]
+        # Худший случай: эха нет, просматривается весь текст
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            extract_answer_by_prompt(prompt, body)
+        dt_miss = (time.perf_counter() - t0) / rounds
+        print(f"{raw:>4s} ({len(panel):>8d} chars): anchor {dt * 1000:8.2f} ms"
+              f"  no-echo scan {dt_miss * 1000:8.2f} ms ({len(body) / max(dt_miss, 1e-9) / 1e6:5.1f} Mchar/s)"
+              f"  legacy rfind {dt_old * 1000:7.2f} ms (wrong anchor)")
+
+
+def main():
+    ok = regression()
+    if "--no-bench" not in sys.argv[1:]:
+        bench()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка AIProcessor.summarize_async на локальной фейковой модели (без сети и ключа Gemini).
+
+Фейк — синхронный generate_content со sleep, как у настоящего клиента; считает вызовы и
+максимальное число одновременных запросов. Проверяется:
+  - event loop не блокируется, пока модель «думает»;
+  - одновременно не больше AI_MAX_CONCURRENCY запросов;
+  - повтор того же текста — из кэша (памяти и диска), одинаковые параллельные — один вызов;
+  - длинный текст — map-reduce: по запросу на часть + сведение;
+  - таймаут — усечённый исходный текст, без записи в кэш.
+
+Запуск:
+  python debug/check_summarize.py
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+CACHE_DIR = tempfile.mkdtemp(prefix="ai_cache_")
+os.environ.update({
+    "AI_MAX_CONCURRENCY": "2",
+    "AI_TIMEOUT_SECONDS": "1.0",
+    "AI_CHUNK_CHARS": "2000",
+    "AI_CACHE_DIR": CACHE_DIR,
+})
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ai_processor import AIProcessor  # noqa: E402
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    model_name = "fake-model"
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str) -> _Response:
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.active -= 1
+        return _Response(f"summary#{len(prompt)}")
+
+
+def _check(name: str, ok: bool, detail: str = "") -> bool:
+    print(f"{'OK ' if ok else 'FAIL'} {name}{(' — ' + detail) if detail else ''}")
+    return ok
+
+
+async def _ticker(stop: asyncio.Event, gaps: list) -> None:
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def run() -> bool:
+    ok = True
+    model = FakeModel(delay=0.1)
+    proc = AIProcessor(model=model)
+
+    stop, gaps = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, gaps))
+    texts = [f"ответ номер {i} " * 20 for i in range(6)]
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(proc.summarize_async(t) for t in texts))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    ok &= _check("все ответы суммаризированы", all(r.startswith("summary#") for r in results))
+    ok &= _check("не больше AI_MAX_CONCURRENCY одновременно", model.max_active <= 2,
+                 f"max={model.max_active}, {elapsed:.2f}s")
+    ok &= _check("event loop не блокируется", max(gaps) < 0.08, f"max gap {max(gaps) * 1000:.0f} ms")
+
+    calls = model.calls
+    again = await proc.summarize_async(texts[0])
+    ok &= _check("повтор — из кэша в памяти", again == results[0] and model.calls == calls)
+
+    fresh = AIProcessor(model=model)
+    from_disk = await fresh.summarize_async(texts[1])
+    ok &= _check("новый процесс — из кэша на диске",
+                 from_disk == results[1] and model.calls == calls and fresh.cache.disk_hits == 1)
+
+    calls = model.calls
+    same = await asyncio.gather(*(proc.summarize_async("одинаковый текст " * 30) for _ in range(5)))
+    ok &= _check("одинаковые параллельные запросы — один вызов",
+                 len(set(same)) == 1 and model.calls == calls + 1, f"coalesced={proc.coalesced}")
+
+    calls = model.calls
+    long_text = "\n\n".join(f"абзац {i}: " + "слово " * 60 for i in range(40))
+    summary = await proc.summarize_async(long_text)
+    n_calls = model.calls - calls
+    ok &= _check("длинный текст — map-reduce", summary.startswith("summary#") and n_calls >= 3,
+                 f"{len(long_text)} символов, вызовов {n_calls}")
+
+    slow = AIProcessor(model=FakeModel(delay=3.0))
+    t0 = time.perf_counter()
+    text = "медленная модель " * 50
+    res = await slow.summarize_async(text)
+    took = time.perf_counter() - t0
+    ok &= _check("таймаут — усечённый текст", res == text[:500] + "..." and took < 2.0,
+                 f"{took:.2f}s, timeouts={slow.timeouts}")
+    ok &= _check("таймаут не кэшируется", slow.cache.get(slow._cache_key(text)) is None)
+    print(f"stats: {proc.stats()}")
+    return ok
+
+
+def main() -> int:
+    try:
+        return 0 if asyncio.run(run()) else 1
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
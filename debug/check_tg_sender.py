@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка нарезки core.tg_sender.iter_chunks (без Telegram и сети).
+
+Для заданных и случайных текстов (эмодзи, длинные строки, блоки кода) проверяется:
+  - каждая часть не длиннее limit в единицах UTF-16;
+  - блок кода, разрезанный между частями, закрыт в каждой части (чётное число строк ```);
+  - склейка частей восстанавливает исходный текст: разрез по строке — через "\\n",
+    разрез длинной строки — без разделителя; добавленные закрывающие ``` и повторённые
+    заголовки блоков при этом отбрасываются.
+
+Запуск:
+  python debug/check_tg_sender.py
+  python debug/check_tg_sender.py --rounds 2000
+"""
+
+import os
+import random
+import sys
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.text_utils import utf16_len  # noqa: E402
+from core.tg_sender import FENCE, iter_chunks  # noqa: E402
+
+
+def _check(name: str, ok: bool, detail: str = "") -> bool:
+    print(f"{'OK ' if ok else 'FAIL'} {name}{(' — ' + detail) if detail else ''}")
+    return ok
+
+
+def _fences_balanced(chunk: str) -> bool:
+    return sum(1 for ln in chunk.split("\n") if ln.strip().startswith(FENCE)) % 2 == 0
+
+
+def rejoin(chunks: List[str], text: str) -> Optional[str]:
+    """Склейка частей, совпадающая с text, если она существует (перебор мест разреза)."""
+
+    def _variants(chunk: str, first: bool, last: bool):
+        heads = [chunk]
+        if not first and chunk.startswith(FENCE) and "\n" in chunk:
+            heads.append(chunk.split("\n", 1)[1])           # повторённый заголовок блока
+        for body in heads:
+            yield body
+            if not last and body.endswith("\n" + FENCE):
+                yield body[:-len(FENCE) - 1]                 # добавленный закрывающий ```
+
+    def _walk(i: int, built: str) -> Optional[str]:
+        if i == len(chunks):
+            return built if built.rstrip() == text.rstrip() else None
+        for body in _variants(chunks[i], i == 0, i == len(chunks) - 1):
+            for sep in (("",) if i == 0 else ("\n", "")):
+                cand = built + sep + body
+                if text.startswith(cand) or (i == len(chunks) - 1 and cand.rstrip() == text.rstrip()):
+                    found = _walk(i + 1, cand)
+                    if found is not None:
+                        return found
+        return None
+
+    return _walk(0, "")
+
+
+def check_text(text: str, limit: int) -> Optional[str]:
+    """None — всё в порядке, иначе описание нарушения."""
+    chunks = list(iter_chunks(text, limit))
+    for n, chunk in enumerate(chunks):
+        if utf16_len(chunk) > limit:
+            return f"часть {n}: {utf16_len(chunk)} > {limit} единиц UTF-16"
+    for n, chunk in enumerate(chunks[:-1]):
+        if not _fences_balanced(chunk):
+            return f"часть {n}: блок кода не закрыт"
+    if text.strip() and rejoin(chunks, text) is None:
+        return f"склейка {len(chunks)} частей не даёт исходный текст"
+    return None
+
+
+def _random_text(rng: random.Random) -> str:
+    words = ["слово", "word", "😀", "🚀🚀", "x" * 7, "👩‍💻", "tab\t", "ё"]
+    lines = []
+    for _ in range(rng.randint(1, 60)):
+        r = rng.random()
+        if r < 0.12:
+            lines.append(rng.choice(["```", "```python", "  ```", "```bash"]))
+        elif r < 0.2:
+            lines.append("")
+        elif r < 0.3:
+            lines.append(rng.choice(words) * rng.randint(20, 200))       # длиннее части
+        else:
+            lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 15))))
+    return "\n".join(lines)
+
+
+def main() -> int:
+    rounds = int(sys.argv[sys.argv.index("--rounds") + 1]) if "--rounds" in sys.argv[1:] else 500
+    ok = True
+
+    cases = [
+        ("заголовок блока на границе части", "😀" * 29 + "\n```\n```", 64),
+        ("длинная строка из эмодзи", "😀" * 300, 64),
+        ("длинная строка без разделителей", "a" * 1000, 100),
+        ("блок кода длиннее части", "```python\n" + "\n".join(f"print({i})" for i in range(200)) + "\n```", 128),
+        ("длинная строка внутри блока", "текст\n```\n" + "б" * 500 + "\n```\nконец", 64),
+        ("обычный абзац", "строка\n" * 50, 4096),
+    ]
+    for name, text, limit in cases:
+        err = check_text(text, limit)
+        ok &= _check(name, err is None, err or f"{len(list(iter_chunks(text, limit)))} частей")
+
+    rng = random.Random(42)
+    failures = []
+    for i in range(rounds):
+        text = _random_text(rng)
+        limit = rng.choice([64, 80, 128, 300, 4096])
+        err = check_text(text, limit)
+        if err is not None:
+            failures.append((i, limit, err))
+    ok &= _check(f"случайные тексты ({rounds})", not failures,
+                 f"первая ошибка: #{failures[0][0]} limit={failures[0][1]}: {failures[0][2]}" if failures else "")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
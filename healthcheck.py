@@ -2,9 +2,8 @@ import time
 import logging
 import platform
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+import core.config  # noqa: F401  — загружает .env
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger("healthcheck")
 
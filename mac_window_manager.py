@@ -1,7 +1,12 @@
 import logging
 import os
 import subprocess
-from typing import List, Optional, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.metrics import counters
+from core.script_worker import run_osascript
 
 # Quartz (CoreGraphics) как фоллбэк на случай, когда System Events не видит окна (например, полноэкранные/другие Spaces)
 try:
@@ -13,25 +18,190 @@ except Exception:
 logger = logging.getLogger(__name__)
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class WindowInfo:
+    """Снимок окна: порядковый номер в System Events (1 — переднее), заголовок, геометрия и ID.
+
+    System Events не отдаёт идентификатор окна, поэтому wid берётся из CGWindowList по заголовку
+    (если доступен Quartz); иначе ключом служит заголовок.
+    """
+
+    __slots__ = ("index", "title", "x", "y", "w", "h", "wid")
+
+    def __init__(self, index: int, title: str, x: int, y: int, w: int, h: int, wid: Optional[int] = None):
+        self.index = index
+        self.title = title
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.wid = wid
+
+    @property
+    def key(self) -> str:
+        return f"id:{self.wid}" if self.wid is not None else f"title:{self.title}"
+
+    @property
+    def bounds(self) -> Tuple[int, int, int, int]:
+        return self.x, self.y, self.w, self.h
+
+    def __repr__(self) -> str:
+        return f"WindowInfo(#{self.index} {self.title!r} {self.bounds} wid={self.wid})"
+
+
 class MacWindowManager:
     """Утилита для работы с окнами Windsurf на macOS через AppleScript/Accessibility.
     Требует включенный доступ в "Универсальный доступ" для терминала/процесса Python.
+
+    Геометрия и заголовки окон кэшируются на короткий TTL (WINDOW_CACHE_TTL_SECONDS,
+    WINDOW_TITLES_TTL_SECONDS). Фокус по индексу (AXRaise) переупорядочивает кэш на месте,
+    фокус через меню и явный invalidate() — сбрасывают его.
     """
 
+    def __init__(self, cache_ttl: Optional[float] = None, titles_ttl: Optional[float] = None):
+        self.cache_ttl = _env_float("WINDOW_CACHE_TTL_SECONDS", 1.0) if cache_ttl is None else float(cache_ttl)
+        self.titles_ttl = _env_float("WINDOW_TITLES_TTL_SECONDS", 5.0) if titles_ttl is None else float(titles_ttl)
+        self._cache_lock = threading.Lock()
+        self._windows: Optional[List[WindowInfo]] = None
+        self._windows_at = 0.0
+        self._titles: Optional[List[str]] = None
+        self._titles_at = 0.0
+        self.cache_hits: Dict[str, int] = {"windows": 0, "titles": 0}
+        self.cache_misses: Dict[str, int] = {"windows": 0, "titles": 0}
+
+    # === Кэш геометрии/заголовков ===
+
+    def invalidate(self) -> None:
+        """Сбросить кэш окон (после фокуса, перемещения, открытия проекта и т.п.)."""
+        with self._cache_lock:
+            self._windows = None
+            self._titles = None
+
+    def _note_raised(self, index_one_based: int) -> None:
+        """AXRaise переносит окно N на первое место: правим кэш на месте вместо полного сброса."""
+        i = index_one_based - 1
+        with self._cache_lock:
+            if self._titles is not None:
+                if 0 <= i < len(self._titles):
+                    self._titles.insert(0, self._titles.pop(i))
+                else:
+                    self._titles = None
+            if self._windows is not None:
+                if 0 <= i < len(self._windows):
+                    self._windows.insert(0, self._windows.pop(i))
+                    for n, wi in enumerate(self._windows, start=1):
+                        wi.index = n
+                else:
+                    self._windows = None
+
+    def cache_info(self) -> dict:
+        """Счётчики попаданий/промахов кэша для диагностики."""
+        return {
+            "hits": dict(self.cache_hits),
+            "misses": dict(self.cache_misses),
+            "ttl": self.cache_ttl,
+            "titles_ttl": self.titles_ttl,
+        }
+
+    def _query_windows(self) -> List[WindowInfo]:
+        """Один AppleScript на все окна процесса: заголовок, позиция и размер через табуляцию."""
+        app_name = os.getenv("WINDSURF_APP_NAME", "Windsurf").strip() or "Windsurf"
+        script = (
+            'tell application "System Events"\n'
+            f'  tell process "{app_name}"\n'
+            '    set out to ""\n'
+            '    repeat with w in windows\n'
+            '      try\n'
+            '        set nm to name of w\n'
+            '        set p to position of w\n'
+            '        set s to size of w\n'
+            '        set out to out & nm & tab & (item 1 of p) & tab & (item 2 of p) '
+            '& tab & (item 1 of s) & tab & (item 2 of s) & linefeed\n'
+            '      end try\n'
+            '    end repeat\n'
+            '    return out\n'
+            '  end tell\n'
+            'end tell'
+        )
+        res = self._osascript(script)
+        if res.returncode != 0:
+            return []
+        wins: List[WindowInfo] = []
+        out = (res.stdout or "").replace("\r\n", "\n").replace("\r", "\n")
+        for line in out.split("\n"):
+            parts = line.split("\t")
+            if len(parts) < 5:
+                continue
+            try:
+                x, y, w, h = (int(float(v)) for v in parts[-4:])
+            except Exception:
+                continue
+            title = "\t".join(parts[:-4]).strip()
+            wins.append(WindowInfo(len(wins) + 1, title, x, y, w, h))
+        if _HAVE_QUARTZ and wins:
+            try:
+                ids: Dict[str, int] = {}
+                for info in CGWindowListCopyWindowInfo(kCGWindowListOptionAll, kCGNullWindowID) or []:
+                    if (info.get('kCGWindowOwnerName') or '').strip() == app_name and info.get('kCGWindowName'):
+                        ids.setdefault(str(info.get('kCGWindowName')).strip(), int(info.get('kCGWindowNumber')))
+                for wi in wins:
+                    wi.wid = ids.get(wi.title)
+            except Exception:
+                pass
+        return wins
+
+    def windows(self, force: bool = False) -> List[WindowInfo]:
+        """Окна процесса (из кэша, если он свежее cache_ttl)."""
+        now = time.time()
+        with self._cache_lock:
+            if not force and self._windows is not None and now - self._windows_at < self.cache_ttl:
+                self.cache_hits["windows"] += 1
+                return list(self._windows)
+            self.cache_misses["windows"] += 1
+        wins = self._query_windows()
+        with self._cache_lock:
+            self._windows = wins
+            self._windows_at = time.time()
+        return list(wins)
+
+    def find_window(self, substr: str) -> Optional[WindowInfo]:
+        """Окно по подстроке заголовка (без фокуса) — например, чтобы узнать границы неактивного окна."""
+        sub = (substr or "").strip().lower()
+        for wi in self.windows():
+            if sub and sub in (wi.title or "").lower():
+                return wi
+        return None
+
     def _osascript(self, script: str) -> subprocess.CompletedProcess:
         """Выполнить osascript с таймаутом. Таймаут задаётся OSASCRIPT_TIMEOUT_SECONDS (по умолчанию 2.0s).
         При таймауте возвращаем CompletedProcess с returncode=124 и stderr='timeout'.
+        Скрипт выполняется в постоянном воркере core/script_worker.py (без fork и перекомпиляции).
         """
         try:
             t = float(os.getenv("OSASCRIPT_TIMEOUT_SECONDS", "2.0"))
         except Exception:
             t = 2.0
-        try:
-            return subprocess.run(["osascript", "-e", script], capture_output=True, text=True, check=False, timeout=max(0.2, t))
-        except subprocess.TimeoutExpired:
-            return subprocess.CompletedProcess(args=["osascript", "-e", script], returncode=124, stdout="", stderr="timeout")
+        # Через долгоживущий воркер (OSASCRIPT_WORKER=1), иначе — отдельный osascript
+        return run_osascript(script, timeout=max(0.2, t))
 
     def list_window_titles(self) -> List[str]:
+        """Заголовки окон Windsurf (все стратегии), с кэшем на titles_ttl."""
+        now = time.time()
+        with self._cache_lock:
+            if self._titles is not None and now - self._titles_at < self.titles_ttl:
+                self.cache_hits["titles"] += 1
+                return list(self._titles)
+            self.cache_misses["titles"] += 1
+        titles = self._list_window_titles_uncached()
+        with self._cache_lock:
+            self._titles = list(titles)
+            self._titles_at = time.time()
+        return titles
+
+    def _list_window_titles_uncached(self) -> List[str]:
         app_name = os.getenv("WINDSURF_APP_NAME", "Windsurf").strip() or "Windsurf"
         proc_match = os.getenv("WINDSURF_PROCESS_MATCH", app_name).strip() or app_name
         alt_names = [s.strip() for s in (os.getenv("WINDSURF_ALT_PROCESS_NAMES", "Windsurf Helper,Windsurf Helper (Renderer)").split(",")) if s.strip() and s.strip().lower() != "electron"]
@@ -149,6 +319,7 @@ class MacWindowManager:
 
         # 5) PID-based фоллбэк, ограниченный только на процессы, содержащие 'windsurf'
         try:
+            counters().inc("subprocess_spawns", cmd="ps")
             ps = subprocess.run(["ps", "-axo", "pid,command"], capture_output=True, text=True, check=False)
             if ps.returncode == 0:
                 lines = (ps.stdout or "").splitlines()
@@ -329,6 +500,7 @@ class MacWindowManager:
 
         # Strategy 5: PID-based limited to 'windsurf' in command line
         try:
+            counters().inc("subprocess_spawns", cmd="ps")
             ps = subprocess.run(["ps", "-axo", "pid,command"], capture_output=True, text=True, check=False)
             if ps.returncode == 0:
                 lines = (ps.stdout or "").splitlines()
@@ -398,6 +570,10 @@ class MacWindowManager:
                 f'tell application "System Events" to tell process "Windsurf" to perform action "AXRaise" of window {index_one_based}'
             )
             res = self._osascript(script)
+            if res.returncode == 0:
+                self._note_raised(index_one_based)
+            else:
+                self.invalidate()
             return res.returncode == 0
         except Exception:
             return False
@@ -460,6 +636,7 @@ class MacWindowManager:
                 'return "fail"'
             )
             res = self._osascript(script)
+            self.invalidate()
             return res.returncode == 0 and (res.stdout or "").strip().lower().startswith("ok")
         except Exception:
             return False
@@ -470,27 +647,10 @@ class MacWindowManager:
         return res.returncode == 0 and res.stdout.strip().lower() in ("true", "yes")
 
     def get_front_window_bounds(self) -> Optional[Tuple[int, int, int, int]]:
-        """Возвращает (x, y, w, h) активного окна Windsurf. None при ошибке."""
+        """Возвращает (x, y, w, h) активного окна Windsurf (window 1). None при ошибке."""
         try:
-            pos = self._osascript('tell application "System Events" to tell process "Windsurf" to get position of window 1')
-            size = self._osascript('tell application "System Events" to tell process "Windsurf" to get size of window 1')
-            if pos.returncode != 0 or size.returncode != 0:
-                return None
-            # Ответ вида: "{x, y}" и "{w, h}" или "x, y" без скобок
-            def _parse_pair(s: str):
-                s = (s or "").strip().strip("{}").strip()
-                parts = [p.strip() for p in s.split(",")]
-                if len(parts) != 2:
-                    return None
-                try:
-                    return int(float(parts[0])), int(float(parts[1]))
-                except Exception:
-                    return None
-            xy = _parse_pair(pos.stdout)
-            wh = _parse_pair(size.stdout)
-            if not xy or not wh:
-                return None
-            return xy[0], xy[1], wh[0], wh[1]
+            wins = self.windows()
+            return wins[0].bounds if wins else None
         except Exception as e:
             logger.debug(f"get_front_window_bounds failed: {e}")
             return None
@@ -498,9 +658,9 @@ class MacWindowManager:
     def get_front_window_title(self) -> Optional[str]:
         """Возвращает заголовок активного окна Windsurf. None при ошибке."""
         try:
-            res = self._osascript('tell application "System Events" to tell process "Windsurf" to get name of window 1')
-            if res.returncode == 0:
-                return (res.stdout or "").strip().strip('"')
+            wins = self.windows()
+            if wins:
+                return wins[0].title
         except Exception as e:
             logger.debug(f"get_front_window_title failed: {e}")
         return None
@@ -1,10 +1,12 @@
 import os
-import time
 import logging
 from typing import Tuple
 
-import pyautogui
-import pyperclip
+from core import timing
+from core.clipboard import ClipboardSession
+from core.lazy import lazy_module
+
+pyautogui = lazy_module("pyautogui")  # импорт при первом действии мышью
 
 # Этот модуль намеренно читает параметры из os.getenv, чтобы не создавать циклических импортов.
 
@@ -19,10 +21,8 @@ def _env_int(name: str, default: int) -> int:
 logger = logging.getLogger(__name__)
 
 
-def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple[int, int, int, int]]:
-    """Копирует текст из правой панели ответа Windsurf с помощью протяжки и автоскролла.
-    Возвращает (скопированный_текст, регион_анализа_rx_ry_rw_rh).
-    """
+def answer_panel_region(bounds: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """Регион правой панели ответа (rx, ry, rw, rh) по границам окна с учётом VISUAL_REGION_TOP/BOTTOM."""
     x, y, w, h = bounds
     VISUAL_REGION_TOP = _env_int("VISUAL_REGION_TOP", 100)
     VISUAL_REGION_BOTTOM = _env_int("VISUAL_REGION_BOTTOM", 150)
@@ -31,6 +31,14 @@ def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple
     ry = max(0, y + max(0, VISUAL_REGION_TOP))
     rw = max(16, int(w / 3) - 16)
     rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
+    return rx, ry, rw, rh
+
+
+def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple[int, int, int, int]]:
+    """Копирует текст из правой панели ответа Windsurf с помощью протяжки и автоскролла.
+    Возвращает (скопированный_текст, регион_анализа_rx_ry_rw_rh).
+    """
+    rx, ry, rw, rh = answer_panel_region(bounds)
 
     # Якорь: только ANSWER_ABS_X/Y; если не заданы — используем точку в правом нижнем секторе панели
     try:
@@ -55,7 +63,7 @@ def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple
         if copy_click_x > 0 and copy_click_y > 0:
             logger.info(f"[Copy] Вспомогательный клик перед копированием в ({copy_click_x},{copy_click_y})")
             pyautogui.click(copy_click_x, copy_click_y)
-            time.sleep(0.3)  # Даем время на реакцию UI
+            timing.delay("copy_click_settle")  # Даем время на реакцию UI
     except Exception as e:
         logger.debug(f"[Copy] Вспомогательный клик пропущен: {e}")
     
@@ -78,11 +86,11 @@ def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple
         try:
             pyautogui.moveTo(drag_sx, drag_sy)
             pyautogui.mouseDown(drag_sx, drag_sy)
-            time.sleep(0.05)
+            timing.delay("drag_press")
             pyautogui.moveTo(drag_ex, drag_ey, duration=0.25)
-            time.sleep(max(0.1, drag_hold))  # удержание
+            timing.delay("drag_hold", max(0.1, drag_hold))  # удержание (COPY_DRAG_HOLD_SECONDS)
             pyautogui.mouseUp(drag_ex, drag_ey)
-            time.sleep(0.2)
+            timing.delay("drag_release")
         except Exception as e:
             logger.debug(f"[Copy] Явная протяжка не удалась: {e}\n[Copy] Пробую fallback с автоскроллом")
             drag_sx = drag_sy = drag_ex = drag_ey = 0
@@ -91,17 +99,17 @@ def copy_from_right_panel(bounds: Tuple[int, int, int, int]) -> Tuple[str, Tuple
         # 2) Fallback: Протяжка и автоскролл в рамках правой панели
         pyautogui.moveTo(start_x, start_y)
         pyautogui.mouseDown(start_x, start_y)
-        time.sleep(0.05)
+        timing.delay("drag_press")
         pyautogui.moveTo(rx + 12, ry + 12, duration=0.2)
         for _ in range(10):
             pyautogui.scroll(500)
-            time.sleep(0.04)
+            timing.delay("scroll_step")
         pyautogui.mouseUp(rx + 12, ry + 12)
-        time.sleep(0.1)
+        timing.delay("drag_settle")
 
-    # Копирование с логированием
-    pyautogui.hotkey('command', 'c')
-    time.sleep(0.3)  # Увеличена задержка для надежности
-    text = (pyperclip.paste() or "").strip()
+    # Копирование с логированием: ждём смены буфера вместо фиксированной паузы;
+    # текст возвращается вызывающему, а буфер пользователя восстанавливается (CLIPBOARD_RESTORE)
+    with ClipboardSession() as cb:
+        text = cb.copy_hotkey(('command', 'c')).strip()
     logger.info(f"[Copy] Скопировано {len(text)} символов")
     return text, (rx, ry, rw, rh)
@@ -1,54 +1,54 @@
 import asyncio
+import io
 import logging
 import os
-from typing import Optional, List
+import tempfile
+from typing import Optional
 
-from dotenv import load_dotenv
 from telethon import TelegramClient, events
 
 from windsurf_controller import desktop_controller
-from ai_processor import ai_processor
+from ai_processor import ai_processor, format_models_catalog
+from core.metrics import format_percentiles, metrics
+from core.openmetrics import start_metrics_server
+from core.tg_sender import format_sender_stats, tg_sender
+from core.tracing import format_trace, get_tracer
 
 
-load_dotenv()
-
 # Логирование
 _LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, _LOG_LEVEL, logging.INFO))
 logger = logging.getLogger("telethon_bot")
 
 
-def _chunk_text(text: str, max_len: int = 4096) -> List[str]:
-    chunks: List[str] = []
-    remaining = text or ""
-    while remaining:
-        if len(remaining) <= max_len:
-            chunks.append(remaining)
-            break
-        split_at = remaining.rfind("\n", 0, max_len)
-        if split_at == -1:
-            split_at = max_len
-        chunks.append(remaining[:split_at])
-        remaining = remaining[split_at:]
-    return chunks
-
-
 async def send_chunks(event: events.NewMessage.Event, text: str):
+    """Отправка через core.tg_sender: части до 4096 (UTF-16), темп по чату, flood-wait; очень длинные — файлом."""
     if not text:
         return
-    chunks = _chunk_text(text)
-    logger.info(f"[send_chunks] sending {len(chunks)} chunk(s), total_len={len(text)}")
-    for i, chunk in enumerate(chunks):
-        logger.debug(f"[send_chunks] chunk {i+1}/{len(chunks)} len={len(chunk)}")
+    logger.info(f"[send_chunks] total_len={len(text)}")
+
+    async def _send(chunk: str, i: int):
+        logger.debug(f"[send_chunks] chunk {i+1} len={len(chunk)}")
         await event.respond(chunk)
 
+    async def _send_document(data: bytes, filename: str, caption: str):
+        f = io.BytesIO(data)
+        f.name = filename
+        await event.respond(caption, file=f)
+
+    await tg_sender().send_text(event.chat_id, text, _send, _send_document,
+                                retry_on=(ConnectionError, asyncio.TimeoutError))
+
 
 def _status_text() -> str:
     diag = desktop_controller.get_diagnostics()
+    m = diag.get('metrics') or {}
+    wcache = diag.get('window_cache') or {}
     lines = [
         "📊 Статус системы:",
         f"Платформа: {diag.get('platform')}",
         f"Windsurf процессов: {len(diag.get('windsurf_pids', []))} — {diag.get('windsurf_pids')}",
+        f"Сэмплер процессов: {diag.get('process_sampler')}",
         f"Windows automation: {'✅' if diag.get('windows_automation') else '❌'}",
         f"Успешных отправок: {diag.get('success_sends')}",
         f"Неуспешных отправок: {diag.get('failed_sends')}",
@@ -66,9 +66,22 @@ def _status_text() -> str:
         f"last_visual_region: {diag.get('last_visual_region')}",
         f"last_click_xy: {diag.get('last_click_xy')}",
         f"last_ready_pixel: {diag.get('last_ready_pixel')}",
+        f"ready_probe_count: {diag.get('ready_probe_count')} (wasted: {diag.get('ready_wasted_probes')})",
         f"last_model_set: {diag.get('last_model_set')}",
         f"cpu_quiet_seconds: {diag.get('cpu_quiet_seconds')}",
         f"cpu_last_total_percent: {diag.get('cpu_last_total_percent')}",
+        f"Очередь UI: {diag.get('ui_queue')}",
+        f"Пропускная способность: {(diag.get('ui_queue') or {}).get('requests_per_hour')} запросов/час",
+        f"Кэш окон (hit/miss): {wcache.get('hits')} / {wcache.get('misses')}",
+        f"AppleScript-воркер: {diag.get('script_worker')}",
+        f"Извлечение ответа: {diag.get('extraction')}",
+        f"Буфер обмена (мс по операциям): {diag.get('clipboard')}",
+        f"Паузы запроса: {diag.get('last_sleep')}",
+        f"p50/p95/p99 за ≈1ч: {format_percentiles(m.get('last_hour'))}",
+        f"p50/p95/p99 за {(m.get('store') or {}).get('retention_hours')}ч: {format_percentiles(m.get('window'))}",
+        f"Готовность по окнам, с: {format_percentiles(m.get('ready_by_window'))}",
+        f"Готовность по моделям, с: {format_percentiles(m.get('ready_by_model'))}",
+        format_sender_stats(tg_sender().stats(), metrics().percentiles("tg_delivery_seconds", window_seconds=3600)),
         "",
         "Параметры:",
         f"RESPONSE_WAIT_SECONDS={diag.get('RESPONSE_WAIT_SECONDS')}",
@@ -108,6 +121,7 @@ def _status_text() -> str:
         "",
         "AI:",
         f"Gemini модель: {ai_processor.get_model_name() or '—'}",
+        format_models_catalog(ai_processor.models_stats()),
     ]
     return "\n".join(lines)
 
@@ -121,6 +135,7 @@ async def handle_start(event: events.NewMessage.Event):
         "/model — управление моделью API (list/set/current)\n"
         "/wsmodel set [#N|@sub] <name> — переключить модель в UI Windsurf (Cmd+/ → ввести → Enter)\n"
         "/whoami — показать ваш Telegram user_id\n"
+        "/trace [N|export] — разбивка времени последних запросов по фазам\n"
         "/windows — список окон Windsurf (macOS)\n\n"
         "Просто напишите сообщение, чтобы отправить его в Windsurf!"
     )
@@ -232,7 +247,9 @@ async def handle_wsmodel(event: events.NewMessage.Event):
     if not name:
         await event.respond("Пустое имя модели")
         return
-    ok, msg = desktop_controller.set_model_ui(name, target or "active")
+    ok, msg = await desktop_controller.ui.run(
+        desktop_controller.set_model_ui, name, target or "active", label="wsmodel",
+    )
     prefix = "✅" if ok else "❌"
     await event.respond(f"{prefix} {msg}")
 
@@ -250,6 +267,38 @@ async def handle_whoami(event: events.NewMessage.Event):
     await event.respond(f"Ваш user_id: {uid}\nusername: @{uname}")
 
 
+async def handle_trace(event: events.NewMessage.Event):
+    """/trace [N] — дерево фаз последних N запросов; /trace export — буфер трасс файлом JSON lines."""
+    logger.info("Handling /trace")
+    parts = (event.raw_text or "").split()
+    arg = parts[1].strip().lower() if len(parts) > 1 else ""
+    tracer = get_tracer()
+    if arg == "export":
+        if not tracer.recent(tracer.capacity):
+            await event.respond("Трасс пока нет")
+            return
+        fd, path = tempfile.mkstemp(prefix="traces_", suffix=".jsonl")
+        os.close(fd)
+        try:
+            n = tracer.dump_jsonl(path)
+            await event.respond(f"Трасс: {n}", file=path)
+        finally:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+        return
+    try:
+        n = max(1, min(20, int(arg))) if arg else 3
+    except ValueError:
+        n = 3
+    items = tracer.recent(n)
+    if not items:
+        await event.respond("Трасс пока нет — отправьте запрос в Windsurf")
+        return
+    await send_chunks(event, "\n\n".join(format_trace(d) for d in items))
+
+
 async def main_async():
     api_id = int(os.getenv("TELEGRAM_API_ID", "0"))
     api_hash = os.getenv("TELEGRAM_API_HASH")
@@ -278,6 +327,7 @@ async def main_async():
     client.add_event_handler(handle_model, events.NewMessage(pattern=r"^/model(?:\b.*)?$"))
     client.add_event_handler(handle_wsmodel, events.NewMessage(pattern=r"^/wsmodel(?:\b.*)?$"))
     client.add_event_handler(handle_whoami, events.NewMessage(pattern=r"^/whoami(?:@\w+)?$"))
+    client.add_event_handler(handle_trace, events.NewMessage(pattern=r"^/trace(?:@\w+)?(?:\s.*)?$"))
 
     logger.info("Telethon бот запущен. Ожидаю команды…")
 
@@ -295,7 +345,13 @@ async def main_async():
             await client.disconnect()
         asyncio.create_task(_stopper())
 
-    await client.run_until_disconnected()
+    # Опциональный /metrics для Prometheus (METRICS_HTTP_PORT) в этом же event loop
+    metrics_server = await start_metrics_server(lambda: desktop_controller.export_openmetrics())
+    try:
+        await client.run_until_disconnected()
+    finally:
+        if metrics_server is not None:
+            await metrics_server.close()
 
 
 if __name__ == "__main__":
@@ -1,12 +1,210 @@
+import functools
 import re
 from typing import Optional
 
 ECHO_PREFIX_LEN_DEFAULT = 24
 
+# Предкомпилированные шаблоны фильтра (раньше собирались на каждый вызов/строку)
+_MONTH_RE = re.compile(r"^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{1,2}:\d{2}\s+(AM|PM)$")
+_NOISE_SUBSTRINGS = (
+    "feedback submitted", "feedback", "submitted",
+    "a fews ago", "a few sec ago", "a few mins ago", " ago",
+    "edited", "copied",
+    # русские UI‑метки
+    "сохраненные кар", "сохраненные изоб", "сохранённые кар", "сохранённые изоб",
+)
+_REFUSAL_PHRASES = (
+    # частые boilerplate‑фразы отказа/редиректа
+    "выходит за рамки моей компетенции",
+    "я здесь, чтобы помочь с кодом",
+    "this is outside the scope",
+    "i'm here to help with code",
+)
+# Одна альтернация вместо линейного перебора подстрок на каждой строке
+_NOISE_RE = re.compile("|".join(re.escape(s) for s in _NOISE_SUBSTRINGS))
+_REFUSAL_RE = re.compile("|".join(re.escape(s) for s in _REFUSAL_PHRASES))
+# Пунктуация, заменяемая пробелом при нормализации (тот же набор, что был в регулярке _norm)
+_PUNCT_TABLE = str.maketrans({c: " " for c in "!'()+,-./:;?[]`{|}~«»“”"})
+_TOKEN_SPLIT_RE = re.compile(r"[^a-zа-я0-9]+")
+
+
+def _norm(s: str) -> str:
+    """Нижний регистр, пунктуация -> пробел, схлопывание пробелов (один проход)."""
+    return " ".join((s or "").lower().translate(_PUNCT_TABLE).split())
+
+
+def _tokens_of_norm(norm: str) -> list[str]:
+    """Токены длиннее 2 символов из уже нормализованной строки."""
+    return [t for t in _TOKEN_SPLIT_RE.split(norm) if len(t) > 2]
+
+
+_WORD_RE = re.compile(r"\w+")
+# Окно шинглов для нечёткого поиска эха (в словах) и доля шинглов промпта, которую должен покрыть кластер
+_SHINGLE_WORDS = 4
+_FUZZY_MIN_COVERAGE = 0.6
+# Участки эха дальше друг от друга (в символах) считаются разными кластерами
+_CLUSTER_GAP_CHARS = 40
+# Эхо обычно ближе к концу панели: сначала ищем в хвосте такого размера, затем в 4 раза больше и т.д.
+_TAIL_CHUNK = 64 * 1024
+_HASH_MOD = (1 << 61) - 1
+_HASH_BASE = 1_000_003
+
+
+def _word_spans(s: str, pos: int = 0) -> tuple[list[str], list[tuple[int, int]]]:
+    """Нормализованные слова (нижний регистр, без пробелов/пунктуации) начиная с pos и их смещения в s."""
+    words: list[str] = []
+    spans: list[tuple[int, int]] = []
+    for m in _WORD_RE.finditer(s, pos):
+        words.append(m.group().lower())
+        spans.append(m.span())
+    return words, spans
+
+
+def _window_hashes(ids: list[int], k: int):
+    """Полиномиальный rolling hash всех окон длины k: (начало окна, хеш), O(n)."""
+    if k <= 0 or len(ids) < k:
+        return
+    top = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    h = 0
+    for i in range(k):
+        h = (h * _HASH_BASE + ids[i]) % _HASH_MOD
+    yield 0, h
+    for i in range(k, len(ids)):
+        h = ((h - ids[i - k] * top) * _HASH_BASE + ids[i]) % _HASH_MOD
+        yield i - k + 1, h
+
+
+@functools.lru_cache(maxsize=32)
+def _prompt_patterns(words: tuple[str, ...]) -> tuple["re.Pattern", "re.Pattern"]:
+    """Регулярки для промпта (сканирование текста идёт в C, а не в цикле Python):
+    seq — вся последовательность слов через любые не-словесные символы;
+    runs — участки из _SHINGLE_WORDS и более подряд идущих слов промпта (кандидаты для нечёткого поиска).
+    """
+    seq = re.compile(r"(?<!\w)" + r"\W+".join(re.escape(w) for w in words) + r"(?!\w)", re.IGNORECASE)
+    alt = r"(?<!\w)(?:" + "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True)) + r")(?!\w)"
+    runs = re.compile(alt + r"(?:\W+" + alt + r"){%d,}" % (_SHINGLE_WORDS - 1), re.IGNORECASE)
+    return seq, runs
+
+
+def _skip_prompt_tail(text: str, pos: int, tail: str) -> int:
+    """Пропустить в text хвостовую пунктуацию промпта (например «?» или «).» после последнего слова)."""
+    marks = {ch for ch in tail if not ch.isspace()}
+    while pos < len(text) and (text[pos] in marks or text[pos] in " \t"):
+        pos += 1
+    return pos
+
+
+def _anchor_in(p_words: list[str], tail: str, t: str, start: int, fuzzy: bool) -> int:
+    """Конец последнего эха в t[start:] (нормализованное совпадение, затем нечёткое) или -1."""
+    seq, runs = _prompt_patterns(tuple(p_words))
+
+    # Нормализованное совпадение: те же слова подряд, между ними — любые пробелы/переносы/пунктуация
+    last = None
+    for last in seq.finditer(t, start):
+        pass
+    if last is not None:
+        return _skip_prompt_tail(t, last.end(), tail)
+
+    # Нечёткий: в участках подряд идущих слов промпта rolling hash окон по _SHINGLE_WORDS слов;
+    # близкие участки (правка/пропуск пары слов) образуют кластер, берём последний достаточно полный.
+    # Для коротких промптов не применяется — слишком легко совпасть с текстом ответа.
+    m = len(p_words)
+    if not fuzzy or m < _SHINGLE_WORDS + 2:
+        return -1
+    k = _SHINGLE_WORDS
+    vocab: dict[str, int] = {}
+    p_ids = [vocab.setdefault(w, len(vocab) + 1) for w in p_words]
+    shingles: dict[int, list[int]] = {}
+    for j, h in _window_hashes(p_ids, k):
+        shingles.setdefault(h, []).append(j)
+    need = max(1, int((m - k + 1) * _FUZZY_MIN_COVERAGE + 0.999))
+    best_end = -1
+    cl_seen: set[int] = set()
+    cl_end = -(10 ** 9)
+    for run in runs.finditer(t, start):
+        base = run.start()
+        ids: list[int] = []
+        starts: list[int] = []
+        ends: list[int] = []
+        for mt in _WORD_RE.finditer(run.group()):
+            ids.append(vocab.get(mt.group().lower(), 0))
+            starts.append(base + mt.start())
+            ends.append(base + mt.end())
+        for i, h in _window_hashes(ids, k):
+            js = shingles.get(h)
+            if not js:
+                continue
+            window = ids[i:i + k]
+            js = [j for j in js if p_ids[j:j + k] == window]
+            if not js:
+                continue
+            if starts[i] - cl_end > _CLUSTER_GAP_CHARS:
+                # Новый кластер: прошлый засчитываем, если он покрыл достаточно шинглов
+                if len(cl_seen) >= need:
+                    best_end = cl_end
+                cl_seen = set()
+            cl_seen.update(js)
+            cl_end = max(cl_end, ends[i + k - 1])
+    if len(cl_seen) >= need:
+        best_end = cl_end
+    if best_end < 0:
+        return -1
+    pos = _skip_prompt_tail(t, best_end, tail)
+    # Обрезанное эхо: многоточие после последнего совпавшего слова тоже часть эха
+    rest = t[pos:].lstrip(" \t")
+    for mark in ("…", "..."):
+        if rest.startswith(mark):
+            return len(t) - len(rest) + len(mark)
+    return pos
+
+
+def _anchor_from_tail(p_words: list[str], tail: str, t: str, lo: int, fuzzy: bool) -> int:
+    """_anchor_in по растущим хвостам t (64К, 256К, … до lo): обычно работа ~ длине ответа, в худшем — O(n)."""
+    span = _TAIL_CHUNK
+    while True:
+        start = max(lo, len(t) - span)
+        if start > lo:
+            # не режем слово на границе окна
+            while start < len(t) and not t[start].isspace():
+                start += 1
+        end = _anchor_in(p_words, tail, t, start, fuzzy)
+        if end >= 0 or start <= lo:
+            return end
+        span *= 4
+
+
+def find_prompt_end(prompt: str, text: str) -> int:
+    """Смещение в text сразу после последнего эха prompt или -1.
+
+    1) точное вхождение (rfind), если после него нет более позднего нормализованного эха;
+    2) совпадение по нормализованным словам (переносы, пробелы, пунктуация, регистр не важны);
+       смещения берутся из исходного текста, поэтому отдельная карта не нужна;
+    3) нечёткий поиск: rolling hash шинглов по _SHINGLE_WORDS слов, последний кластер совпавших окон,
+       покрывающий не меньше _FUZZY_MIN_COVERAGE шинглов промпта (эхо с правками/обрезкой).
+    Всё линейно по длине просмотренного текста.
+    """
+    p = (prompt or "").strip()
+    t = text or ""
+    if not p or not t:
+        return -1
+    p_words, p_spans = _word_spans(p)
+    idx = t.rfind(p)
+    if idx >= 0:
+        base = idx + len(p)
+        if not p_words:
+            return base
+        # Промпт мог быть отправлен ещё раз и отрисован с переносами — ищем более позднее эхо
+        # (только нормализованное совпадение: один проход регулярки по остатку текста)
+        later = _anchor_in(p_words, p[p_spans[-1][1]:], t, base, fuzzy=False)
+        return later if later >= 0 else base
+    if not p_words:
+        return -1
+    return _anchor_from_tail(p_words, p[p_spans[-1][1]:], t, 0, fuzzy=True)
+
 
 def extract_answer_by_prompt(prompt: str, text: str, echo_prefix_len: int = ECHO_PREFIX_LEN_DEFAULT) -> str:
-    """Вернуть часть текста после последнего вхождения prompt (или его префикса).
-    Если совпадений нет — вернуть исходный text.
+    """Вернуть часть текста после последнего вхождения prompt (точного, нормализованного или нечёткого —
+    см. find_prompt_end), в крайнем случае — после префикса prompt. Если совпадений нет — вернуть исходный text.
     """
     try:
         t = text or ""
@@ -14,9 +212,9 @@ def extract_answer_by_prompt(prompt: str, text: str, echo_prefix_len: int = ECHO
             return t
         p = (prompt or "").strip()
         if p:
-            idx = t.rfind(p)
-            if idx >= 0:
-                return t[idx + len(p):].lstrip()
+            end = find_prompt_end(p, t)
+            if end >= 0:
+                return t[end:].lstrip()
             prefix = p[: min(echo_prefix_len, len(p))]
             if prefix:
                 i2 = t.rfind(prefix)
@@ -33,78 +231,54 @@ def clean_copied_text(prompt: str, text: str, echo_prefix_len: int = ECHO_PREFIX
         # 1) Отрезаем всё до конца промпта (используя префикс при необходимости)
         s = extract_answer_by_prompt(prompt, text or "", echo_prefix_len)
 
-        # Вспомогательные нормализаторы
-        def _norm(s_: str) -> str:
-            s_ = (s_ or "").lower()
-            s_ = re.sub(r"[\s\t\n]+", " ", s_)            # схлопываем пробелы
-            s_ = re.sub(r"[""'`“”«»()\[\]{}:;,.!?~|\\/+\\-]", " ", s_)  # убираем пунктуацию
-            s_ = re.sub(r"\s+", " ", s_).strip()
-            return s_
-
-        def _tokens(s_: str) -> list[str]:
-            s_ = _norm(s_)
-            toks = re.split(r"[^a-zа-я0-9]+", s_)
-            return [t for t in toks if len(t) > 2]
-
         prompt_norm = _norm(prompt or "")
-        prompt_tokens = set(_tokens(prompt or ""))
-
-        lines = (s or "").splitlines()
-        month_re = re.compile(r"^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{1,2}:\d{2}\s+(AM|PM)$")
-        noise_substrings = [
-            "feedback submitted", "feedback", "submitted",
-            "a fews ago", "a few sec ago", "a few mins ago", " ago",
-            "edited", "copied",
-            # русские UI‑метки
-            "сохраненные кар", "сохраненные изоб", "сохранённые кар", "сохранённые изоб",
-        ]
-
-        refusal_phrases = [
-            # частые boilerplate‑фразы отказа/редиректа
-            "выходит за рамки моей компетенции",
-            "я здесь, чтобы помочь с кодом",
-            "this is outside the scope",
-            "i'm here to help with code",
-        ]
+        prompt_tokens = set(_tokens_of_norm(prompt_norm))
+        noise_search = _NOISE_RE.search
+        refusal_search = _REFUSAL_RE.search
+        month_match = _MONTH_RE.match
 
-        cleaned: list[str] = []
-        for ln in lines:
-            raw_ln = ln
-            low = raw_ln.strip().lower()
+        # Решение зависит только от строки и промпта: повторяющиеся строки (код, UI-хвосты) проверяем один раз
+        verdicts: dict[str, bool] = {}
 
-            # Пустые строки сохраняем (но потом схлопнем повторы)
-            if not low:
-                cleaned.append("")
-                continue
+        def _keep(ln: str) -> bool:
+            kept = verdicts.get(ln)
+            if kept is None:
+                kept = verdicts[ln] = _keep_line(ln)
+            return kept
 
-            # Шум интерфейса и дат
-            if any(ns in low for ns in noise_substrings):
-                continue
-            if month_re.match(raw_ln.strip()):
-                continue
-            if low.startswith("feedback") or low.startswith("submitted"):
-                continue
+        def _keep_line(ln: str) -> bool:
+            stripped = ln.strip()
+            low = stripped.lower()
+
+            # Шум интерфейса и дат, фразы‑отказы (дешёвые проверки — до нормализации строки)
+            if noise_search(low) or refusal_search(low):
+                return False
+            if month_match(stripped):
+                return False
 
             # Удаляем строки, похожие на вопрос пользователя (эхо), даже если частично
-            ln_norm = _norm(raw_ln)
+            ln_norm = _norm(ln)
             if prompt_tokens:
-                ln_tokens = set(_tokens(raw_ln))
+                ln_tokens = set(_tokens_of_norm(ln_norm))
                 if ln_tokens:
                     inter = len(ln_tokens & prompt_tokens)
                     union = len(ln_tokens | prompt_tokens)
                     jacc = (inter / union) if union else 0.0
                     # если схожесть высокая и строка достаточно содержательная — считаем эхом
                     if jacc >= 0.6 and (len(ln_norm) >= 20 or inter >= 4):
-                        continue
+                        return False
             # подстроковое совпадение длинных нормализованных фраз
             if len(ln_norm) >= 20 and (ln_norm in prompt_norm or prompt_norm in ln_norm):
-                continue
+                return False
+            return True
 
-            # Фразы‑отказы тоже удаляем
-            if any(p in low for p in refusal_phrases):
-                continue
-
-            cleaned.append(raw_ln)
+        cleaned: list[str] = []
+        for ln in (s or "").splitlines():
+            # Пустые строки сохраняем (но потом схлопнем повторы)
+            if not ln.strip():
+                cleaned.append("")
+            elif _keep(ln):
+                cleaned.append(ln)
 
         # 2) Схлопываем ведущие/двойные пустые строки
         out_lines: list[str] = []
@@ -1,24 +1,40 @@
 import asyncio
+import inspect
 import os
-from dotenv import load_dotenv
-
-import pyautogui
 import time
 import logging
 import platform
 import subprocess
+import threading
 
-import pyperclip
 from mac_window_manager import MacWindowManager
 from selection import copy_from_right_panel
+from core.extraction import create_extractor
 from clipboard_utils import copy_to_clipboard as cb_copy, paste_from_clipboard_mac as cb_paste_mac
+from core.clipboard import ClipboardSession, clipboard_stats, read_clipboard
 from text_filter import clean_copied_text, extract_answer_by_prompt
-from PIL import ImageChops, ImageStat, Image
 
 # Новые модули рефакторинга
-from core.config import config
+from core.config import ConfigSnapshot, config, config_store
 from core.telemetry import Telemetry
-from core.sleep_utils import sleep_interruptible as _sleep_interruptible
+from core import timing
+from core import openmetrics as om
+from core.lazy import LazyObject, lazy_module, module_available
+from core.metrics import counters, metrics
+from core.proc_sampler import process_sampler
+from core.tracing import get_tracer, record_span, span
+from core.readiness import (
+    ReadinessScheduler,
+    PixelDetector,
+    VisualDiffDetector,
+    CpuQuietDetector,
+    ClipboardStableDetector,
+    SignatureDetector,
+)
+from core.screen_grabber import get_grabber
+from core.script_worker import get_script_worker, run_osascript
+from core.signature import ReadySignature, default_signature_path, load_signature
+from core.ui_worker import PRIORITY_HIGH, PRIORITY_NORMAL, UIJob, UIWorker
 from core.pixel_utils import (
     rgb_at as _rgb_at,
     avg_rgb as _avg_rgb,
@@ -27,19 +43,13 @@ from core.pixel_utils import (
     map_ready_pixel_xy,
     measure_ready_pixel_rgb as _measure_ready_pixel_rgb,
 )
-try:
-    import psutil  # для диагностики процессов Windsurf
-except Exception:
-    psutil = None
-try:
-    # Импорты специфичные для Windows
-    from pywinauto import Application
-    from pywinauto.keyboard import send_keys
-    WINDOWS_AUTOMATION_AVAILABLE = platform.system() == "Windows"
-except Exception:
-    Application = None
-    send_keys = None
-    WINDOWS_AUTOMATION_AVAILABLE = False
+# GUI-библиотеки импортируются при первом обращении (импорт pyautogui — сотни мс на macOS)
+pyautogui = lazy_module("pyautogui")
+pyperclip = lazy_module("pyperclip")
+
+# Импорты специфичные для Windows (pywinauto — только при первом подключении к окну)
+_pywinauto = lazy_module("pywinauto")
+WINDOWS_AUTOMATION_AVAILABLE = platform.system() == "Windows" and module_available("pywinauto")
 
 # Добавляем альтернативный способ работы с буфером обмена
 try:
@@ -52,37 +62,11 @@ try:
 except ImportError:
     WIN32CLIPBOARD_AVAILABLE = False
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 # Используем config вместо прямого чтения из os.getenv
 WINDSURF_WINDOW_TITLE = config.WINDSURF_WINDOW_TITLE
 
-# Диагностика процессов Windsurf для /status
-def _scan_windsurf_processes():
-    """Вернёт список процессов Windsurf с полями pid, name, cpu_percent. Безопасно при отсутствии psutil."""
-    if psutil is None:
-        return []
-    procs = []
-    try:
-        for p in psutil.process_iter(["pid", "name", "cmdline", "cpu_percent"]):
-            try:
-                name = (p.info.get("name") or "")
-                pid = int(p.info.get("pid") or p.pid)
-                cpu = float(p.info.get("cpu_percent") or 0.0)
-                cmd = p.info.get("cmdline") or []
-                name_l = str(name).lower()
-                cmd_s = " ".join(cmd).lower() if isinstance(cmd, list) else str(cmd).lower()
-                if "windsurf" in name_l or "windsurf" in cmd_s:
-                    procs.append({"pid": pid, "name": name, "cpu_percent": round(cpu, 2)})
-            except Exception:
-                continue
-    except Exception as e:
-        try:
-            logger.debug(f"_scan_windsurf_processes failed: {e}")
-        except Exception:
-            pass
-    return procs
 
 # === Используем централизованный config вместо прямого чтения ENV ===
 PASTE_RETRY_COUNT = config.PASTE_RETRY_COUNT
@@ -139,13 +123,39 @@ READY_PIXEL_PROBE_INTERVAL_SECONDS = config.READY_PIXEL_PROBE_INTERVAL_SECONDS
 READY_PIXEL_AVG_K = config.READY_PIXEL_AVG_K
 READY_PIXEL_REQUIRE_TRANSITION = config.READY_PIXEL_REQUIRE_TRANSITION
 READY_PIXEL_STABLE_SECONDS = config.READY_PIXEL_STABLE_SECONDS
+READY_PIXEL_ADAPTIVE = config.READY_PIXEL_ADAPTIVE
+READY_PIXEL_MAX_PROBE_INTERVAL_SECONDS = config.READY_PIXEL_MAX_PROBE_INTERVAL_SECONDS
+READY_PIXEL_BACKOFF = config.READY_PIXEL_BACKOFF
+READY_PIXEL_FAST_INTERVAL_SECONDS = config.READY_PIXEL_FAST_INTERVAL_SECONDS
+READY_PIXEL_CONFIRM_SAMPLES = config.READY_PIXEL_CONFIRM_SAMPLES
 READY_PIXEL_TRANSITION_TIMEOUT_SECONDS = config.READY_PIXEL_TRANSITION_TIMEOUT_SECONDS
+READY_EXTRA_DETECTORS = config.READY_EXTRA_DETECTORS
+PARALLEL_WINDOWS = config.PARALLEL_WINDOWS
+STREAM_PARTIAL = config.STREAM_PARTIAL
+STREAM_PARTIAL_INTERVAL_SECONDS = config.STREAM_PARTIAL_INTERVAL_SECONDS
 CLICK_ABS_X = config.CLICK_ABS_X
 CLICK_ABS_Y = config.CLICK_ABS_Y
 SAVE_READY_HYPOTHESES = config.SAVE_READY_HYPOTHESES
 SAVE_READY_ONLY_ON_MATCH = config.SAVE_READY_ONLY_ON_MATCH
 ENV_RELOAD_INTERVAL_SECONDS = config.ENV_RELOAD_INTERVAL_SECONDS
 WSMODEL_RESTORE_CLIPBOARD = config.WSMODEL_RESTORE_CLIPBOARD
+CLIPBOARD_RESTORE = config.CLIPBOARD_RESTORE
+
+# Глобалы выше — копии полей config; при перечитывании .env (core.config) обновляются подписчиком
+_CONFIG_MIRRORS = frozenset(n for n in config_store().current().to_dict() if n in globals())
+
+
+def _apply_config(old, new, changed) -> None:
+    """Подписчик core.config: новые значения изменившихся полей в глобалы модуля, профиль таймингов."""
+    g = globals()
+    for name in changed:
+        if name in _CONFIG_MIRRORS:
+            g[name] = getattr(new, name)
+    if any(name.startswith("TIMING_") for name in changed):
+        timing.reload()
+
+
+config_store().subscribe(_apply_config)
 
 # === Дублирующиеся функции удалены — используем core.pixel_utils ===
 # map_ready_pixel_xy, _rgb_at, _avg_rgb, _avg_rgb_via_screencapture, _sanitize_k,
@@ -162,6 +172,19 @@ class DesktopController:
         pyautogui.PAUSE = max(0.1, KEY_DELAY_SECONDS)
         self.telemetry = Telemetry()
         self._mac_manager = MacWindowManager() if platform.system() == "Darwin" else None
+        # Единственный владелец pyautogui/буфера/фокуса: запросы идут через очередь по одному
+        self.ui = UIWorker(default_duration=max(30.0, RESPONSE_WAIT_SECONDS + READY_PIXEL_STABLE_SECONDS + 30.0))
+        # Параллельные окна: не больше одного запроса в генерации на окно
+        self._window_locks: dict[str, asyncio.Lock] = {}
+        self._pipeline_checks: dict[str, tuple] = {}
+        # Извлечение текста ответа: AX-дерево, протяжка как fallback (выбор по успешности)
+        self.extractor = create_extractor(prepare_drag=self._prepare_drag_copy)
+        # Очищенный ответ последней финализации (буфер может быть восстановлен к содержимому пользователя)
+        self._last_response: str | None = None
+        # Процессы Windsurf и их CPU — фоновым потоком; /status и детектор CPU читают снимок
+        process_sampler()
+        # Перечитывание .env по mtime (CONFIG_WATCH_INTERVAL_SECONDS): новые значения без перезапуска
+        config_store().start_watcher()
 
     def _lcp_suffix(self, a: str, b: str) -> str:
         """Возвращает суффикс b после наибольшего общего префикса a и b."""
@@ -228,483 +251,495 @@ class DesktopController:
             logger.debug(f"classify_send_button_mac (in DesktopController) failed: {e}")
             return 'unknown', None
 
-    def _wait_for_ready_mac(self, message: str, baseline_text: str | None = None) -> tuple[bool, str]:
-        """Ожидание готовности ответа на macOS двумя способами:
-        1) CPU-тишь процесса Windsurf (по умолчанию).
-        2) Пиксельная детекция кнопки (send/stop) — если включена.
-        По готовности копируем весь текст и извлекаем суффикс относительно baseline.
+    def _ready_pixel_params(self, c: ConfigSnapshot | None = None) -> dict:
+        """Параметры READY_PIXEL на начало ожидания — из одного снимка конфигурации (видит перечитанный .env)."""
+        c = c or config_store().current()
+        return {
+            'x': c.READY_PIXEL_X,
+            'y': c.READY_PIXEL_Y,
+            'r': c.READY_PIXEL_R,
+            'g': c.READY_PIXEL_G,
+            'b': c.READY_PIXEL_B,
+            'tol': c.READY_PIXEL_TOL,
+            'tol_pct': c.READY_PIXEL_TOL_PCT,
+            'mode': c.READY_PIXEL_COORD_MODE.strip().lower(),
+            'dx': c.READY_PIXEL_DX,
+            'dy': c.READY_PIXEL_DY,
+        }
+
+    def _right_panel_region(self) -> tuple[int, int, int, int] | None:
+        """Регион правой панели ответа (rx, ry, rw, rh) по границам активного окна."""
+        if not self._mac_manager:
+            return None
+        try:
+            bounds = self._mac_manager.get_front_window_bounds()
+        except Exception:
+            bounds = None
+        if not bounds:
+            return None
+        x, y, w, h = bounds
+        right_third_x = x + max(0, int(w * 2 / 3))
+        rx = max(0, right_third_x + 8)
+        ry = max(0, y + max(0, VISUAL_REGION_TOP))
+        rw = max(16, int(w / 3) - 16)
+        rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
+        return rx, ry, rw, rh
+
+    def _visual_frame(self) -> bytes | None:
+        """Уменьшенный grayscale-кадр правой панели для VisualDiffDetector."""
+        region = self._right_panel_region()
+        if not region:
+            return None
+        self.telemetry.last_visual_region = region
+        frame = get_grabber().grab(region)
+        img = frame.to_image() if frame is not None else pyautogui.screenshot(region=region)
+        return img.resize((96, 72)).convert('L').tobytes()
+
+    def _windsurf_cpu_total(self) -> float:
+        """Суммарная загрузка CPU процессами Windsurf (для CpuQuietDetector) — из снимка фонового сэмплера."""
+        total = process_sampler().cpu_total()
+        self.telemetry.cpu_last_total_percent = total
+        return total
+
+    def _build_readiness_scheduler(self, baseline_text: str | None = None,
+                                   signature: ReadySignature | None = None,
+                                   c: ConfigSnapshot | None = None) -> ReadinessScheduler:
+        """Собрать набор детекторов готовности и планировщик для одного ожидания.
+
+        signature задаётся явно для окна параллельного конвейера: тогда дополнительные детекторы
+        (смотрят на активное окно, которое может быть другим) не используются.
+        c — снимок конфигурации запроса: перечитанный посреди ожидания .env его не меняет.
         """
-        start = time.time()
-        last_ready_probe = 0.0  # Время последней проверки READY_PIXEL
-        # Для логики стабильности и перехода non-match -> match
-        seen_nonmatch = False
-        match_started_at = None
-        transition_deadline = None
+        c = c or config_store().current()
+        detectors = []
+        window_mode = signature is not None
+        adaptive = {
+            'adaptive': c.READY_PIXEL_ADAPTIVE,
+            'max_interval': c.READY_PIXEL_MAX_PROBE_INTERVAL_SECONDS,
+            'backoff': c.READY_PIXEL_BACKOFF,
+            'fast_interval': c.READY_PIXEL_FAST_INTERVAL_SECONDS,
+            'confirm_samples': c.READY_PIXEL_CONFIRM_SAMPLES if c.READY_PIXEL_ADAPTIVE else 0,
+        }
+        if signature is None and c.USE_READY_PIXEL:
+            signature = load_signature()
+        if signature is not None:
+            # Многоточечная сигнатура заменяет одиночный READY_PIXEL: одна рамка на пробу
+            anchor = signature.points[0] if signature.points else signature.template
+            ax, ay = anchor.x, anchor.y
+            detectors.append(SignatureDetector(
+                signature.measure,
+                require_transition=c.READY_PIXEL_REQUIRE_TRANSITION,
+                transition_timeout=c.READY_PIXEL_TRANSITION_TIMEOUT_SECONDS,
+                stable_seconds=c.READY_PIXEL_STABLE_SECONDS,
+                interval=c.READY_PIXEL_PROBE_INTERVAL_SECONDS,
+                meta={'x': ax, 'y': ay, 'used_xy': (ax, ay), 'mode': 'top', 'signature': signature.name,
+                      'region': signature.bounding_region()},
+                **adaptive,
+            ))
+        elif c.USE_READY_PIXEL and c.READY_PIXEL_X >= 0 and c.READY_PIXEL_Y >= 0:
+            try:
+                p = self._ready_pixel_params(c)
+                sx, sy = map_ready_pixel_xy(p['x'], p['y'], p['mode'], p['dx'], p['dy'])
+                target = (p['r'], p['g'], p['b'])
+                avg_k = max(1, int(c.READY_PIXEL_AVG_K))
+
+                def _sample(sx=int(sx), sy=int(sy)):
+                    # Сэмплируем цвет с учетом READY_PIXEL_SRC (auto|cap|dir), как в пипетке (status)
+                    return _measure_ready_pixel_rgb(sx, sy, avg_k, target)
+
+                detectors.append(PixelDetector(
+                    _sample, target,
+                    tol=p['tol'], tol_pct=p['tol_pct'],
+                    require_transition=c.READY_PIXEL_REQUIRE_TRANSITION,
+                    transition_timeout=c.READY_PIXEL_TRANSITION_TIMEOUT_SECONDS,
+                    stable_seconds=c.READY_PIXEL_STABLE_SECONDS,
+                    interval=c.READY_PIXEL_PROBE_INTERVAL_SECONDS,
+                    meta={'x': p['x'], 'y': p['y'], 'used_xy': (sx, sy), 'mode': p['mode'], 'dxdy': (p['dx'], p['dy'])},
+                    **adaptive,
+                ))
+            except Exception as _e:
+                self.telemetry.last_ready_pixel = {'x': c.READY_PIXEL_X, 'y': c.READY_PIXEL_Y, 'error': str(_e)}
+
+        # Дополнительные (информационные при READY_PIXEL_REQUIRED=1) детекторы
+        extra = set() if window_mode else {
+            s.strip().lower() for s in (c.READY_EXTRA_DETECTORS or "").split(",") if s.strip()
+        }
+        if 'visual' in extra and self._mac_manager:
+            detectors.append(VisualDiffDetector(
+                self._visual_frame, c.VISUAL_DIFF_THRESHOLD, c.VISUAL_STABLE_SECONDS, c.VISUAL_SAMPLE_INTERVAL_SECONDS,
+            ))
+        if 'cpu' in extra and process_sampler().available:
+            detectors.append(CpuQuietDetector(
+                self._windsurf_cpu_total, c.CPU_READY_THRESHOLD, c.CPU_READY_STABLE_SECONDS,
+                c.CPU_SAMPLE_INTERVAL_SECONDS,
+            ))
+        if 'clipboard' in extra:
+            detectors.append(ClipboardStableDetector(
+                read_clipboard, c.RESPONSE_STABLE_MIN_SECONDS, c.RESPONSE_POLL_INTERVAL_SECONDS,
+                baseline=baseline_text or None,
+            ))
+
+        decisive = {'ready_pixel'} if c.READY_PIXEL_REQUIRED else None
+        return ReadinessScheduler(detectors, decisive=decisive, max_wait=c.RESPONSE_MAX_WAIT_SECONDS)
+
+    def _save_ready_pixel_debug(self, last: dict) -> None:
+        """Сохранить отладочные снимки вокруг READY_PIXEL (SAVE_VISUAL_DEBUG)."""
+        from PIL import ImageDraw
+        match = bool(last.get('match'))
+        if SAVE_READY_ONLY_ON_MATCH and not match:
+            return
+        rp_x, rp_y = int(last['x']), int(last['y'])
+        sx, sy = last['used_xy']
+        rp_mode = last.get('mode') or 'top'
+        tag = 'match' if match else 'probe'
+        ts_dbg = int(time.time())
+        sw, sh = pyautogui.size()
+        cw, ch = 180, 140
+        os.makedirs(SAVE_VISUAL_DIR, exist_ok=True)
+
+        def _crop_with_cross(cx: int, cy: int, color: tuple[int, int, int]):
+            rx = max(0, min(sw - cw, int(cx - cw / 2)))
+            ry = max(0, min(sh - ch, int(cy - ch / 2)))
+            img = pyautogui.screenshot(region=(rx, ry, cw, ch))
+            d = ImageDraw.Draw(img)
+            d.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=color, width=2)
+            d.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=color, width=2)
+            return img, rx, ry
+
+        # used (фактически применённые координаты)
+        uimg, urx, ury = _crop_with_cross(sx, sy, (0, 255, 0))
+        uimg.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{tag}_USED_{rp_mode}_{ts_dbg}_{urx}x{ury}_{cw}x{ch}.png"))
+
+        # Полноэкранный снимок с крестом в фактической точке
         try:
-            _transition_timeout = float(READY_PIXEL_TRANSITION_TIMEOUT_SECONDS)
+            fs = pyautogui.screenshot()
+            dfs = ImageDraw.Draw(fs)
+            dfs.line([(sx - 12, sy), (sx + 12, sy)], fill=(0, 255, 0), width=3)
+            dfs.line([(sx, sy - 12), (sx, sy + 12)], fill=(0, 255, 0), width=3)
+            max_w = 1600
+            if fs.width > max_w:
+                ratio = max_w / fs.width
+                fs = fs.resize((max_w, int(fs.height * ratio)))
+            fs.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{tag}_USED_FULL_{rp_mode}_{ts_dbg}_{sx}x{sy}.png"))
         except Exception:
-            _transition_timeout = 25.0
-        if READY_PIXEL_REQUIRE_TRANSITION:
-            transition_deadline = (start + _transition_timeout) if _transition_timeout and _transition_timeout > 0 else None
-        # READY_PIXEL-only режим: не отправляем никаких хоткеев во время ожидания
-        baseline_full = ""
-        logger.info("macOS: ожидание READY_PIXEL — без отправки каких-либо клавиш/копирования до готовности")
+            pass
 
-        loops = 0
-        ready_by = None  # 'visual' | 'pixel'
-        # Визуальная стабилизация — отключено (оставляем только READY_PIXEL)
-        visual_prev_small = None
-        last_visual_change = start
-        last_visual_sample = 0.0
-        # Упростили детекцию: без edge/стабилизации и без динамической перезагрузки .env
-        last_env_reload = start - ENV_RELOAD_INTERVAL_SECONDS
-
-        # Если RESPONSE_MAX_WAIT_SECONDS<=0 — ждём бесконечно (пока не совпадёт READY_PIXEL)
-        while True:
-            # Прерывание по таймауту только если он задан (>0)
-            if RESPONSE_MAX_WAIT_SECONDS and RESPONSE_MAX_WAIT_SECONDS > 0:
-                if time.time() - start >= RESPONSE_MAX_WAIT_SECONDS:
-                    break
-            loops += 1
-
-            # 1) Визуальная стабилизация — отключено намеренно
-            _use_vs = False
-            if _use_vs and self._mac_manager:
-                now = time.time()
-                if now - last_visual_sample >= max(0.1, VISUAL_SAMPLE_INTERVAL_SECONDS):
-                    last_visual_sample = now
-                    bounds = None
-                    try:
-                        bounds = self._mac_manager.get_front_window_bounds()
-                    except Exception:
-                        bounds = None
-                    if bounds:
-                        x, y, w, h = bounds
-                        # Анализируем только правую треть окна (панель ответа)
-                        right_third_x = x + max(0, int(w * 2 / 3))
-                        rx = max(0, right_third_x + 8)
-                        ry = max(0, y + max(0, VISUAL_REGION_TOP))
-                        rw = max(16, int(w / 3) - 16)
-                        rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
-                        try:
-                            color_img = pyautogui.screenshot(region=(rx, ry, rw, rh))
-                            img = color_img.resize((96, 72)).convert('L')
-                            # запомним регион для диагностики
-                            self.telemetry.last_visual_region = (rx, ry, rw, rh)
-                            if visual_prev_small is not None:
-                                diff = ImageChops.difference(img, visual_prev_small)
-                                stat = ImageStat.Stat(diff)
-                                mean_diff = float(stat.mean[0]) if stat and stat.mean else 0.0
-                                if mean_diff > VISUAL_DIFF_THRESHOLD:
-                                    visual_last_change = now
-                            visual_prev_small = img
-                            if (now - visual_last_change) >= VISUAL_STABLE_SECONDS:
-                                ready_by = 'visual'
-                            # Сохранение промежуточных кадров области анализа — по отдельному флагу
-                            _save_samples = os.getenv("SAVE_VISUAL_SAMPLES", "0").lower() not in ("0", "false")
-                            if _save_samples:
-                                try:
-                                    os.makedirs(SAVE_VISUAL_DIR, exist_ok=True)
-                                    ts = time.strftime("%Y%m%d_%H%M%S")
-                                    ms = int((time.time() % 1) * 1000)
-                                    color_img.save(os.path.join(SAVE_VISUAL_DIR, f"visual_region_{ts}_{ms:03d}.png"))
-                                except Exception as _e:
-                                    logger.debug(f"save visual debug failed: {_e}")
-                        except Exception:
-                            pass
-
-            # 2) Пиксельная детекция кнопки — отключено намеренно
-            if False and ready_by is None and USE_UI_BUTTON_DETECTION:
-                ui_state, avg = self._classify_send_button_mac()
-                self.telemetry.last_ui_button = ui_state
-                self.telemetry.last_ui_avg_color = avg
-                if ui_state == 'send':
-                    ready_by = 'pixel'
-
-            # 3) Датчик готовности по опорному пикселю (абсолютные координаты) с edge-логикой
-            if ready_by is None and USE_READY_PIXEL and READY_PIXEL_X >= 0 and READY_PIXEL_Y >= 0 \
-               and (time.time() - last_ready_probe) >= READY_PIXEL_PROBE_INTERVAL_SECONDS:
-                last_ready_probe = time.time()
+        # Дополнительные гипотезы — только если явно включено
+        if SAVE_READY_HYPOTHESES:
+            hypotheses = [
+                ('top', rp_x, rp_y),                                             # top-origin как есть
+                ('flipY', rp_x, max(0, min(sh - 1, sh - 1 - rp_y))),             # flipped Y
+                ('top2x', rp_x * 2, rp_y * 2),                                   # retina 2x top-origin
+                ('flipY2x', rp_x * 2, max(0, (sh * 2 - 1) - rp_y * 2)),          # retina 2x + flipped Y
+            ]
+            for name, hx, hy in hypotheses:
+                img, rx, ry = _crop_with_cross(hx, hy, (255, 0, 0))
+                img.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{tag}_{name}_{ts_dbg}_{rx}x{ry}_{cw}x{ch}.png"))
+
+    def _wait_for_ready_mac(self, message: str, baseline_text: str | None = None,
+                            cancel: threading.Event | None = None) -> tuple[bool, str]:
+        """Ожидание готовности ответа на macOS через ReadinessScheduler (блокирующее).
+        По готовности копируем текст из правой панели и извлекаем ответ.
+        """
+        start = time.time()
+        c = config_store().current()
+        logger.info("macOS: ожидание READY_PIXEL — без отправки каких-либо клавиш/копирования до готовности")
+        scheduler = self._build_readiness_scheduler(baseline_text, c=c)
+        with span("readiness") as sp:
+            ready_by = scheduler.run(cancel=cancel)
+            if sp is not None:
+                sp.set(ready_by=ready_by, ticks=scheduler.ticks)
+        return self._finish_ready_mac(message, scheduler, ready_by, start, c)
+
+    async def _wait_for_ready_mac_async(self, message: str, baseline_text: str | None = None,
+                                        cancel: threading.Event | None = None,
+                                        on_partial=None) -> tuple[bool, str]:
+        """То же, что _wait_for_ready_mac, но ожидание не занимает поток: пробы идут короткими вызовами в UI-потоке.
+        При on_partial и STREAM_PARTIAL параллельно с пробами снимается частичный ответ (_stream_partials)."""
+        start = time.time()
+        c = config_store().current()
+        logger.info("macOS: ожидание READY_PIXEL (async) — без отправки каких-либо клавиш/копирования до готовности")
+        scheduler = self._build_readiness_scheduler(baseline_text, c=c)
+        done = asyncio.Event()
+        streamer = None
+        if on_partial is not None and c.STREAM_PARTIAL:
+            streamer = asyncio.ensure_future(self._stream_partials(message, on_partial, done, start))
+        try:
+            with span("readiness") as sp:
+                ready_by = await scheduler.wait(cancel=cancel, runner=self.ui.call)
+                if sp is not None:
+                    sp.set(ready_by=ready_by, ticks=scheduler.ticks)
+        finally:
+            done.set()
+            if streamer is not None:
                 try:
-                    # Динамическая перезагрузка .env отключена по умолчанию для стабильности измерения
-                    rp_x = int(os.getenv("READY_PIXEL_X", str(READY_PIXEL_X)))
-                    rp_y = int(os.getenv("READY_PIXEL_Y", str(READY_PIXEL_Y)))
-                    rp_r = int(os.getenv("READY_PIXEL_R", str(READY_PIXEL_R)))
-                    rp_g = int(os.getenv("READY_PIXEL_G", str(READY_PIXEL_G)))
-                    rp_b = int(os.getenv("READY_PIXEL_B", str(READY_PIXEL_B)))
-                    rp_tol = int(os.getenv("READY_PIXEL_TOL", str(READY_PIXEL_TOL)))
-                    rp_tol_pct = float(os.getenv("READY_PIXEL_TOL_PCT", str(READY_PIXEL_TOL_PCT)))
-                    rp_mode = os.getenv("READY_PIXEL_COORD_MODE", READY_PIXEL_COORD_MODE).strip().lower()
-                    rp_dx = int(os.getenv("READY_PIXEL_DX", str(READY_PIXEL_DX)))
-                    rp_dy = int(os.getenv("READY_PIXEL_DY", str(READY_PIXEL_DY)))
-
-                    sx, sy = map_ready_pixel_xy(rp_x, rp_y, rp_mode, rp_dx, rp_dy)
-                    # Сэмплируем цвет с учетом READY_PIXEL_SRC (auto|cap|dir), как в пипетке (status)
-                    (pr, pg, pb), used_src = _measure_ready_pixel_rgb(
-                        int(sx), int(sy), max(1, int(READY_PIXEL_AVG_K)), (rp_r, rp_g, rp_b)
-                    )
-                    dr = abs(int(pr) - rp_r)
-                    dg = abs(int(pg) - rp_g)
-                    db = abs(int(pb) - rp_b)
-                    if rp_tol_pct is not None and rp_tol_pct >= 0:
-                        # относительная ошибка по каналам (в % от 255)
-                        rel = (dr + dg + db) / (3.0 * 255.0) * 100.0
-                        match = rel <= rp_tol_pct
-                    else:
-                        match = (dr <= rp_tol and dg <= rp_tol and db <= rp_tol)
-                    logger.debug(
-                        "READY_PIXEL probe: used_xy=%s rgb=%s target=%s delta=%s tol=%s tol_pct=%s -> match=%s",
-                        (sx, sy), (int(pr), int(pg), int(pb)), (rp_r, rp_g, rp_b), (dr, dg, db), rp_tol, rp_tol_pct, match,
-                    )
-                    self.telemetry.last_ready_pixel = {
-                        'x': rp_x, 'y': rp_y, 'used_xy': (sx, sy), 'mode': rp_mode, 'dxdy': (rp_dx, rp_dy),
-                        'rgb': (int(pr), int(pg), int(pb)), 'src': used_src,
-                        'target': (rp_r, rp_g, rp_b),
-                        'tol': rp_tol,
-                        'tol_pct': rp_tol_pct if rp_tol_pct is not None and rp_tol_pct >= 0 else None,
-                        'delta': (dr, dg, db), 'match': match,
-                    }
-                    # Логика перехода (edge)
-                    now_ts = time.time()
-                    if not match:
-                        seen_nonmatch = True
-                        match_started_at = None
-                        logger.info(
-                            "READY_PIXEL проверка: used_xy=(%d,%d) цвет=(%d,%d,%d) не подходит; жду %.1fs",
-                            sx, sy, int(pr), int(pg), int(pb), READY_PIXEL_PROBE_INTERVAL_SECONDS
-                        )
-                        _sleep_interruptible(float(READY_PIXEL_PROBE_INTERVAL_SECONDS))
-                        continue
-                    # Тут match == True
-                    if READY_PIXEL_REQUIRE_TRANSITION and not seen_nonmatch:
-                        # Требуем увидеть хотя бы один non-match после отправки
-                        # Если задан таймаут перехода и он истёк — либо принимаем (если timeout<=0 не задан), либо продолжаем ждать
-                        if transition_deadline is not None and now_ts >= transition_deadline:
-                            logger.info("READY_PIXEL: переход non-match->match не зафиксирован до таймаута, продолжаю ожидать совпадение...")
-                            _sleep_interruptible(float(READY_PIXEL_PROBE_INTERVAL_SECONDS))
-                            continue
-                    # Стабильность совпадения
-                    if match_started_at is None:
-                        match_started_at = now_ts
-                    stable_for = now_ts - match_started_at
-                    if stable_for < max(0.0, READY_PIXEL_STABLE_SECONDS):
-                        logger.info("READY_PIXEL: совпадение, но ждём стабильность %.1fs (уже %.2fs)", READY_PIXEL_STABLE_SECONDS, stable_for)
-                        _sleep_interruptible(float(READY_PIXEL_PROBE_INTERVAL_SECONDS))
-                        continue
-                    # Все условия выполнены
-                    ready_by = 'ready_pixel'
-                    # Сохраняем снимки (умолчание: только при совпадении и не сохраняем гипотезы)
-                    if SAVE_VISUAL_DEBUG:
-                        try:
-                            if (not SAVE_READY_ONLY_ON_MATCH) or match:
-                                from PIL import ImageDraw
-                                ts_dbg = int(time.time())
-                                sw, sh = pyautogui.size()
-                                cw, ch = 180, 140
-                                # used (фактически применённые координаты)
-                                urx = int(sx - cw / 2)
-                                ury = int(sy - ch / 2)
-                                urx = max(0, min(sw - cw, urx))
-                                ury = max(0, min(sh - ch, ury))
-                                uimg = pyautogui.screenshot(region=(urx, ury, cw, ch))
-                                du = ImageDraw.Draw(uimg)
-                                du.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=(0,255,0), width=2)
-                                du.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=(0,255,0), width=2)
-                                os.makedirs(SAVE_VISUAL_DIR, exist_ok=True)
-                                uimg.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_USED_{rp_mode}_{ts_dbg}_{urx}x{ury}_{cw}x{ch}.png"))
-
-                                # Полноэкранный снимок с крестом в фактической точке
-                                try:
-                                    fs = pyautogui.screenshot()
-                                    dfs = ImageDraw.Draw(fs)
-                                    cx, cy = sx, sy
-                                    dfs.line([(cx - 12, cy), (cx + 12, cy)], fill=(0,255,0), width=3)
-                                    dfs.line([(cx, cy - 12), (cx, cy + 12)], fill=(0,255,0), width=3)
-                                    max_w = 1600
-                                    if fs.width > max_w:
-                                        ratio = max_w / fs.width
-                                        fs = fs.resize((max_w, int(fs.height * ratio)))
-                                    fs.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_USED_FULL_{rp_mode}_{ts_dbg}_{sx}x{sy}.png"))
-                                except Exception:
-                                    pass
+                    await streamer
+                except Exception:
+                    pass
+        return await self.ui.call(self._finish_ready_mac, message, scheduler, ready_by, start, c)
 
-                                # Дополнительные гипотезы — только если явно включено
-                                if SAVE_READY_HYPOTHESES:
-                                    # 1) top-origin как есть
-                                    rx1 = int(rp_x - cw / 2)
-                                    ry1 = int(rp_y - ch / 2)
-                                    rx1 = max(0, min(sw - cw, rx1))
-                                    ry1 = max(0, min(sh - ch, ry1))
-                                    img1 = pyautogui.screenshot(region=(rx1, ry1, cw, ch))
-                                    d1 = ImageDraw.Draw(img1)
-                                    d1.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=(255,0,0), width=2)
-                                    d1.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=(255,0,0), width=2)
-                                    img1.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_top_{ts_dbg}_{rx1}x{ry1}_{cw}x{ch}.png"))
-
-                                    # 2) flipped Y
-                                    fy = max(0, min(sh - 1, sh - 1 - rp_y))
-                                    rx2 = int(rp_x - cw / 2)
-                                    ry2 = int(fy - ch / 2)
-                                    rx2 = max(0, min(sw - cw, rx2))
-                                    ry2 = max(0, min(sh - ch, ry2))
-                                    img2 = pyautogui.screenshot(region=(rx2, ry2, cw, ch))
-                                    d2 = ImageDraw.Draw(img2)
-                                    d2.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=(255,0,0), width=2)
-                                    d2.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=(255,0,0), width=2)
-                                    img2.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_flipY_{ts_dbg}_{rx2}x{ry2}_{cw}x{ch}.png"))
-
-                                    # 3) retina 2x top-origin
-                                    rx3 = int(rp_x*2 - cw/2)
-                                    ry3 = int(rp_y*2 - ch/2)
-                                    rx3 = max(0, min(sw - cw, rx3))
-                                    ry3 = max(0, min(sh - ch, ry3))
-                                    img3 = pyautogui.screenshot(region=(rx3, ry3, cw, ch))
-                                    d3 = ImageDraw.Draw(img3)
-                                    d3.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=(255,0,0), width=2)
-                                    d3.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=(255,0,0), width=2)
-                                    img3.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_top2x_{ts_dbg}_{rx3}x{ry3}_{cw}x{ch}.png"))
-
-                                    # 4) retina 2x + flipped Y
-                                    fy2 = max(0, (sh*2 - 1) - rp_y*2)
-                                    rx4 = int(rp_x*2 - cw/2)
-                                    ry4 = int(fy2 - ch/2)
-                                    rx4 = max(0, min(sw - cw, rx4))
-                                    ry4 = max(0, min(sh - ch, ry4))
-                                    img4 = pyautogui.screenshot(region=(rx4, ry4, cw, ch))
-                                    d4 = ImageDraw.Draw(img4)
-                                    d4.line([(cw//2 - 8, ch//2), (cw//2 + 8, ch//2)], fill=(255,0,0), width=2)
-                                    d4.line([(cw//2, ch//2 - 8), (cw//2, ch//2 + 8)], fill=(255,0,0), width=2)
-                                    img4.save(os.path.join(SAVE_VISUAL_DIR, f"ready_pixel_{'match' if match else 'probe'}_flipY2x_{ts_dbg}_{rx4}x{ry4}_{cw}x{ch}.png"))
-                        except Exception:
-                            pass
-                    if match:
-                        ready_by = 'ready_pixel'
-                        logger.info(
-                            "READY_PIXEL matched: used_xy=(%d,%d) rgb=(%d,%d,%d) target=(%d,%d,%d) tol=%d tol_pct=%s",
-                            sx, sy, int(pr), int(pg), int(pb), rp_r, rp_g, rp_b, rp_tol, str(rp_tol_pct)
-                        )
-                except Exception as _e:
-                    self.telemetry.last_ready_pixel = {'x': READY_PIXEL_X, 'y': READY_PIXEL_Y, 'error': str(_e)}
-
-            if ready_by is not None and (not READY_PIXEL_REQUIRED or ready_by == 'ready_pixel'):
-                logger.info("Readiness satisfied by=%s, proceeding to copy", ready_by)
-                break
-
-            # Короткий прерывный сон, чтобы Ctrl+C срабатывал мгновенно
-            _sleep_interruptible(max(0.05, float(RESPONSE_POLL_INTERVAL_SECONDS)))
-
-        # Финальный сбор текста
-        copied_text = ""
-        if ready_by is not None and (not READY_PIXEL_REQUIRED or ready_by == 'ready_pixel'):
+    def _peek_answer_mac(self, message: str) -> str:
+        """Снимок текущего (ещё генерируемого) ответа из правой панели активного окна (UI-поток)."""
+        try:
+            bounds = self._mac_manager.get_front_window_bounds() if self._mac_manager else None
+            if not bounds:
+                return ""
+            text, _region = self.extractor.extract(bounds)
+            text = (text or "").strip()
+            if TRIM_AFTER_PROMPT and text:
+                text = extract_answer_by_prompt(str(message), text)
+            if not text or self._looks_like_echo(str(message), text):
+                return ""
+            return text
+        except Exception as e:
+            logger.debug(f"peek answer failed: {e}")
+            return ""
+
+    async def _stream_partials(self, message: str, on_partial, done: asyncio.Event, start: float) -> None:
+        """Пока не сработала готовность: раз в STREAM_PARTIAL_INTERVAL_SECONDS снимаем панель ответа
+        и отдаём в on_partial(text, delta), если текст изменился (delta — суффикс после общего префикса)."""
+        last = ""
+        interval = max(1.0, STREAM_PARTIAL_INTERVAL_SECONDS)
+        while not done.is_set():
             try:
-                # 0) Если включён строгий режим — выделим текст мышью в правой панели и скопируем
-                short_txt = ''
-                if False and READY_PIXEL_REQUIRED and self._mac_manager:
-                    bounds = None
-                    try:
-                        bounds = self._mac_manager.get_front_window_bounds()
-                    except Exception:
-                        bounds = None
-                    if bounds:
-                        x, y, w, h = bounds
-                        right_third_x = x + max(0, int(w * 2 / 3))
-                        rx = max(0, right_third_x + 8)
-                        ry = max(0, y + max(0, VISUAL_REGION_TOP))
-                        rw = max(16, int(w / 3) - 16)
-                        rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
-                        try:
-                            # Клик для фокуса в правой панели
-                            focus_x = rx + min(rw - 8, 24)
-                            focus_y = ry + min(rh - 8, 24)
-                            pyautogui.click(focus_x, focus_y)
-                            time.sleep(0.1)
-                            # Протяжка выделения до низа панели
-                            end_x = rx + max(8, rw - 24)
-                            end_y = ry + max(8, rh - 24)
-                            pyautogui.mouseDown(focus_x, focus_y)
-                            time.sleep(0.05)
-                            pyautogui.moveTo(end_x, end_y, duration=0.15)
-                            time.sleep(0.05)
-                            pyautogui.mouseUp(end_x, end_y)
-                            time.sleep(0.1)
-                            pyautogui.hotkey('command', 'c')
-                            time.sleep(0.2)
-                            short_txt = (pyperclip.paste() or '').strip()
-                            self.telemetry.last_copy_method = 'drag'
-                            self.telemetry.last_click_xy = (focus_x, focus_y)
-                        except Exception:
-                            short_txt = ''
-                # 1) Если не получилось — попробуем клавиатурную навигацию к последнему ответу и копирование
-                #    В строгом режиме по опорному пикселю этот путь отключаем, чтобы не захватывать редактор
-                if not short_txt and not READY_PIXEL_REQUIRED:
-                    try:
-                        pyautogui.press('esc')
-                        time.sleep(0.1)
-                        pyautogui.keyDown('shift')
-                        pyautogui.press('tab')
-                        time.sleep(0.1)
-                        pyautogui.press('tab')
-                        pyautogui.keyUp('shift')
-                        time.sleep(0.2)
-                        pyautogui.press('enter')
-                        time.sleep(0.3)
-                        pyautogui.hotkey('command', 'c')
-                        time.sleep(0.2)
-                        short_txt = (pyperclip.paste() or '').strip()
-                        self.telemetry.last_copy_method = 'short'
-                    except Exception:
-                        short_txt = ''
-                disable_echo = (ready_by in ('ready_pixel', 'pixel'))
-                # Обрезка по запросу и очистка от UI-шума
-                processed_short = extract_answer_by_prompt(str(message), short_txt) if TRIM_AFTER_PROMPT else short_txt
-                if processed_short and (disable_echo or not self._looks_like_echo(str(message), processed_short)):
-                    copied_text = processed_short
-                    self.telemetry.last_copy_is_echo = False
-                    self.telemetry.last_copy_length = len(copied_text)
-                    final_full = ''
-                else:
-                    # 1) Полное копирование: клик по ANSWER_ABS_X/Y, скролл вниз до конца и протяжка c автоскроллом
-                    bounds = None
-                    try:
-                        bounds = self._mac_manager.get_front_window_bounds() if self._mac_manager else None
-                    except Exception:
-                        bounds = None
-                    if bounds:
-                        x, y, w, h = bounds
-                        # Точка клика — только ANSWER_ABS_X/Y; если не заданы — fallback в правой панели
-                        try:
-                            ax = int(os.getenv("ANSWER_ABS_X", "-1"))
-                            ay = int(os.getenv("ANSWER_ABS_Y", "-1"))
-                        except Exception:
-                            ax = ay = -1
-                        if ax >= 0 and ay >= 0:
-                            click_x, click_y = ax, ay
-                        else:
-                            right_third_x = x + max(0, int(w * 2 / 3))
-                            rx = max(0, right_third_x + 8)
-                            ry = max(0, y + max(0, VISUAL_REGION_TOP))
-                            rw = max(16, int(w / 3) - 16)
-                            rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
-                            click_x = rx + max(12, int(rw * 0.9))
-                            click_y = ry + max(12, int(rh * 0.9))
-                        # Страховка: ограничим точку клика рамками окна и экрана
-                        try:
-                            sw, sh = pyautogui.size()
-                        except Exception:
-                            sw, sh = None, None
-                        if isinstance(sw, int) and isinstance(sh, int) and sw > 0 and sh > 0:
-                            click_x = max(0, min(sw - 1, int(click_x)))
-                            click_y = max(0, min(sh - 1, int(click_y)))
-                        # внутри окна с небольшим отступом от рамок
-                        click_x = max(x + 6, min(x + w - 6, int(click_x)))
-                        click_y = max(y + 6, min(y + h - 6, int(click_y)))
-                        try:
-                            # Защита от клика по зоне READY_PIXEL
-                            do_click = True
-                            if USE_READY_PIXEL and READY_PIXEL_X >= 0 and READY_PIXEL_Y >= 0:
-                                rp_sx, rp_sy = map_ready_pixel_xy(READY_PIXEL_X, READY_PIXEL_Y, READY_PIXEL_COORD_MODE, READY_PIXEL_DX, READY_PIXEL_DY)
-                                dx = int(click_x) - int(rp_sx)
-                                dy = int(click_y) - int(rp_sy)
-                                ban_r = max(6, int(READY_PIXEL_TOL) + 4)
-                                if (dx*dx + dy*dy) <= (ban_r * ban_r):
-                                    logger.info(f"Пропускаю клик перед копированием: ({click_x},{click_y}) близко к READY_PIXEL ({rp_sx},{rp_sy}), r<={ban_r}")
-                                    do_click = False
-                            if do_click:
-                                logger.info(f"Фокус перед копированием: click=({click_x},{click_y})")
-                                pyautogui.click(click_x, click_y)
-                                self.telemetry.last_click_xy = (click_x, click_y)
-                                time.sleep(0.15)
-                                # Прокрутка до самого низа, чтобы начать копирование с конца
-                                for _ in range(12):
-                                    pyautogui.scroll(-1000)
-                                    time.sleep(0.04)
-                        except Exception:
-                            pass
-                    # Сохраним и финальный регион, если включен отладочный режим
-                    if SAVE_VISUAL_DEBUG and bounds:
-                        try:
-                            right_third_x = x + max(0, int(w * 2 / 3))
-                            rx = max(0, right_third_x + 8)
-                            ry = max(0, y + max(0, VISUAL_REGION_TOP))
-                            rw = max(16, int(w / 3) - 16)
-                            rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
-                            fin_img = pyautogui.screenshot(region=(rx, ry, rw, rh))
-                            os.makedirs(SAVE_VISUAL_DIR, exist_ok=True)
-                            ts = time.strftime("%Y%m%d_%H%M%S")
-                            ms = int((time.time() % 1) * 1000)
-                            fin_img.save(os.path.join(SAVE_VISUAL_DIR, f"visual_region_final_{ts}_{ms:03d}.png"))
-                        except Exception as _e:
-                            logger.debug(f"save final visual debug failed: {_e}")
-                    # Выделение содержимого правой панели протяжкой вверх с автоскроллом (без Cmd+A)
-                    try:
-                        final_full, region = copy_from_right_panel((x, y, w, h))
-                        self.telemetry.last_visual_region = region
-                        self.telemetry.last_copy_method = 'drag_full'
-                    except Exception:
-                        final_full = ""
-            except Exception:
-                final_full = ""
-            # Обрезка по запросу и очистка от UI-шума
-            if TRIM_AFTER_PROMPT and final_full:
+                await asyncio.wait_for(done.wait(), timeout=interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            text = await self.ui.call(self._peek_answer_mac, message)
+            if done.is_set():
+                return
+            if not text or text == last:
+                continue
+            delta = self._lcp_suffix(last, text)
+            last = text
+            self.telemetry.stream_partials += 1
+            if self.telemetry.first_partial_seconds is None:
+                self.telemetry.first_partial_seconds = round(time.time() - start, 2)
+            try:
+                res = on_partial(text, delta)
+                if inspect.isawaitable(res):
+                    await res
+            except Exception as e:
+                logger.debug(f"on_partial failed: {e}")
+
+    def _finish_ready_mac(self, message: str, scheduler: ReadinessScheduler, ready_by: str | None,
+                          start: float, c: ConfigSnapshot | None = None) -> tuple[bool, str]:
+        """Зафиксировать телеметрию ожидания и, если готово, собрать текст ответа."""
+        c = c or config_store().current()
+        pixel = scheduler.get('ready_pixel')
+        if pixel is not None and pixel.last is not None:
+            self.telemetry.last_ready_pixel = pixel.last
+        if pixel is not None:
+            self.telemetry.ready_probe_count = pixel.probes
+            self.telemetry.ready_wasted_probes = getattr(pixel, 'wasted', 0)
+        cpu = scheduler.get('cpu')
+        if cpu is not None and cpu.last:
+            self.telemetry.cpu_quiet_seconds = float(cpu.last.get('quiet_seconds') or 0.0)
+
+        if ready_by == 'ready_pixel' and pixel is not None and pixel.last:
+            last = pixel.last
+            logger.info(
+                "READY_PIXEL matched: used_xy=%s rgb=%s target=%s tol=%s tol_pct=%s",
+                last.get('used_xy'), last.get('rgb'), last.get('target'), last.get('tol'), str(last.get('tol_pct')),
+            )
+            # Сохраняем снимки (умолчание: только при совпадении и не сохраняем гипотезы)
+            if c.SAVE_VISUAL_DEBUG:
                 try:
-                    final_full = extract_answer_by_prompt(str(message), final_full)
+                    self._save_ready_pixel_debug(last)
                 except Exception:
                     pass
-            if final_full:
-                suffix = self._lcp_suffix(baseline_full or "", final_full)
-                if suffix and suffix.strip() and (disable_echo or not self._looks_like_echo(str(message), suffix)):
-                    copied_text = suffix
-                    self.telemetry.last_copy_method = 'full'
-                    self.telemetry.last_copy_is_echo = False
-                    self.telemetry.last_copy_length = len(copied_text)
-                    self.telemetry.last_full_copy_length = len(final_full or '')
-                else:
-                    # если суффикс пуст/эхо — попробуем взять весь финальный
-                    if disable_echo or not self._looks_like_echo(str(message), final_full):
-                        copied_text = final_full
-                        self.telemetry.last_copy_method = 'full'
-                        self.telemetry.last_copy_is_echo = False
-                        self.telemetry.last_copy_length = len(copied_text)
-                        self.telemetry.last_full_copy_length = len(final_full or '')
-                    else:
-                        logger.warning("Финальный полный текст выглядит как эхо — попробую короткое копирование (macOS)")
-                        # Попробуем fallback на короткое копирование
-                        if USE_COPY_SHORT_FALLBACK:
-                            try:
-                                pyautogui.press('esc')
-                                time.sleep(0.1)
-                                pyautogui.keyDown('shift')
-                                pyautogui.press('tab')
-                                time.sleep(0.1)
-                                pyautogui.press('tab')
-                                pyautogui.keyUp('shift')
-                                time.sleep(0.2)
-                                pyautogui.press('enter')
-                                time.sleep(0.3)
-                                pyautogui.hotkey('command', 'c')
-                                time.sleep(0.2)
-                                short_txt = (pyperclip.paste() or '').strip()
-                            except Exception:
-                                short_txt = ''
-                            if short_txt and (disable_echo or not self._looks_like_echo(str(message), short_txt)):
-                                copied_text = short_txt
-                                self.telemetry.last_copy_method = 'short'
-                                self.telemetry.last_copy_is_echo = False
-                                self.telemetry.last_copy_length = len(copied_text)
-                            else:
-                                logger.warning(
-                                    "Короткое копирование не дало результата или эхо (macOS). "
-                                    f"last_visual_region={self.telemetry.last_visual_region}, last_click_xy={self.telemetry.last_click_xy}"
-                                )
+
+        copied_text = ""
+        if ready_by is not None and (not c.READY_PIXEL_REQUIRED or ready_by == 'ready_pixel'):
+            logger.info("Readiness satisfied by=%s, proceeding to copy", ready_by)
+            with span("extraction") as sp:
+                copied_text = self._collect_answer_mac(message, ready_by, c)
+                if sp is not None:
+                    sp.set(method=self.telemetry.last_copy_method, chars=len(copied_text or ""),
+                           probes=self.telemetry.ready_probe_count)
 
         # finalize metrics for macOS readiness loop
         ready = bool(copied_text)
-        self.telemetry.response_wait_loops = loops
+        self.telemetry.response_wait_loops = scheduler.ticks
         self.telemetry.response_ready_time = round(time.time() - start, 2)
         self.telemetry.response_stabilized = ready
         self.telemetry.response_stabilized_by = ready_by if ready else None
         return ready, copied_text
-    
+
+    def _prepare_drag_copy(self, bounds: tuple[int, int, int, int]) -> None:
+        """Подготовка к протяжке (бэкенд drag): клик по ANSWER_ABS_X/Y, прокрутка панели вниз,
+        отладочный снимок финального региона (SAVE_VISUAL_DEBUG)."""
+        x, y, w, h = bounds
+        # Точка клика — только ANSWER_ABS_X/Y; если не заданы — fallback в правой панели
+        try:
+            ax = int(os.getenv("ANSWER_ABS_X", "-1"))
+            ay = int(os.getenv("ANSWER_ABS_Y", "-1"))
+        except Exception:
+            ax = ay = -1
+        if ax >= 0 and ay >= 0:
+            click_x, click_y = ax, ay
+        else:
+            right_third_x = x + max(0, int(w * 2 / 3))
+            rx = max(0, right_third_x + 8)
+            ry = max(0, y + max(0, VISUAL_REGION_TOP))
+            rw = max(16, int(w / 3) - 16)
+            rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
+            click_x = rx + max(12, int(rw * 0.9))
+            click_y = ry + max(12, int(rh * 0.9))
+        # Страховка: ограничим точку клика рамками окна и экрана
+        try:
+            sw, sh = pyautogui.size()
+        except Exception:
+            sw, sh = None, None
+        if isinstance(sw, int) and isinstance(sh, int) and sw > 0 and sh > 0:
+            click_x = max(0, min(sw - 1, int(click_x)))
+            click_y = max(0, min(sh - 1, int(click_y)))
+        # внутри окна с небольшим отступом от рамок
+        click_x = max(x + 6, min(x + w - 6, int(click_x)))
+        click_y = max(y + 6, min(y + h - 6, int(click_y)))
+        try:
+            # Защита от клика по зоне READY_PIXEL
+            do_click = True
+            if USE_READY_PIXEL and READY_PIXEL_X >= 0 and READY_PIXEL_Y >= 0:
+                rp_sx, rp_sy = map_ready_pixel_xy(READY_PIXEL_X, READY_PIXEL_Y, READY_PIXEL_COORD_MODE, READY_PIXEL_DX, READY_PIXEL_DY)
+                dx = int(click_x) - int(rp_sx)
+                dy = int(click_y) - int(rp_sy)
+                ban_r = max(6, int(READY_PIXEL_TOL) + 4)
+                if (dx*dx + dy*dy) <= (ban_r * ban_r):
+                    logger.info(f"Пропускаю клик перед копированием: ({click_x},{click_y}) близко к READY_PIXEL ({rp_sx},{rp_sy}), r<={ban_r}")
+                    do_click = False
+            if do_click:
+                logger.info(f"Фокус перед копированием: click=({click_x},{click_y})")
+                pyautogui.click(click_x, click_y)
+                self.telemetry.last_click_xy = (click_x, click_y)
+                timing.delay("click_settle")
+                # Прокрутка до самого низа, чтобы начать копирование с конца
+                for _ in range(12):
+                    pyautogui.scroll(-1000)
+                    timing.delay("scroll_step")
+        except Exception:
+            pass
+        # Сохраним и финальный регион, если включен отладочный режим
+        if SAVE_VISUAL_DEBUG:
+            try:
+                right_third_x = x + max(0, int(w * 2 / 3))
+                rx = max(0, right_third_x + 8)
+                ry = max(0, y + max(0, VISUAL_REGION_TOP))
+                rw = max(16, int(w / 3) - 16)
+                rh = max(24, h - max(0, VISUAL_REGION_TOP) - max(0, VISUAL_REGION_BOTTOM))
+                fin_img = pyautogui.screenshot(region=(rx, ry, rw, rh))
+                os.makedirs(SAVE_VISUAL_DIR, exist_ok=True)
+                ts = time.strftime("%Y%m%d_%H%M%S")
+                ms = int((time.time() % 1) * 1000)
+                fin_img.save(os.path.join(SAVE_VISUAL_DIR, f"visual_region_final_{ts}_{ms:03d}.png"))
+            except Exception as _e:
+                logger.debug(f"save final visual debug failed: {_e}")
+
+    def _collect_answer_mac(self, message: str, ready_by: str | None, c: ConfigSnapshot | None = None) -> str:
+        """Финальный сбор текста ответа после срабатывания готовности (macOS); c — снимок конфигурации запроса."""
+        c = c or config_store().current()
+        copied_text = ""
+        baseline_full = ""
+        disable_echo = (ready_by in ('ready_pixel', 'pixel'))
+
+        try:
+            short_txt = ''
+            # 1) Если не получилось — попробуем клавиатурную навигацию к последнему ответу и копирование
+            #    В строгом режиме по опорному пикселю этот путь отключаем, чтобы не захватывать редактор
+            if not short_txt and not c.READY_PIXEL_REQUIRED:
+                try:
+                    pyautogui.press('esc')
+                    timing.delay("key_step")
+                    pyautogui.keyDown('shift')
+                    pyautogui.press('tab')
+                    timing.delay("key_step")
+                    pyautogui.press('tab')
+                    pyautogui.keyUp('shift')
+                    timing.delay("nav_settle")
+                    pyautogui.press('enter')
+                    timing.delay("open_settle")
+                    with ClipboardSession() as cb:
+                        short_txt = cb.copy_hotkey(('command', 'c')).strip()
+                    self.telemetry.last_copy_method = 'short'
+                except Exception:
+                    short_txt = ''
+            # Обрезка по запросу и очистка от UI-шума
+            processed_short = extract_answer_by_prompt(str(message), short_txt) if c.TRIM_AFTER_PROMPT else short_txt
+            if processed_short and (disable_echo or not self._looks_like_echo(str(message), processed_short)):
+                copied_text = processed_short
+                self.telemetry.last_copy_is_echo = False
+                self.telemetry.last_copy_length = len(copied_text)
+                final_full = ''
+            else:
+                # 1) Полное копирование: бэкенды извлечения по успешности (AX-дерево, затем протяжка
+                #    с автоскроллом — перед ней клик по ANSWER_ABS_X/Y и прокрутка вниз, см. _prepare_drag_copy)
+                bounds = None
+                try:
+                    bounds = self._mac_manager.get_front_window_bounds() if self._mac_manager else None
+                except Exception:
+                    bounds = None
+                try:
+                    final_full, region = self.extractor.extract(bounds) if bounds else ("", None)
+                    self.telemetry.last_visual_region = region
+                    self.telemetry.last_copy_method = f"{self.extractor.last_backend or 'drag'}_full"
+                except Exception:
+                    final_full = ""
+        except Exception:
+            final_full = ""
+        # Обрезка по запросу и очистка от UI-шума
+        if c.TRIM_AFTER_PROMPT and final_full:
+            try:
+                final_full = extract_answer_by_prompt(str(message), final_full)
+            except Exception:
+                pass
+        if final_full:
+            suffix = self._lcp_suffix(baseline_full or "", final_full)
+            if suffix and suffix.strip() and (disable_echo or not self._looks_like_echo(str(message), suffix)):
+                copied_text = suffix
+                self.telemetry.last_copy_method = 'full'
+                self.telemetry.last_copy_is_echo = False
+                self.telemetry.last_copy_length = len(copied_text)
+                self.telemetry.last_full_copy_length = len(final_full or '')
+            else:
+                # если суффикс пуст/эхо — попробуем взять весь финальный
+                if disable_echo or not self._looks_like_echo(str(message), final_full):
+                    copied_text = final_full
+                    self.telemetry.last_copy_method = 'full'
+                    self.telemetry.last_copy_is_echo = False
+                    self.telemetry.last_copy_length = len(copied_text)
+                    self.telemetry.last_full_copy_length = len(final_full or '')
+                else:
+                    logger.warning("Финальный полный текст выглядит как эхо — попробую короткое копирование (macOS)")
+                    # Попробуем fallback на короткое копирование
+                    if c.USE_COPY_SHORT_FALLBACK:
+                        try:
+                            pyautogui.press('esc')
+                            timing.delay("key_step")
+                            pyautogui.keyDown('shift')
+                            pyautogui.press('tab')
+                            timing.delay("key_step")
+                            pyautogui.press('tab')
+                            pyautogui.keyUp('shift')
+                            timing.delay("nav_settle")
+                            pyautogui.press('enter')
+                            timing.delay("open_settle")
+                            with ClipboardSession() as cb:
+                                short_txt = cb.copy_hotkey(('command', 'c')).strip()
+                        except Exception:
+                            short_txt = ''
+                        if short_txt and (disable_echo or not self._looks_like_echo(str(message), short_txt)):
+                            copied_text = short_txt
+                            self.telemetry.last_copy_method = 'short'
+                            self.telemetry.last_copy_is_echo = False
+                            self.telemetry.last_copy_length = len(copied_text)
+                        else:
+                            logger.warning(
+                                "Короткое копирование не дало результата или эхо (macOS). "
+                                f"last_visual_region={self.telemetry.last_visual_region}, "
+                                f"last_click_xy={self.telemetry.last_click_xy}"
+                            )
+        return copied_text
 
     def _ensure_windsurf_frontmost_mac(self, target: str | None) -> bool:
         """Сфокусировать Windsurf и, при необходимости, конкретное окно.
@@ -713,8 +748,8 @@ class DesktopController:
             return True
         try:
             # Активируем приложение
-            subprocess.run(["osascript", "-e", 'tell application "Windsurf" to activate'], check=False)
-            time.sleep(0.3)
+            run_osascript('tell application "Windsurf" to activate')
+            timing.delay("activate_settle")
             # Если задан таргет окна — пытаемся сфокусировать его
             desired_title: str | None = None
             desired_sub: str | None = None
@@ -752,245 +787,298 @@ class DesktopController:
                         ok = self._mac_manager.focus_by_title_substring(desired_sub)
                     if not ok:
                         logger.warning(f"Не удалось сфокусировать окно по заголовку: {target}")
+
             # Ждем, пока Windsurf станет frontmost; по возможности проверим, что активирован нужный заголовок
-            start = time.time()
-            while time.time() - start < FRONTMOST_WAIT_SECONDS:
-                if self._mac_manager.is_frontmost():
-                    if desired_title or desired_sub:
-                        try:
-                            ft = self._mac_manager.get_front_window_title() or ""
-                        except Exception:
-                            ft = ""
-                        if desired_title:
-                            l = ft.strip().lower(); r = desired_title.strip().lower()
-                            if l == r or (l and r and (l in r or r in l)):
-                                return True
-                        elif desired_sub:
-                            if desired_sub.strip().lower() in ft.strip().lower():
-                                return True
-                        # Иначе подождём ещё чуть-чуть
-                    else:
-                        return True
-                time.sleep(0.1)
+            def _front_ok() -> bool:
+                if not self._mac_manager.is_frontmost():
+                    return False
+                if not (desired_title or desired_sub):
+                    return True
+                try:
+                    ft = self._mac_manager.get_front_window_title() or ""
+                except Exception:
+                    ft = ""
+                if desired_title:
+                    front = ft.strip().lower()
+                    want = desired_title.strip().lower()
+                    return front == want or bool(front and want and (front in want or want in front))
+                return desired_sub.strip().lower() in ft.strip().lower()
+
+            if timing.wait("frontmost", _front_ok, timeout=FRONTMOST_WAIT_SECONDS,
+                           poll=timing.seconds("frontmost_poll")):
+                return True
             logger.warning("Windsurf не стал frontmost или активировался не тот заголовок за отведенное время")
             return False
         except Exception as e:
             logger.debug(f"ensure frontmost failed: {e}")
             return False
 
-    def send_message_sync(self, message, target: str | None = None):
-        """Синхронная версия отправки сообщения (вызывается в отдельном потоке)"""
+    def _mac_send_prompt(self, message, target: str | None = None) -> bool:
+        """Фаза отправки (macOS): фокус окна, клик, вставка с верификацией и Enter."""
+        timing.ledger().begin()
+        detailed_log = False
+        logger.info("macOS: активируем приложение Windsurf")
+        with span("focus", target=target or "active") as sp:
+            focused_ok = self._ensure_windsurf_frontmost_mac(target or "active")
+            if sp is not None:
+                sp.set(ok=bool(focused_ok))
+        if target and not focused_ok:
+            logger.warning(f"Фокусировка на целевом окне не удалась: target={target}")
+            self.telemetry.last_error = f"focus failed for target: {target}"
+            self.telemetry.failed_sends += 1
+            return False
 
-        system = platform.system()
-        self.telemetry.last_platform = system
+        # 1) Гарантируем фокус кликом по полю ввода (если заданы INPUT_ABS_X/Y),
+        #    иначе кликом в область ответа (ANSWER_ABS_X/Y) — только для фокуса приложения
+        click_t0 = time.monotonic()
         try:
-            if system == "Darwin":  # macOS путь
-                logger.info("macOS: активируем приложение Windsurf")
-                focused_ok = self._ensure_windsurf_frontmost_mac(target or "active")
-                if target and not focused_ok:
-                    logger.warning(f"Фокусировка на целевом окне не удалась: target={target}")
-                    self.telemetry.last_error = f"focus failed for target: {target}"
-                    self.telemetry.failed_sends += 1
-                    return False
+            bounds = self._mac_manager.get_front_window_bounds() if self._mac_manager else None
+        except Exception:
+            bounds = None
+        if bounds:
+            try:
+                x, y, w, h = bounds
+                detailed_log = False
+                try:
+                    detailed_log = (os.getenv("DETAILED_AUTOMATION_LOG", "0").lower() not in ("0", "false", "no"))
+                except Exception:
+                    detailed_log = False
+                if detailed_log:
+                    logger.info(f"[Focus] window bounds (x={x}, y={y}, w={w}, h={h})")
+                ix = os.getenv("INPUT_ABS_X")
+                iy = os.getenv("INPUT_ABS_Y")
+                ax = os.getenv("ANSWER_ABS_X")
+                ay = os.getenv("ANSWER_ABS_Y")
+                focus_x = None
+                focus_y = None
+                try:
+                    # приоритет: INPUT_ABS -> ANSWER_ABS
+                    if ix is not None and iy is not None:
+                        ix_i = int(str(ix).strip())
+                        iy_i = int(str(iy).strip())
+                        if ix_i >= 0 and iy_i >= 0:
+                            focus_x, focus_y = ix_i, iy_i
+                    if focus_x is None and ax is not None and ay is not None:
+                        ax_i = int(str(ax).strip())
+                        ay_i = int(str(ay).strip())
+                        if ax_i >= 0 and ay_i >= 0:
+                            focus_x, focus_y = ax_i, ay_i
+                except Exception:
+                    focus_x = focus_y = None
+                if detailed_log:
+                    logger.info(
+                        f"[Focus] requested coords: INPUT=({ix},{iy}) ANSWER=({ax},{ay}) "
+                        f"-> chosen=({focus_x},{focus_y})"
+                    )
+                # никаких fallback-ов: кликаем только по ANSWER_ABS_X/Y; если не заданы — пропускаем клик
 
-                # 1) Гарантируем фокус кликом по полю ввода (если заданы INPUT_ABS_X/Y),
-                #    иначе кликом в область ответа (ANSWER_ABS_X/Y) — только для фокуса приложения
+                # Клампим координаты к экрану и (дополнительно) к окну
                 try:
-                    bounds = self._mac_manager.get_front_window_bounds() if self._mac_manager else None
+                    sw, sh = pyautogui.size()
                 except Exception:
-                    bounds = None
-                if bounds:
-                    try:
-                        x, y, w, h = bounds
-                        detailed_log = False
-                        try:
-                            detailed_log = (os.getenv("DETAILED_AUTOMATION_LOG", "0").lower() not in ("0", "false", "no"))
-                        except Exception:
-                            detailed_log = False
-                        if detailed_log:
-                            logger.info(f"[Focus] window bounds (x={x}, y={y}, w={w}, h={h})")
-                        ix = os.getenv("INPUT_ABS_X")
-                        iy = os.getenv("INPUT_ABS_Y")
-                        ax = os.getenv("ANSWER_ABS_X")
-                        ay = os.getenv("ANSWER_ABS_Y")
-                        focus_x = None
-                        focus_y = None
-                        try:
-                            # приоритет: INPUT_ABS -> ANSWER_ABS
-                            if ix is not None and iy is not None:
-                                ix_i = int(str(ix).strip())
-                                iy_i = int(str(iy).strip())
-                                if ix_i >= 0 and iy_i >= 0:
-                                    focus_x, focus_y = ix_i, iy_i
-                            if focus_x is None and ax is not None and ay is not None:
-                                ax_i = int(str(ax).strip())
-                                ay_i = int(str(ay).strip())
-                                if ax_i >= 0 and ay_i >= 0:
-                                    focus_x, focus_y = ax_i, ay_i
-                        except Exception:
-                            focus_x = focus_y = None
+                    sw = sh = None
+                if focus_x is not None and focus_y is not None:
+                    if isinstance(sw, int) and isinstance(sh, int) and sw > 0 and sh > 0:
+                        focus_x = max(0, min(sw - 1, int(focus_x)))
+                        focus_y = max(0, min(sh - 1, int(focus_y)))
                         if detailed_log:
-                            logger.info(f"[Focus] requested coords: INPUT=({ix},{iy}) ANSWER=({ax},{ay}) -> chosen=({focus_x},{focus_y})")
-                        # никаких fallback-ов: кликаем только по ANSWER_ABS_X/Y; если не заданы — пропускаем клик
-
-                        # Клампим координаты к экрану и (дополнительно) к окну
-                        try:
-                            sw, sh = pyautogui.size()
-                        except Exception:
-                            sw = sh = None
-                        if focus_x is not None and focus_y is not None:
-                            if isinstance(sw, int) and isinstance(sh, int) and sw > 0 and sh > 0:
-                                focus_x = max(0, min(sw - 1, int(focus_x)))
-                                focus_y = max(0, min(sh - 1, int(focus_y)))
-                                if detailed_log:
-                                    logger.info(f"[Focus] screen size=({sw},{sh}) -> clamped focus=({focus_x},{focus_y})")
-                            # Внутри окна с небольшими отступами
-                            fx = max(x + 6, min(x + w - 6, int(focus_x)))
-                            fy = max(y + 6, min(y + h - 6, int(focus_y)))
-                            # Защита: не кликать, если рядом с READY_PIXEL (кнопка Stop)
-                            try:
-                                if USE_READY_PIXEL and READY_PIXEL_X >= 0 and READY_PIXEL_Y >= 0:
-                                    rp_sx, rp_sy = map_ready_pixel_xy(READY_PIXEL_X, READY_PIXEL_Y, READY_PIXEL_COORD_MODE, READY_PIXEL_DX, READY_PIXEL_DY)
-                                    dx = int(fx) - int(rp_sx)
-                                    dy = int(fy) - int(rp_sy)
-                                    # Радиус запрета: чуть больше допуска цвета
-                                    ban_r = max(6, int(READY_PIXEL_TOL) + 4)
+                            logger.info(f"[Focus] screen size=({sw},{sh}) -> clamped focus=({focus_x},{focus_y})")
+                    # Внутри окна с небольшими отступами
+                    fx = max(x + 6, min(x + w - 6, int(focus_x)))
+                    fy = max(y + 6, min(y + h - 6, int(focus_y)))
+                    # Защита: не кликать, если рядом с READY_PIXEL (кнопка Stop)
+                    try:
+                        if USE_READY_PIXEL and READY_PIXEL_X >= 0 and READY_PIXEL_Y >= 0:
+                            rp_sx, rp_sy = map_ready_pixel_xy(
+                                READY_PIXEL_X, READY_PIXEL_Y, READY_PIXEL_COORD_MODE, READY_PIXEL_DX, READY_PIXEL_DY
+                            )
+                            dx = int(fx) - int(rp_sx)
+                            dy = int(fy) - int(rp_sy)
+                            # Радиус запрета: чуть больше допуска цвета
+                            ban_r = max(6, int(READY_PIXEL_TOL) + 4)
+                            if detailed_log:
+                                logger.info(
+                                    f"[Focus] READY_PIXEL mapped=({rp_sx},{rp_sy}) tol={READY_PIXEL_TOL} ban_r={ban_r} "
+                                    f"base_click=({fx},{fy}) d2={dx*dx+dy*dy}"
+                                )
+                            if (dx*dx + dy*dy) <= (ban_r * ban_r):
+                                logger.info(
+                                    f"Фокус‑клик близко к READY_PIXEL, ищу безопасное смещение: "
+                                    f"base=({fx},{fy}) rp=({rp_sx},{rp_sy}) r<={ban_r}"
+                                )
+                                # Попробуем несколько смещений, чтобы уйти от кнопки Stop, но остаться в окне
+                                candidates = [
+                                    (-120, -60), (120, -60), (-160, 0), (160, 0), (0, -120), (0, 120)
+                                ]
+                                clicked = False
+                                for dxo, dyo in candidates:
+                                    nfx = max(x + 6, min(x + w - 6, int(fx + dxo)))
+                                    nfy = max(y + 6, min(y + h - 6, int(fy + dyo)))
+                                    ndx = int(nfx) - int(rp_sx)
+                                    ndy = int(nfy) - int(rp_sy)
                                     if detailed_log:
-                                        logger.info(f"[Focus] READY_PIXEL mapped=({rp_sx},{rp_sy}) tol={READY_PIXEL_TOL} ban_r={ban_r} base_click=({fx},{fy}) d2={dx*dx+dy*dy}")
-                                    if (dx*dx + dy*dy) <= (ban_r * ban_r):
-                                        logger.info(f"Фокус‑клик близко к READY_PIXEL, ищу безопасное смещение: base=({fx},{fy}) rp=({rp_sx},{rp_sy}) r<={ban_r}")
-                                        # Попробуем несколько смещений, чтобы уйти от кнопки Stop, но остаться в окне
-                                        candidates = [
-                                            (-120, -60), (120, -60), (-160, 0), (160, 0), (0, -120), (0, 120)
-                                        ]
-                                        clicked = False
-                                        for dxo, dyo in candidates:
-                                            nfx = max(x + 6, min(x + w - 6, int(fx + dxo)))
-                                            nfy = max(y + 6, min(y + h - 6, int(fy + dyo)))
-                                            ndx = int(nfx) - int(rp_sx)
-                                            ndy = int(nfy) - int(rp_sy)
-                                            if detailed_log:
-                                                logger.info(f"[Focus] try offset ({dxo},{dyo}) -> ({nfx},{nfy}) d2={ndx*ndx+ndy*ndy}")
-                                            if (ndx*ndx + ndy*ndy) > (ban_r * ban_r):
-                                                logger.info(f"Фокус‑клик (offset) по координатам: ({nfx},{nfy})")
-                                                pyautogui.click(nfx, nfy)
-                                                self.telemetry.last_click_xy = (nfx, nfy)
-                                                clicked = True
-                                                break
-                                        if not clicked:
-                                            # В крайнем случае кликаем по исходной точке
-                                            logger.info(f"Фокус‑клик (forced) по координатам: ({fx},{fy})")
-                                            pyautogui.click(fx, fy)
-                                            self.telemetry.last_click_xy = (fx, fy)
-                                    else:
-                                        logger.info(f"Фокус‑клик по координатам: ({fx},{fy})")
-                                        pyautogui.click(fx, fy)
-                                        self.telemetry.last_click_xy = (fx, fy)
-                                else:
-                                    logger.info(f"Фокус‑клик по координатам: ({fx},{fy})")
-                                    pyautogui.click(fx, fy)
-                                    self.telemetry.last_click_xy = (fx, fy)
-                            except Exception:
-                                # На всякий случай делаем клик, если проверка не удалась
-                                try:
-                                    logger.info(f"Фокус‑клик (fallback) по координатам: ({fx},{fy})")
+                                        logger.info(
+                                            f"[Focus] try offset ({dxo},{dyo}) -> ({nfx},{nfy}) d2={ndx*ndx+ndy*ndy}"
+                                        )
+                                    if (ndx*ndx + ndy*ndy) > (ban_r * ban_r):
+                                        logger.info(f"Фокус‑клик (offset) по координатам: ({nfx},{nfy})")
+                                        pyautogui.click(nfx, nfy)
+                                        self.telemetry.last_click_xy = (nfx, nfy)
+                                        clicked = True
+                                        break
+                                if not clicked:
+                                    # В крайнем случае кликаем по исходной точке
+                                    logger.info(f"Фокус‑клик (forced) по координатам: ({fx},{fy})")
                                     pyautogui.click(fx, fy)
                                     self.telemetry.last_click_xy = (fx, fy)
-                                except Exception:
-                                    self.telemetry.last_click_xy = None
-                            time.sleep(0.15)
+                            else:
+                                logger.info(f"Фокус‑клик по координатам: ({fx},{fy})")
+                                pyautogui.click(fx, fy)
+                                self.telemetry.last_click_xy = (fx, fy)
+                        else:
+                            logger.info(f"Фокус‑клик по координатам: ({fx},{fy})")
+                            pyautogui.click(fx, fy)
+                            self.telemetry.last_click_xy = (fx, fy)
                     except Exception:
-                        pass
+                        # На всякий случай делаем клик, если проверка не удалась
+                        try:
+                            logger.info(f"Фокус‑клик (fallback) по координатам: ({fx},{fy})")
+                            pyautogui.click(fx, fy)
+                            self.telemetry.last_click_xy = (fx, fy)
+                        except Exception:
+                            self.telemetry.last_click_xy = None
+                    timing.delay("click_settle")
+            except Exception:
+                pass
+        record_span("click", time.monotonic() - click_t0, xy=self.telemetry.last_click_xy)
+
+        # 2) Копируем в буфер и вставляем CMD+V с ретраями
+        if detailed_log:
+            logger.info("[Paste] copying message to clipboard")
+        # Сеанс буфера: содержимое пользователя вернётся после вставки и проверки (CLIPBOARD_RESTORE)
+        with ClipboardSession() as cb:
+            with span("clipboard_copy", chars=len(str(message))):
+                copied_ok = cb.copy(str(message))
+            if not copied_ok:
+                self.telemetry.failed_sends += 1
+                return False
 
-                # 2) Копируем в буфер и вставляем CMD+V с ретраями
-                if detailed_log:
-                    logger.info("[Paste] copying message to clipboard")
-                if not cb_copy(str(message)):
-                    self.telemetry.failed_sends += 1
-                    return False
+            # НЕ используем Cmd+L на macOS — это иногда уводит фокус в терминал/панель
+
+            if detailed_log:
+                logger.info(f"[Paste] starting paste retries: count={PASTE_RETRY_COUNT}")
+            with span("paste") as sp:
+                pasted_ok = cb_paste_mac(str(message), PASTE_RETRY_COUNT, telemetry=self.telemetry)
+                if sp is not None:
+                    sp.set(ok=bool(pasted_ok), strategy=self.telemetry.last_paste_strategy)
+        if not pasted_ok:
+            logger.error("Не удалось вставить текст в Windsurf (macOS)")
+            self.telemetry.last_error = "mac paste failed"
+            self.telemetry.failed_sends += 1
+            return False
 
-                # НЕ используем Cmd+L на macOS — это иногда уводит фокус в терминал/панель
+        logger.info("Вставка успешна, отправляю Enter")
+        with span("enter"):
+            pyautogui.press('enter')
+            timing.delay("submit_settle")
+        return True
+
+    def _mac_finalize(self, message, ready: bool, copied_text: str) -> bool:
+        """Фаза завершения (macOS): fallback-копирование, очистка и запись ответа в буфер."""
+        copied = ready
+        if not ready and not READY_PIXEL_REQUIRED:
+            # Fallback: полный текст окна
+            logger.warning("Не удалось дождаться стабильного короткого ответа — копирую полный текст (macOS)")
+            try:
+                self.telemetry.last_copy_method = 'full'
+                pyautogui.hotkey('command', 'a')
+                timing.delay("select_all_settle")
+                with ClipboardSession() as cb:
+                    copied_text = cb.copy_hotkey(('command', 'c'))
+                copied = bool(
+                    copied_text and copied_text.strip() and not self._looks_like_echo(str(message), copied_text)
+                )
+            except Exception as e:
+                logger.debug(f"full copy fallback failed: {e}")
+        self.telemetry.last_copy_length = len(copied_text or "")
+        # Для информации: длина полного текста при стабилизации
+        try:
+            if USE_FULLTEXT_STABILIZATION:
+                self.telemetry.last_full_copy_length = len(last_full or "")
+        except Exception:
+            pass
+        # Очистка; ответ хранится в контроллере, в буфер пишется только при CLIPBOARD_RESTORE=0
+        # (иначе буфер пользователя остаётся нетронутым)
+        try:
+            raw_clip = copied_text or ("" if CLIPBOARD_RESTORE else read_clipboard())
+            with span("clean", chars=len(raw_clip or "")):
+                cleaned = clean_copied_text(str(message), raw_clip)
+            if cleaned and cleaned.strip():
+                self._last_response = cleaned
+                self.telemetry.last_copy_length = len(cleaned)
+                self.telemetry.last_copy_is_echo = self._looks_like_echo(str(message), cleaned)
+            else:
+                self._last_response = raw_clip or ""
+            if not CLIPBOARD_RESTORE:
+                ClipboardSession(restore=False).copy(self._last_response)
+        except Exception as _e:
+            logger.debug(f"clean/copy failed: {_e}")
+        # Диагностика финального ответа
+        try:
+            final_len = int(self.telemetry.last_copy_length or 0)
+            full_len = int(self.telemetry.last_full_copy_length or 0)
+            method = self.telemetry.last_copy_method or '—'
+            echo_flag = bool(self.telemetry.last_copy_is_echo)
+            logger.info(
+                "Final response prepared: method=%s cleaned_len=%d full_len=%d echo=%s",
+                method, final_len, full_len, echo_flag,
+            )
+        except Exception:
+            pass
+        if not copied:
+            logger.warning("Ответ не получен или выглядит как эхо (macOS)")
 
-                if detailed_log:
-                    logger.info(f"[Paste] starting paste retries: count={PASTE_RETRY_COUNT}")
-                pasted_ok = cb_paste_mac(str(message), PASTE_RETRY_COUNT)
-                if not pasted_ok:
-                    logger.error("Не удалось вставить текст в Windsurf (macOS)")
-                    self.telemetry.last_error = "mac paste failed"
-                    self.telemetry.failed_sends += 1
-                    return False
+        # Сколько времени запроса ушло на паузы и ожидания (core/timing)
+        self.telemetry.last_sleep = timing.ledger().summary()
+        self.telemetry.success_sends += 1
+        return True
 
-                logger.info("Вставка успешна, отправляю Enter")
-                pyautogui.press('enter')
-                time.sleep(0.5)
-
-                # Активное ожидание готовности ответа
-                time.sleep(max(0.0, RESPONSE_WAIT_SECONDS))
-                # baseline: отключено, чтобы не прерывать генерацию
-                baseline_text = ""
-                ready, copied_text = self._wait_for_ready_mac(str(message), baseline_text)
-                copied = ready
-                if not ready and not READY_PIXEL_REQUIRED:
-                    # Fallback: полный текст окна
-                    logger.warning("Не удалось дождаться стабильного короткого ответа — копирую полный текст (macOS)")
-                    try:
-                        self.telemetry.last_copy_method = 'full'
-                        pyautogui.hotkey('command', 'a')
-                        time.sleep(0.2)
-                        pyautogui.hotkey('command', 'c')
-                        time.sleep(0.4)
-                        copied_text = pyperclip.paste()
-                        copied = bool(copied_text and copied_text.strip() and not self._looks_like_echo(str(message), copied_text))
-                    except Exception as e:
-                        logger.debug(f"full copy fallback failed: {e}")
-                self.telemetry.last_copy_length = len(copied_text or "")
-                # Для информации: длина полного текста при стабилизации
-                try:
-                    if USE_FULLTEXT_STABILIZATION:
-                        self.telemetry.last_full_copy_length = len(last_full or "")
-                except Exception:
-                    pass
-                # Очистка и запись ответа в буфер
-                try:
-                    raw_clip = copied_text or (pyperclip.paste() or "")
-                    cleaned = clean_copied_text(str(message), raw_clip)
-                    if cleaned and cleaned.strip():
-                        pyperclip.copy(cleaned)
-                        self.telemetry.last_copy_length = len(cleaned)
-                        self.telemetry.last_copy_is_echo = self._looks_like_echo(str(message), cleaned)
-                    else:
-                        pyperclip.copy(raw_clip or "")
-                except Exception as _e:
-                    logger.debug(f"clean/copy failed: {_e}")
-                # Диагностика финального ответа
-                try:
-                    final_len = int(self.telemetry.last_copy_length or 0)
-                    full_len = int(self.telemetry.last_full_copy_length or 0)
-                    method = self.telemetry.last_copy_method or '—'
-                    echo_flag = bool(self.telemetry.last_copy_is_echo)
-                    logger.info(
-                        "Final response prepared: method=%s cleaned_len=%d full_len=%d echo=%s",
-                        method, final_len, full_len, echo_flag,
-                    )
-                except Exception:
-                    pass
-                if not copied:
-                    logger.warning("Ответ не получен или выглядит как эхо (macOS)")
+    def send_message_sync(self, message, target: str | None = None):
+        """Синхронная версия отправки сообщения (вызывается в отдельном потоке)"""
 
-                self.telemetry.success_sends += 1
-                return True
+        system = platform.system()
+        self.telemetry.last_platform = system
+        try:
+            if system == "Darwin":  # macOS путь
+                with get_tracer().trace("send", target=target or "active", chars=len(str(message))) as root:
+                    if not self._mac_send_prompt(message, target):
+                        root.set(ok=False)
+                        return False
+                    # Активное ожидание готовности ответа
+                    with span("initial_wait"):
+                        timing.delay("response_wait", RESPONSE_WAIT_SECONDS)
+                    # baseline: отключено, чтобы не прерывать генерацию
+                    ready, copied_text = self._wait_for_ready_mac(str(message), "")
+                    with span("finalize"):
+                        ok = self._mac_finalize(message, ready, copied_text)
+                    root.set(ok=bool(ok), ready=bool(ready))
+                    return ok
 
             elif WINDOWS_AUTOMATION_AVAILABLE:
+                timing.ledger().begin()
                 # Ищем окно Windsurf по имени процесса (Windows)
                 logger.info("Ищем окно Windsurf (Windows)...")
-                windsurf_pids = _scan_windsurf_processes()
+                sampler = process_sampler()
+                if sampler.stats().get("age_seconds") is None:
+                    sampler.refresh()   # фоновый поток ещё не успел сделать первый снимок
+                windsurf_pids = [p["pid"] for p in sampler.snapshot()]
                 logger.info(f"Найдено процессов Windsurf: {len(windsurf_pids)} - PIDs: {windsurf_pids}")
 
                 main_window = None
                 for pid in windsurf_pids:
                     try:
                         logger.info(f"Проверяем процесс PID: {pid}")
-                        app = Application(backend="uia").connect(process=pid)
+                        app = _pywinauto.Application(backend="uia").connect(process=pid)
 
                         all_windows = app.windows()
                         visible_windows = [w for w in all_windows if w.is_visible()]
@@ -1013,7 +1101,7 @@ class DesktopController:
 
                 if not main_window:
                     raise Exception("Ни в одном процессе Windsurf не найдены окна")
-                time.sleep(0.8)
+                timing.delay("win_window_settle")
 
                 # Поле ввода уже активно, просто печатаем
                 logger.info(f"Печатаем сообщение напрямую: {message}")
@@ -1023,18 +1111,18 @@ class DesktopController:
                     logger.error("Не удалось скопировать текст в буфер обмена")
                     self.telemetry.failed_sends += 1
                     return False
-                time.sleep(0.2)
+                timing.delay("win_copy_settle")
 
                 # Устанавливаем фокус на окно
                 if main_window is not None:
                     try:
                         main_window.set_focus()
-                        time.sleep(0.3)
+                        timing.delay("win_focus_settle")
                     except Exception as e:
                         logger.warning(f"Не удалось установить фокус через main_window: {e}")
 
                 # Дополнительная задержка для полной активации окна
-                time.sleep(0.3)
+                timing.delay("win_focus_settle")
 
                 # Проверяем содержимое буфера обмена перед вставкой, ретраи
                 for attempt in range(PASTE_RETRY_COUNT + 1):
@@ -1043,35 +1131,35 @@ class DesktopController:
                         if clipboard_content.strip() != str(message).strip():
                             if not self.copy_to_clipboard(str(message)):
                                 continue
-                            time.sleep(0.2)
+                            timing.delay("win_copy_settle")
                         # На повторных попытках предварительно очищаем поле
                         if attempt > 0:
                             logger.warning("Повтор вставки (Windows): очищаю поле (Ctrl+A, Backspace) перед вставкой")
                             pyautogui.hotkey('ctrl', 'a')
-                            time.sleep(0.1)
+                            timing.delay("key_step")
                             pyautogui.press('backspace')
-                            time.sleep(0.15)
+                            timing.delay("clear_settle")
                         # Пытаемся вставить
                         pyautogui.hotkey('ctrl', 'v')
-                        time.sleep(0.5)
+                        timing.delay("win_paste_settle")
                         # Проверяем вставку
                         pyautogui.hotkey('ctrl', 'a')
-                        time.sleep(0.1)
+                        timing.delay("key_step")
                         pyautogui.hotkey('ctrl', 'c')
-                        time.sleep(0.2)
+                        timing.delay("win_copy_settle")
                         pasted_text = pyperclip.paste()
                         if pasted_text.strip() == str(message).strip():
                             break
                     except Exception as e:
                         logger.debug(f"win paste attempt {attempt} failed: {e}")
-                        time.sleep(0.3)
+                        timing.delay("retry_backoff")
 
                 logger.info("Сообщение напечатано, отправляю Enter")
                 pyautogui.press("enter")
-                time.sleep(0.5)
+                timing.delay("submit_settle")
 
                 logger.info("Сообщение отправлено, ждем ответ ИИ (Windows)...")
-                time.sleep(max(0.0, RESPONSE_WAIT_SECONDS))
+                timing.delay("response_wait", RESPONSE_WAIT_SECONDS)
 
                 # Компактный путь копирования: выделяем правую панель по прямоугольнику окна и копируем
                 logger.info("Копирую ответ из правой панели (Windows) через протяжку...")
@@ -1097,6 +1185,7 @@ class DesktopController:
                 except Exception as e:
                     logger.debug(f"windows clean/copy failed: {e}")
 
+                self.telemetry.last_sleep = timing.ledger().summary()
                 self.telemetry.success_sends += 1
                 return True
 
@@ -1116,23 +1205,351 @@ class DesktopController:
         d.update({
             "platform": platform.system(),
             "windows_automation": WINDOWS_AUTOMATION_AVAILABLE,
-            "windsurf_pids": _scan_windsurf_processes(),
+            "windsurf_pids": process_sampler().snapshot(),
+            "process_sampler": process_sampler().stats(),
+            "config_version": config_store().current().version,
             "RESPONSE_WAIT_SECONDS": RESPONSE_WAIT_SECONDS,
             "RESPONSE_MAX_WAIT_SECONDS": RESPONSE_MAX_WAIT_SECONDS,
             "RESPONSE_POLL_INTERVAL_SECONDS": RESPONSE_POLL_INTERVAL_SECONDS,
             "RESPONSE_STABLE_MIN_SECONDS": RESPONSE_STABLE_MIN_SECONDS,
             "PASTE_RETRY_COUNT": PASTE_RETRY_COUNT,
             "COPY_RETRY_COUNT": COPY_RETRY_COUNT,
+            "ui_queue": self.ui.stats(),
+            "window_cache": self._mac_manager.cache_info() if self._mac_manager is not None else None,
+            "script_worker": (get_script_worker().stats() if get_script_worker() is not None else None),
+            "extraction": self.extractor.stats(),
+            "clipboard": clipboard_stats().to_dict(),
+            "metrics": self._metrics_diag(),
         })
         return d
 
+    def _metrics_diag(self) -> dict:
+        """Перцентили за последний час и за весь горизонт хранения, готовность по окнам и моделям."""
+        store = metrics()
+        return {
+            "last_hour": store.summary(3600),
+            "window": store.summary(),
+            "ready_by_window": store.breakdown("ready_seconds", "window"),
+            "ready_by_model": store.breakdown("ready_seconds", "model"),
+            "store": store.stats(),
+        }
+
+    def export_openmetrics(self) -> str:
+        """Метрики в формате OpenMetrics для /metrics (core/openmetrics).
+
+        Только счётчики в памяти и копии гистограмм — без сканирования процессов и UI-вызовов;
+        сервер вызывает это в потоке пула.
+        """
+        store = metrics()
+        cnt = counters().snapshot()
+        ui = self.ui.stats()
+        sw = get_script_worker().stats() if get_script_worker() is not None else {}
+        return om.render([
+            om.counter("windsurf_sends", "Отправки запросов в Windsurf по результату", {
+                (("result", "success"),): self.telemetry.success_sends,
+                (("result", "failure"),): self.telemetry.failed_sends,
+            }),
+            om.histogram("windsurf_ready_seconds", "Время до готовности ответа",
+                         store.lifetime("ready_seconds")),
+            om.histogram("windsurf_send_seconds", "Полное время запроса",
+                         store.lifetime("send_seconds")),
+            om.histogram("windsurf_paste_attempts", "Попытки вставки на запрос",
+                         store.lifetime("paste_attempts"), bounds=(1, 2, 3, 5)),
+            om.gauge("windsurf_ui_queue_depth", "Задачи очереди UI", {
+                (("state", "pending"),): ui.get("pending") or 0,
+                (("state", "in_flight"),): ui.get("in_flight") or 0,
+                (("state", "running"),): 1 if ui.get("running") else 0,
+            }),
+            om.counter("windsurf_ui_jobs", "Завершённые задачи очереди UI", {
+                (("result", "completed"),): ui.get("completed") or 0,
+                (("result", "failed"),): ui.get("failed") or 0,
+                (("result", "cancelled"),): ui.get("cancelled") or 0,
+            }),
+            om.counter("windsurf_ready_probes", "Пробы детекторов готовности", cnt.get("ready_probes") or {}),
+            om.counter("windsurf_subprocess_spawns", "Запуски подпроцессов", cnt.get("subprocess_spawns") or {}),
+            om.counter("windsurf_osascript_calls", "Вызовы AppleScript через воркер", {
+                (("result", "ok"),): max(0, (sw.get("calls") or 0) - (sw.get("errors") or 0)),
+                (("result", "error"),): sw.get("errors") or 0,
+            }),
+            om.counter("windsurf_models_refresh", "Обновления каталога моделей Gemini",
+                       cnt.get("models_refresh") or {}),
+            om.histogram("windsurf_models_refresh_seconds", "Время обновления каталога моделей Gemini",
+                         store.lifetime("models_refresh_seconds")),
+            om.counter("windsurf_tg_messages", "Ответы, отправленные в Telegram, по результату",
+                       cnt.get("tg_messages") or {}),
+            om.counter("windsurf_tg_flood_waits", "Паузы flood-wait от Telegram", cnt.get("tg_flood_waits") or {}),
+            om.histogram("windsurf_tg_delivery_seconds", "Время доставки ответа в Telegram целиком",
+                         store.lifetime("tg_delivery_seconds")),
+        ])
+
+    def _observe_request(self, target: str | None, ok: bool, seconds: float) -> None:
+        """Успешный запрос — в историю метрик (core/metrics) с метками окна и модели.
+
+        Значения берутся из диагностики задачи (снимок телеметрии этого запроса), иначе — из текущей.
+        """
+        if not ok:
+            return
+        try:
+            job = self.ui.current_job()
+            diag = (job.meta.get('diag') if job is not None else None) or self.telemetry.to_dict()
+            labels = {"window": target or "active", "model": diag.get('last_model_set')}
+            store = metrics()
+            store.observe("send_seconds", round(seconds, 3), **labels)
+            store.observe("ready_seconds", diag.get('response_ready_time'), **labels)
+            store.observe("paste_attempts", diag.get('last_paste_attempts'), **labels)
+            store.observe("probe_count", diag.get('response_wait_loops'), **labels)
+            store.observe("extraction_chars", diag.get('last_copy_length'), **labels)
+        except Exception as e:
+            logger.debug(f"metrics observe failed: {e}")
+
+    async def _send_message_async(self, message, target: str | None = None,
+                                  cancel: threading.Event | None = None, on_partial=None):
+        """Асинхронная отправка (выполняется как задача очереди UI). На macOS фазы отправки
+        и копирования идут в UI-потоке, а ожидание готовности — в event loop.
+        Фазы запроса пишутся в трассу (core/tracing, /trace)."""
+        with get_tracer().trace("send", target=target or "active", chars=len(str(message))) as root:
+            ok = await self._send_message_async_traced(message, target, cancel, on_partial)
+            root.set(ok=bool(ok))
+        self._observe_request(target, ok, root.duration)
+        return ok
+
+    async def _send_message_async_traced(self, message, target: str | None,
+                                         cancel: threading.Event | None, on_partial) -> bool:
+        if platform.system() != "Darwin":
+            return await self.ui.call(self.send_message_sync, message, target)
+        self.telemetry.last_platform = "Darwin"
+        try:
+            if cancel is not None and cancel.is_set():
+                return False
+            if not await self.ui.call(self._mac_send_prompt, message, target):
+                return False
+            with span("initial_wait"):
+                await timing.adelay("response_wait", RESPONSE_WAIT_SECONDS)
+            self.telemetry.stream_partials = 0
+            self.telemetry.first_partial_seconds = None
+            ready, copied_text = await self._wait_for_ready_mac_async(
+                str(message), "", cancel=cancel, on_partial=on_partial,
+            )
+            if cancel is not None and cancel.is_set():
+                self.telemetry.last_error = "cancelled"
+                return False
+            with span("finalize"):
+                ok = await self.ui.call(self._mac_finalize, message, ready, copied_text)
+            self._store_job_result(*(await self.ui.call(self._response_snapshot)))
+            return ok
+        except Exception as e:
+            logger.error(f"Ошибка: {str(e)}")
+            self.telemetry.last_error = str(e)
+            self.telemetry.failed_sends += 1
+            return False
+
+    def _front_bounds_fresh(self):
+        """Границы фронтального окна в обход кэша (геометрия вот-вот изменится)."""
+        if self._mac_manager is None:
+            return None
+        try:
+            self._mac_manager.invalidate()
+            return self._mac_manager.get_front_window_bounds()
+        except Exception:
+            return None
+
+    def _wait_window_settled(self, before) -> bool:
+        """Ждать, пока границы окна отличаются от before и не меняются между двумя опросами
+        (анимация полноэкранного режима закончилась); дедлайн — задержка fullscreen_settle."""
+        state = {"last": None}
+
+        def _settled() -> bool:
+            cur = self._front_bounds_fresh()
+            prev, state["last"] = state["last"], cur
+            return cur is not None and cur != before and cur == prev
+
+        ok = timing.wait("fullscreen_settle", _settled, poll=0.25)
+        if not ok:
+            logger.info("Геометрия окна не устоялась за отведённое время — продолжаю")
+        return ok
+
+    def _response_snapshot(self) -> tuple[str, dict]:
+        """Ответ финализации (или буфер, если его не было) и телеметрия — в UI-потоке, до следующей задачи."""
+        response = self._last_response
+        self._last_response = None
+        return (response if response is not None else read_clipboard()), self.telemetry.to_dict()
+
+    def _store_job_result(self, response: str, diag: dict) -> None:
+        """Сохранить ответ в meta текущей задачи очереди — буфер к моменту чтения ботом может быть занят другим окном."""
+        job = self.ui.current_job()
+        if job is not None:
+            job.meta['response'] = response
+            job.meta['diag'] = diag
+
+    def _window_pipeline_enabled(self, target: str | None) -> bool:
+        """Конвейер по окнам: macOS, PARALLEL_WINDOWS и сигнатура для этого окна в READY_SIGNATURE_FILE.
+
+        Вызывается в event loop: результат кэшируется по окну, пока не изменились файл (mtime) и настройки.
+        """
+        if not (PARALLEL_WINDOWS and target and platform.system() == "Darwin"):
+            return False
+        path = (config.READY_SIGNATURE_FILE or default_signature_path()).strip()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        key = str(target).strip().lower()
+        stamp = (config.READY_SIGNATURE_JSON, path, mtime)
+        cached = self._pipeline_checks.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        enabled = load_signature(target, bounds=(0, 0, 0, 0), window_only=True) is not None
+        self._pipeline_checks[key] = (stamp, enabled)
+        return enabled
+
+    def _window_lock(self, target: str) -> asyncio.Lock:
+        return self._window_locks.setdefault(str(target).strip().lower(), asyncio.Lock())
+
+    @staticmethod
+    async def _acquire_window_lock(lock: asyncio.Lock, cancel: threading.Event | None) -> bool:
+        """Дождаться замка окна; False — задачу отменили раньше (cancel_event проверяется раз в 0.5 с)."""
+        while not (cancel is not None and cancel.is_set()):
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=0.5)
+                return True
+            except asyncio.TimeoutError:
+                continue
+        return False
+
+    async def _send_pipelined_queued(self, message, target: str, cancel: threading.Event | None = None):
+        """Задача очереди для конвейера окон: второй запрос в то же окно ждёт, пока первый соберёт ответ.
+
+        Задача ставится в очередь сразу (видна в позиции/ETA, снимается /cancel). Свободное окно —
+        отправка в этой же задаче; занятое — задача отдаёт рабочий стол, ждёт замок окна и продолжает
+        отдельной задачей очереди с тем же приоритетом и владельцем.
+        """
+        lock = self._window_lock(target)
+        if not lock.locked():
+            async with lock:
+                return await self._send_pipelined(message, target, cancel)
+        job = self.ui.current_job()
+        self.ui.release()
+        logger.info(f"Параллельный режим: окно {target} занято предыдущим запросом, ожидание")
+        if not await self._acquire_window_lock(lock, cancel):
+            self.telemetry.last_error = "cancelled"
+            return False
+        try:
+            resumed = await self.ui.submit(
+                self._send_pipelined, message, target, cancel=cancel,
+                priority=job.priority if job is not None else PRIORITY_NORMAL,
+                label="send_resume", owner=job.owner if job is not None else None,
+            )
+            ok = await self.ui.wait(resumed)
+            if job is not None:
+                job.meta.update(resumed.meta)
+            return ok
+        finally:
+            lock.release()
+
+    def _collect_window(self, message, target: str, scheduler: ReadinessScheduler,
+                        ready_by: str | None, start: float,
+                        c: ConfigSnapshot | None = None) -> tuple[bool, str, dict]:
+        """Фаза сбора ответа окна конвейера (UI-задача): фокус окна, копирование, финализация."""
+        if not self._ensure_windsurf_frontmost_mac(target):
+            self.telemetry.last_error = f"focus failed for target: {target}"
+            self.telemetry.failed_sends += 1
+            return False, "", self.telemetry.to_dict()
+        ready, copied_text = self._finish_ready_mac(str(message), scheduler, ready_by, start, c)
+        ok = self._mac_finalize(message, ready, copied_text)
+        response, diag = self._response_snapshot()
+        return ok, response, diag
+
+    async def _send_pipelined(self, message, target: str, cancel: threading.Event | None = None):
+        """Отправка в окно с освобождением рабочего стола на время генерации.
+
+        Отправка — в текущей задаче очереди; затем release(): очередь обслуживает другие окна,
+        а пробы сигнатуры этого окна и сбор ответа идут отдельными UI-задачами с высоким приоритетом.
+        """
+        with get_tracer().trace("send", target=target, chars=len(str(message)), pipelined=True) as root:
+            ok = await self._send_pipelined_traced(message, target, cancel)
+            root.set(ok=bool(ok))
+        self._observe_request(target, ok, root.duration)
+        return ok
+
+    async def _send_pipelined_traced(self, message, target: str, cancel: threading.Event | None) -> bool:
+        self.telemetry.last_platform = "Darwin"
+        job = self.ui.current_job()
+        try:
+            if cancel is not None and cancel.is_set():
+                return False
+            if not await self.ui.call(self._mac_send_prompt, message, target):
+                return False
+            bounds = await self.ui.call(self._mac_manager.get_front_window_bounds) if self._mac_manager else None
+            signature = load_signature(target, bounds, window_only=True)
+            if signature is None:
+                # relative-сигнатура без границ окна — ждём по-старому, не отдавая рабочий стол
+                logger.warning(f"Параллельный режим: нет сигнатуры/границ для окна {target}, ожидание без release")
+                await timing.adelay("response_wait", RESPONSE_WAIT_SECONDS)
+                ready, copied_text = await self._wait_for_ready_mac_async(str(message), "", cancel=cancel)
+                ok = await self.ui.call(self._mac_finalize, message, ready, copied_text)
+                self._store_job_result(*(await self.ui.call(self._response_snapshot)))
+                return ok
+            self.ui.release()
+            with span("initial_wait"):
+                await timing.adelay("response_wait", RESPONSE_WAIT_SECONDS)
+            start = time.time()
+            c = config_store().current()
+            scheduler = self._build_readiness_scheduler("", signature=signature, c=c)
+            logger.info(f"Параллельный режим: окно {target} генерирует, пробы сигнатуры {signature.bounding_region()}")
+            with span("readiness") as sp:
+                ready_by = await scheduler.wait(
+                    cancel=cancel,
+                    runner=lambda fn: self.ui.run(fn, priority=PRIORITY_HIGH, label="probe"),
+                )
+                if sp is not None:
+                    sp.set(ready_by=ready_by, ticks=scheduler.ticks)
+            if cancel is not None and cancel.is_set():
+                self.telemetry.last_error = "cancelled"
+                return False
+            # Сбор идёт отдельной задачей очереди (свой контекст) — фаза измеряется снаружи целиком
+            collect_t0 = time.monotonic()
+            ok, response, diag = await self.ui.run(
+                self._collect_window, message, target, scheduler, ready_by, start, c,
+                priority=PRIORITY_HIGH, label="collect",
+            )
+            record_span("collect", time.monotonic() - collect_t0, chars=len(response or ""))
+            if job is not None:
+                job.meta['response'] = response
+                job.meta['diag'] = diag
+            return ok
+        except Exception as e:
+            logger.error(f"Ошибка: {str(e)}")
+            self.telemetry.last_error = str(e)
+            self.telemetry.failed_sends += 1
+            return False
+
+    async def enqueue_send(self, message, target: str | None = None, owner=None,
+                           priority: int = PRIORITY_NORMAL, on_partial=None) -> UIJob:
+        """Поставить отправку в очередь UI. Результат — await self.ui.wait(job); позиция/ETA — self.ui.
+
+        on_partial(text, delta) — получатель частичного ответа во время генерации (STREAM_PARTIAL=1);
+        в конвейере окон не используется: окно генерирует в фоне, а копирование требует фокуса.
+
+        При PARALLEL_WINDOWS и сигнатуре окна запрос идёт конвейером (_send_pipelined); второй запрос
+        в то же окно ждёт, пока первый не соберёт ответ.
+        """
+        if self._window_pipeline_enabled(target):
+            return await self.ui.submit(
+                self._send_pipelined_queued, message, target,
+                priority=priority, label="send", owner=owner, with_cancel=True,
+            )
+        return await self.ui.submit(
+            self._send_message_async, message, target,
+            priority=priority, label="send", owner=owner, with_cancel=True, on_partial=on_partial,
+        )
+
     async def send_message(self, message):
-        """Асинхронная обертка для отправки сообщения"""
-        return await asyncio.to_thread(self.send_message_sync, message)
+        """Асинхронная обертка для отправки сообщения (через очередь UI)"""
+        return await self.ui.wait(await self.enqueue_send(message))
 
     async def send_message_to(self, target: str, message):
         """Асинхронная отправка сообщения в конкретное окно/таргет (macOS: index:N или часть заголовка)."""
-        return await asyncio.to_thread(self.send_message_sync, message, target)
+        return await self.ui.wait(await self.enqueue_send(message, target))
 
     def list_windows(self) -> list:
         """Список заголовков окон Windsurf (macOS). На других платформах возвращает пустой список."""
@@ -1157,7 +1574,7 @@ class DesktopController:
                 return False, "UI model switching поддерживается только на macOS"
             # Сфокусировать нужное окно Windsurf
             self._ensure_windsurf_frontmost_mac(target or "active")
-            time.sleep(0.2)
+            timing.delay("palette_settle")
             # Кликнуть в правую панель (ANSWER_ABS_X/Y), чтобы гарантировать фокус перед Cmd+/
             try:
                 ax = int(os.getenv("ANSWER_ABS_X", "-1"))
@@ -1175,102 +1592,89 @@ class DesktopController:
                     pyautogui.moveTo(cx, cy, duration=0.05)
                     pyautogui.click()
                     self.telemetry.last_click_xy = (cx, cy)
-                    time.sleep(0.15)
+                    timing.delay("click_settle")
                 except Exception:
                     pass
             # Открыть палитру команд и ввести запрос (через буфер, чтобы избежать раскладки)
             pyautogui.hotkey('command', '/')
-            time.sleep(0.25)
+            timing.delay("palette_open")
             # Очистим строку
             pyautogui.hotkey('command', 'a')
-            time.sleep(0.05)
-            # Подготовим буфер обмена
-            old_clip = None
-            try:
-                if WSMODEL_RESTORE_CLIPBOARD:
-                    old_clip = pyperclip.paste()
-            except Exception:
-                old_clip = None
-            try:
-                pyperclip.copy(str(model_name))
-                time.sleep(0.05)
-            except Exception:
-                pass
-            pyautogui.hotkey('command', 'v')
-            time.sleep(0.2)
-            # Подтверждение кликом (вместо Enter)
-            try:
-                sw, sh = pyautogui.size()
-            except Exception:
-                sw = sh = 0
-            cx = int(WSMODEL_CONFIRM_CLICK_X)
-            cy = int(WSMODEL_CONFIRM_CLICK_Y)
-            # Спец. условие для /wsmodel set: проверяем пиксель в точке (по умолчанию 1179,728)
-            # Если он "белый" (>=254 по всем каналам), то финальный клик смещаем на безопасную точку
-            # Делаем двойное измерение (direct + screencapture) и логируем детали.
-            try:
-                # Кламп координаты измерения в пределах экрана
+            timing.delay("key_tap")
+            # Подготовим буфер обмена (снимок для восстановления — WSMODEL_RESTORE_CLIPBOARD)
+            with ClipboardSession(restore=WSMODEL_RESTORE_CLIPBOARD) as cb:
+                cb.copy(str(model_name))
+                pyautogui.hotkey('command', 'v')
+                timing.delay("palette_paste")
+                # Подтверждение кликом (вместо Enter)
                 try:
-                    sx = int(os.getenv("WSMODEL_PROBE_X", "1179").strip())
-                except Exception:
-                    sx = 1179
-                try:
-                    sy = int(os.getenv("WSMODEL_PROBE_Y", "728").strip())
+                    sw, sh = pyautogui.size()
                 except Exception:
-                    sy = 728
-                if sw and sh:
-                    sx = max(0, min(sw - 1, sx))
-                    sy = max(0, min(sh - 1, sy))
-                # Переместим курсор к точке проверки и подождём 1.5s, чтобы визуально видеть где измеряем
+                    sw = sh = 0
+                cx = int(WSMODEL_CONFIRM_CLICK_X)
+                cy = int(WSMODEL_CONFIRM_CLICK_Y)
+                # Спец. условие для /wsmodel set: проверяем пиксель в точке (по умолчанию 1179,728)
+                # Если он "белый" (>=254 по всем каналам), то финальный клик смещаем на безопасную точку
+                # Делаем двойное измерение (direct + screencapture) и логируем детали.
                 try:
-                    logger.info("wsmodel confirm: навожу курсор на точку проверки (%d,%d) и жду 1.5s", sx, sy)
-                    pyautogui.moveTo(sx, sy, duration=0.05)
-                except Exception:
-                    pass
-                time.sleep(1.5)
-                pr1, pg1, pb1 = _rgb_at(sx, sy)
-                pr2, pg2, pb2 = _avg_rgb_via_screencapture(sx, sy, 1)
-                is_white_direct = (int(pr1) >= 254 and int(pg1) >= 254 and int(pb1) >= 254)
-                is_white_cap = (int(pr2) >= 254 and int(pg2) >= 254 and int(pb2) >= 254)
-                logger.info(
-                    "wsmodel confirm probe @(%d,%d): direct=(%d,%d,%d) cap=(%d,%d,%d) -> white_direct=%s white_cap=%s",
-                    sx, sy, int(pr1), int(pg1), int(pb1), int(pr2), int(pg2), int(pb2), is_white_direct, is_white_cap,
-                )
-                if is_white_direct or is_white_cap:
-                    # Безопасная точка подтверждения (ENV override)
+                    # Кламп координаты измерения в пределах экрана
                     try:
-                        safe_x = int(os.getenv("WSMODEL_CONFIRM_SAFE_X", "1130").strip())
+                        sx = int(os.getenv("WSMODEL_PROBE_X", "1179").strip())
                     except Exception:
-                        safe_x = 1130
+                        sx = 1179
                     try:
-                        safe_y = int(os.getenv("WSMODEL_CONFIRM_SAFE_Y", "695").strip())
+                        sy = int(os.getenv("WSMODEL_PROBE_Y", "728").strip())
                     except Exception:
-                        safe_y = 695
-                    logger.info("wsmodel confirm: белый фон обнаружен — смещаю клик на (%d,%d)", safe_x, safe_y)
-                    cx, cy = safe_x, safe_y
+                        sy = 728
+                    if sw and sh:
+                        sx = max(0, min(sw - 1, sx))
+                        sy = max(0, min(sh - 1, sy))
+                    # Переместим курсор к точке проверки и подождём 1.5s, чтобы визуально видеть где измеряем
+                    try:
+                        logger.info("wsmodel confirm: навожу курсор на точку проверки (%d,%d) и жду 1.5s", sx, sy)
+                        pyautogui.moveTo(sx, sy, duration=0.05)
+                    except Exception:
+                        pass
+                    timing.delay("probe_hover")
+                    pr1, pg1, pb1 = _rgb_at(sx, sy)
+                    pr2, pg2, pb2 = _avg_rgb_via_screencapture(sx, sy, 1)
+                    is_white_direct = (int(pr1) >= 254 and int(pg1) >= 254 and int(pb1) >= 254)
+                    is_white_cap = (int(pr2) >= 254 and int(pg2) >= 254 and int(pb2) >= 254)
+                    logger.info(
+                        "wsmodel confirm probe @(%d,%d): direct=(%d,%d,%d) cap=(%d,%d,%d) "
+                        "-> white_direct=%s white_cap=%s",
+                        sx, sy, int(pr1), int(pg1), int(pb1), int(pr2), int(pg2), int(pb2),
+                        is_white_direct, is_white_cap,
+                    )
+                    if is_white_direct or is_white_cap:
+                        # Безопасная точка подтверждения (ENV override)
+                        try:
+                            safe_x = int(os.getenv("WSMODEL_CONFIRM_SAFE_X", "1130").strip())
+                        except Exception:
+                            safe_x = 1130
+                        try:
+                            safe_y = int(os.getenv("WSMODEL_CONFIRM_SAFE_Y", "695").strip())
+                        except Exception:
+                            safe_y = 695
+                        logger.info("wsmodel confirm: белый фон обнаружен — смещаю клик на (%d,%d)", safe_x, safe_y)
+                        cx, cy = safe_x, safe_y
+                    else:
+                        logger.info("wsmodel confirm: белый фон НЕ обнаружен — кликаю по стандартным (%d,%d)", cx, cy)
+                except Exception as e:
+                    logger.warning(f"wsmodel confirm probe failed: {e}")
+                if cx >= 0 and cy >= 0:
+                    ccx = max(0, min((sw - 1) if sw else cx, cx))
+                    ccy = max(0, min((sh - 1) if sh else cy, cy))
+                    try:
+                        logger.info("wsmodel confirm click at (%d,%d) [clamped from (%d,%d)]", ccx, ccy, cx, cy)
+                        pyautogui.moveTo(ccx, ccy, duration=0.05)
+                        pyautogui.click()
+                        timing.delay("palette_settle")
+                    except Exception:
+                        # Фоллбэк — Enter, если клик не удался
+                        pyautogui.press('enter')
                 else:
-                    logger.info("wsmodel confirm: белый фон НЕ обнаружен — кликаю по стандартным (%d,%d)", cx, cy)
-            except Exception as e:
-                logger.warning(f"wsmodel confirm probe failed: {e}")
-            if cx >= 0 and cy >= 0:
-                ccx = max(0, min((sw - 1) if sw else cx, cx))
-                ccy = max(0, min((sh - 1) if sh else cy, cy))
-                try:
-                    logger.info("wsmodel confirm click at (%d,%d) [clamped from (%d,%d)]", ccx, ccy, cx, cy)
-                    pyautogui.moveTo(ccx, ccy, duration=0.05)
-                    pyautogui.click()
-                    time.sleep(0.2)
-                except Exception:
-                    # Фоллбэк — Enter, если клик не удался
                     pyautogui.press('enter')
-            else:
-                pyautogui.press('enter')
-            # Восстановим буфер, если нужно
-            try:
-                if WSMODEL_RESTORE_CLIPBOARD and (old_clip is not None):
-                    pyperclip.copy(old_clip)
-            except Exception:
-                pass
             self.telemetry.last_model_set = str(model_name)
             logger.info(f"UI: переключил модель Windsurf -> {model_name}")
             return True, f"Модель переключена: {model_name}"
@@ -1290,7 +1694,7 @@ class DesktopController:
                 self._ensure_windsurf_frontmost_mac(target or "active")
             except Exception:
                 pass
-            time.sleep(0.1)
+            timing.delay("key_step")
             try:
                 sw, sh = pyautogui.size()
             except Exception:
@@ -1327,143 +1731,144 @@ class DesktopController:
                     self._ensure_windsurf_frontmost_mac(target or "active")
                 except Exception:
                     pass
-                time.sleep(0.2)
-                try:
-                    pyautogui.hotkey('command', 'o')
-                    time.sleep(0.35)
-                    pyautogui.hotkey('command', 'shift', 'g')  # Go to Folder
-                    time.sleep(0.25)
-                    old_clip = None
-                    if WSMODEL_RESTORE_CLIPBOARD:
-                        try:
-                            old_clip = pyperclip.paste()
-                        except Exception:
-                            old_clip = None
-                    try:
-                        pyperclip.copy(dest)
-                        time.sleep(0.07)
-                    except Exception:
-                        pass
-                    pyautogui.hotkey('command', 'v')
-                    time.sleep(0.12)
-                    pyautogui.press('enter')  # go
-                    time.sleep(0.35)
-                    pyautogui.press('enter')  # open in current window
-                    # Дать времени окну перегрузиться
-                    time.sleep(0.8)
-                    # Разворачиваем в полноэкранный режим (macOS стандарт)
-                    pyautogui.hotkey('command', 'control', 'f')
-                    # Подождём, чтобы UI устаканился, прежде чем проверять пиксель
-                    logger.info("change_project: жду 3s перед финальной проверкой пикселя...")
-                    time.sleep(3.0)
-                    # Финальное действие: кликнуть в (1205,15), НО пропустить,
-                    # если цвет равен 127,126,122 или 51,51,51 (по direct или screencapture)
+                timing.delay("palette_settle")
+                # Снимок буфера на весь путь, включая фоллбэк open -a (WSMODEL_RESTORE_CLIPBOARD)
+                with ClipboardSession(restore=WSMODEL_RESTORE_CLIPBOARD) as cb:
                     try:
+                        pyautogui.hotkey('command', 'o')
+                        timing.delay("dialog_open")
+                        pyautogui.hotkey('command', 'shift', 'g')  # Go to Folder
+                        timing.delay("dialog_step")
+                        cb.copy(dest)
+                        pyautogui.hotkey('command', 'v')
+                        timing.delay("dialog_paste")
+                        pyautogui.press('enter')  # go
+                        timing.delay("dialog_open")
+                        pyautogui.press('enter')  # open in current window
+                        # Дать времени окну перегрузиться
+                        timing.delay("project_reload")
+                        # Разворачиваем в полноэкранный режим (macOS стандарт)
+                        before = self._front_bounds_fresh()
+                        pyautogui.hotkey('command', 'control', 'f')
+                        # Подождём, пока геометрия окна сменится и устоится (не дольше fullscreen_settle),
+                        # прежде чем проверять пиксель
+                        logger.info("change_project: жду полноэкранный режим перед финальной проверкой пикселя...")
+                        self._wait_window_settled(before)
+                        # Финальное действие: кликнуть в (1205,15), НО пропустить,
+                        # если цвет равен 127,126,122 или 51,51,51 (по direct или screencapture)
                         try:
-                            sw, sh = pyautogui.size()
-                        except Exception:
-                            sw = sh = 0
-                        # Точка финальной проверки (ENV override), по умолчанию 1205,15
-                        try:
-                            tx = int(os.getenv("CHANGE_FINAL_PROBE_X", "1205").strip())
-                        except Exception:
-                            tx = 1205
-                        try:
-                            ty = int(os.getenv("CHANGE_FINAL_PROBE_Y", "15").strip())
-                        except Exception:
-                            ty = 15
-                        if sw and sh:
-                            tx = max(0, min(sw - 1, tx))
-                            ty = max(0, min(sh - 1, ty))
-                        # Наведём курсор к точке финальной проверки и дадим время 1.5s
-                        try:
-                            logger.info("change_project: навожу курсор на точку финальной проверки (%d,%d) и жду 1.5s", tx, ty)
-                            pyautogui.moveTo(tx, ty, duration=0.05)
-                        except Exception:
-                            pass
-                        time.sleep(1.5)
-                        r1, g1, b1 = _rgb_at(tx, ty)
-                        r2, g2, b2 = _avg_rgb_via_screencapture(tx, ty, 1)
-                        forbid1 = (int(r1) == 127 and int(g1) == 126 and int(b1) == 122) or (int(r1) == 51 and int(g1) == 51 and int(b1) == 51)
-                        forbid2 = (int(r2) == 127 and int(g2) == 126 and int(b2) == 122) or (int(r2) == 51 and int(g2) == 51 and int(b2) == 51)
-                        logger.info(
-                            "change_project final probe @(1205,15)->@(%d,%d): direct=(%d,%d,%d) cap=(%d,%d,%d) forbid_direct=%s forbid_cap=%s",
-                            tx, ty, int(r1), int(g1), int(b1), int(r2), int(g2), int(b2), forbid1, forbid2,
-                        )
-                        if not (forbid1 or forbid2):
-                            pyautogui.moveTo(tx, ty, duration=0.05)
-                            pyautogui.click()
-                            logger.info("change_project: финальный клик по (%d,%d)", tx, ty)
-                        else:
-                            logger.info("change_project: финальный клик пропущен из-за запрещённого цвета")
-                    except Exception as _e:
-                        logger.warning(f"change_project final click check failed: {_e}")
-                    if WSMODEL_RESTORE_CLIPBOARD and (old_clip is not None):
-                        try:
-                            pyperclip.copy(old_clip)
-                        except Exception:
-                            pass
-                    return True, f"Открыт проект и развернут на весь экран: {dest}"
-                except Exception as e:
-                    logger.warning(f"change_project UI path failed: {e}; trying 'open -a' fallback")
-                    # 2) Фоллбэк: open -a (может открыть в новом окне). После открытия — разворачиваем.
-                    try:
-                        rc = subprocess.run(["open", "-a", "Windsurf", dest], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        if rc.returncode == 0:
-                            time.sleep(0.8)
                             try:
-                                self._ensure_windsurf_frontmost_mac(target or "active")
+                                sw, sh = pyautogui.size()
                             except Exception:
-                                pass
-                            pyautogui.hotkey('command', 'control', 'f')
-                            # Подождём, чтобы UI устаканился, прежде чем проверять пиксель
-                            logger.info("change_project (fallback): жду 3s перед финальной проверкой пикселя...")
-                            time.sleep(3.0)
-                            # Финальное действие: кликнуть в (1205,15), НО пропустить,
-                            # если цвет равен 127,126,122 или 51,51,51 (по direct или screencapture)
+                                sw = sh = 0
+                            # Точка финальной проверки (ENV override), по умолчанию 1205,15
                             try:
+                                tx = int(os.getenv("CHANGE_FINAL_PROBE_X", "1205").strip())
+                            except Exception:
+                                tx = 1205
+                            try:
+                                ty = int(os.getenv("CHANGE_FINAL_PROBE_Y", "15").strip())
+                            except Exception:
+                                ty = 15
+                            if sw and sh:
+                                tx = max(0, min(sw - 1, tx))
+                                ty = max(0, min(sh - 1, ty))
+                            # Наведём курсор к точке финальной проверки и дадим время 1.5s
+                            try:
+                                logger.info("change_project: навожу курсор на точку финальной проверки "
+                                            "(%d,%d) и жду 1.5s", tx, ty)
+                                pyautogui.moveTo(tx, ty, duration=0.05)
+                            except Exception:
+                                pass
+                            timing.delay("probe_hover")
+                            r1, g1, b1 = _rgb_at(tx, ty)
+                            r2, g2, b2 = _avg_rgb_via_screencapture(tx, ty, 1)
+                            forbid1 = ((int(r1) == 127 and int(g1) == 126 and int(b1) == 122)
+                                       or (int(r1) == 51 and int(g1) == 51 and int(b1) == 51))
+                            forbid2 = ((int(r2) == 127 and int(g2) == 126 and int(b2) == 122)
+                                       or (int(r2) == 51 and int(g2) == 51 and int(b2) == 51))
+                            logger.info(
+                                "change_project final probe @(1205,15)->@(%d,%d): direct=(%d,%d,%d) cap=(%d,%d,%d) "
+                                "forbid_direct=%s forbid_cap=%s",
+                                tx, ty, int(r1), int(g1), int(b1), int(r2), int(g2), int(b2), forbid1, forbid2,
+                            )
+                            if not (forbid1 or forbid2):
+                                pyautogui.moveTo(tx, ty, duration=0.05)
+                                pyautogui.click()
+                                logger.info("change_project: финальный клик по (%d,%d)", tx, ty)
+                            else:
+                                logger.info("change_project: финальный клик пропущен из-за запрещённого цвета")
+                        except Exception as _e:
+                            logger.warning(f"change_project final click check failed: {_e}")
+                        return True, f"Открыт проект и развернут на весь экран: {dest}"
+                    except Exception as e:
+                        logger.warning(f"change_project UI path failed: {e}; trying 'open -a' fallback")
+                        # 2) Фоллбэк: open -a (может открыть в новом окне). После открытия — разворачиваем.
+                        try:
+                            counters().inc("subprocess_spawns", cmd="open")
+                            rc = subprocess.run(["open", "-a", "Windsurf", dest],
+                                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                            if rc.returncode == 0:
+                                timing.delay("project_reload")
                                 try:
-                                    sw, sh = pyautogui.size()
-                                except Exception:
-                                    sw = sh = 0
-                                # Точка финальной проверки (ENV override), по умолчанию 1205,15
-                                try:
-                                    tx = int(os.getenv("CHANGE_FINAL_PROBE_X", "1205").strip())
-                                except Exception:
-                                    tx = 1205
-                                try:
-                                    ty = int(os.getenv("CHANGE_FINAL_PROBE_Y", "15").strip())
-                                except Exception:
-                                    ty = 15
-                                if sw and sh:
-                                    tx = max(0, min(sw - 1, tx))
-                                    ty = max(0, min(sh - 1, ty))
-                                # Наведём курсор к точке финальной проверки и дадим время 1.5s
-                                try:
-                                    logger.info("change_project(fallback): навожу курсор на точку финальной проверки (%d,%d) и жду 1.5s", tx, ty)
-                                    pyautogui.moveTo(tx, ty, duration=0.05)
+                                    self._ensure_windsurf_frontmost_mac(target or "active")
                                 except Exception:
                                     pass
-                                time.sleep(1.5)
-                                r1, g1, b1 = _rgb_at(tx, ty)
-                                r2, g2, b2 = _avg_rgb_via_screencapture(tx, ty, 1)
-                                forbid1 = (int(r1) == 127 and int(g1) == 126 and int(b1) == 122) or (int(r1) == 51 and int(g1) == 51 and int(b1) == 51)
-                                forbid2 = (int(r2) == 127 and int(g2) == 126 and int(b2) == 122) or (int(r2) == 51 and int(g2) == 51 and int(b2) == 51)
-                                logger.info(
-                                    "change_project final probe @(1205,15)->@(%d,%d): direct=(%d,%d,%d) cap=(%d,%d,%d) forbid_direct=%s forbid_cap=%s",
-                                    tx, ty, int(r1), int(g1), int(b1), int(r2), int(g2), int(b2), forbid1, forbid2,
-                                )
-                                if not (forbid1 or forbid2):
-                                    pyautogui.moveTo(tx, ty, duration=0.05)
-                                    pyautogui.click()
-                                    logger.info("change_project: финальный клик по (%d,%d)", tx, ty)
-                                else:
-                                    logger.info("change_project: финальный клик пропущен из-за запрещённого цвета")
-                            except Exception as _e:
-                                logger.warning(f"change_project final click check failed: {_e}")
-                            return True, f"Открыт проект через fallback и развернут: {dest}"
-                    except Exception as e2:
-                        return False, f"Не удалось открыть (fallback): {e2}"
+                                before = self._front_bounds_fresh()
+                                pyautogui.hotkey('command', 'control', 'f')
+                                # Подождём, пока геометрия окна сменится и устоится, прежде чем проверять пиксель
+                                logger.info("change_project (fallback): жду полноэкранный режим "
+                                            "перед финальной проверкой пикселя...")
+                                self._wait_window_settled(before)
+                                # Финальное действие: кликнуть в (1205,15), НО пропустить,
+                                # если цвет равен 127,126,122 или 51,51,51 (по direct или screencapture)
+                                try:
+                                    try:
+                                        sw, sh = pyautogui.size()
+                                    except Exception:
+                                        sw = sh = 0
+                                    # Точка финальной проверки (ENV override), по умолчанию 1205,15
+                                    try:
+                                        tx = int(os.getenv("CHANGE_FINAL_PROBE_X", "1205").strip())
+                                    except Exception:
+                                        tx = 1205
+                                    try:
+                                        ty = int(os.getenv("CHANGE_FINAL_PROBE_Y", "15").strip())
+                                    except Exception:
+                                        ty = 15
+                                    if sw and sh:
+                                        tx = max(0, min(sw - 1, tx))
+                                        ty = max(0, min(sh - 1, ty))
+                                    # Наведём курсор к точке финальной проверки и дадим время 1.5s
+                                    try:
+                                        logger.info("change_project(fallback): навожу курсор на точку "
+                                                    "финальной проверки (%d,%d) и жду 1.5s", tx, ty)
+                                        pyautogui.moveTo(tx, ty, duration=0.05)
+                                    except Exception:
+                                        pass
+                                    timing.delay("probe_hover")
+                                    r1, g1, b1 = _rgb_at(tx, ty)
+                                    r2, g2, b2 = _avg_rgb_via_screencapture(tx, ty, 1)
+                                    forbid1 = ((int(r1) == 127 and int(g1) == 126 and int(b1) == 122)
+                                               or (int(r1) == 51 and int(g1) == 51 and int(b1) == 51))
+                                    forbid2 = ((int(r2) == 127 and int(g2) == 126 and int(b2) == 122)
+                                               or (int(r2) == 51 and int(g2) == 51 and int(b2) == 51))
+                                    logger.info(
+                                        "change_project final probe @(1205,15)->@(%d,%d): direct=(%d,%d,%d) "
+                                        "cap=(%d,%d,%d) forbid_direct=%s forbid_cap=%s",
+                                        tx, ty, int(r1), int(g1), int(b1), int(r2), int(g2), int(b2), forbid1, forbid2,
+                                    )
+                                    if not (forbid1 or forbid2):
+                                        pyautogui.moveTo(tx, ty, duration=0.05)
+                                        pyautogui.click()
+                                        logger.info("change_project: финальный клик по (%d,%d)", tx, ty)
+                                    else:
+                                        logger.info("change_project: финальный клик пропущен из-за запрещённого цвета")
+                                except Exception as _e:
+                                    logger.warning(f"change_project final click check failed: {_e}")
+                                return True, f"Открыт проект через fallback и развернут: {dest}"
+                        except Exception as e2:
+                            return False, f"Не удалось открыть (fallback): {e2}"
             else:
                 return False, "Смена проекта поддерживается только на macOS"
         except Exception as e:
@@ -1471,4 +1876,5 @@ class DesktopController:
             return False, f"Ошибка change: {e}"
 
 
-desktop_controller = DesktopController()
+# Ленивый синглтон: контроллер (воркеры, сэмплер, наблюдатель .env) создаётся при первом обращении
+desktop_controller = LazyObject(DesktopController)